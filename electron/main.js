@@ -1048,7 +1048,7 @@ async function startPythonServer() {
       if (app.isPackaged) {
         // 在生产环境中，使用应用数据目录中的Python脚本
         const appDataPath = getAppDataPath();
-        pythonScript = path.join(appDataPath, 'app_python', 'api.py');
+        pythonScript = path.join(appDataPath, 'app_python', 'server.py');
         
         // 如果脚本不存在，尝试从资源目录复制
         if (!fs.existsSync(pythonScript)) {
@@ -1066,7 +1066,7 @@ async function startPythonServer() {
         }
       } else {
         // 开发环境使用项目目录中的脚本
-        pythonScript = path.join(app.getAppPath(), 'python', 'api.py');
+        pythonScript = path.join(app.getAppPath(), 'python', 'server.py');
       }
       
       // 确保脚本文件存在
@@ -1098,6 +1098,10 @@ async function startPythonServer() {
       let envVars = {
         ...process.env,
         PYTHONUNBUFFERED: '1', // 禁用Python输出缓冲
+        // 本地模型目录：打包后Python代码在应用数据目录中，模型在资源目录中
+        FINDME_MODELS_DIR: app.isPackaged
+          ? path.join(process.resourcesPath, 'models')
+          : path.join(app.getAppPath(), 'src', 'models'),
       };
       
       // 如果是打包后的应用，确保加载.env文件中的环境变量
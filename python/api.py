@@ -5,32 +5,26 @@ import os
 import sys
 import json
 import time
+import asyncio
 import subprocess
 import shutil
 import traceback
+import threading
 import urllib.parse
 from typing import List, Dict, Any, Optional
 
+# 启动各阶段的耗时记录在 STARTUP 中，通过 /startup 查看
+from profiling import STARTUP, lazy_import
+
 # 配置详细日志
 import logging
+from log_pipeline import setup_logging
 
-# 创建自定义的日志格式和处理器
-class StdoutLogHandler(logging.StreamHandler):
-    def __init__(self):
-        logging.StreamHandler.__init__(self, sys.stdout)
-
-# 创建控制台处理器，正常日志输出到标准输出
-stdout_handler = StdoutLogHandler()
-stdout_handler.setLevel(logging.INFO)
-stdout_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+# 日志格式: json(每行一条结构化记录) / text(旧的纯文本格式)
+LOG_FORMAT = "json"
 
-# 配置根日志记录器
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
-# 移除所有已存在的处理器
-for handler in root_logger.handlers[:]:
-    root_logger.removeHandler(handler)
-root_logger.addHandler(stdout_handler)
+# 日志先进入有界队列，由后台线程写到标准输出，索引和请求处理线程不会被输出阻塞
+log_listener = setup_logging(logging.INFO, LOG_FORMAT)
 
 # 获取应用程序日志记录器
 logger = logging.getLogger(__name__)
@@ -53,6 +47,8 @@ def load_env_variables():
 # 在导入其他模块前加载环境变量
 load_env_variables()
 
+STARTUP.mark("logging_ready")
+
 # 导入watchdog相关模块
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileDeletedEvent, FileMovedEvent, FileModifiedEvent
@@ -60,26 +56,54 @@ from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileDelete
 
 from fastapi import FastAPI, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
-# 导入所需的langchain模块
-from langchain_community.document_loaders import (
-    TextLoader, 
-    PyPDFLoader
-)
-from langchain.document_loaders.base import BaseLoader
-from langchain.schema import Document
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import DashScopeEmbeddings
+# 只导入轻量的 langchain_core.documents；文档加载器、faiss 等重依赖第一次用到时才导入（见 preload_heavy_modules）
+from langchain_core.documents import Document
 from dotenv import load_dotenv
+STARTUP.mark("web_imports_done")
+
+from chunking import create_chunker, get_token_counter
+from embedding import EmbeddingBatcher, DeadLetterQueue, DEAD_LETTER_FILE
+from vector_storage import (load_vector_store, save_vector_store, close_vector_store, delete_sources, add_embeddings,
+                            get_chunk_store, reuse_vectors, folder_prefix, current_index_path, SnapshotReader,
+                            similarity_search_in_folder, import_vector_store, index_dimension, INDEX_FILE,
+                            STORAGE_MODES)
+from chunk_store import ChunkStore, CHUNK_STORE_FILE
+from dedup import DuplicateDetector, file_content_hash, simhash, chunk_hash, remove_surrogates
+from metrics import (REGISTRY, PARSE_SECONDS, PARSE_FAILURES, EMBEDDING_REUSED_TEXTS, WATCHER_QUEUE_DEPTH,
+                     WATCHER_LAG_SECONDS, REQUEST_SECONDS, INDEX_IN_PROGRESS, DEAD_LETTER_PENDING)
+from profiling import IndexProfiler
+from progress import FileHistory, FILE_CATEGORIES
+from executors import BoundedExecutor, ExecutorBusy
+from pipeline import Pipeline
+from query_cache import QueryCache
+from suggest import SuggestIndex, SuggestRegistry, QueryHistory
+from filename_index import FilenameIndex, looks_like_filename
+from ocr import OcrEngine, IMAGE_EXTENSIONS, OCR_CACHE_FILE
+from warmup import SearchUsage, Warmer, WarmupSkipped, SEARCH_USAGE_FILE
+from search_worker import SearchProcessPool, search_folder
+STARTUP.mark("backend_imports_done")
 
 # 全局变量：文件监控相关
 active_observers = {}  # 存储活跃的文件监控器
 file_handlers = {}  # 存储文件处理器
 
+# 全局变量：死信队列（按向量库路径）
+dead_letter_queues = {}
+
+# 全局变量：搜索使用记录（按向量库路径）
+search_usages = {}
+
+# 共享向量库的写锁：索引、文件监控和死信重试都写同一个向量库
+vector_store_lock = threading.RLock()
+
+# 向量数据库目录，共享向量库保存在其中的 SHARED_STORE_NAME 子目录
+VECTOR_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vector_store")
+SHARED_STORE_NAME = "shared"
+
 # 索引状态全局变量
 index_status = {
     "in_progress": False,
@@ -92,18 +116,113 @@ index_status = {
         "failure_count": 0,
         "skipped_count": 0,
         "total_count": 0
-    },
-    "success_files": [],    # 成功索引的文件列表
-    "failed_files": [],     # 索引失败的文件列表
-    "skipped_files": []     # 跳过的文件列表
+    }
 }
 
+# 最近一次开启剖析的索引任务，供 /index-profile 查询
+last_index_profile = None
+
 # 全局配置参数
 MAX_TEXT_LENGTH = 20000  # 每个文件的最大字符数限制
 MAX_CHUNK_COUNT = 200    # 每个文件最大分块数量
 MAX_FILE_SIZE_MB = 100   # 默认最大文件大小限制(MB)，从10MB改为100MB
 MAX_TEXT_BLOCK_SIZE = 2048  # v2模型限制为2048 Token/行
 MAX_BATCH_ROWS = 25      # 通义千问一次调用支持的最大行数
+MAX_BATCH_TOKENS = 16384  # 每批嵌入请求的最大Token总数
+EMBEDDING_MAX_RETRIES = 5  # 嵌入请求被限流时的最大重试次数
+EMBEDDING_BASE_URL = None  # 嵌入服务地址，None 为通义千问的默认地址
+EMBEDDING_HTTP_MAX_CONNECTIONS = 10   # 嵌入客户端连接池的最大连接数
+EMBEDDING_HTTP_MAX_KEEPALIVE = 5      # 空闲时保持的长连接数
+EMBEDDING_HTTP_KEEPALIVE_EXPIRY = 60  # 空闲长连接的保持时间(秒)
+EMBEDDING_CONNECT_TIMEOUT = 5         # 建立连接的超时(秒)
+EMBEDDING_READ_TIMEOUT = 30           # 等待嵌入响应的超时(秒)
+EMBEDDING_HTTP2 = True                # 安装了h2时使用HTTP/2
+DEAD_LETTER_RETRY_INTERVAL = 300  # 后台重试死信队列的间隔(秒)
+DEAD_LETTER_MAX_ATTEMPTS = 10     # 死信队列中文本块的最大自动重试次数
+INDEX_STORAGE_MODE = "flat"  # 向量存储格式: flat(float32) / fp16 / sq8
+INDEX_MMAP_ENABLED = True    # 搜索时以只读内存映射方式打开索引文件
+CSV_ENCODING_SAMPLE_BYTES = 64 * 1024  # CSV编码检测只读取文件开头的样本大小
+CSV_GROUP_MAX_CHARS = 1500  # CSV每个行组文档的最大字符数
+CSV_GROUP_MAX_ROWS = 100    # CSV每个行组文档的最大行数
+INDEX_FILE_HISTORY_LIMIT = 2000  # 索引进度中每类文件明细在内存中保留的最大条数
+# 索引流水线各阶段之间的队列容量：队列满时上游等待下游，同时在内存中的文件和文本块数与文件夹大小无关
+INDEX_WALK_QUEUE_SIZE = 256     # 等待解析的文件路径数
+INDEX_PARSE_QUEUE_SIZE = 8      # 已解析、等待分块的文件数
+INDEX_CHUNK_QUEUE_SIZE = 8      # 已分块、等待嵌入的文件数
+INDEX_EMBED_QUEUE_SIZE = 2      # 已嵌入、等待写入的批次数
+INDEX_EMBED_UNIT_CHUNKS = 100   # 每个嵌入批次累积的文本块数
+INDEX_EMBED_UNIT_FILES = 100    # 每个嵌入批次最多的文件数
+INDEX_CHECKPOINT_ITEMS = 5000   # 写入多少个文本块和文件记录后保存一次向量库
+INDEX_CHECKPOINT_SECONDS = 60   # 两次保存向量库的最长间隔(秒)
+PROGRESS_STREAM_INTERVAL = 0.5   # 进度推送流检查状态变化的间隔(秒)
+PROGRESS_STREAM_HEARTBEAT = 15   # 进度推送流无变化时发送心跳的间隔(秒)
+
+# 路由中的阻塞操作放到有界线程池执行：检索和管理操作分开，管理操作再慢也不占用检索线程
+SEARCH_WORKERS = min(4, os.cpu_count() or 1)  # 检索线程数
+SEARCH_QUEUE_SIZE = 32     # 检索线程池排队上限，超出时直接拒绝
+SEARCH_TIMEOUT = 30        # 单次检索的超时(秒)
+# 检索进程数：大于0时faiss打分、去重和高亮在多个进程中并行，各进程内存映射同一个索引文件；0 为在检索线程池中执行
+SEARCH_PROCESSES = 0
+EMBED_QUERY_TIMEOUT = 15   # 查询向量嵌入请求的超时(秒)
+ADMIN_WORKERS = 2          # 管理操作（检查索引、启停监控、清理索引、打开文件）的线程数
+ADMIN_QUEUE_SIZE = 16      # 管理线程池排队上限
+ADMIN_TIMEOUT = 60         # 管理操作的超时(秒)
+search_executor = BoundedExecutor("search", SEARCH_WORKERS, SEARCH_QUEUE_SIZE)
+admin_executor = BoundedExecutor("admin", ADMIN_WORKERS, ADMIN_QUEUE_SIZE)
+search_processes = SearchProcessPool(SEARCH_PROCESSES, SEARCH_QUEUE_SIZE)
+
+# 搜索结果缓存：索引保存时按文件夹失效，相同的并发查询合并为一次计算
+QUERY_CACHE_MAX_ENTRIES = 256  # 缓存的查询结果条数上限
+QUERY_CACHE_TTL = 600          # 缓存结果的最长保留时间(秒)
+query_cache = QueryCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL)
+
+# 输入即搜索的候选词：文件名、高频词的内存前缀索引和最近的查询记录，/suggest 不调用嵌入接口
+SUGGEST_TERM_SAMPLE_CHUNKS = 5000  # 统计高频词时抽取的文本块数
+SUGGEST_MAX_TERMS = 50000          # 每个文件夹保留的高频词数
+SUGGEST_REBUILD_INTERVAL = 60      # 索引变化后两次重建候选词索引的最短间隔(秒)
+SUGGEST_HISTORY_LIMIT = 500        # 保留的最近查询条数
+suggest_registry = SuggestRegistry(lambda root: build_suggest_index(root), SUGGEST_REBUILD_INTERVAL)
+query_history = QueryHistory(SUGGEST_HISTORY_LIMIT)
+
+# 文件名索引：已索引文件夹中所有文件（包括不支持解析的格式）的文件名和相对路径，按名字查找时不需要嵌入
+FILENAME_SEARCH_LIMIT = 5         # 文件名查找返回的最大结果数
+FILENAME_MIN_SIMILARITY = 0.5     # 模糊匹配至少共有的三字母组比例
+filename_index = FilenameIndex()
+SEARCH_MODES = ("auto", "semantic", "filename")
+
+# OCR：图片和扫描版PDF中没有文字层的页面在独立进程池中识别，结果按内容哈希缓存在 OCR_CACHE_FILE
+OCR_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))  # OCR进程数上限，留出CPU给其他解析器
+OCR_LANG = "chi_sim+eng"   # tesseract 识别语言
+OCR_DPI = 200              # 扫描页渲染分辨率
+OCR_MIN_TEXT_CHARS = 20    # PDF页面提取到的文字少于该字数时视为没有文字层
+LOCAL_EMBEDDING_QUANTIZED = True      # 本地模型使用int8动态量化
+LOCAL_EMBEDDING_THREADS = os.cpu_count() or 1  # 本地模型推理线程数
+LOCAL_EMBEDDING_BATCH_SIZE = 64       # 本地模型每批最多的文本数，批内按Token数分桶
+WARMUP_ENABLED = True          # 启动后在后台预热最近搜索过的文件夹和嵌入模型
+WARMUP_FOLDERS = 3             # 预热最近搜索过的文件夹数
+WARMUP_MEMORY_BUDGET_MB = 512  # 预热最多读入的索引和模型文件大小(MB)
+WARMUP_READ_RATE_MB = 200      # 预热读取索引文件的速率上限(MB/秒)
+ocr_engine = OcrEngine(os.path.join(VECTOR_STORE_DIR, OCR_CACHE_FILE), OCR_WORKERS, OCR_LANG, OCR_DPI,
+                       OCR_MIN_TEXT_CHARS)
+filename_index_load_lock = threading.Lock()
+warmer = Warmer(WARMUP_MEMORY_BUDGET_MB * 1024 * 1024, WARMUP_READ_RATE_MB * 1024 * 1024)
+
+# 按路由设置请求日志级别，前端高频轮询的路由默认不输出
+ROUTE_LOG_LEVELS = {
+    "/index-progress": logging.DEBUG,
+    "/index-progress/files": logging.DEBUG,
+    "/index-progress/stream": logging.DEBUG,
+    "/health": logging.DEBUG,
+    "/startup": logging.DEBUG,
+    "/metrics": logging.DEBUG,
+    "/monitoring-status": logging.DEBUG,
+    "/search-cache": logging.DEBUG,
+    "/suggest": logging.DEBUG,
+    "/warmup": logging.DEBUG,
+}
+
+# 成功、失败和跳过的文件明细，每类只保留最近 INDEX_FILE_HISTORY_LIMIT 条，通过 /index-progress/files 分页读取
+index_file_history = FileHistory(INDEX_FILE_HISTORY_LIMIT)
 
 # 直接设置通义千问API密钥
 # 请替换成你自己的通义千问API密钥
@@ -114,12 +233,21 @@ EMBEDDING_MODELS = {
     "text-embedding-v2": {
         "name": "文本嵌入模型V2",
         "max_tokens": 2048,
+        "dimension": 1536,
         "supported_languages": "中文、英文、多语言支持"
     },
     "text-embedding-v3": {
         "name": "文本嵌入模型V3",
         "max_tokens": 8192,
+        "dimension": 1024,
         "supported_languages": "中文、英文、多语言支持(50+语种)"
+    },
+    "all-MiniLM-L6-v2": {
+        "name": "本地MiniLM模型(int8量化，离线)",
+        "max_tokens": 256,
+        "dimension": 384,
+        "supported_languages": "英文为主",
+        "local": True
     }
 }
 
@@ -143,8 +271,10 @@ load_env_variables()
 class FileIndexHandler(FileSystemEventHandler):
     def __init__(self, folder_path):
         self.folder_path = folder_path
-        self.db_path = get_db_path(folder_path)
+        self.db_path = get_db_path()
         self.pending_events = []
+        # 最早一个待处理事件的时间，用于统计事件到写入索引的延迟
+        self.first_event_time = None
         self.processing_lock = threading.Lock()
         self.last_update_time = 0
         self.update_timer = None
@@ -156,6 +286,10 @@ class FileIndexHandler(FileSystemEventHandler):
     
     def on_created(self, event):
         """当文件或目录被创建时"""
+        # 文件名索引立即更新，包括不支持解析的文件
+        if not event.is_directory and not is_system_file(os.path.basename(event.src_path)):
+            filename_index.add(event.src_path, self.folder_path)
+            query_cache.invalidate(self.folder_path)
         if not event.is_directory and is_supported_file(event.src_path):
             logger.info(f"文件创建: {event.src_path}")
             self.schedule_update(event)
@@ -171,11 +305,20 @@ class FileIndexHandler(FileSystemEventHandler):
                 return  # 忽略系统隐藏文件的删除事件
                 
             logger.info(f"文件删除: {event.src_path}")
+            filename_index.remove(event.src_path)
+            query_cache.invalidate(self.folder_path)
             self.schedule_update(event)
     
     def on_moved(self, event):
         """当文件或目录被移动或重命名时"""
         if not event.is_directory:
+            # 文件名索引按目标路径更新：临时文件重命名为正式文件名（编辑器保存）时也要加入
+            filename_index.remove(event.src_path)
+            if event.dest_path.startswith(folder_prefix(self.folder_path)) and \
+                    not is_system_file(os.path.basename(event.dest_path)):
+                filename_index.add(event.dest_path, self.folder_path)
+            query_cache.invalidate(self.folder_path)
+            
             # 源路径可能已不存在，但检查目标路径
             file_name_src = os.path.basename(event.src_path)
             if (file_name_src.startswith('.') or file_name_src in ['.DS_Store', 'Thumbs.db', 'desktop.ini'] or 
@@ -196,6 +339,9 @@ class FileIndexHandler(FileSystemEventHandler):
         """安排更新，延迟执行以避免频繁更新"""
         with self.processing_lock:
             self.pending_events.append(event)
+            if self.first_event_time is None:
+                self.first_event_time = time.time()
+            WATCHER_QUEUE_DEPTH.set(len(self.pending_events), folder=self.folder_path)
             
             # 取消之前计划的更新
             if self.update_timer:
@@ -220,12 +366,16 @@ class FileIndexHandler(FileSystemEventHandler):
                         # 收集所有待处理事件
                         events = self.pending_events.copy()
                         self.pending_events.clear()
+                        first_event_time = self.first_event_time
+                        self.first_event_time = None
+                        WATCHER_QUEUE_DEPTH.set(0, folder=self.folder_path)
                         # 处理事件
-                        self.process_events(events)
+                        if self.process_events(events) and first_event_time is not None:
+                            WATCHER_LAG_SECONDS.observe(time.time() - first_event_time)
             time.sleep(1)
     
     def process_events(self, events):
-        """处理收集到的事件"""
+        """处理收集到的事件，变动写入向量库后返回True"""
         # 防止索引正在进行时尝试更新
         if index_status["in_progress"]:
             logger.info("索引正在进行中，暂不处理文件变动")
@@ -303,9 +453,16 @@ class FileIndexHandler(FileSystemEventHandler):
         
         logger.info(f"开始处理文件变动: {len(files_to_update)} 个文件需更新, {len(files_to_remove)} 个文件需删除")
         
+        # 与索引任务、其他文件夹的监控共用同一个向量库，写入前加锁
+        with vector_store_lock:
+            return self.apply_changes(files_to_update, files_to_remove)
+    
+    def apply_changes(self, files_to_update, files_to_remove):
+        """把文件的新增、修改和删除写入共享向量库"""
+        db = None
         try:
             # 检查向量数据库是否存在
-            if not os.path.exists(self.db_path) or not os.path.exists(os.path.join(self.db_path, "index.faiss")):
+            if not shared_store_exists():
                 logger.warning(f"向量数据库不存在，需要完整重建索引: {self.folder_path}")
                 # 触发完整索引重建
                 background_tasks = BackgroundTasks()
@@ -313,54 +470,70 @@ class FileIndexHandler(FileSystemEventHandler):
                 return
             
             # 加载现有向量库
-            embedding_model = DashScopeEmbeddings(
-                model=EMBEDDING_MODEL_NAME,
-                dashscope_api_key=DASHSCOPE_API_KEY
-            )
+            embedding_model = create_embedding_model(max_retries=1)
+            dead_letter_queue = get_dead_letter_queue()
             
             # 加载现有数据库
-            db = FAISS.load_local(self.db_path, embedding_model, allow_dangerous_deserialization=True)
+            db = load_vector_store(self.db_path, embedding_model, writable=True, dimension=get_embedding_dimension())
+            store = get_chunk_store(db)
+            file_records = store.file_records()
+            pending_file_records = []
+            
+            # 处理文件删除（先于更新处理，被删除文件的重复文件需要重新索引）
+            if files_to_remove:
+                dead_letter_queue.remove_sources(files_to_remove)
+                for file_path in files_to_remove:
+                    try:
+                        logger.info(f"从向量库中删除文件: {file_path}")
+                        
+                        try:
+                            # 按源文件删除向量和文本块，无需重新嵌入其余文档
+                            removed_count = delete_sources(db, [file_path])
+                            store.delete_files([file_path])
+                            if removed_count:
+                                logger.info(f"文件 {file_path} 已从向量库中移除 ({removed_count} 个向量)")
+                            else:
+                                logger.warning(f"未找到与文件 {file_path} 相关的文档")
+                            # 以该文件为代表的重复文件改为各自索引
+                            for alias in store.detach_aliases(file_path):
+                                file_records.pop(alias, None)
+                                if os.path.exists(alias):
+                                    files_to_update.add(alias)
+                        except Exception as e:
+                            logger.error(f"删除文件 {file_path} 的向量失败: {str(e)}")
+                    except Exception as e:
+                        logger.error(f"处理文件 {file_path} 删除操作失败: {str(e)}")
             
             # 处理文件更新（添加和修改）
             if files_to_update:
                 all_docs = []
-                for file_path in files_to_update:
+                replace_sources = set()
+                detector = DuplicateDetector(store)
+                update_queue = list(files_to_update)
+                for file_path in update_queue:
                     try:
                         logger.info(f"处理更新文件: {file_path}")
-                        # 加载文档
-                        file_docs = load_document(file_path)
-                        if file_docs:
-                            # 移除该文件的现有向量（如果存在）
-                            try:
-                                # 尝试使用filter删除
-                                docs_to_keep = []
-                                search_results = db.similarity_search_with_score("", k=1000)
-                                for doc, _ in search_results:
-                                    if doc.metadata.get("source") != file_path:
-                                        docs_to_keep.append(doc)
-                                
-                                # 如果找到了需要保留的文档，重建索引
-                                if docs_to_keep:
-                                    logger.info(f"重建索引以删除文件 {file_path} 的文档")
-                                    # 创建新的向量库
-                                    new_db = FAISS.from_documents(docs_to_keep, embedding_model)
-                                    # 保存新库到临时目录
-                                    temp_path = f"{self.db_path}_temp"
-                                    if os.path.exists(temp_path):
-                                        shutil.rmtree(temp_path)
-                                    os.makedirs(temp_path, exist_ok=True)
-                                    new_db.save_local(temp_path)
-                                    # 加载新库
-                                    db = FAISS.load_local(temp_path, embedding_model, allow_dangerous_deserialization=True)
-                                    # 删除临时库
-                                    shutil.rmtree(temp_path)
-                            except Exception as e:
-                                logger.warning(f"删除文件 {file_path} 现有向量时出错: {str(e)}")
-                                logger.info(f"继续处理更新，将添加文件的新内容")
+                        # 加载文档，与已索引文件重复时只记录不解析
+                        file_docs, file_record, duplicate_reason = load_document_deduplicated(
+                            file_path, detector, file_records.get(file_path))
+                        if duplicate_reason:
+                            logger.info(f"文件 {file_path} {duplicate_reason}，跳过嵌入")
+                            if file_record["canonical"]:
+                                dead_letter_queue.remove_sources([file_path])
+                                delete_sources(db, [file_path])
+                            pending_file_records.append(file_record)
+                        elif file_docs:
+                            # 旧向量在嵌入时替换，未变化的文本块可以复用向量
+                            replace_sources.add(file_path)
+                            # 代表文件内容变化后，原来的重复文件需要重新判断
+                            for alias in store.detach_aliases(file_path):
+                                file_records.pop(alias, None)
+                                if os.path.exists(alias) and alias not in update_queue:
+                                    update_queue.append(alias)
+                            pending_file_records.append(file_record)
                             
                             # 分割文档
-                            text_splitter = CharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-                            split_docs = text_splitter.split_documents(file_docs)
+                            split_docs = get_text_chunker().split_documents(file_docs)
                             all_docs.extend(split_docs)
                             logger.info(f"文件 {file_path} 更新成功")
                     except Exception as e:
@@ -369,60 +542,31 @@ class FileIndexHandler(FileSystemEventHandler):
                 # 将所有新文档添加到向量库
                 if all_docs:
                     logger.info(f"添加 {len(all_docs)} 个文档块到向量库")
-                    db.add_documents(all_docs)
-            
-            # 处理文件删除
-            if files_to_remove:
-                for file_path in files_to_remove:
-                    try:
-                        logger.info(f"从向量库中删除文件: {file_path}")
-                        
-                        try:
-                            # 尝试使用filter重建索引，删除特定文件的文档
-                            docs_to_keep = []
-                            search_results = db.similarity_search_with_score("", k=1000)
-                            for doc, _ in search_results:
-                                if doc.metadata.get("source") != file_path:
-                                    docs_to_keep.append(doc)
-                            
-                            # 如果找到了需要保留的文档，重建索引
-                            if docs_to_keep:
-                                logger.info(f"重建索引以删除文件 {file_path} 的文档")
-                                # 创建新的向量库
-                                new_db = FAISS.from_documents(docs_to_keep, embedding_model)
-                                # 保存新库到临时目录
-                                temp_path = f"{self.db_path}_temp"
-                                if os.path.exists(temp_path):
-                                    shutil.rmtree(temp_path)
-                                os.makedirs(temp_path, exist_ok=True)
-                                new_db.save_local(temp_path)
-                                # 加载新库
-                                db = FAISS.load_local(temp_path, embedding_model, allow_dangerous_deserialization=True)
-                                # 删除临时库
-                                shutil.rmtree(temp_path)
-                                logger.info(f"文件 {file_path} 已从向量库中移除")
-                            else:
-                                logger.warning(f"未找到与文件 {file_path} 相关的文档")
-                        except Exception as e:
-                            logger.error(f"删除文件 {file_path} 的向量失败: {str(e)}")
-                    except Exception as e:
-                        logger.error(f"处理文件 {file_path} 删除操作失败: {str(e)}")
+                    dead_letter_queue.remove_sources(replace_sources)
+                    db, _ = embed_into_db(db, all_docs, embedding_model, dead_letter_queue,
+                                          replace_sources=replace_sources)
             
             # 保存更新后的向量库
             logger.info("保存更新后的向量库")
-            db.save_local(self.db_path)
+            save_vector_store(db, self.db_path, INDEX_STORAGE_MODE, pending_file_records)
+            query_cache.invalidate(self.folder_path)
             logger.info("向量库更新完成")
+            return True
             
         except Exception as e:
             error_msg = str(e)
             logger.error(f"处理文件变动时出错: {error_msg}")
             logger.debug(f"错误详情: {traceback.format_exc()}")
+        finally:
+            # 释放文本库连接和它持有的写锁
+            if db is not None:
+                close_vector_store(db)
 
 # 保存监控配置到文件
 def save_monitoring_config():
     """保存当前的监控配置到文件"""
     try:
-        config_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vector_store")
+        config_dir = VECTOR_STORE_DIR
         os.makedirs(config_dir, exist_ok=True)
         config_file = os.path.join(config_dir, "monitoring_config.json")
         
@@ -503,6 +647,15 @@ def stop_all_monitoring():
     return True
 
 # 自定义Docx加载器
+# 自定义加载器的基类，接口与 langchain 的 BaseLoader 相同；
+# langchain_core.document_loaders 会连带导入 langsmith（约0.3秒），启动时不导入
+class BaseLoader:
+    def lazy_load(self):
+        raise NotImplementedError
+
+    def load(self) -> List[Document]:
+        return list(self.lazy_load())
+
 class CustomDocxLoader(BaseLoader):
     def __init__(self, file_path):
         self.file_path = file_path
@@ -625,15 +778,93 @@ class CustomExcelLoader(BaseLoader):
             logger.error(f"读取Excel文件时出错: {str(e)}")
             return []
 
-# 导入dashscope模块并配置其日志级别
-import dashscope
-import dashscope.embeddings
-dashscope.api_key = DASHSCOPE_API_KEY  # 使用通义千问API密钥
-# 配置dashscope客户端日志级别 (如果有这样的API)
-# 注意: dashscope可能没有直接的日志控制API
-# 但我们已经在下面设置了关联模块的日志级别
+# 自定义CSV加载器
+class CustomCsvLoader(BaseLoader):
+    """流式读取CSV文件，每个行组输出一个带表头的文档，避免整文件读入内存"""
+    def __init__(self, file_path, max_chars=None):
+        self.file_path = file_path
+        # 输出文本的总字符预算，None表示不限制
+        self.max_chars = max_chars
+    
+    def detect_encoding(self):
+        """只读取文件开头的一段样本检测编码，而不是整个文件"""
+        encoding = 'utf-8'  # 默认编码
+        try:
+            import chardet
+            with open(self.file_path, 'rb') as f:
+                sample = f.read(CSV_ENCODING_SAMPLE_BYTES)
+            # 样本以UTF-8解码成功时直接使用utf-8（截断处的半个字符除外）
+            try:
+                sample.decode('utf-8')
+                return 'utf-8'
+            except UnicodeDecodeError as decode_error:
+                if len(sample) == CSV_ENCODING_SAMPLE_BYTES and decode_error.start >= len(sample) - 3:
+                    return 'utf-8'
+            result = chardet.detect(sample)
+            if result['encoding'] and result['confidence'] > 0.7:  # 仅当置信度高于0.7时使用检测结果
+                encoding = result['encoding']
+            logger.info(f"检测到CSV文件编码: {encoding}")
+        except ImportError:
+            logger.warning("chardet库未安装，使用默认utf-8编码")
+        except Exception as e:
+            logger.warning(f"检测CSV文件编码失败: {str(e)}，使用默认utf-8编码")
+        return encoding
+    
+    def lazy_load(self):
+        import csv
+        
+        encoding = self.detect_encoding()
+        file_name = os.path.basename(self.file_path)
+        with open(self.file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+            csv_reader = csv.reader(f)
+            
+            # 提取表头（第一行）
+            headers = next(csv_reader, None)
+            if headers is None:
+                logger.warning(f"CSV文件为空: {file_name}")
+                return
+            header_text = f"表头: {' | '.join(headers)}\n\n" if headers else ""
+            
+            emitted_chars = 0
+            group_lines = []
+            group_chars = len(header_text)
+            group_start = 1
+            row_index = 0
+            for row_index, row in enumerate(csv_reader, 1):  # 跳过表头，从第二行开始
+                row_values = [str(val).strip() for val in row]
+                line = f"行 {row_index}: {' | '.join(row_values)}\n"
+                group_lines.append(line)
+                group_chars += len(line)
+                
+                if group_chars >= CSV_GROUP_MAX_CHARS or len(group_lines) >= CSV_GROUP_MAX_ROWS:
+                    yield self._make_document(header_text, group_lines, group_start, row_index)
+                    emitted_chars += group_chars
+                    group_lines = []
+                    group_chars = len(header_text)
+                    group_start = row_index + 1
+                    # 超出字符预算后停止读取，剩余内容不会被索引
+                    if self.max_chars is not None and emitted_chars >= self.max_chars:
+                        logger.warning(f"CSV文件 '{file_name}' 内容过长，已在第 {row_index} 行后停止读取")
+                        return
+            
+            if group_lines:
+                yield self._make_document(header_text, group_lines, group_start, row_index)
+            elif row_index == 0 and header_text:
+                # 只有表头的文件也保留表头信息
+                yield Document(page_content=header_text, metadata={"source": self.file_path})
+    
+    def _make_document(self, header_text, lines, row_start, row_end):
+        metadata = {"source": self.file_path, "row_start": row_start, "row_end": row_end}
+        return Document(page_content=header_text + "".join(lines), metadata=metadata)
+    
+    def load(self):
+        try:
+            return list(self.lazy_load())
+        except Exception as e:
+            logger.error(f"加载CSV文件失败 {os.path.basename(self.file_path)}: {str(e)}")
+            return []
 
-# 加载环境变量
+# 嵌入请求由 embedding_client 直接发送，不再导入 dashscope SDK（导入耗时约0.25秒）
 
 # 初始化FastAPI应用
 app = FastAPI(title="FindMe API")
@@ -652,14 +883,26 @@ async def global_exception_handler(request: Request, exc: Exception):
 # 添加中间件处理请求
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.info(f"请求: {request.method} {request.url.path}")
+    start_time = time.perf_counter()
+    if "first_request" not in STARTUP.marks:
+        STARTUP.mark("first_request")
     try:
         # 处理请求
         response = await call_next(request)
-        logger.info(f"响应: {response.status_code}")
+        elapsed = time.perf_counter() - start_time
+        # 按路由模板统计，避免路径参数产生大量不同的标签
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.observe(elapsed, method=request.method, route=route_path, status=response.status_code)
+        # 每个请求只记一条日志，高频轮询的路由使用更低的级别
+        level = logging.ERROR if response.status_code >= 500 else ROUTE_LOG_LEVELS.get(route_path, logging.INFO)
+        if logger.isEnabledFor(level):
+            logger.log(level, f"{request.method} {request.url.path} {response.status_code} {elapsed * 1000:.1f}ms",
+                       extra={"method": request.method, "route": route_path, "status": response.status_code,
+                              "duration_ms": round(elapsed * 1000, 1)})
         return response
     except Exception as e:
-        logger.error(f"处理请求时出错: {e}")
+        logger.error(f"处理请求时出错: {request.method} {request.url.path}: {e}")
         return JSONResponse(
             status_code=500,
             content={"success": False, "message": f"处理请求时出错: {str(e)}"}
@@ -678,9 +921,15 @@ app.add_middleware(
 class FolderRequest(BaseModel):
     folder: str
 
+class IndexRequest(BaseModel):
+    folder: str
+    profile: bool = False      # 记录每个文件各阶段的耗时
+    cpu_profile: bool = False  # 同时对解析阶段做采样式CPU剖析
+
 class SearchRequest(BaseModel):
     query: str
     folder: str
+    mode: str = "auto"  # auto: 查询像文件名时合并文件名匹配; semantic: 只做语义检索; filename: 只按文件名查找
 
 class FileRequest(BaseModel):
     file_path: str
@@ -690,6 +939,7 @@ class ConfigRequest(BaseModel):
     max_chunk_count: Optional[int] = None
     max_file_size_mb: Optional[int] = None
     embedding_model: Optional[str] = None  # 添加嵌入模型选择
+    index_storage: Optional[str] = None  # 向量存储格式
 
 # 工具函数：规范化路径
 def normalize_path(path: str) -> str:
@@ -699,8 +949,13 @@ def normalize_path(path: str) -> str:
     return normalized
 
 # 工具函数：获取向量数据库路径
-def get_db_path(folder: str) -> str:
-    """根据文件夹路径生成向量数据库路径"""
+def get_db_path() -> str:
+    """共享向量数据库路径，所有已索引文件夹共用一个向量库"""
+    return os.path.join(VECTOR_STORE_DIR, SHARED_STORE_NAME)
+
+# 工具函数：旧版本按文件夹单独保存的向量数据库路径
+def get_legacy_db_path(folder: str) -> str:
+    """根据文件夹路径生成旧版向量数据库路径，仅用于迁移"""
     # 使用MD5哈希值作为数据库文件夹名，更稳定
     import hashlib
     # 确保输入是 str 类型
@@ -708,13 +963,139 @@ def get_db_path(folder: str) -> str:
         folder = str(folder)
     folder = normalize_path(folder)
     folder_hash = hashlib.md5(folder.encode('utf-8')).hexdigest()
-    db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vector_store", folder_hash)
-    return db_path
+    return os.path.join(VECTOR_STORE_DIR, folder_hash)
+
+# 工具函数：判断共享向量库是否存在
+def shared_store_exists() -> bool:
+    db_path = get_db_path()
+    return os.path.exists(os.path.join(db_path, INDEX_FILE)) and os.path.exists(os.path.join(db_path, CHUNK_STORE_FILE))
+
+# 工具函数：合并旧版文件夹索引
+def migrate_legacy_index(folder: str) -> bool:
+    """把旧版本单独保存的文件夹索引合并进共享向量库，向量直接复制，不重新嵌入；合并成功返回True"""
+    legacy_path = get_legacy_db_path(folder)
+    if not os.path.exists(os.path.join(legacy_path, INDEX_FILE)):
+        return False
+    # 其他任务正在写向量库时不等待（可能在请求处理中调用），下次再合并
+    if not vector_store_lock.acquire(blocking=False):
+        logger.info(f"向量库正在写入，稍后再合并旧版索引: {folder}")
+        return False
+    try:
+        logger.info(f"合并旧版文件夹索引到共享向量库: {folder}")
+        db_path = get_db_path()
+        embedding_model = create_embedding_model(max_retries=1)
+        db = None
+        if shared_store_exists():
+            db = load_vector_store(db_path, embedding_model, writable=True, dimension=get_embedding_dimension())
+        try:
+            db, chunk_count, file_records = import_vector_store(db, legacy_path, embedding_model)
+        except ValueError as e:
+            logger.error(str(e))
+            if db is not None:
+                close_vector_store(db)
+            return False
+        if db is None:
+            shutil.rmtree(legacy_path)
+            return False
+        save_vector_store(db, db_path, INDEX_STORAGE_MODE, file_records)
+        store = get_chunk_store(db)
+        store.add_root(folder)
+        store.commit()
+        close_vector_store(db)
+        query_cache.invalidate(folder)
+        # 旧索引遗留的死信记录并入共享死信队列
+        if os.path.exists(os.path.join(legacy_path, DEAD_LETTER_FILE)):
+            get_dead_letter_queue().merge(DeadLetterQueue(legacy_path, folder))
+        shutil.rmtree(legacy_path)
+        logger.info(f"旧版索引合并完成: {folder}, {chunk_count} 个文本块")
+        return True
+    finally:
+        vector_store_lock.release()
+
+# 工具函数：查找包含文件夹的已索引根目录
+def get_covering_root(folder: str):
+    """返回包含该文件夹的已索引根目录（自身或上级目录），没有时返回None
+
+    已索引文件夹的子文件夹可以直接搜索，不需要单独索引。
+    """
+    root = None
+    if shared_store_exists():
+        store = ChunkStore(os.path.join(get_db_path(), CHUNK_STORE_FILE))
+        try:
+            root = store.covering_root(folder)
+        finally:
+            store.close()
+    if root is None and migrate_legacy_index(folder):
+        root = folder
+    return root
+
+# 工具函数：判断是否为系统隐藏文件或临时文件
+def is_system_file(file_name: str) -> bool:
+    return (file_name.startswith('.') or file_name in ['.DS_Store', 'Thumbs.db', 'desktop.ini'] or
+            file_name.endswith('~') or file_name.startswith('~$'))
+
+# 工具函数：扫描文件夹
+def iter_folder_files(folder: str):
+    """逐个产出 (文件路径, 是否支持解析)，不包括系统隐藏文件；不在内存中收集整个文件夹的文件列表"""
+    for root, _, files in os.walk(folder):
+        for file in files:
+            try:
+                file_path = os.path.join(root, file)
+                # 只检查是否为文件，不再使用is_supported_file过滤
+                if not os.path.isfile(file_path):
+                    continue
+                # 检查是否支持该格式
+                supported = is_supported_file(file_path)
+            except Exception as e:
+                logger.error(f"扫描文件时出错: {file}, {e}")
+                continue
+            # 不是系统隐藏文件（如.DS_Store）的不支持格式文件也产出，记为失败
+            if supported or not is_system_file(file):
+                yield file_path, supported
+
+# 工具函数：统计文件夹中的文件数
+def count_folder_files(folder: str, stop: threading.Event):
+    """与索引流水线并行地只按文件名计数（不读取文件属性），随时更新进度中的文件总数"""
+    count = 0
+    for _, _, files in os.walk(folder):
+        if stop.is_set():
+            return
+        count += sum(1 for file in files if not is_system_file(file))
+        index_status["file_stats"]["total_count"] = count
+
+# 工具函数：加载文件名索引
+def ensure_filename_index():
+    """启动后第一次使用时扫描所有已索引的根目录建立文件名索引；之后由索引任务和文件监控增量维护"""
+    if filename_index.loaded:
+        return
+    with filename_index_load_lock:
+        if filename_index.loaded or not shared_store_exists():
+            return
+        store = ChunkStore(os.path.join(get_db_path(), CHUNK_STORE_FILE))
+        try:
+            roots = store.roots()
+        finally:
+            store.close()
+        for root in roots:
+            if os.path.isdir(root):
+                scan = filename_index.begin_scan(root)
+                completed = False
+                try:
+                    for file_path, _ in iter_folder_files(root):
+                        scan.add(file_path)
+                    completed = True
+                finally:
+                    scan.finish(remove_missing=completed)
+        filename_index.loaded = True
+        logger.info(f"文件名索引已建立: {len(roots)} 个文件夹, {len(filename_index)} 个文件")
 
 # 工具函数：检查文件类型是否支持
 def is_supported_file(file_path: str) -> bool:
     """检查文件类型是否支持索引"""
     supported_extensions = ['.txt', '.pdf', '.docx', '.pptx', '.xlsx', '.xls', '.csv']  # 添加了.csv支持
+    # 能做OCR时支持图片
+    if ocr_engine.available:
+        supported_extensions += IMAGE_EXTENSIONS
     try:
         # 获取文件名和扩展名
         file_name = os.path.basename(file_path)
@@ -751,19 +1132,255 @@ def is_file_too_large(file_path: str) -> (bool, float):
         logger.error(f"检查文件大小时出错: {file_path}, {e}")
         return False, 0
 
+# 工具函数：获取当前嵌入模型的分块器
+def get_text_chunker():
+    """按当前嵌入模型的Token限制创建分块器，所有分块都通过它完成"""
+    return create_chunker(EMBEDDING_MODEL_NAME, MAX_TEXT_BLOCK_SIZE)
+
+# 工具函数：获取嵌入模型的向量维度
+def get_embedding_dimension(model_name: str = None) -> int:
+    """嵌入模型输出的向量维度，共享向量库中所有向量必须来自维度相同的模型"""
+    return EMBEDDING_MODELS[model_name or EMBEDDING_MODEL_NAME]["dimension"]
+
+# 工具函数：创建嵌入模型
+def create_embedding_model(max_retries: int = EMBEDDING_MAX_RETRIES):
+    """创建通义千问嵌入模型，批量嵌入时传入max_retries=1，由EmbeddingBatcher统一退避重试
+
+    所有嵌入模型共用进程内的连接池客户端，创建本身没有开销。选择本地模型时返回进程内共用的本地推理模型。
+    嵌入模块继承 langchain_core 的 Embeddings，会连带导入 langsmith，所以第一次创建模型时才导入。
+    """
+    if EMBEDDING_MODELS.get(EMBEDDING_MODEL_NAME, {}).get("local"):
+        return lazy_import("local_embedding").get_local_embeddings(
+            quantized=LOCAL_EMBEDDING_QUANTIZED, threads=LOCAL_EMBEDDING_THREADS, batch_size=LOCAL_EMBEDDING_BATCH_SIZE)
+    embedding_client = lazy_import("embedding_client")
+    client = embedding_client.get_shared_client(
+        DASHSCOPE_API_KEY,
+        base_url=EMBEDDING_BASE_URL or embedding_client.DASHSCOPE_BASE_URL,
+        max_connections=EMBEDDING_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=EMBEDDING_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=EMBEDDING_HTTP_KEEPALIVE_EXPIRY,
+        connect_timeout=EMBEDDING_CONNECT_TIMEOUT,
+        read_timeout=EMBEDDING_READ_TIMEOUT,
+        http2=EMBEDDING_HTTP2
+    )
+    return embedding_client.DashScopeHttpEmbeddings(client, EMBEDDING_MODEL_NAME, max_retries=max_retries)
+
+# 工具函数：获取死信队列
+def get_dead_letter_queue() -> DeadLetterQueue:
+    """获取（必要时创建）共享向量库的死信队列"""
+    db_path = get_db_path()
+    queue = dead_letter_queues.get(db_path)
+    if queue is None:
+        queue = DeadLetterQueue(db_path, db_path)
+        dead_letter_queues[db_path] = queue
+    return queue
+
+# 工具函数：获取搜索使用记录
+def get_search_usage() -> SearchUsage:
+    """获取（必要时读取）共享向量库的搜索使用记录，使用时才按当前的向量库路径查找"""
+    db_path = get_db_path()
+    usage = search_usages.get(db_path)
+    if usage is None:
+        usage = search_usages.setdefault(db_path, SearchUsage(os.path.join(db_path, SEARCH_USAGE_FILE)))
+    return usage
+
+# 工具函数：批量嵌入文本块，内容相同的只嵌入一次
+def embed_documents_once(docs, embedding_model):
+    """按行数和Token总数分批嵌入，逐批产出 (成功的(文本块, 向量)列表, 失败的(文本块, 错误信息)列表)
+
+    同一组中内容相同的文本块只请求一次，结果分给每一个。
+    """
+    twins = {}
+    unique_docs = []
+    for doc in docs:
+        if doc.page_content not in twins:
+            twins[doc.page_content] = []
+            unique_docs.append(doc)
+        twins[doc.page_content].append(doc)
+
+    batcher = EmbeddingBatcher(
+        embedding_model,
+        get_token_counter(EMBEDDING_MODEL_NAME),
+        max_rows=MAX_BATCH_ROWS,
+        max_tokens=MAX_BATCH_TOKENS,
+        max_retries=EMBEDDING_MAX_RETRIES
+    )
+    for embedded, failed in batcher.embed_documents(unique_docs):
+        yield ([(twin, vector) for doc, vector in embedded for twin in twins[doc.page_content]],
+               [(twin, error) for doc, error in failed for twin in twins[doc.page_content]])
+
+# 工具函数：批量嵌入文本块并写入向量库
+def embed_into_db(db, docs, embedding_model, dead_letter_queue, replace_sources=()):
+    """按行数和Token总数分批嵌入文本块并加入向量库，最终失败的文本块进入死信队列
+
+    内容与已有文本块完全相同的直接复用已有向量，同一批中重复的文本块只嵌入一次；
+    replace_sources 中文件的旧向量在复用查找之后删除，文件修改时未变化的部分不必重新嵌入。
+    返回 (更新后的向量库, 成功写入的文本块列表)
+    """
+    reused, docs = reuse_vectors(db, docs)
+    if replace_sources and get_chunk_store(db) is not None:
+        removed_count = delete_sources(db, replace_sources)
+        if removed_count:
+            logger.info(f"已移除 {len(replace_sources)} 个更新文件的 {removed_count} 个旧向量")
+    embedded_docs = []
+    if reused:
+        db.add_embeddings([(doc.page_content, vector) for doc, vector in reused],
+                          metadatas=[doc.metadata for doc, _ in reused])
+        embedded_docs.extend(doc for doc, _ in reused)
+        EMBEDDING_REUSED_TEXTS.inc(len(reused))
+        logger.info(f"复用已有向量 {len(reused)} 个文本块")
+
+    for embedded, failed in embed_documents_once(docs, embedding_model):
+        if embedded:
+            text_embeddings = [(doc.page_content, vector) for doc, vector in embedded]
+            metadatas = [doc.metadata for doc, _ in embedded]
+            db = add_embeddings(db, text_embeddings, embedding_model, metadatas)
+            embedded_docs.extend(doc for doc, _ in embedded)
+        dead_letter_queue.add(failed)
+    return db, embedded_docs
+
+# 工具函数：重试死信队列中的文本块
+def retry_dead_letters():
+    """重新嵌入死信队列中的文本块，保存向量库后才从队列中移除"""
+    queue = get_dead_letter_queue()
+    # 源文件已删除的记录直接丢弃
+    missing_sources = {doc.metadata.get("source") for doc in queue.pending() if not os.path.exists(doc.metadata.get("source", ""))}
+    if missing_sources:
+        queue.remove_sources(missing_sources)
+    pending = queue.pending(DEAD_LETTER_MAX_ATTEMPTS)
+    if not pending:
+        return
+    
+    logger.info(f"重试死信队列: {len(pending)} 个文本块")
+    db_path = get_db_path()
+    embedding_model = create_embedding_model(max_retries=1)
+    # 整个加载、嵌入和保存过程持有写锁：索引任务和文件监控等到保存完成后才加载向量库，读到包含重试结果的新版本
+    with vector_store_lock:
+        db = None
+        if shared_store_exists():
+            db = load_vector_store(db_path, embedding_model, writable=True, dimension=get_embedding_dimension())
+        try:
+            db, succeeded = embed_into_db(db, pending, embedding_model, queue)
+            if succeeded:
+                save_vector_store(db, db_path, INDEX_STORAGE_MODE)
+                # 死信中的文本块可能来自任意文件夹
+                query_cache.invalidate()
+                queue.remove(succeeded)
+                logger.info(f"死信队列重试成功 {len(succeeded)} 个文本块")
+        finally:
+            if db is not None:
+                close_vector_store(db)
+
+# 工具函数：加载磁盘上已有的死信队列
+def load_dead_letter_queues():
+    """恢复上次运行遗留的死信队列"""
+    if os.path.exists(os.path.join(get_db_path(), DEAD_LETTER_FILE)):
+        get_dead_letter_queue()
+
+# 后台线程：定期重试死信队列
+def dead_letter_worker():
+    """定期重试死信队列，索引进行中时跳过"""
+    load_dead_letter_queues()
+    while True:
+        time.sleep(DEAD_LETTER_RETRY_INTERVAL)
+        if index_status["in_progress"] or not dead_letter_queues:
+            continue
+        try:
+            retry_dead_letters()
+        except Exception as e:
+            logger.error(f"重试死信队列出错: {str(e)}")
+
+# 工具函数：汇总死信队列状态
+def get_dead_letter_summary() -> dict:
+    summaries = [queue.summary() for queue in list(dead_letter_queues.values()) if len(queue) > 0]
+    return {
+        "pending_count": sum(summary["count"] for summary in summaries),
+        "folders": summaries
+    }
+
+# 工具函数：去重后加载文档
+def load_document_deduplicated(file_path: str, detector: DuplicateDetector, previous_record: dict = None):
+    """计算文件内容哈希和SimHash，与已索引文件重复时不再解析或嵌入
+
+    返回 (文档列表, 文件记录, 重复说明)：重复说明不为空时文档列表为空，文件记录中的 canonical 指向代表文件；
+    文件解析失败时文件记录为None。
+    """
+    stat = os.stat(file_path)
+    content_hash = file_content_hash(file_path)
+    # 只是修改时间变化、内容没变时沿用原记录
+    if previous_record and previous_record.get("content_hash") == content_hash:
+        return [], dict(previous_record, mtime=stat.st_mtime), "内容未变化"
+
+    record = {
+        "source": file_path,
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "content_hash": content_hash,
+        "simhash": None,
+        "canonical": None
+    }
+    canonical = detector.find_exact(content_hash, file_path)
+    if canonical:
+        record["canonical"] = canonical
+        return [], record, f"与 {os.path.basename(canonical)} 内容相同"
+
+    docs = load_document(file_path)
+    if not docs:
+        return [], None, None
+    record["simhash"] = simhash("\n".join(doc.page_content for doc in docs))
+    if record["simhash"] is not None:
+        canonical = detector.find_near(record["simhash"], file_path)
+        if canonical:
+            record["canonical"] = canonical
+            return [], record, f"与 {os.path.basename(canonical)} 内容近似"
+    detector.add(file_path, content_hash, record["simhash"])
+    return docs, record, None
+
 # 工具函数：加载文档
 def load_document(file_path: str) -> List:
-    """根据文件类型加载文档，并应用字数限制"""
+    """根据文件类型加载文档，并应用字数限制；按扩展名记录解析耗时"""
+    _, ext = os.path.splitext(file_path.lower())
+    with PARSE_SECONDS.time(extension=ext):
+        docs = _load_document(file_path)
+    for doc in docs:
+        doc.page_content = remove_surrogates(doc.page_content)
+    if not docs:
+        PARSE_FAILURES.inc(extension=ext)
+    return docs
+
+# 工具函数：用OCR补全PDF中没有文字层的页面
+def apply_pdf_ocr(file_path: str, docs: List) -> List:
+    """只渲染和识别没有文字层的页面，识别结果并入对应页的文档"""
+    if not ocr_engine.available:
+        return docs
+    pages = ocr_engine.pages_without_text(file_path)
+    if not pages:
+        return docs
+    logger.info(f"PDF {os.path.basename(file_path)} 有 {len(pages)} 页没有文字层，进行OCR")
+    by_page = {doc.metadata.get("page"): doc for doc in docs}
+    for page_number, text in ocr_engine.ocr_pdf_pages(file_path, pages).items():
+        if not text.strip():
+            continue
+        doc = by_page.get(page_number)
+        if doc is None:
+            docs.append(Document(page_content=text, metadata={"source": file_path, "page": page_number, "ocr": True}))
+        else:
+            doc.page_content = f"{doc.page_content.strip()}\n{text}".strip()
+            doc.metadata["ocr"] = True
+    docs.sort(key=lambda doc: doc.metadata.get("page") or 0)
+    return docs
+
+def _load_document(file_path: str) -> List:
     try:
         _, ext = os.path.splitext(file_path.lower())
         
         # 加载文档
         docs = []
         if ext == '.txt':
-            docs = [TextLoader(file_path).load()[0]]
+            docs = [lazy_import("langchain_community.document_loaders.text").TextLoader(file_path).load()[0]]
         elif ext == '.pdf':
             try:
-                docs = PyPDFLoader(file_path).load()
+                docs = lazy_import("langchain_community.document_loaders.pdf").PyPDFLoader(file_path).load()
             except Exception as pdf_error:
                 if "Odd-length string" in str(pdf_error):
                     logger.error(f"加载PDF文件出错 {os.path.basename(file_path)}: Odd-length string")
@@ -788,6 +1405,13 @@ def load_document(file_path: str) -> List:
                 else:
                     # 其他PDF解析错误
                     raise pdf_error
+            # 扫描版页面没有文字层，用OCR补全
+            docs = apply_pdf_ocr(file_path, docs)
+        elif ext in IMAGE_EXTENSIONS:
+            if ocr_engine.available:
+                text = ocr_engine.ocr_image(file_path, file_content_hash(file_path))
+                if text.strip():
+                    docs = [Document(page_content=text, metadata={"source": file_path, "ocr": True})]
         elif ext == '.docx':
             docs = CustomDocxLoader(file_path).load()
         elif ext == '.pptx':
@@ -795,57 +1419,10 @@ def load_document(file_path: str) -> List:
         elif ext in ['.xlsx', '.xls']:
             docs = CustomExcelLoader(file_path).load()
         elif ext == '.csv':
-            # 处理CSV文件
-            try:
-                import csv
-                import io
-                
-                # 尝试检测编码
-                encoding = 'utf-8'  # 默认编码
-                try:
-                    import chardet
-                    with open(file_path, 'rb') as f:
-                        result = chardet.detect(f.read())
-                        if result['confidence'] > 0.7:  # 仅当置信度高于0.7时使用检测结果
-                            encoding = result['encoding']
-                    logger.info(f"检测到CSV文件编码: {encoding}")
-                except ImportError:
-                    logger.warning("chardet库未安装，使用默认utf-8编码")
-                except Exception as e:
-                    logger.warning(f"检测CSV文件编码失败: {str(e)}，使用默认utf-8编码")
-                
-                # 读取CSV文件
-                with open(file_path, 'r', encoding=encoding, errors='replace') as f:
-                    csv_reader = csv.reader(f)
-                    rows = list(csv_reader)
-                    
-                    if not rows:
-                        logger.warning(f"CSV文件为空: {os.path.basename(file_path)}")
-                        return []
-                    
-                    # 提取表头（第一行）
-                    headers = rows[0] if rows else []
-                    
-                    # 构建文本内容
-                    text_content = ""
-                    
-                    # 添加表头信息
-                    if headers:
-                        text_content += f"表头: {' | '.join(headers)}\n\n"
-                    
-                    # 添加每行数据
-                    for i, row in enumerate(rows[1:], 1):  # 跳过表头，从第二行开始
-                        # 将行数据合并为文本
-                        row_values = [str(val).strip() for val in row]
-                        row_text = " | ".join(row_values)
-                        text_content += f"行 {i}: {row_text}\n"
-                    
-                    metadata = {"source": file_path}
-                    docs = [Document(page_content=text_content, metadata=metadata)]
-                    logger.info(f"成功加载CSV文件: {os.path.basename(file_path)}")
-            except Exception as e:
-                logger.error(f"加载CSV文件失败 {os.path.basename(file_path)}: {str(e)}")
-                return []
+            # 流式读取CSV文件，按行组输出带表头的文档
+            docs = CustomCsvLoader(file_path, max_chars=MAX_TEXT_LENGTH).load()
+            if docs:
+                logger.info(f"成功加载CSV文件: {os.path.basename(file_path)}，共 {len(docs)} 个行组")
         
         # 应用文本长度限制
         if not docs:
@@ -877,9 +1454,292 @@ def load_document(file_path: str) -> List:
         logger.error(f"加载文件出错 {file_path}: {str(e)}")
         return []
 
+# 索引流水线：遍历 → 解析 → 分块 → 嵌入 → 写入
+class FolderIndexPipeline:
+    """一次文件夹索引任务的流水线
+
+    遍历、解析、分块和嵌入各在一个线程中运行，阶段之间是有界队列，写入在调用 run 的线程中进行。
+    同时在内存中的文件、文本块和待提交的文件记录数由队列容量和保存间隔决定，与文件夹中的文件总数无关；
+    已索引文件的记录逐个从 ChunkStore 查询，不预先读入内存。
+    faiss 索引只由写入阶段修改，解析和嵌入阶段只通过加锁的 ChunkStore 查询文件记录和文本块哈希。
+    """
+
+    _STAT_KEYS = {"success": "success_count", "failed": "failure_count", "skipped": "skipped_count"}
+    _SAMPLE_LIMIT = 10  # 日志中列出的失败和跳过文件数
+
+    def __init__(self, folder: str, db, db_path: str, profiler: IndexProfiler):
+        self.folder = folder
+        self.db = db
+        self.db_path = db_path
+        self.profiler = profiler
+        self.store = get_chunk_store(db)
+        self.detector = DuplicateDetector(self.store)
+        self.dead_letter_queue = get_dead_letter_queue()
+        self.embedding_model = create_embedding_model(max_retries=1)
+        self.processed = 0      # 遍历到的文件数
+        self.parsed_files = 0   # 解析出内容、需要嵌入的文件数
+        self.duplicate_count = 0
+        self.failed_samples = []
+        self.skipped_samples = []
+        # 上次保存之后写入的文本块来源和文件记录，保存时一起提交
+        self.unsaved_sources = []
+        self.pending_records = []
+        self.saved_at = time.time()
+        self.stats = {}
+
+    def _outcome(self, category: str, file_path: str, **details):
+        index_file_history.add(category, {"name": os.path.basename(file_path), "path": file_path, **details})
+        index_status["file_stats"][self._STAT_KEYS[category]] += 1
+
+    def _failed(self, file_path: str, reason: str, sample: str):
+        self._outcome("failed", file_path, reason=reason)
+        if len(self.failed_samples) < self._SAMPLE_LIMIT:
+            self.failed_samples.append(sample)
+
+    def _update_progress(self, file_name: str):
+        # 文件总数由计数线程并行统计，统计完成前总数还在增加
+        total = max(index_status["file_stats"]["total_count"], self.processed)
+        index_status["progress"] = max(index_status["progress"], int(self.processed / total * 90))
+        index_status["status"] = f"加载文件 ({self.processed}/{total}): {file_name}"
+        if self.processed % 10 == 1:
+            logger.info(f"加载文件 {self.processed}/{total}: {file_name}")
+
+    def _indexed_state(self, file_path: str, current_mtime: float):
+        """返回 (索引时的修改时间, 文件记录)，未索引时修改时间为None；旧版本索引没有文件记录，沿用当前修改时间"""
+        store = self.store
+        if store is None:
+            return None, None
+        record = store.file_record(file_path)
+        if record is not None:
+            return record["mtime"], record
+        if store.has_source(file_path):
+            return current_mtime, None
+        return None, None
+
+    def walk(self, folder: str):
+        """遍历文件夹，同时更新文件名索引（包括不支持解析的文件）"""
+        scan = filename_index.begin_scan(folder)
+        completed = False
+        try:
+            for item in iter_folder_files(folder):
+                scan.add(item[0])
+                yield item
+            completed = True
+        finally:
+            scan.finish(remove_missing=completed)
+
+    def parse(self, files):
+        """检查文件是否需要重新索引并解析；只有需要写入的文件进入下一阶段"""
+        for file_path, supported in files:
+            self.processed += 1
+            file_name = os.path.basename(file_path)
+            self._update_progress(file_name)
+            if not supported:
+                _, ext = os.path.splitext(file_path.lower())
+                logger.warning(f"不支持的文件格式 '{ext}': {file_name}")
+                self._failed(file_path, f"不支持的格式: {ext}", f"{file_name} (不支持的格式: {ext})")
+                continue
+            try:
+                item = self._parse_file(file_path, file_name)
+            except Exception as e:
+                logger.error(f"加载文件失败 {file_name}: {str(e)}")
+                self.profiler.mark(file_path, "failed")
+                self._failed(file_path, f"加载失败: {str(e)}", file_name)
+                continue
+            if item is not None:
+                yield item
+
+    def _parse_file(self, file_path: str, file_name: str):
+        # 检查文件是否已存在于索引中并且没有更改
+        with self.profiler.stage("stat", file_path):
+            current_mtime = os.path.getmtime(file_path)
+            indexed_mtime, previous_record = self._indexed_state(file_path, current_mtime)
+            is_unchanged = indexed_mtime is not None and current_mtime <= indexed_mtime
+            if not is_unchanged:
+                is_too_large, file_size_mb = is_file_too_large(file_path)
+        if is_unchanged:
+            logger.debug(f"文件 '{file_name}' 已存在于索引中且未更改，跳过处理")
+            self.profiler.mark(file_path, "unchanged")
+            self._outcome("success", file_path, skipped=True, reason="已索引且未更改")
+            return None
+
+        # 对于特别大的文件，跳过处理
+        if is_too_large:
+            logger.warning(f"文件 '{file_name}' 过大 ({file_size_mb:.2f}MB > {MAX_FILE_SIZE_MB}MB)，已跳过")
+            self.profiler.mark(file_path, "too_large")
+            self._outcome("skipped", file_path, reason=f"文件过大: {file_size_mb:.2f}MB")
+            if len(self.skipped_samples) < self._SAMPLE_LIMIT:
+                self.skipped_samples.append(f"{file_name} (过大: {file_size_mb:.2f}MB)")
+            return None
+
+        with self.profiler.stage("parse", file_path):
+            file_docs, file_record, duplicate_reason = load_document_deduplicated(
+                file_path, self.detector, previous_record)
+        # 文件重新解析或与其他文件重复后，旧的失败记录不再有效
+        if not duplicate_reason or file_record["canonical"]:
+            self.dead_letter_queue.remove_sources([file_path])
+        if duplicate_reason:
+            duplicate = bool(file_record["canonical"])
+            self.profiler.mark(file_path, "duplicate" if duplicate else "unchanged")
+            if duplicate:
+                # 与其他文件重复，不单独保存文本块，搜索时随代表文件一起返回；旧向量在写入阶段删除
+                self.duplicate_count += 1
+                index_status["file_stats"]["duplicate_count"] = self.duplicate_count
+            logger.info(f"文件 '{file_name}' {duplicate_reason}，跳过解析和嵌入")
+            self._outcome("success", file_path, skipped=True, reason=duplicate_reason)
+            return {"path": file_path, "record": file_record, "duplicate": duplicate}
+
+        if not file_docs:
+            logger.error(f"文件解析结果为空: {file_name}")
+            self.profiler.mark(file_path, "failed")
+            self._failed(file_path, "解析结果为空", file_name)
+            return None
+
+        replace = indexed_mtime is not None
+        if replace and self.store is not None:
+            # 代表文件内容变化后，原来的重复文件需要重新判断：删除它们的记录，遍历到时重新索引
+            self.store.detach_aliases(file_path)
+        self.parsed_files += 1
+        self._outcome("success", file_path)
+        return {"path": file_path, "record": file_record, "docs": file_docs, "replace": replace}
+
+    def chunk(self, items):
+        # 按Token预算分块，文本块不会超过模型限制
+        chunker = get_text_chunker()
+        for item in items:
+            docs = item.pop("docs", None)
+            if docs:
+                with self.profiler.stage("chunk", item["path"]):
+                    chunks = chunker.split_documents(docs)
+                # 限制单个文件的块数量
+                if len(chunks) > MAX_CHUNK_COUNT:
+                    logger.warning(f"文件 '{os.path.basename(item['path'])}' 生成的块数 ({len(chunks)}) "
+                                   f"超过限制 ({MAX_CHUNK_COUNT})，已截断")
+                    chunks = chunks[:MAX_CHUNK_COUNT]
+                item["chunks"] = chunks
+            yield item
+
+    def embed(self, items):
+        """把文件攒成约 INDEX_EMBED_UNIT_CHUNKS 个文本块的批次后嵌入"""
+        unit = []
+        chunk_count = 0
+        for item in items:
+            unit.append(item)
+            chunk_count += len(item.get("chunks", ()))
+            if chunk_count >= INDEX_EMBED_UNIT_CHUNKS or len(unit) >= INDEX_EMBED_UNIT_FILES:
+                yield self._embed_unit(unit)
+                unit = []
+                chunk_count = 0
+        if unit:
+            yield self._embed_unit(unit)
+
+    def _embed_unit(self, items: list) -> dict:
+        # 内容与已有文本块相同的不请求嵌入接口，向量在写入阶段从索引中复制
+        docs = [doc for item in items for doc in item.get("chunks", ())]
+        reusable = []
+        store = self.store
+        if store is not None and docs:
+            found = store.vector_ids_for_chunk_hashes([chunk_hash(doc.page_content) for doc in docs])
+            if found:
+                reusable = [doc for doc in docs if chunk_hash(doc.page_content) in found]
+                docs = [doc for doc in docs if chunk_hash(doc.page_content) not in found]
+        embedded = []
+        failed = []
+        if docs:
+            with self.profiler.batch("embed", (doc.metadata.get("source") for doc in docs)):
+                for batch_embedded, batch_failed in embed_documents_once(docs, self.embedding_model):
+                    embedded.extend(batch_embedded)
+                    failed.extend(batch_failed)
+        return {"items": items, "embedded": embedded, "reusable": reusable, "failed": failed}
+
+    def write(self, unit: dict):
+        """把一个批次写入向量库，写入的文本块或文件记录足够多、或距上次保存足够久时保存"""
+        items = unit["items"]
+        embedded = unit["embedded"]
+        failed = unit["failed"]
+        duplicates = [item["path"] for item in items if item.get("duplicate")]
+        if duplicates and get_chunk_store(self.db) is not None:
+            delete_sources(self.db, duplicates)
+        if unit["reusable"]:
+            # 嵌入阶段查到的向量可能已随所属文件的旧版本一起删除，这时在这里补做嵌入
+            if get_chunk_store(self.db) is not None:
+                reused, missing = reuse_vectors(self.db, unit["reusable"])
+            else:
+                reused, missing = [], unit["reusable"]
+            if reused:
+                EMBEDDING_REUSED_TEXTS.inc(len(reused))
+            embedded = reused + embedded
+            for batch_embedded, batch_failed in embed_documents_once(missing, self.embedding_model):
+                embedded += batch_embedded
+                failed += batch_failed
+        # 更新文件的旧向量在复用查找之后删除，文件修改时未变化的部分不必重新嵌入
+        replace_sources = [item["path"] for item in items if item.get("replace")]
+        if replace_sources and get_chunk_store(self.db) is not None:
+            removed_count = delete_sources(self.db, replace_sources)
+            if removed_count:
+                logger.info(f"已移除 {len(replace_sources)} 个更新文件的 {removed_count} 个旧向量")
+        if embedded:
+            self.db = add_embeddings(self.db, [(doc.page_content, vector) for doc, vector in embedded],
+                                     self.embedding_model, [doc.metadata for doc, _ in embedded])
+            self.unsaved_sources.extend(doc.metadata.get("source") for doc, _ in embedded)
+        self.dead_letter_queue.add(failed)
+        self.pending_records.extend(item["record"] for item in items)
+        if (len(self.unsaved_sources) + len(self.pending_records) >= INDEX_CHECKPOINT_ITEMS or
+                time.time() - self.saved_at >= INDEX_CHECKPOINT_SECONDS):
+            logger.info(f"保存中间结果: {len(self.unsaved_sources)} 个文本块, {len(self.pending_records)} 个文件记录")
+            self.save()
+
+    def save(self):
+        """保存向量库并提交文件记录；已提交的文件不再保留在去重器的内存中"""
+        if self.db is None:
+            return
+        with self.profiler.batch("save", self.unsaved_sources):
+            save_vector_store(self.db, self.db_path, INDEX_STORAGE_MODE, self.pending_records)
+        query_cache.invalidate(self.folder)
+        self.detector.store = self.store = get_chunk_store(self.db)
+        self.detector.forget(self.pending_records)
+        self.pending_records = []
+        self.unsaved_sources = []
+        self.saved_at = time.time()
+
+    def run(self):
+        """运行流水线直到所有文件写入（最后一次保存由调用方进行）"""
+        stop_counting = threading.Event()
+        counter = threading.Thread(target=count_folder_files, args=(self.folder, stop_counting),
+                                   name="index-count", daemon=True)
+        counter.start()
+        try:
+            with Pipeline() as pipeline:
+                files = pipeline.stage("walk", self.walk, self.folder, INDEX_WALK_QUEUE_SIZE)
+                parsed = pipeline.stage("parse", self.parse, files, INDEX_PARSE_QUEUE_SIZE)
+                chunked = pipeline.stage("chunk", self.chunk, parsed, INDEX_CHUNK_QUEUE_SIZE)
+                units = pipeline.stage("embed", self.embed, chunked, INDEX_EMBED_QUEUE_SIZE)
+                for unit in units:
+                    self.write(unit)
+                self.stats = pipeline.stats()
+        finally:
+            stop_counting.set()
+            counter.join()
+        index_status["file_stats"]["total_count"] = self.processed
+        logger.info(f"索引流水线各阶段: {self.stats}")
+
 # 索引文件夹中的文档
-def index_folder(folder: str):
-    """索引文件夹中的所有支持的文档"""
+def index_folder(folder: str, profile: bool = False, cpu_profile: bool = False):
+    """索引文件夹中的所有支持的文档，写入共享向量库期间持有写锁
+
+    profile 为真时记录每个文件在各阶段的耗时，结果可通过 /index-profile 查看。
+    """
+    global last_index_profile
+    profiler = IndexProfiler(folder, enabled=profile, cpu_profile=cpu_profile)
+    if profile:
+        last_index_profile = profiler
+    try:
+        with vector_store_lock:
+            _index_folder(folder, profiler)
+    finally:
+        profiler.finish()
+
+def _index_folder(folder: str, profiler: IndexProfiler):
     global index_status
     
     try:
@@ -893,11 +1753,10 @@ def index_folder(folder: str):
             "success_count": 0,
             "failure_count": 0,
             "skipped_count": 0,
+            "duplicate_count": 0,
             "total_count": 0
         }
-        index_status["success_files"] = []
-        index_status["failed_files"] = []
-        index_status["skipped_files"] = []
+        index_file_history.clear()
         
         # 规范化并检查路径
         folder = normalize_path(folder)
@@ -906,379 +1765,99 @@ def index_folder(folder: str):
         if not os.path.isdir(folder):
             raise ValueError(f"路径不是文件夹: {folder}")
         
-        # 获取数据库路径
-        db_path = get_db_path(folder)
+        # 获取数据库路径，旧版本单独保存的该文件夹索引先合并进共享向量库
+        db_path = get_db_path()
         logger.info(f"数据库路径: {db_path}")
+        migrate_legacy_index(folder)
+        
+        # 已索引文件夹的子文件夹只需登记为新的视图，不需要重新解析和嵌入
+        root = get_covering_root(folder)
+        if root is not None and root != folder:
+            store = ChunkStore(os.path.join(db_path, CHUNK_STORE_FILE), writable=True)
+            try:
+                store.add_root(folder)
+                store.commit()
+            finally:
+                store.close()
+            index_status["status"] = f"索引完成！该文件夹已包含在已索引的文件夹 {root} 中，无需重新索引。"
+            index_status["progress"] = 100
+            index_status["completed"] = True
+            logger.info(index_status["status"])
+            return
         
-        # 初始化变量
-        indexed_files = {}
         db = None
         
-        # 如果数据库已存在，检查现有索引并进行增量更新
-        if os.path.exists(db_path) and os.path.exists(os.path.join(db_path, "index.faiss")):
+        # 如果数据库已存在，进行增量更新：已索引文件的记录在处理到该文件时从文本库查询
+        if shared_store_exists():
             logger.info(f"发现现有向量数据库，将进行增量更新: {db_path}")
             index_status["status"] = "发现现有索引，准备增量更新..."
             
             # 加载现有数据库
             try:
-                embedding_model = DashScopeEmbeddings(
-                    model=EMBEDDING_MODEL_NAME,
-                    dashscope_api_key=DASHSCOPE_API_KEY
-                )
-                db = FAISS.load_local(db_path, embedding_model, allow_dangerous_deserialization=True)
-                
-                # 获取已索引文件列表
-                # 查询所有文档，获取源文件路径
-                search_results = db.similarity_search_with_score("", k=10000)  # 尝试获取所有文档
-                for doc, _ in search_results:
-                    source = doc.metadata.get("source", "")
-                    if source and os.path.exists(source):
-                        # 获取文件的最后修改时间
-                        mtime = os.path.getmtime(source)
-                        if source not in indexed_files or mtime > indexed_files[source]["mtime"]:
-                            indexed_files[source] = {
-                                "mtime": mtime,
-                                "indexed": True
-                            }
-                
-                logger.info(f"从现有索引中找到 {len(indexed_files)} 个已索引文件")
-                index_status["status"] = f"从现有索引中找到 {len(indexed_files)} 个已索引文件，准备增量更新..."
+                db = load_vector_store(db_path, create_embedding_model(max_retries=1), writable=True,
+                                       dimension=get_embedding_dimension())
             except Exception as e:
+                # 共享向量库包含所有已索引文件夹，不能因为索引其中一个文件夹就删除重建，由用户决定是否清理
                 logger.error(f"加载现有索引出错: {str(e)}")
-                logger.info("将重新创建索引数据库")
-                # 如果加载失败，删除现有索引并重建
-                if os.path.exists(db_path):
-                    shutil.rmtree(db_path)
-                os.makedirs(db_path, exist_ok=True)
-                indexed_files = {}
-                db = None
+                raise Exception(f"无法加载现有向量数据库，索引已中止，现有索引保持不变。"
+                                f"如果索引已损坏，请清理所有索引后重新索引: {str(e)}")
         else:
             # 确保数据库目录存在
             os.makedirs(db_path, exist_ok=True)
         
-        # 扫描文件夹中的所有文件 - 不再过滤格式，收集所有文件
-        all_files = []
-        unsupported_files = []
-        
-        for root, _, files in os.walk(folder):
-            for file in files:
-                try:
-                    file_path = os.path.join(root, file)
-                    # 只检查是否为文件，不再使用is_supported_file过滤
-                    if os.path.isfile(file_path):
-                        # 检查是否支持该格式
-                        if is_supported_file(file_path):
-                            all_files.append(file_path)
-                        else:
-                            # 检查是否是系统文件（如.DS_Store）
-                            file_name = os.path.basename(file_path)
-                            # 如果不是系统隐藏文件，则添加到不支持文件列表
-                            if not (file_name == '.DS_Store' or 
-                                   file_name.startswith('.') or 
-                                   file_name in ['Thumbs.db', 'desktop.ini'] or 
-                                   file_name.endswith('~') or 
-                                   file_name.startswith('~$')):
-                                unsupported_files.append(file_path)
-                except Exception as e:
-                    logger.error(f"扫描文件时出错: {file}, {e}")
-        
-        # 计算总文件数，包括不支持的格式
-        total_files = len(all_files) + len(unsupported_files)
+        # 边遍历边解析、分块、嵌入和写入，内存占用与文件夹大小无关
+        indexer = FolderIndexPipeline(folder, db, db_path, profiler)
+        dead_letter_before = len(indexer.dead_letter_queue)
+        indexer.run()
+        db = indexer.db
+        stats = index_status["file_stats"]
         
-        if total_files == 0:
+        if indexer.processed == 0:
             index_status["status"] = "没有找到任何文件"
             index_status["completed"] = True
-            index_status["in_progress"] = False
             logger.warning(f"文件夹 {folder} 中没有找到任何文件")
             return
         
-        index_status["status"] = f"找到 {total_files} 个文件（其中 {len(unsupported_files)} 个格式不支持），开始加载..."
-        index_status["file_stats"]["total_count"] = total_files
-        logger.info(f"找到 {total_files} 个文件（其中 {len(unsupported_files)} 个格式不支持），开始加载...")
-        
-        # 加载所有文档
-        docs = []
-        success_count = 0
-        failed_files = []
-        skipped_files = []
-        embedding_model = None  # 初始化嵌入模型变量
-        
-        # 先处理不支持的文件格式，将它们标记为失败
-        for file_path in unsupported_files:
-            file_name = os.path.basename(file_path)
-            _, ext = os.path.splitext(file_path.lower())
-            logger.warning(f"不支持的文件格式 '{ext}': {file_name}")
-            failed_files.append(f"{file_name} (不支持的格式: {ext})")
-            index_status["failed_files"].append({
-                "name": file_name,
-                "path": file_path,
-                "reason": f"不支持的格式: {ext}"
-            })
-            index_status["file_stats"]["failure_count"] += 1
-        
-        # 处理支持的文件格式
-        for i, file_path in enumerate(all_files):
-            # 计算进度，考虑到已处理的不支持文件格式
-            processed_count = len(unsupported_files) + i
-            index_status["progress"] = int((processed_count / total_files) * 50)  # 前50%进度用于加载文件
-            file_name = os.path.basename(file_path)
-            index_status["status"] = f"加载文件 ({processed_count+1}/{total_files}): {file_name}"
-            
-            # 减少日志输出，只在每10个文件或最后一个文件时记录日志
-            if i % 10 == 0 or i == len(all_files) - 1:
-                logger.info(f"加载文件 {processed_count+1}/{total_files}: {file_name}")
-            
-            try:
-                # 检查文件是否已存在于索引中并且没有更改
-                current_mtime = os.path.getmtime(file_path)
-                if file_path in indexed_files and current_mtime <= indexed_files[file_path]["mtime"]:
-                    logger.info(f"文件 '{file_name}' 已存在于索引中且未更改，跳过处理")
-                    success_count += 1
-                    index_status["success_files"].append({
-                        "name": file_name,
-                        "path": file_path,
-                        "skipped": True,
-                        "reason": "已索引且未更改"
-                    })
-                    index_status["file_stats"]["success_count"] += 1
-                    continue
-                
-                # 检查文件大小
-                is_too_large, file_size_mb = is_file_too_large(file_path)
-                # 对于特别大的文件，跳过处理
-                if is_too_large:
-                    logger.warning(f"文件 '{file_name}' 过大 ({file_size_mb:.2f}MB > {MAX_FILE_SIZE_MB}MB)，已跳过")
-                    skipped_files.append(f"{file_name} (过大: {file_size_mb:.2f}MB)")
-                    index_status["skipped_files"].append({
-                        "name": file_name,
-                        "path": file_path,
-                        "reason": f"文件过大: {file_size_mb:.2f}MB"
-                    })
-                    index_status["file_stats"]["skipped_count"] += 1
-                    continue
-                
-                file_docs = load_document(file_path)
-                if file_docs:
-                    # 限制单个文件的块数量
-                    if len(file_docs) > MAX_CHUNK_COUNT:
-                        logger.warning(f"文件 '{file_name}' 生成的块数 ({len(file_docs)}) 超过限制 ({MAX_CHUNK_COUNT})，已截断")
-                        file_docs = file_docs[:MAX_CHUNK_COUNT]
-                        
-                    docs.extend(file_docs)
-                    success_count += 1
-                    index_status["success_files"].append({
-                        "name": file_name,
-                        "path": file_path
-                    })
-                    index_status["file_stats"]["success_count"] += 1
-                    
-                    # 更新已索引文件记录
-                    indexed_files[file_path] = {
-                        "mtime": current_mtime,
-                        "indexed": True
-                    }
-                    
-                    # 流水线处理 - 每处理一定数量的文件就进行一次向量化
-                    # 设置阈值，每积累100个文档块或处理了20个文件就进行一次向量化
-                    if len(docs) >= 100 or (i > 0 and i % 20 == 0):
-                        # 文本切片
-                        partial_progress = int((processed_count / total_files) * 50)
-                        index_status["status"] = f"已处理 {success_count} 个文件，进行部分向量化..."
-                        index_status["progress"] = 50 + partial_progress // 2  # 进度表现为50%-75%之间
-                        
-                        # 分块处理
-                        text_splitter = CharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-                        split_docs = text_splitter.split_documents(docs)
-                        
-                        # 检查并修剪文本块
-                        valid_split_docs = []
-                        for doc in split_docs:
-                            if len(doc.page_content) > MAX_TEXT_BLOCK_SIZE:
-                                # 截断超长内容
-                                truncated_content = doc.page_content[:(MAX_TEXT_BLOCK_SIZE-8)] + "..."
-                                valid_split_docs.append(Document(page_content=truncated_content, metadata=doc.metadata))
-                            else:
-                                valid_split_docs.append(doc)
-                        
-                        # 创建嵌入模型（如果还没创建）
-                        if embedding_model is None:
-                            logger.info("初始化嵌入模型...")
-                            embedding_model = DashScopeEmbeddings(
-                                model=EMBEDDING_MODEL_NAME,
-                                dashscope_api_key=DASHSCOPE_API_KEY
-                            )
-                        
-                        # 向量化处理
-                        logger.info(f"中间向量化处理 {len(valid_split_docs)} 个文本块...")
-                        try:
-                            # 分批向量化
-                            batch_size = MAX_BATCH_ROWS
-                            for j in range(0, len(valid_split_docs), batch_size):
-                                end_j = min(j + batch_size, len(valid_split_docs))
-                                batch_docs = valid_split_docs[j:end_j]
-                                try:
-                                    if db is None:
-                                        # 第一批，创建新的向量数据库
-                                        db = FAISS.from_documents(batch_docs, embedding_model)
-                                    else:
-                                        # 向现有数据库添加文档
-                                        db.add_documents(batch_docs)
-                                    logger.info(f"成功向量化 {end_j-j} 个文本块")
-                                except Exception as batch_error:
-                                    logger.error(f"批量向量化出错: {str(batch_error)}")
-                                    # 尝试减小批量
-                                    retry_size = len(batch_docs) // 2
-                                    if retry_size > 0:
-                                        logger.info(f"尝试以较小批量 ({retry_size}) 重试...")
-                                        for k in range(0, len(batch_docs), retry_size):
-                                            retry_docs = batch_docs[k:k+retry_size]
-                                            try:
-                                                if db is None:
-                                                    db = FAISS.from_documents(retry_docs, embedding_model)
-                                                else:
-                                                    db.add_documents(retry_docs)
-                                            except Exception:
-                                                # 继续处理下一批
-                                                continue
-                        except Exception as e:
-                            logger.error(f"中间向量化处理失败: {str(e)}")
-                        
-                        # 保存中间结果
-                        if db is not None:
-                            try:
-                                logger.info("保存中间向量化结果...")
-                                db.save_local(db_path)
-                            except Exception as save_error:
-                                logger.error(f"保存中间结果失败: {str(save_error)}")
-                        
-                        # 清空处理队列，开始下一批文件
-                        docs = []
-                else:
-                    logger.error(f"文件解析结果为空: {file_name}")
-                    failed_files.append(file_name)
-                    index_status["failed_files"].append({
-                        "name": file_name,
-                        "path": file_path,
-                        "reason": "解析结果为空"
-                    })
-                    index_status["file_stats"]["failure_count"] += 1
-            except Exception as e:
-                logger.error(f"加载文件失败 {file_name}: {str(e)}")
-                failed_files.append(file_name)
-                index_status["failed_files"].append({
-                    "name": file_name,
-                    "path": file_path,
-                    "reason": f"加载失败: {str(e)}"
-                })
-                index_status["file_stats"]["failure_count"] += 1
-        
-        # 统计并显示成功和失败的文件
-        failure_count = len(failed_files)
-        skipped_count = len(skipped_files)
-        
-        # 更新索引状态的文件统计
-        index_status["file_stats"]["success_count"] = success_count
-        index_status["file_stats"]["failure_count"] = failure_count
-        index_status["file_stats"]["skipped_count"] = skipped_count
+        logger.info(f"文件处理完成: 成功 {stats['success_count']} 个, 失败 {stats['failure_count']} 个, "
+                    f"跳过 {stats['skipped_count']} 个")
+        if indexer.failed_samples:
+            logger.info(f"失败的文件: {', '.join(indexer.failed_samples)}" +
+                       (f" 等 {stats['failure_count']} 个文件" if stats["failure_count"] > len(indexer.failed_samples) else ""))
+        if indexer.skipped_samples:
+            logger.info(f"跳过的文件: {', '.join(indexer.skipped_samples)}" +
+                       (f" 等 {stats['skipped_count']} 个文件" if stats["skipped_count"] > len(indexer.skipped_samples) else ""))
         
-        logger.info(f"文件处理完成: 成功 {success_count} 个, 失败 {failure_count} 个, 跳过 {skipped_count} 个")
-        if failed_files:
-            logger.info(f"失败的文件: {', '.join(failed_files[:10])}" + 
-                       (f" 等 {len(failed_files)} 个文件" if len(failed_files) > 10 else ""))
-        if skipped_files:
-            logger.info(f"跳过的文件: {', '.join(skipped_files[:10])}" + 
-                       (f" 等 {len(skipped_files)} 个文件" if len(skipped_files) > 10 else ""))
-        
-        # 处理队列中剩余的文档（最后一批）
-        if docs:
-            # 文本切片
-            index_status["status"] = f"处理最后一批文件..."
-            index_status["progress"] = 75
-            logger.info("处理剩余文档...")
-            
-            # 分块处理
-            text_splitter = CharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-            split_docs = text_splitter.split_documents(docs)
-            
-            # 检查并修剪文本块
-            valid_split_docs = []
-            for doc in split_docs:
-                if len(doc.page_content) > MAX_TEXT_BLOCK_SIZE:
-                    truncated_content = doc.page_content[:(MAX_TEXT_BLOCK_SIZE-8)] + "..."
-                    valid_split_docs.append(Document(page_content=truncated_content, metadata=doc.metadata))
-                else:
-                    valid_split_docs.append(doc)
-            
-            # 截断过多的文本块，避免请求数量过大
-            if len(valid_split_docs) > MAX_CHUNK_COUNT:
-                logger.warning(f"文本块数量超出限制，从 {len(valid_split_docs)} 截断至 {MAX_CHUNK_COUNT}")
-                valid_split_docs = valid_split_docs[:MAX_CHUNK_COUNT]
-            
-            # 创建嵌入模型（如果还没有创建）
-            if embedding_model is None:
-                index_status["status"] = "加载嵌入模型..."
-                index_status["progress"] = 80
-                logger.info("加载通义千问嵌入模型...")
-                
-                embedding_model = DashScopeEmbeddings(
-                    model=EMBEDDING_MODEL_NAME,
-                    dashscope_api_key=DASHSCOPE_API_KEY
-                )
-            
-            # 构建向量数据库
-            index_status["status"] = "处理最后批次文本块..."
-            index_status["progress"] = 85
-            logger.info(f"对剩余 {len(valid_split_docs)} 个文本块创建向量索引...")
-            
-            # 分批处理文本块
-            batch_size = MAX_BATCH_ROWS
-            for i in range(0, len(valid_split_docs), batch_size):
-                end_idx = min(i + batch_size, len(valid_split_docs))
-                batch_docs = valid_split_docs[i:end_idx]
-                
-                try:
-                    if db is None:
-                        db = FAISS.from_documents(batch_docs, embedding_model)
-                    else:
-                        db.add_documents(batch_docs)
-                except Exception as e:
-                    logger.error(f"处理最后批次时出错: {str(e)}")
-                    # 如果批处理失败，尝试减小批大小并重试
-                    retry_batch_size = len(batch_docs) // 2
-                    if retry_batch_size > 0:
-                        for j in range(0, len(batch_docs), retry_batch_size):
-                            try:
-                                retry_docs = batch_docs[j:j+retry_batch_size]
-                                if db is None:
-                                    db = FAISS.from_documents(retry_docs, embedding_model)
-                                else:
-                                    db.add_documents(retry_docs)
-                            except:
-                                continue
-        else:
-            # 如果没有文档需要处理
-            if not db:  # 如果也没有中间生成的数据库
-                index_status["status"] = f"未能成功加载任何文件。尝试处理了 {total_files} 个文件，全部失败或跳过。"
+        if db is None:
+            if indexer.parsed_files == 0:
+                index_status["status"] = f"未能成功加载任何文件。尝试处理了 {indexer.processed} 个文件，全部失败或跳过。"
                 index_status["completed"] = True
-                index_status["in_progress"] = False
                 logger.warning("没有成功加载任何文件")
                 return
-
-        if db is None:
-            raise Exception("所有批次处理均失败，无法创建向量数据库")
+            raise Exception("所有批次处理均失败，失败的文本块已加入死信队列，稍后会自动重试")
 
         # 保存向量数据库
         index_status["status"] = "保存向量数据库..."
-        index_status["progress"] = 90
+        index_status["progress"] = 95
         logger.info("保存最终向量数据库...")
 
-        db.save_local(db_path)
+        indexer.save()
+        get_chunk_store(db).add_root(folder)
+        get_chunk_store(db).commit()
+        query_cache.invalidate(folder)
+        # 在后台重建该文件夹的候选词索引
+        suggest_registry.refresh(folder, query_cache.version(folder))
 
         # 索引完成
-        index_status["status"] = f"索引完成！成功处理 {success_count} 个文件，失败 {failure_count} 个文件，跳过 {skipped_count} 个文件。"
+        index_status["status"] = (f"索引完成！成功处理 {stats['success_count']} 个文件，失败 {stats['failure_count']} 个文件，"
+                                  f"跳过 {stats['skipped_count']} 个文件。")
+        if indexer.duplicate_count > 0:
+            index_status["status"] += f" 其中 {indexer.duplicate_count} 个文件与已索引文件重复，未重复嵌入。"
+        dead_letter_added = len(indexer.dead_letter_queue) - dead_letter_before
+        if dead_letter_added > 0:
+            index_status["status"] += f" {dead_letter_added} 个文本块嵌入失败，已加入重试队列。"
         index_status["progress"] = 100
         index_status["completed"] = True
-        logger.info(f"索引完成！成功处理 {success_count} 个文件，失败 {failure_count} 个文件，跳过 {skipped_count} 个文件。")
+        logger.info(index_status["status"])
         
     except Exception as e:
         error_msg = str(e)
@@ -1299,9 +1878,9 @@ async def check_db(folder_req: FolderRequest):
     try:
         # 规范化路径
         folder = normalize_path(folder)
-        db_path = get_db_path(folder)
-        exists = os.path.exists(db_path) and os.path.exists(os.path.join(db_path, "index.faiss"))
-        logger.info(f"数据库路径: {db_path}, 存在: {exists}")
+        root = await admin_executor.run(get_covering_root, folder, timeout=ADMIN_TIMEOUT)
+        exists = root is not None
+        logger.info(f"已索引的根目录: {root}, 存在: {exists}")
         return {"exists": exists}
     except Exception as e:
         logger.error(f"检查数据库出错: {str(e)}\n{traceback.format_exc()}")
@@ -1316,9 +1895,9 @@ async def check_db_get(folder: str):
         folder = urllib.parse.unquote(folder)
         # 规范化路径
         folder = normalize_path(folder)
-        db_path = get_db_path(folder)
-        exists = os.path.exists(db_path) and os.path.exists(os.path.join(db_path, "index.faiss"))
-        logger.info(f"数据库路径: {db_path}, 存在: {exists}")
+        root = await admin_executor.run(get_covering_root, folder, timeout=ADMIN_TIMEOUT)
+        exists = root is not None
+        logger.info(f"已索引的根目录: {root}, 存在: {exists}")
         return {"exists": exists}
     except Exception as e:
         logger.error(f"检查数据库出错: {str(e)}\n{traceback.format_exc()}")
@@ -1326,7 +1905,7 @@ async def check_db_get(folder: str):
 
 # API路由：开始索引
 @app.post("/index")
-async def start_index(folder_req: FolderRequest, background_tasks: BackgroundTasks):
+async def start_index(folder_req: IndexRequest, background_tasks: BackgroundTasks):
     folder = folder_req.folder
     logger.info(f"收到索引请求: {folder}")
     
@@ -1353,16 +1932,22 @@ async def start_index(folder_req: FolderRequest, background_tasks: BackgroundTas
             return {"success": False, "message": error}
         
         # 检查是否已经有现有索引
-        db_path = get_db_path(folder)
-        has_existing_index = os.path.exists(db_path) and os.path.exists(os.path.join(db_path, "index.faiss"))
+        has_existing_index = await admin_executor.run(get_covering_root, folder, timeout=ADMIN_TIMEOUT) is not None
         if has_existing_index:
             logger.info(f"文件夹 {folder} 已存在索引，将进行增量更新")
         
-        # 开始索引
-        background_tasks.add_task(index_folder, folder)
+        # 开始索引；先标记为进行中，避免后台任务启动前的进度查询（或重复的索引请求）读到上一次任务的状态
+        index_status["in_progress"] = True
+        index_status["completed"] = False
+        # 索引会改变向量库，后台预热不再继续，也不与索引争抢磁盘和CPU
+        warmer.cancel("开始索引")
+        index_status["error"] = None
+        index_status["progress"] = 0
+        index_status["status"] = "准备索引..."
+        background_tasks.add_task(index_folder, folder, folder_req.profile, folder_req.cpu_profile)
         
-        # 同时启动文件监控
-        start_file_monitoring(folder)
+        # 同时启动文件监控（递归注册目录监听可能较慢）
+        await admin_executor.run(start_file_monitoring, folder, timeout=ADMIN_TIMEOUT)
         
         logger.info(f"索引任务已开始: {folder}")
         return {"success": True, "message": "开始增量索引更新..." if has_existing_index else "开始创建索引..."}
@@ -1371,21 +1956,121 @@ async def start_index(folder_req: FolderRequest, background_tasks: BackgroundTas
         logger.error(f"启动索引时出错: {error_msg}")
         return {"success": False, "message": f"启动索引时出错: {error_msg}"}
 
-# API路由：获取索引进度
-@app.get("/index-progress")
-async def get_index_progress():
+# 工具函数：索引进度的精简快照（只有计数，不含文件明细）
+def get_progress_snapshot() -> dict:
     return {
         "in_progress": index_status["in_progress"],
         "progress": index_status["progress"],
         "status": index_status["status"],
         "error": index_status["error"],
         "completed": index_status["completed"],
-        "file_stats": index_status["file_stats"],
-        "success_files": index_status["success_files"],
-        "failed_files": index_status["failed_files"],
-        "skipped_files": index_status["skipped_files"]
+        "file_stats": dict(index_status["file_stats"]),
+        "file_cursor": index_file_history.cursor,
+        "dead_letter": get_dead_letter_summary()
     }
 
+# API路由：获取索引进度
+@app.get("/index-progress")
+async def get_index_progress(include_files: bool = False):
+    """默认只返回计数和 file_cursor，文件明细通过 /index-progress/files 增量读取；
+    include_files 为真时附带内存中保留的全部文件明细（兼容旧客户端）"""
+    snapshot = get_progress_snapshot()
+    if include_files:
+        for category in FILE_CATEGORIES:
+            snapshot[f"{category}_files"] = index_file_history.snapshot(category)
+    return snapshot
+
+# API路由：分页获取索引过程中的文件明细
+@app.get("/index-progress/files")
+async def get_index_progress_files(after: int = 0, limit: int = 200, category: str = None, q: str = None):
+    """返回序号大于 after 的文件记录，客户端用返回的 next_cursor 作为下一次的 after"""
+    if category is not None and category not in FILE_CATEGORIES:
+        return {"success": False, "message": f"未知的文件类别: {category}，可选: {', '.join(FILE_CATEGORIES)}"}
+    page = index_file_history.page(after, max(1, min(limit, 1000)), category, q)
+    return dict(page, success=True)
+
+# API路由：以SSE推送索引进度的变化
+@app.get("/index-progress/stream")
+async def stream_index_progress(request: Request):
+    """先推送一次完整快照，之后只推送变化的字段；索引结束后推送最终状态并关闭连接"""
+    async def events():
+        last = {}
+        last_sent = time.time()
+        while True:
+            snapshot = get_progress_snapshot()
+            delta = {key: value for key, value in snapshot.items() if last.get(key) != value}
+            if delta:
+                last = snapshot
+                last_sent = time.time()
+                yield f"data: {json.dumps(delta, ensure_ascii=False)}\n\n"
+            elif time.time() - last_sent >= PROGRESS_STREAM_HEARTBEAT:
+                last_sent = time.time()
+                yield ": heartbeat\n\n"
+            if not snapshot["in_progress"] or await request.is_disconnected():
+                break
+            await asyncio.sleep(PROGRESS_STREAM_INTERVAL)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# API路由：获取最近一次索引的剖析报告
+@app.get("/index-profile")
+async def get_index_profile(top: int = 20):
+    """返回最慢的 top 个文件、各阶段耗时占比以及按扩展名和文件大小的汇总；索引进行中时返回当前的部分结果"""
+    if last_index_profile is None:
+        return {"success": False, "message": "没有剖析数据，请在 /index 请求中设置 profile 为 true 后重新索引"}
+    report = await admin_executor.run(last_index_profile.report, max(1, top), timeout=ADMIN_TIMEOUT)
+    return {"success": True, "in_progress": index_status["in_progress"], "report": report}
+
+# 工具函数：在文件夹视图内检索并整理搜索结果，在检索线程池中执行
+def search_in_folder(query: str, query_embedding: List[float], folder: str) -> list:
+    reader = SnapshotReader(get_db_path(), mmap=INDEX_MMAP_ENABLED)
+    try:
+        with reader.snapshot() as db:
+            return search_folder(db, query, query_embedding, folder, MAX_BATCH_ROWS)
+    finally:
+        reader.close()
+
+# 工具函数：语义检索，按配置在检索进程池或检索线程池中执行
+async def run_semantic_search(query: str, query_embedding: List[float], folder: str) -> list:
+    if SEARCH_PROCESSES > 0:
+        return await search_processes.search(get_db_path(), INDEX_MMAP_ENABLED, query, query_embedding, folder,
+                                              MAX_BATCH_ROWS, timeout=SEARCH_TIMEOUT)
+    return await search_executor.run(search_in_folder, query, query_embedding, folder, timeout=SEARCH_TIMEOUT)
+
+# 工具函数：按文件名查找，结果整理成与语义检索相同的格式，在检索线程池中执行
+def search_filenames(query: str, folder: str) -> list:
+    ensure_filename_index()
+    results = []
+    needle = query.strip()
+    for match in filename_index.search(needle, FILENAME_SEARCH_LIMIT, folder, FILENAME_MIN_SIMILARITY):
+        name = match["name"]
+        highlighted_name = name
+        start = name.lower().find(needle.lower())
+        if start >= 0:
+            end = start + len(needle)
+            highlighted_name = f"{name[:start]}<mark>{name[start:end]}</mark>{name[end:]}"
+        results.append({
+            "content": f"文件: {name}\n路径: {match['path']}",
+            "highlighted_content": f"文件: {highlighted_name}\n路径: {match['path']}",
+            "source": match["path"],
+            # 换算成与向量距离相同的尺度（越小越相关），前端按 (1 - score/2) 显示匹配度
+            "score": 2 * (1 - match["similarity"]),
+            "duplicates": [],
+            "match": "filename"
+        })
+    return results
+
+# 工具函数：合并文件名匹配和语义检索的结果
+def merge_search_results(filename_results: list, semantic_results: list) -> list:
+    """同一文件只保留分数更低（更相关）的一条，按分数排序"""
+    merged = {}
+    for result in semantic_results + filename_results:
+        existing = merged.get(result["source"])
+        if existing is None or result["score"] < existing["score"]:
+            merged[result["source"]] = result
+    return sorted(merged.values(), key=lambda result: result["score"])
+
 # API路由：搜索
 @app.post("/search")
 async def search(search_req: SearchRequest):
@@ -1396,81 +2081,46 @@ async def search(search_req: SearchRequest):
     try:
         # 规范化路径
         folder = normalize_path(folder)
-        db_path = get_db_path(folder)
-        
-        # 检查数据库是否存在
-        if not os.path.exists(db_path) or not os.path.exists(os.path.join(db_path, "index.faiss")):
-            logger.error(f"向量数据库不存在: {db_path}")
-            return {"success": False, "message": "向量数据库不存在，请先索引文件夹"}
-        
-        # 加载向量数据库
-        embedding_model = DashScopeEmbeddings(
-            model=EMBEDDING_MODEL_NAME,
-            dashscope_api_key=DASHSCOPE_API_KEY
-        )
-        db = FAISS.load_local(db_path, embedding_model, allow_dangerous_deserialization=True)
         
-        # 执行搜索 - 使用批处理模式，充分利用模型的行数限制
-        # 默认情况下执行单次查询，因为查询只有一行文本
-        try:
-            # 标准查询模式
-            docs_and_scores = db.similarity_search_with_score(query, k=MAX_BATCH_ROWS)
-        except Exception as search_error:
-            logger.warning(f"初始查询失败，尝试备用方法: {str(search_error)}")
-            # 如果初始查询失败，使用更保守的k值
-            try:
-                docs_and_scores = db.similarity_search_with_score(query, k=10)
-            except Exception as fallback_error:
-                logger.error(f"备用查询也失败: {str(fallback_error)}")
-                docs_and_scores = []
+        mode = search_req.mode if search_req.mode in SEARCH_MODES else "auto"
+        # 查询像文件名时同时按文件名查找，结果合并
+        with_filenames = mode == "filename" or (mode == "auto" and looks_like_filename(query))
         
-        # 按文件源去重，保留每个文件最相似的结果
-        unique_sources = {}
-        for doc, score in docs_and_scores:
-            source = doc.metadata.get("source", "未知文件")
-            float_score = float(score)
+        async def compute():
+            # 检查文件夹（或其上级目录）是否已索引，未索引时返回 None，不写入缓存
+            if await search_executor.run(get_covering_root, folder, timeout=SEARCH_TIMEOUT) is None:
+                return None
             
-            # 如果文件还未记录，或当前结果比已记录的相似度更高
-            if source not in unique_sources or float_score < unique_sources[source]["score"]:
-                # 处理高亮
-                content = doc.page_content
-                highlighted_content = content
-                
-                # 分割查询词并找出最长的词组匹配
-                query_terms = query.split()
-                
-                # 先尝试查找完整查询
-                if query in content:
-                    # 添加高亮标记 - 使用HTML标签作为高亮标记，前端可以解析它
-                    highlighted_content = content.replace(query, f"<mark>{query}</mark>")
-                else:
-                    # 尝试查找较长的词组
-                    for i in range(len(query_terms), 0, -1):
-                        for j in range(len(query_terms) - i + 1):
-                            phrase = " ".join(query_terms[j:j+i])
-                            if phrase and len(phrase) > 1 and phrase in content:
-                                # 避免重复替换已高亮的部分
-                                highlighted_content = highlighted_content.replace(
-                                    phrase, 
-                                    f"<mark>{phrase}</mark>"
-                                )
-                
-                unique_sources[source] = {
-                    "content": content,
-                    "highlighted_content": highlighted_content,
-                    "source": source,
-                    "score": float_score
-                }
-        
-        # 将去重后的结果按相似度排序
-        results = list(unique_sources.values())
-        results.sort(key=lambda x: x["score"])
-        
-        # 限制返回数量
-        results = results[:5]
+            if mode == "filename":
+                return await search_executor.run(search_filenames, query, folder, timeout=SEARCH_TIMEOUT)
+            
+            # 查询向量通过嵌入模型的异步接口获取，等待网络响应时不占用检索线程
+            query_embedding = await asyncio.wait_for(create_embedding_model().aembed_query(query), EMBED_QUERY_TIMEOUT)
+            
+            # 加载共享向量数据库并检索，faiss和SQLite的阻塞操作都在检索进程池或检索线程池中执行
+            results = await run_semantic_search(query, query_embedding, folder)
+            if with_filenames:
+                filename_results = await search_executor.run(search_filenames, query, folder, timeout=SEARCH_TIMEOUT)
+                results = merge_search_results(filename_results, results)
+            return results
+        
+        # 相同文件夹、索引版本和查询命中缓存时直接返回；同时到达的相同查询共用一次计算
+        results = await query_cache.get_or_compute(folder, query, (EMBEDDING_MODEL_NAME, MAX_BATCH_ROWS, mode),
+                                                   compute)
+        if results is None:
+            logger.error(f"文件夹未索引: {folder}")
+            return {"success": False, "message": "向量数据库不存在，请先索引文件夹"}
+        query_history.record(query)
+        get_search_usage().record(folder)
         
         logger.info(f"查询完成，找到 {len(results)} 个结果")
         return {"success": True, "results": results}
+    except ExecutorBusy:
+        logger.warning(f"搜索请求过多，已拒绝: '{query}'")
+        return {"success": False, "message": "搜索请求过多，请稍后再试"}
+    except asyncio.TimeoutError:
+        logger.error(f"搜索超时: '{query}'")
+        return {"success": False, "message": "搜索超时，请稍后再试"}
     except Exception as e:
         error_msg = str(e)
         trace = traceback.format_exc()
@@ -1479,6 +2129,59 @@ async def search(search_req: SearchRequest):
         logger.debug(f"错误详情: {trace}")
         return {"success": False, "message": f"搜索出错: {error_msg}"}
 
+# 工具函数：从文本块存储构建文件夹的候选词索引，在后台线程中执行
+def build_suggest_index(root: str) -> SuggestIndex:
+    store = ChunkStore(os.path.join(get_db_path(), CHUNK_STORE_FILE))
+    try:
+        prefix = folder_prefix(root)
+        files = {source: record["mtime"] for source, record in store.file_records(prefix).items()}
+        texts = store.sample_contents(prefix, SUGGEST_TERM_SAMPLE_CHUNKS)
+    finally:
+        store.close()
+    return SuggestIndex(root, files, texts, max_terms=SUGGEST_MAX_TERMS)
+
+# API路由：输入即搜索的候选词
+@app.get("/suggest")
+async def suggest(q: str, folder: str = None, limit: int = 8):
+    """返回匹配输入前缀的最近查询、文件名和高频词，每类最多 limit 个；只在内存中匹配，不调用嵌入接口"""
+    prefix = q.strip().lower()
+    limit = max(1, min(limit, 50))
+    if not prefix:
+        return {"success": True, "suggestions": [], "building": False}
+    suggestions = query_history.match(prefix, limit)
+    building = False
+    if folder:
+        folder = normalize_path(folder)
+        root = suggest_registry.find_root(folder)
+        if root is None:
+            # 该文件夹还没有候选词索引，查找已索引的根目录后在后台构建
+            try:
+                root = await search_executor.run(get_covering_root, folder, timeout=SEARCH_TIMEOUT)
+            except (ExecutorBusy, asyncio.TimeoutError) as e:
+                logger.warning(f"查找候选词索引的根目录失败: {str(e)}")
+        if root is not None:
+            index = suggest_registry.get(root, query_cache.version(root))
+            if index is not None:
+                suggestions += index.match_files(prefix, limit, folder)
+                suggestions += index.match_terms(prefix, limit)
+            building = suggest_registry.is_building(root)
+    return {"success": True, "suggestions": suggestions, "building": building}
+
+# API路由：搜索结果缓存的命中率和条目数
+@app.get("/search-cache")
+async def get_search_cache_stats():
+    return {"success": True, "stats": query_cache.get_stats()}
+
+# 工具函数：用系统默认程序打开文件
+def open_with_default_app(file_path: str):
+    # 根据操作系统使用不同的命令打开文件
+    if sys.platform.startswith('darwin'):  # macOS
+        subprocess.run(['open', file_path], check=True)
+    elif sys.platform.startswith('win'):   # Windows
+        os.startfile(file_path)
+    else:  # Linux或其他
+        subprocess.run(['xdg-open', file_path], check=True)
+
 # API路由：打开文件
 @app.post("/open-file")
 async def open_file(file_req: FileRequest):
@@ -1494,13 +2197,7 @@ async def open_file(file_req: FileRequest):
             logger.error(error)
             return {"success": False, "message": error}
         
-        # 根据操作系统使用不同的命令打开文件
-        if sys.platform.startswith('darwin'):  # macOS
-            subprocess.run(['open', file_path], check=True)
-        elif sys.platform.startswith('win'):   # Windows
-            os.startfile(file_path)
-        else:  # Linux或其他
-            subprocess.run(['xdg-open', file_path], check=True)
+        await admin_executor.run(open_with_default_app, file_path, timeout=ADMIN_TIMEOUT)
         
         logger.info(f"已成功打开文件: {file_path}")
         return {"success": True}
@@ -1515,6 +2212,23 @@ async def open_file(file_req: FileRequest):
 async def health_check():
     return {"status": "ok"}
 
+# API路由：启动耗时（各启动阶段、后台初始化阶段和按需导入的重依赖）
+@app.get("/startup")
+async def get_startup_report():
+    return STARTUP.report()
+
+# API路由：启动预热的进度和各步骤结果
+@app.get("/warmup")
+async def get_warmup_status():
+    return {"success": True, "warmup": warmer.status()}
+
+# API路由：运行指标（Prometheus文本格式）
+@app.get("/metrics")
+async def get_metrics():
+    INDEX_IN_PROGRESS.set(1 if index_status["in_progress"] else 0)
+    DEAD_LETTER_PENDING.set(get_dead_letter_summary()["pending_count"])
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # 调试端点，检查路径
 @app.post("/debug/check-path")
 async def debug_check_path(folder_req: FolderRequest):
@@ -1527,7 +2241,7 @@ async def debug_check_path(folder_req: FolderRequest):
         # 检查是否是文件夹
         is_dir = os.path.isdir(normalized) if exists else False
         # 获取数据库路径
-        db_path = get_db_path(normalized)
+        db_path = get_db_path()
         
         return {
             "original": folder,
@@ -1535,6 +2249,7 @@ async def debug_check_path(folder_req: FolderRequest):
             "exists": exists,
             "is_dir": is_dir,
             "db_path": db_path,
+            "indexed_root": await admin_executor.run(get_covering_root, normalized, timeout=ADMIN_TIMEOUT) if exists else None,
             "os_info": {
                 "platform": sys.platform,
                 "cwd": os.getcwd(),
@@ -1569,14 +2284,13 @@ async def api_start_monitoring(folder_req: FolderRequest):
             return {"success": False, "message": error}
         
         # 检查是否已创建索引
-        db_path = get_db_path(folder)
-        if not os.path.exists(db_path) or not os.path.exists(os.path.join(db_path, "index.faiss")):
+        if await admin_executor.run(get_covering_root, folder, timeout=ADMIN_TIMEOUT) is None:
             error = f"索引不存在，请先创建索引"
             logger.error(error)
             return {"success": False, "message": error}
         
         # 启动监控
-        result = start_file_monitoring(folder)
+        result = await admin_executor.run(start_file_monitoring, folder, timeout=ADMIN_TIMEOUT)
         if result:
             return {"success": True, "message": "文件监控已启动"}
         else:
@@ -1594,7 +2308,7 @@ async def api_stop_monitoring(folder_req: FolderRequest):
     
     try:
         folder = normalize_path(folder)
-        result = stop_file_monitoring(folder)
+        result = await admin_executor.run(stop_file_monitoring, folder, timeout=ADMIN_TIMEOUT)
         if result:
             return {"success": True, "message": "文件监控已停止"}
         else:
@@ -1632,42 +2346,55 @@ async def api_stop_all_monitoring():
     logger.info("请求停止所有文件监控")
     try:
         # 调用停止所有监控函数
-        stop_all_monitoring()
+        await admin_executor.run(stop_all_monitoring, timeout=ADMIN_TIMEOUT)
         return {"success": True, "message": "已停止所有文件监控"}
     except Exception as e:
         error_msg = str(e)
         logger.error(f"停止所有文件监控时出错: {error_msg}")
         return {"success": False, "message": f"停止所有文件监控时出错: {error_msg}"}
 
+# 工具函数：删除向量存储目录中的所有索引数据，保留目录本身
+def remove_all_index_data():
+    # 停止所有文件监控
+    stop_all_monitoring()
+    dead_letter_queues.clear()
+    search_usages.clear()
+    # 检索进程映射着索引文件（Windows 上无法删除），先关闭，下次搜索时重新启动
+    search_processes.shutdown()
+    
+    # 获取向量存储根目录
+    vector_store_dir = VECTOR_STORE_DIR
+    
+    # 如果目录存在，删除其中的所有文件和子目录
+    if os.path.exists(vector_store_dir):
+        # 遍历并删除子目录和文件
+        for item in os.listdir(vector_store_dir):
+            # OCR缓存按内容哈希保存，与索引无关，保留下来重新索引时不必再次识别
+            if item.startswith(OCR_CACHE_FILE):
+                continue
+            item_path = os.path.join(vector_store_dir, item)
+            if os.path.isdir(item_path):
+                shutil.rmtree(item_path)
+            else:
+                os.remove(item_path)
+        
+        # 保留vector_store目录本身
+        logger.info(f"已清理所有索引数据，保留根目录: {vector_store_dir}")
+    else:
+        # 如果目录不存在，创建它
+        os.makedirs(vector_store_dir, exist_ok=True)
+        logger.info(f"索引数据目录不存在，已创建: {vector_store_dir}")
+    query_cache.invalidate()
+    suggest_registry.clear()
+    filename_index.clear()
+
 # API路由：清理所有索引数据
 @app.post("/clean-all-indexes")
 async def clean_all_indexes():
     """清理所有索引数据"""
     logger.info("请求清理所有索引数据")
     try:
-        # 停止所有文件监控
-        stop_all_monitoring()
-        
-        # 获取向量存储根目录
-        vector_store_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vector_store")
-        
-        # 如果目录存在，删除其中的所有文件和子目录
-        if os.path.exists(vector_store_dir):
-            # 遍历并删除子目录和文件
-            for item in os.listdir(vector_store_dir):
-                item_path = os.path.join(vector_store_dir, item)
-                if os.path.isdir(item_path):
-                    shutil.rmtree(item_path)
-                else:
-                    os.remove(item_path)
-            
-            # 保留vector_store目录本身
-            logger.info(f"已清理所有索引数据，保留根目录: {vector_store_dir}")
-        else:
-            # 如果目录不存在，创建它
-            os.makedirs(vector_store_dir, exist_ok=True)
-            logger.info(f"索引数据目录不存在，已创建: {vector_store_dir}")
-        
+        await admin_executor.run(remove_all_index_data, timeout=ADMIN_TIMEOUT)
         return {"success": True, "message": "已清理所有索引数据"}
     except Exception as e:
         error_msg = str(e)
@@ -1678,7 +2405,7 @@ async def clean_all_indexes():
 @app.post("/config")
 async def update_config(config_req: ConfigRequest):
     """更新系统配置"""
-    global MAX_TEXT_LENGTH, MAX_CHUNK_COUNT, MAX_FILE_SIZE_MB, EMBEDDING_MODEL_NAME
+    global MAX_TEXT_LENGTH, MAX_CHUNK_COUNT, MAX_FILE_SIZE_MB, EMBEDDING_MODEL_NAME, INDEX_STORAGE_MODE
     
     try:
         # 检查并更新每个配置项
@@ -1710,6 +2437,14 @@ async def update_config(config_req: ConfigRequest):
         
         if config_req.embedding_model is not None:
             if config_req.embedding_model in EMBEDDING_MODELS:
+                # 共享向量库中已有其他维度的向量时不能切换，否则新旧向量无法放进同一个索引
+                if config_req.embedding_model != EMBEDDING_MODEL_NAME and shared_store_exists():
+                    stored_dimension = index_dimension(get_db_path())
+                    if stored_dimension != get_embedding_dimension(config_req.embedding_model):
+                        return {"success": False,
+                                "message": f"现有索引的向量维度为 {stored_dimension}，与嵌入模型 {config_req.embedding_model} "
+                                           f"的向量维度 {get_embedding_dimension(config_req.embedding_model)} 不一致，"
+                                           f"请先清理所有索引再切换模型"}
                 old_value = EMBEDDING_MODEL_NAME
                 EMBEDDING_MODEL_NAME = config_req.embedding_model
                 # 更新token限制
@@ -1718,6 +2453,14 @@ async def update_config(config_req: ConfigRequest):
             else:
                 return {"success": False, "message": f"不支持的嵌入模型: {config_req.embedding_model}"}
         
+        if config_req.index_storage is not None:
+            if config_req.index_storage in STORAGE_MODES:
+                old_value = INDEX_STORAGE_MODE
+                INDEX_STORAGE_MODE = config_req.index_storage
+                changes.append(f"向量存储格式: {old_value} -> {INDEX_STORAGE_MODE} (下次保存索引时生效)")
+            else:
+                return {"success": False, "message": f"不支持的向量存储格式: {config_req.index_storage}"}
+        
         # 记录更改
         if changes:
             logger.info(f"配置已更新: {', '.join(changes)}")
@@ -1735,7 +2478,12 @@ async def update_config(config_req: ConfigRequest):
                     "max_tokens": MAX_TEXT_BLOCK_SIZE,
                     "details": EMBEDDING_MODELS.get(EMBEDDING_MODEL_NAME, {})
                 },
-                "available_models": EMBEDDING_MODELS
+                "available_models": EMBEDDING_MODELS,
+                "index_storage": {
+                    "mode": INDEX_STORAGE_MODE,
+                    "mmap": INDEX_MMAP_ENABLED,
+                    "available_modes": {mode: info["name"] for mode, info in STORAGE_MODES.items()}
+                }
             }
         }
     except Exception as e:
@@ -1755,14 +2503,129 @@ async def get_config():
             "max_tokens": MAX_TEXT_BLOCK_SIZE,
             "details": EMBEDDING_MODELS.get(EMBEDDING_MODEL_NAME, {})
         },
-        "available_models": EMBEDDING_MODELS
+        "available_models": EMBEDDING_MODELS,
+        "index_storage": {
+            "mode": INDEX_STORAGE_MODE,
+            "mmap": INDEX_MMAP_ENABLED,
+            "available_modes": {mode: info["name"] for mode, info in STORAGE_MODES.items()}
+        },
+        "search_processes": search_processes.status()
     }
 
-# 主入口点
-if __name__ == "__main__":
+# 后台预加载的重依赖：启动时不导入，服务开始监听后在后台线程中导入，第一次索引或搜索时不必再等待
+PRELOAD_MODULES = (
+    "faiss",
+    "langchain_community.vectorstores.faiss",
+    "embedding_client",
+    "langchain_community.document_loaders.text",
+    "langchain_community.document_loaders.pdf",
+)
+
+# 服务开始监听时置位，后台初始化等到这之后再开始，不与启动争抢CPU
+server_started = threading.Event()
+# 服务的事件循环，预热搜索所用的异步嵌入客户端时需要在这个循环上建立连接
+server_loop = None
+
+@app.on_event("startup")
+async def mark_server_started():
+    global server_loop
+    server_loop = asyncio.get_running_loop()
+    STARTUP.mark("server_started")
+    server_started.set()
+
+# 工具函数：预加载重依赖
+def preload_heavy_modules():
+    for name in PRELOAD_MODULES:
+        try:
+            lazy_import(name)
+        except ImportError as e:
+            logger.warning(f"预加载 {name} 失败: {str(e)}")
+
+# 工具函数：预热嵌入客户端
+def warm_up_embedding_client():
+    """在服务的事件循环上建立搜索所用异步客户端的连接，第一次搜索不必等待TCP和TLS握手"""
+    if EMBEDDING_MODELS.get(EMBEDDING_MODEL_NAME, {}).get("local"):
+        raise WarmupSkipped("使用本地嵌入模型")
+    if server_loop is None:
+        raise WarmupSkipped("服务尚未开始监听")
+    client = create_embedding_model().client
+    future = asyncio.run_coroutine_threadsafe(client.awarm_up(), server_loop)
+    status_code = future.result(EMBEDDING_CONNECT_TIMEOUT + EMBEDDING_READ_TIMEOUT)
+    return f"已连接 {client.base_url} (HTTP {status_code})"
+
+# 工具函数：预热最近搜索过的文件夹
+def warm_up_recent_folders(folders: List[str]):
+    """把共享索引文件读入页缓存，再对每个文件夹用零向量走一遍检索路径（视图向量编号、faiss检索、读取文本块）"""
+    if not folders:
+        raise WarmupSkipped("没有搜索记录")
+    if not shared_store_exists():
+        raise WarmupSkipped("向量库不存在")
+    index_path = current_index_path(get_db_path())
+    size = os.path.getsize(index_path)
+    if not warmer.reserve(size):
+        raise WarmupSkipped(f"索引文件 {size / 1024 / 1024:.0f}MB 超出预热内存预算")
+    warmer.prefetch_file(index_path)
+    db = load_vector_store(get_db_path(), create_embedding_model(), mmap=INDEX_MMAP_ENABLED,
+                           dimension=get_embedding_dimension())
+    warmed = []
+    try:
+        zero_vector = [0.0] * db.index.d
+        for folder in folders:
+            warmer.check()
+            if get_chunk_store(db).covering_root(folder) is None:
+                continue
+            similarity_search_in_folder(db, "", 1, folder, zero_vector)
+            warmed.append(folder)
+    finally:
+        close_vector_store(db)
+    return {"index_bytes": size, "folders": warmed}
+
+# 工具函数：预热本地嵌入模型
+def warm_up_local_model():
+    """加载本地模型（必要时生成量化模型）并嵌入一条短文本"""
+    if not EMBEDDING_MODELS.get(EMBEDDING_MODEL_NAME, {}).get("local"):
+        raise WarmupSkipped("未使用本地嵌入模型")
+    model = create_embedding_model()
+    model_path = model.model_path if os.path.exists(model.model_path) else lazy_import("local_embedding").FP32_MODEL_PATH
+    if not os.path.exists(model_path):
+        raise WarmupSkipped(f"模型文件不存在: {model_path}")
+    if not warmer.reserve(os.path.getsize(model_path)):
+        raise WarmupSkipped("模型文件超出预热内存预算")
+    model.embed_query("预热")
+    return f"已加载 {model.model_path}"
+
+# 工具函数：预热检索进程
+def warm_up_search_processes():
+    """启动所有检索进程并映射当前版本的索引文件，第一次搜索不必等待进程启动"""
+    if SEARCH_PROCESSES <= 0:
+        raise WarmupSkipped("未启用检索进程")
+    pids = search_processes.start(get_db_path(), INDEX_MMAP_ENABLED, timeout=SEARCH_TIMEOUT)
+    return f"已启动 {len(pids)} 个检索进程"
+
+# 工具函数：启动预热
+def run_warmup():
+    """按最近的搜索记录预热；模型在普通优先级下加载，它的推理线程会继承加载线程的优先级"""
+    if index_status["in_progress"]:
+        warmer.cancel("索引进行中")
+    folders = get_search_usage().recent(WARMUP_FOLDERS)
+    warmer.run([
+        ("embedding_client", warm_up_embedding_client, False),
+        ("recent_folders", lambda: warm_up_recent_folders(folders), True),
+        ("search_processes", warm_up_search_processes, False),
+        ("local_model", warm_up_local_model, False),
+    ])
+    logger.info(f"启动预热结束: {warmer.state}, " +
+                ", ".join(f"{step['name']} {step['status']}" for step in warmer.steps))
+
+STARTUP.mark("module_loaded")
+
+# 主入口点：由 server.py 调用，检索进程以 __mp_main__ 重新导入入口脚本时不会导入本模块
+def main():
     import time
     start_time = time.time()
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Python后端启动中...")
+    if __name__ == "__main__" and SEARCH_PROCESSES > 0:
+        logger.warning("直接运行 api.py 时每个检索进程都会重新执行 api.py 的模块级代码，请通过 server.py 启动")
     
     # 打印工作目录信息
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 当前工作目录: {os.getcwd()}")
@@ -1773,20 +2636,27 @@ if __name__ == "__main__":
         print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 程序退出，清理资源...")
         # 停止所有监控
         stop_all_monitoring()
+        ocr_engine.shutdown()
+        search_processes.shutdown(wait=False)
+        for usage in search_usages.values():
+            usage.save()
     atexit.register(cleanup)
     
     # 发送一个特殊标记，表示Python后端已经准备好启动服务器
     # 这个标记会被Electron捕获，用来立即通知前端
     print("PYTHON_BACKEND_READY", flush=True)
+    STARTUP.mark("ready_marker")
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Python后端就绪标记已发送")
     
     # 把监控器停止和配置加载放到后台线程中，避免阻塞主启动流程
     def init_background_tasks():
+        server_started.wait(timeout=10)
         # 确保没有遗留的监控器
         try:
             thread_start_time = time.time()
             print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 停止所有可能遗留的监控器...")
             stop_all_monitoring()
+            STARTUP.record_phase("stop_monitoring", time.time() - thread_start_time)
             print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 停止监控器完成，耗时: {time.time() - thread_start_time:.3f}秒")
             
             # 尝试加载应用配置
@@ -1810,8 +2680,15 @@ if __name__ == "__main__":
                     global MAX_CHUNK_COUNT
                     MAX_CHUNK_COUNT = config["MAX_CHUNK_COUNT"]
                     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 已加载块数量限制: {MAX_CHUNK_COUNT}")
+                
+                # 加载向量存储格式
+                if config.get("INDEX_STORAGE_MODE") in STORAGE_MODES:
+                    global INDEX_STORAGE_MODE
+                    INDEX_STORAGE_MODE = config["INDEX_STORAGE_MODE"]
+                    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 已加载向量存储格式: {INDEX_STORAGE_MODE}")
             else:
                 print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 应用配置文件不存在: {config_file}")
+            STARTUP.record_phase("load_config", time.time() - config_load_start)
             print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 加载应用配置完成，耗时: {time.time() - config_load_start:.3f}秒")
             
             # 尝试恢复之前的监控状态
@@ -1833,7 +2710,26 @@ if __name__ == "__main__":
                         print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 恢复对 {folder} 的监控完成，耗时: {time.time() - inner_start:.3f}秒")
             else:
                 print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 监控配置文件不存在: {config_file}")
+            STARTUP.record_phase("restore_monitoring", time.time() - monitor_start)
             print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 恢复监控状态完成，耗时: {time.time() - monitor_start:.3f}秒")
+            
+            # 预先建立文件名索引，第一次按文件名查找时不必等待扫描
+            filename_start = time.time()
+            ensure_filename_index()
+            STARTUP.record_phase("filename_index", time.time() - filename_start)
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 文件名索引建立完成，耗时: {time.time() - filename_start:.3f}秒")
+
+            preload_start = time.time()
+            preload_heavy_modules()
+            STARTUP.record_phase("preload_modules", time.time() - preload_start)
+            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 预加载依赖完成，耗时: {time.time() - preload_start:.3f}秒")
+            
+            # 预热最近搜索过的文件夹和嵌入模型，开始索引时取消
+            if WARMUP_ENABLED:
+                warmup_start = time.time()
+                run_warmup()
+                STARTUP.record_phase("warmup", time.time() - warmup_start)
+                print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 启动预热{'已取消' if warmer.cancelled else '完成'}，耗时: {time.time() - warmup_start:.3f}秒")
             print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 后台初始化任务全部完成，总耗时: {time.time() - thread_start_time:.3f}秒")
         except Exception as e:
             print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 后台初始化任务出错: {str(e)}")
@@ -1846,10 +2742,18 @@ if __name__ == "__main__":
     import threading
     init_thread = threading.Thread(target=init_background_tasks, daemon=True)
     init_thread.start()
+    
+    # 死信队列后台重试线程
+    dead_letter_thread = threading.Thread(target=dead_letter_worker, daemon=True)
+    dead_letter_thread.start()
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 后台初始化线程已启动")
     
     # 输出总启动时间
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 启动预处理完成，耗时: {time.time() - start_time:.3f}秒")
     
     # 启动服务器
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    # 请求日志由 log_requests 中间件按路由级别记录，关闭uvicorn自带的逐请求访问日志
+    uvicorn.run(app, host="127.0.0.1", port=8000, access_log=False)
+
+if __name__ == "__main__":
+    main()
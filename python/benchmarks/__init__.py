@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""FindMe 后端性能基准脚本
+
+在 python 目录下以模块方式运行，例如：
+    python -m benchmarks.csv_loader --size-mb 200
+"""
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""冷启动基准：像 Electron 一样用子进程启动后端，测量从启动进程到输出就绪标记、/health 第一次返回的耗时
+
+每次运行后读取 /startup 的启动阶段耗时（等后台预加载完成），再结束进程；--importtime 时额外用
+python -X importtime 启动一次，列出 api 模块直接导入的耗时最多的模块。后端固定监听 8000 端口，运行前该端口必须空闲。
+
+用法（在 python 目录下）：
+    python -m benchmarks.cold_start --runs 5 --importtime
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
+
+import httpx
+
+from benchmarks import common
+
+PORT = 8000
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+def port_in_use() -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        return sock.connect_ex(("127.0.0.1", PORT)) == 0
+
+
+def wait_port_free(timeout: float = 10):
+    deadline = time.time() + timeout
+    while port_in_use():
+        if time.time() > deadline:
+            raise RuntimeError(f"端口 {PORT} 被占用")
+        time.sleep(0.05)
+
+
+def parse_importtime(stderr: str, top: int) -> list:
+    """从 -X importtime 的输出中取出 api 直接导入的模块，按累计耗时排序"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # __main__ 本身不出现在输出中，它直接导入的模块只缩进1个空格
+        if len(name) - len(name.lstrip()) == 1:
+            rows.append({"module": name.strip(), "ms": int(cumulative) / 1000})
+    rows.sort(key=lambda row: row["ms"], reverse=True)
+    return rows[:top]
+
+
+def run_once(python_args: list, preload_timeout: float) -> dict:
+    wait_port_free()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, *python_args, "api.py"], cwd=common.BACKEND_DIR,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8",
+                               errors="replace")
+    result = {"ready_marker_seconds": None}
+    stderr_lines = []
+
+    def read_stdout():
+        for line in process.stdout:
+            if result["ready_marker_seconds"] is None and "PYTHON_BACKEND_READY" in line:
+                result["ready_marker_seconds"] = time.perf_counter() - start
+
+    readers = [threading.Thread(target=read_stdout, daemon=True),
+               threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)]
+    for reader in readers:
+        reader.start()
+    try:
+        with httpx.Client(base_url=BASE_URL, timeout=1) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"后端进程已退出: {''.join(stderr_lines)[-2000:]}")
+                try:
+                    if client.get("/health").status_code == 200:
+                        result["health_seconds"] = time.perf_counter() - start
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+            # 等后台预加载完成，得到完整的启动报告
+            deadline = time.time() + preload_timeout
+            while True:
+                report = client.get("/startup").json()
+                if any(phase["name"] == "preload_modules" for phase in report["phases"]) or time.time() > deadline:
+                    break
+                time.sleep(0.1)
+        result["startup"] = report
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        for reader in readers:
+            reader.join(timeout=5)
+    result["stderr"] = "".join(stderr_lines)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端冷启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="启动次数")
+    parser.add_argument("--importtime", action="store_true", help="额外运行一次 -X importtime 并列出最慢的导入")
+    parser.add_argument("--top", type=int, default=15, help="列出的导入模块数")
+    parser.add_argument("--preload-timeout", type=float, default=30, help="等待后台预加载完成的最长时间(秒)")
+    parser.add_argument("--name", default="cold_start", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    if port_in_use():
+        sys.exit(f"端口 {PORT} 被占用，请先关闭正在运行的后端")
+
+    runs = []
+    for i in range(args.runs):
+        run = run_once([], args.preload_timeout)
+        run.pop("stderr")
+        runs.append(run)
+        marks = {mark["name"]: mark["at"] for mark in run["startup"]["marks"]}
+        print(f"第 {i + 1} 次: 就绪标记 {run['ready_marker_seconds'] or 0:.3f}s  /health {run['health_seconds']:.3f}s  "
+              f"(进程内: 导入完成 {marks.get('backend_imports_done', 0):.3f}s, 开始监听 {marks.get('server_started', 0):.3f}s)")
+
+    results = {"config": vars(args), "runs": runs}
+    for key in ("ready_marker_seconds", "health_seconds"):
+        values = [run[key] for run in runs if run[key] is not None]
+        results[key] = {"p50": common.percentile(values, 50), "max": max(values)} if values else None
+
+    last = runs[-1]["startup"]
+    print("\n启动时刻（距进程创建，最后一次运行）:")
+    print(f"  {'interpreter':<22} {last['interpreter_seconds']:.3f}s")
+    for mark in last["marks"]:
+        print(f"  {mark['name']:<22} {mark['at']:.3f}s  (+{mark['since_previous'] * 1000:.0f}ms)")
+    print("后台初始化阶段:")
+    for phase in last["phases"]:
+        print(f"  {phase['name']:<22} {phase['start']:.3f}s 开始  {phase['seconds'] * 1000:7.0f}ms")
+    print("按需导入:")
+    for name, entry in last["lazy_imports"].items():
+        print(f"  {name:<45} {entry['seconds'] * 1000:7.0f}ms  ({entry['thread']})")
+
+    if args.importtime:
+        run = run_once(["-X", "importtime"], args.preload_timeout)
+        results["importtime"] = parse_importtime(run["stderr"], args.top)
+        print(f"\napi 直接导入的最慢模块（-X importtime，累计耗时，含后台预加载）:")
+        for row in results["importtime"]:
+            print(f"  {row['module']:<45} {row['ms']:7.1f}ms")
+
+    print(f"\n/health p50 {results['health_seconds']['p50']:.3f}s  max {results['health_seconds']['max']:.3f}s")
+    print(f"结果已保存: {common.save_results(args.name, results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""基准脚本共用的工具函数"""
+
+import os
+import sys
+import json
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+# python 目录，基准脚本需要从这里导入后端模块
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def current_rss_mb() -> float:
+    """当前进程的常驻内存(MB)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except ImportError:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def anon_rss_mb():
+    """当前进程的匿名内存(MB)，不含可与其他进程通过页缓存共享的文件映射页；仅Linux可用，其他平台返回None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存(MB)"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位是字节，Linux 是KB
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, pct: float) -> float:
+    """计算百分位数（线性插值）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def save_results(name: str, results: dict, output_dir: str = None) -> str:
+    """把结果保存为带时间戳的JSON文件，便于比较多次运行"""
+    output_dir = output_dir or os.path.join(BENCHMARK_DIR, "results")
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
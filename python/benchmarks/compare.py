@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""对比两次基准运行的JSON结果，列出所有数值指标的变化
+
+用法（在 python 目录下）：
+    python -m benchmarks.compare benchmarks/results/indexing-A.json benchmarks/results/indexing-B.json
+"""
+
+import json
+import argparse
+
+
+def flatten(data, prefix: str = "") -> dict:
+    """把嵌套字典展开为 {a.b.c: 数值}，只保留数值"""
+    values = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            values.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        values[prefix[:-1]] = data
+    return values
+
+
+def compare(baseline: dict, candidate: dict):
+    """返回 [(指标, 基线值, 新值, 变化百分比)]，两边都有的指标才比较"""
+    base_values = flatten(baseline)
+    new_values = flatten(candidate)
+    rows = []
+    for key in base_values:
+        if key not in new_values:
+            continue
+        old, new = base_values[key], new_values[key]
+        change = (new - old) / old * 100 if old else None
+        rows.append((key, old, new, change))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准结果")
+    parser.add_argument("baseline", help="基线结果JSON")
+    parser.add_argument("candidate", help="新结果JSON")
+    parser.add_argument("--filter", default="", help="只显示包含该字符串的指标")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    rows = [row for row in compare(baseline, candidate) if args.filter in row[0]]
+    width = max((len(row[0]) for row in rows), default=10)
+    for key, old, new, change in rows:
+        change_text = f"{change:+8.1f}%" if change is not None else "       -"
+        print(f"{key:<{width}}  {old:14.3f}  {new:14.3f}  {change_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""合成测试语料：按指定的文件类型比例和大小生成 txt/pdf/docx/pptx/xlsx/csv 文件，相同参数和随机种子生成的内容完全相同
+
+用法（在 python 目录下）：
+    python -m benchmarks.corpus /tmp/corpus --files 200 --size-kb 20 --mix txt=4,pdf=1,docx=1,pptx=1,xlsx=1,csv=1
+"""
+
+import os
+import csv
+import json
+import random
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = ".manifest.json"
+DEFAULT_MIX = {"txt": 4, "pdf": 1, "docx": 1, "pptx": 1, "xlsx": 1, "csv": 1}
+
+# 主题词：每个文件围绕一个主题生成，搜索基准从中抽取查询
+TOPICS = {
+    "能源": ["光伏", "储能", "电网", "风电", "碳排放", "电价", "solar", "battery"],
+    "财务": ["营收", "利润", "现金流", "预算", "审计", "季度报告", "revenue", "forecast"],
+    "医疗": ["临床试验", "药物", "患者", "诊断", "医保", "影像", "clinical", "dosage"],
+    "教育": ["课程", "学生", "考试", "教材", "在线学习", "教师", "curriculum", "semester"],
+    "物流": ["仓储", "运输", "配送", "库存", "供应链", "订单", "shipment", "warehouse"],
+    "软件": ["接口", "数据库", "缓存", "部署", "性能优化", "日志", "latency", "throughput"],
+}
+COMMON_WORDS = ["我们", "系统", "数据", "分析", "结果", "方案", "需要", "进行", "提高", "管理",
+                "the", "and", "report", "system", "with", "for", "analysis", "plan"]
+SENTENCE_ENDINGS = ["。", "。", "；", "！", ". "]
+
+
+class TextGenerator:
+    """按主题生成可复现的中英文混合文本"""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+
+    def sentence(self, topic: str, ascii_only: bool = False) -> str:
+        words = TOPICS[topic] + COMMON_WORDS
+        if ascii_only:
+            words = [word for word in words if word.isascii()]
+        parts = [self.rng.choice(words) for _ in range(self.rng.randint(6, 18))]
+        ending = ". " if ascii_only else self.rng.choice(SENTENCE_ENDINGS)
+        return "".join(part if "\u4e00" <= part[0] <= "\u9fff" else f" {part} " for part in parts).strip() + ending
+
+    def paragraph(self, topic: str, ascii_only: bool = False) -> str:
+        return "".join(self.sentence(topic, ascii_only) for _ in range(self.rng.randint(3, 8)))
+
+    def paragraphs(self, topic: str, size_chars: int, ascii_only: bool = False):
+        """生成段落直到总字符数达到 size_chars；ascii_only 时只使用英文词"""
+        total = 0
+        while total < size_chars:
+            paragraph = self.paragraph(topic, ascii_only)
+            total += len(paragraph)
+            yield paragraph
+
+    def rows(self, topic: str, size_chars: int):
+        """生成表格行直到总字符数达到 size_chars"""
+        total = 0
+        row_id = 0
+        while total < size_chars:
+            row_id += 1
+            row = [str(row_id), self.rng.choice(TOPICS[topic]), self.sentence(topic),
+                   f"{self.rng.uniform(0, 10000):.2f}", f"2024-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}"]
+            total += sum(len(cell) for cell in row)
+            yield row
+
+
+TABLE_HEADER = ["编号", "类别", "说明", "金额", "日期"]
+
+
+def write_txt(path: str, generator: TextGenerator, topic: str, size_chars: int):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(generator.paragraphs(topic, size_chars)))
+
+
+def write_csv(path: str, generator: TextGenerator, topic: str, size_chars: int):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(TABLE_HEADER)
+        writer.writerows(generator.rows(topic, size_chars))
+
+
+def write_docx(path: str, generator: TextGenerator, topic: str, size_chars: int):
+    from docx import Document
+    document = Document()
+    document.add_heading(f"{topic}报告", level=1)
+    for paragraph in generator.paragraphs(topic, size_chars):
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def write_pptx(path: str, generator: TextGenerator, topic: str, size_chars: int):
+    from pptx import Presentation
+    from pptx.util import Inches
+    presentation = Presentation()
+    layout = presentation.slide_layouts[5]  # 只有标题的版式
+    for i, paragraph in enumerate(generator.paragraphs(topic, size_chars)):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"{topic} 第{i + 1}页"
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(1.5), Inches(9), Inches(5))
+        box.text_frame.word_wrap = True
+        box.text_frame.text = paragraph
+    presentation.save(path)
+
+
+def write_xlsx(path: str, generator: TextGenerator, topic: str, size_chars: int):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(topic)
+    sheet.append(TABLE_HEADER)
+    for row in generator.rows(topic, size_chars):
+        sheet.append(row)
+    workbook.save(path)
+
+
+PDF_PAGE_CHARS = 1200
+PDF_TEXT_RECT = (50, 50, 545, 792)
+
+
+def write_pdf(path: str, generator: TextGenerator, topic: str, size_chars: int):
+    """PDF只写英文：PyMuPDF 内置的中文字体（china-s）不嵌入字体文件，也没有 ToUnicode 映射，
+    PyPDFLoader 提取出的是乱码；内置的 Helvetica 可以原样提取"""
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    document = pymupdf.open()
+    page_text = []
+    for paragraph in generator.paragraphs(topic, size_chars, ascii_only=True):
+        page_text.append(paragraph)
+        # 每页写入约1200字，保证能放进一页的文本框
+        if sum(len(text) for text in page_text) >= PDF_PAGE_CHARS:
+            document.new_page().insert_textbox(PDF_TEXT_RECT, "\n".join(page_text), fontsize=9, fontname="helv")
+            page_text = []
+    if page_text or document.page_count == 0:
+        document.new_page().insert_textbox(PDF_TEXT_RECT, "\n".join(page_text), fontsize=9, fontname="helv")
+    document.save(path)
+    document.close()
+
+
+WRITERS = {
+    "txt": write_txt,
+    "csv": write_csv,
+    "docx": write_docx,
+    "pptx": write_pptx,
+    "xlsx": write_xlsx,
+    "pdf": write_pdf,
+}
+
+
+def parse_mix(value: str) -> dict:
+    """解析 txt=4,pdf=1 形式的文件类型比例"""
+    mix = {}
+    for item in value.split(","):
+        ext, _, weight = item.partition("=")
+        ext = ext.strip().lower()
+        if ext not in WRITERS:
+            raise ValueError(f"不支持的文件类型: {ext}，可选: {', '.join(WRITERS)}")
+        mix[ext] = float(weight or 1)
+    return mix
+
+
+def generate_corpus(output_dir: str, file_count: int, size_kb: float = 20, mix: dict = None, seed: int = 42) -> dict:
+    """生成合成语料，返回清单（文件列表、各类型数量、查询词）并写入 output_dir/.manifest.json（隐藏文件，不会被索引）
+
+    某种文件类型所需的库未安装时跳过该类型并记录警告。
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    extensions = list(mix)
+    weights = [mix[ext] for ext in extensions]
+    topics = list(TOPICS)
+
+    files = []
+    counts = {}
+    unavailable = set()
+    for i in range(file_count):
+        ext = rng.choices(extensions, weights)[0]
+        if ext in unavailable:
+            continue
+        topic = topics[i % len(topics)]
+        # 文件大小在目标值上下浮动
+        size_chars = max(200, int(size_kb * 1024 / 2 * rng.uniform(0.5, 1.5)))
+        subdir = os.path.join(output_dir, topic)
+        os.makedirs(subdir, exist_ok=True)
+        path = os.path.join(subdir, f"{topic}_{i:05d}.{ext}")
+        try:
+            WRITERS[ext](path, TextGenerator(seed * 1000003 + i), topic, size_chars)
+        except ImportError as e:
+            logger.warning(f"缺少生成 {ext} 文件所需的库，跳过该类型: {str(e)}")
+            unavailable.add(ext)
+            continue
+        files.append(path)
+        counts[ext] = counts.get(ext, 0) + 1
+
+    query_rng = random.Random(seed + 1)
+    queries = [f"{topic} {query_rng.choice(TOPICS[topic])}" for topic in topics for _ in range(5)]
+    query_rng.shuffle(queries)
+    manifest = {
+        "file_count": len(files),
+        "size_kb": size_kb,
+        "seed": seed,
+        "counts": counts,
+        "total_bytes": sum(os.path.getsize(path) for path in files),
+        "queries": queries,
+        "files": files
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成测试语料")
+    parser.add_argument("output_dir", help="输出目录")
+    parser.add_argument("--files", type=int, default=200, help="文件数量")
+    parser.add_argument("--size-kb", type=float, default=20, help="每个文件的平均文本量(KB)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="文件类型比例，如 txt=4,pdf=1,csv=1")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    manifest = generate_corpus(args.output_dir, args.files, args.size_kb, args.mix, args.seed)
+    print(f"已生成 {manifest['file_count']} 个文件 ({manifest['total_bytes'] / 1024 / 1024:.1f}MB): {manifest['counts']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""CSV加载基准：对比旧的整文件读取方式与流式行组加载的吞吐量和峰值内存
+
+用法（在 python 目录下）：
+    python -m benchmarks.csv_loader --size-mb 200
+"""
+
+import os
+import csv
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+import api
+
+
+def generate_csv(path: str, size_mb: int, seed: int = 42):
+    """生成指定大小的合成CSV文件，混合中英文字段"""
+    rng = random.Random(seed)
+    words = ["能源", "项目", "报告", "预算", "合同", "energy", "budget", "report", "north", "季度"]
+    target = size_mb * 1024 * 1024
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["编号", "名称", "类别", "金额", "备注"])
+        row_id = 0
+        while f.tell() < target:
+            row_id += 1
+            writer.writerow([
+                row_id,
+                " ".join(rng.choice(words) for _ in range(3)),
+                rng.choice(words),
+                f"{rng.random() * 10000:.2f}",
+                " ".join(rng.choice(words) for _ in range(12)),
+            ])
+
+
+def legacy_load(file_path: str):
+    """旧实现：整文件检测编码、一次性读入所有行并逐行拼接字符串"""
+    import chardet
+    encoding = 'utf-8'
+    with open(file_path, 'rb') as f:
+        result = chardet.detect(f.read())
+        if result['confidence'] > 0.7:
+            encoding = result['encoding']
+    with open(file_path, 'r', encoding=encoding, errors='replace') as f:
+        rows = list(csv.reader(f))
+        headers = rows[0] if rows else []
+        text_content = f"表头: {' | '.join(headers)}\n\n"
+        for i, row in enumerate(rows[1:], 1):
+            text_content += f"行 {i}: {' | '.join(str(val).strip() for val in row)}\n"
+    return 1, len(text_content)
+
+
+def streaming_load(file_path: str, max_chars):
+    """新实现：逐个消费行组文档，不保留已处理的文本"""
+    doc_count = 0
+    chars = 0
+    for doc in api.CustomCsvLoader(file_path, max_chars=max_chars).lazy_load():
+        doc_count += 1
+        chars += len(doc.page_content)
+    return doc_count, chars
+
+
+def measure(name: str, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    doc_count, chars = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28} 耗时 {elapsed:8.2f}s  峰值内存 {peak / 1024 / 1024:9.1f}MB  输出 {doc_count} 个文档 / {chars} 字符")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV加载吞吐量和峰值内存基准")
+    parser.add_argument("--size-mb", type=int, default=100, help="合成CSV文件大小(MB)")
+    parser.add_argument("--skip-legacy", action="store_true", help="跳过旧实现（文件很大时旧实现非常慢）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench.csv")
+        print(f"生成 {args.size_mb}MB 合成CSV文件...")
+        generate_csv(path, args.size_mb)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+
+        if not args.skip_legacy:
+            elapsed = measure("旧实现(整文件)", legacy_load, path)
+            print(f"{'':<28} 吞吐量 {size_mb / elapsed:8.1f}MB/s")
+        elapsed = measure("流式行组(不限字符)", streaming_load, path, None)
+        print(f"{'':<28} 吞吐量 {size_mb / elapsed:8.1f}MB/s")
+        measure(f"流式行组(预算{api.MAX_TEXT_LENGTH}字符)", streaming_load, path, api.MAX_TEXT_LENGTH)
+
+
+if __name__ == "__main__":
+    main()
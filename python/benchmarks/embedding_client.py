@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""嵌入客户端基准：在本地启动模拟DashScope嵌入接口的服务，对比每次请求新建连接和共享连接池的单次请求延迟
+
+本地服务前面有一个TCP中转，每个新连接先等待 --connect-delay-ms 再转发，模拟公网上建立TCP连接和TLS握手的往返耗时；
+--tls 时使用自签名证书，包含真实的TLS握手开销。报告各方式的延迟分布和新建的连接数。
+
+用法（在 python 目录下）：
+    python -m benchmarks.embedding_client --requests 200 --connect-delay-ms 60 --tls
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+from benchmarks import common
+from benchmarks.fake_embeddings import FakeEmbeddings
+
+from embedding_client import DashScopeClient, DashScopeHttpEmbeddings, EMBEDDING_PATH, HTTP2_AVAILABLE
+
+
+def create_stand_in_app(embeddings: FakeEmbeddings, latency_ms: float) -> FastAPI:
+    """与DashScope文本嵌入接口请求/响应格式相同的本地服务"""
+    app = FastAPI()
+
+    @app.post("/api/v1" + EMBEDDING_PATH)
+    async def embed(request: Request):
+        body = await request.json()
+        texts = body["input"]["texts"]
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        vectors = embeddings.embed_documents(texts)
+        # 直接序列化，避免 FastAPI 逐个转换浮点数的开销让模拟服务本身成为瓶颈
+        return Response(json.dumps({
+            "output": {"embeddings": [{"text_index": i, "embedding": vector} for i, vector in enumerate(vectors)]},
+            "usage": {"total_tokens": sum(len(text) for text in texts)},
+            "request_id": "stand-in"
+        }), media_type="application/json")
+
+    return app
+
+
+class ConnectDelayRelay:
+    """TCP中转：每个新连接先等待 delay 秒再连接后端，之后原样转发；记录新建的连接数"""
+
+    def __init__(self, target_port: int, delay: float):
+        self.target_port = target_port
+        self.delay = delay
+        self.connections = 0
+        self.port = None
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+
+    async def _pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, client_reader, client_writer):
+        self.connections += 1
+        await asyncio.sleep(self.delay)
+        server_reader, server_writer = await asyncio.open_connection("127.0.0.1", self.target_port)
+        await asyncio.gather(self._pipe(client_reader, server_writer), self._pipe(server_reader, client_writer))
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self.loop.run_until_complete, args=(self._serve(),), daemon=True).start()
+        self.ready.wait()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def create_certificate(directory: str):
+    """用 openssl 生成自签名证书，返回 (证书, 私钥)"""
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1"],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+def start_server(app: FastAPI, port: int, certificate=None) -> uvicorn.Server:
+    options = {"ssl_certfile": certificate[0], "ssl_keyfile": certificate[1]} if certificate else {}
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           access_log=False, **options))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def summarize(latencies, seconds: float, connections: int) -> dict:
+    return {
+        "requests": len(latencies),
+        "connections": connections,
+        "seconds": seconds,
+        "requests_per_sec": len(latencies) / seconds if seconds else 0.0,
+        "mean_ms": sum(latencies) / len(latencies),
+        "p50_ms": common.percentile(latencies, 50),
+        "p95_ms": common.percentile(latencies, 95),
+        "p99_ms": common.percentile(latencies, 99)
+    }
+
+
+def run_sequential(relay: ConnectDelayRelay, request_count: int, embed_once) -> dict:
+    connections_before = relay.connections
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(request_count):
+        request_start = time.perf_counter()
+        embed_once()
+        latencies.append((time.perf_counter() - request_start) * 1000)
+    return summarize(latencies, time.perf_counter() - start, relay.connections - connections_before)
+
+
+def run_concurrent(relay: ConnectDelayRelay, request_count: int, concurrency: int, embeddings, texts) -> dict:
+    """用异步接口并发发送请求"""
+    connections_before = relay.connections
+    latencies = []
+
+    async def worker(count: int):
+        for _ in range(count):
+            request_start = time.perf_counter()
+            await embeddings.aembed_documents(texts)
+            latencies.append((time.perf_counter() - request_start) * 1000)
+
+    async def main():
+        per_worker = request_count // concurrency
+        await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return summarize(latencies, time.perf_counter() - start, relay.connections - connections_before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入客户端连接复用基准（本地模拟服务）")
+    parser.add_argument("--requests", type=int, default=200, help="每种方式的请求数")
+    parser.add_argument("--texts", type=int, default=10, help="每次请求的文本数")
+    parser.add_argument("--connect-delay-ms", type=float, default=50.0, help="每个新连接额外等待的时间，模拟握手往返")
+    parser.add_argument("--server-latency-ms", type=float, default=5.0, help="模拟服务端处理耗时")
+    parser.add_argument("--concurrency", type=int, default=8, help="异步并发请求数")
+    parser.add_argument("--tls", action="store_true", help="使用自签名证书走HTTPS")
+    parser.add_argument("--dim", type=int, default=1536, help="嵌入向量维度")
+    parser.add_argument("--name", default="embedding_client", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    texts = [f"基准测试文本 {i} 用于衡量嵌入请求的连接开销" for i in range(args.texts)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        certificate = create_certificate(tmp_dir) if args.tls else None
+        server_port = free_port()
+        server = start_server(create_stand_in_app(FakeEmbeddings(dim=args.dim), args.server_latency_ms),
+                              server_port, certificate)
+        relay = ConnectDelayRelay(server_port, args.connect_delay_ms / 1000)
+        relay.start()
+        base_url = f"{'https' if args.tls else 'http'}://127.0.0.1:{relay.port}/api/v1"
+        verify = certificate[0] if certificate else True
+        payload = {"model": "text-embedding-v2", "input": {"texts": texts}, "parameters": {"text_type": "document"}}
+
+        def new_client_request():
+            # 每次请求新建客户端，相当于不复用连接
+            with httpx.Client(base_url=base_url, verify=verify) as client:
+                client.post(EMBEDDING_PATH, json=payload).raise_for_status()
+
+        pooled = DashScopeHttpEmbeddings(DashScopeClient("stand-in", base_url=base_url, verify=verify,
+                                                         max_connections=args.concurrency,
+                                                         max_keepalive_connections=args.concurrency),
+                                         "text-embedding-v2", max_retries=1)
+        try:
+            results = {
+                "new_connection_per_request": run_sequential(relay, args.requests, new_client_request),
+                "pooled_sync": run_sequential(relay, args.requests, lambda: pooled.embed_documents(texts)),
+                "pooled_async_concurrent": run_concurrent(relay, args.requests, args.concurrency, pooled, texts)
+            }
+        finally:
+            server.should_exit = True
+
+    saved = results["new_connection_per_request"]["mean_ms"] - results["pooled_sync"]["mean_ms"]
+    results["saved_per_request_ms"] = saved
+    results["config"] = dict(vars(args), http2=HTTP2_AVAILABLE)
+    results["config"].pop("name")
+    for name in ("new_connection_per_request", "pooled_sync", "pooled_async_concurrent"):
+        entry = results[name]
+        print(f"{name:<28} {entry['requests']:5d} 次  新建连接 {entry['connections']:4d}  "
+                  f"{entry['requests_per_sec']:7.1f}/s  mean {entry['mean_ms']:7.1f}ms  "
+                  f"p50 {entry['p50_ms']:7.1f}ms  p95 {entry['p95_ms']:7.1f}ms")
+    print(f"连接复用节省的单次请求延迟: {saved:.1f}ms")
+    print(f"结果已保存: {common.save_results(args.name, results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""离线嵌入替身：用字符n-gram特征哈希生成确定性的向量，不访问网络，相同文本总是得到相同向量
+
+向量保留了字面相似度（共享n-gram越多越接近），足以让搜索基准返回有意义的结果。
+"""
+
+import time
+import hashlib
+import threading
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class FakeEmbeddings(Embeddings):
+    """确定性的本地嵌入模型
+
+    dim 默认与 text-embedding-v2 一致；latency_ms 模拟每次请求的网络延迟，用于观察批处理的效果。
+    """
+
+    def __init__(self, dim: int = 1536, ngram: int = 2, latency_ms: float = 0.0):
+        self.dim = dim
+        self.ngram = ngram
+        self.latency_ms = latency_ms
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.text_count = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = text.lower()
+        for i in range(max(1, len(text) - self.ngram + 1)):
+            digest = hashlib.blake2b(text[i:i + self.ngram].encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            # 低位决定维度，最高位决定符号
+            vector[value % self.dim] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self.lock:
+            self.request_count += 1
+            self.text_count += len(texts)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
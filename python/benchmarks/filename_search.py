@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""文件名索引基准：用合成路径建立三字母组索引，测量子串、带错字和带扩展名的文件名查询延迟
+
+用法（在 python 目录下）：
+    python -m benchmarks.filename_search --files 100000 --queries 1000
+"""
+
+import os
+import time
+import random
+import argparse
+
+from benchmarks import common
+from benchmarks.suggest import synthetic_files
+
+from filename_index import FilenameIndex
+
+
+def make_queries(paths: list, rng: random.Random, count: int) -> dict:
+    """从真实文件名中截取片段作为子串查询，再随机替换一个字符作为带错字的查询"""
+    queries = {"substring": [], "typo": [], "full_name": []}
+    for _ in range(count):
+        name = os.path.basename(rng.choice(paths))
+        start = rng.randint(0, max(0, len(name) - 8))
+        fragment = name[start:start + rng.randint(4, 10)]
+        queries["substring"].append(fragment)
+        position = rng.randrange(len(name))
+        queries["typo"].append(name[:position] + rng.choice("abcxyz0") + name[position + 1:])
+        queries["full_name"].append(name)
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文件名三字母组索引基准（合成路径）")
+    parser.add_argument("--files", type=int, default=100000, help="合成的文件数")
+    parser.add_argument("--queries", type=int, default=1000, help="每类查询数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--name", default="filename_search", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    root = "/benchmark/filenames"
+    paths = list(synthetic_files(root, args.files, rng))
+
+    rss_before = common.current_rss_mb()
+    start = time.perf_counter()
+    index = FilenameIndex()
+    index.replace_root(root, paths)
+    build_seconds = time.perf_counter() - start
+    rss_mb = common.current_rss_mb() - rss_before
+    print(f"建立文件名索引: {len(index)} 个文件, {len(index.postings)} 个三字母组, {build_seconds:.2f} 秒, 内存约 {rss_mb:.0f}MB")
+
+    results = {"config": vars(args), "build_seconds": build_seconds, "rss_mb": rss_mb}
+    for kind, queries in make_queries(paths, rng, args.queries).items():
+        latencies = []
+        found = 0
+        for query in queries:
+            query_start = time.perf_counter()
+            matches = index.search(query, 5)
+            latencies.append((time.perf_counter() - query_start) * 1000)
+            found += bool(matches)
+        results[kind] = {
+            "queries": len(queries),
+            "found_rate": found / len(queries),
+            "mean_ms": sum(latencies) / len(latencies),
+            "p50_ms": common.percentile(latencies, 50),
+            "p95_ms": common.percentile(latencies, 95),
+            "p99_ms": common.percentile(latencies, 99)
+        }
+        entry = results[kind]
+        print(f"{kind:<10} {entry['queries']:5d} 次  命中 {entry['found_rate']:6.1%}  mean {entry['mean_ms']:6.2f}ms  "
+              f"p50 {entry['p50_ms']:6.2f}ms  p95 {entry['p95_ms']:6.2f}ms  p99 {entry['p99_ms']:6.2f}ms")
+    print(f"结果已保存: {common.save_results(args.name, results)}")
+
+
+if __name__ == "__main__":
+    main()
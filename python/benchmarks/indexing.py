@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""索引与搜索基准：用合成语料和离线嵌入替身完整运行 index_folder 和 search()，不需要DashScope
+
+报告各阶段（解析、哈希去重、分块、嵌入写入、保存）的耗时和吞吐量、增量索引耗时、
+搜索延迟 p50/p95/p99、峰值内存和磁盘上的索引大小，结果保存为JSON，可用 benchmarks.compare 对比。
+
+用法（在 python 目录下）：
+    python -m benchmarks.indexing --files 200 --size-kb 20
+    python -m benchmarks.indexing --corpus /tmp/corpus --queries 200 --latency-ms 50
+"""
+
+import os
+import time
+import json
+import asyncio
+import logging
+import argparse
+import tempfile
+import functools
+
+from benchmarks import common
+from benchmarks.corpus import generate_corpus, parse_mix, DEFAULT_MIX, MANIFEST_FILE
+from benchmarks.fake_embeddings import FakeEmbeddings
+
+import api
+
+
+class StageTimer:
+    """累计各阶段的耗时和处理数量"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, stage: str, seconds: float, items: int = 0):
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0, "items": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        entry["items"] += items
+
+    def wrap(self, stage: str, func, count_items=None):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            self.record(stage, time.perf_counter() - start, count_items(args, result) if count_items else 0)
+            return result
+        return wrapper
+
+    def report(self) -> dict:
+        return {stage: dict(entry, items_per_sec=entry["items"] / entry["seconds"] if entry["seconds"] else 0.0)
+                for stage, entry in self.stages.items()}
+
+    def reset(self):
+        self.stages = {}
+
+
+def instrument(timer: StageTimer, embedding_model: FakeEmbeddings):
+    """替换 api 模块中的嵌入模型和各阶段函数，记录每个阶段的耗时"""
+    api.create_embedding_model = lambda max_retries=api.EMBEDDING_MAX_RETRIES: embedding_model
+    api.load_document = timer.wrap("parse", api.load_document, lambda args, docs: 1)
+    api.file_content_hash = timer.wrap("hash", api.file_content_hash, lambda args, value: 1)
+    api.simhash = timer.wrap("simhash", api.simhash, lambda args, value: 1)
+    # 嵌入在索引流水线的嵌入线程中按批进行，各阶段的耗时相互重叠
+    api.FolderIndexPipeline._embed_unit = timer.wrap(
+        "embed", api.FolderIndexPipeline._embed_unit,
+        lambda args, unit: len(unit["embedded"]) + len(unit["reusable"]) + len(unit["failed"]))
+    api.save_vector_store = timer.wrap("save", api.save_vector_store)
+
+    create_chunker = api.get_text_chunker
+
+    def get_text_chunker():
+        chunker = create_chunker()
+        chunker.split_documents = timer.wrap("chunk", chunker.split_documents, lambda args, chunks: len(chunks))
+        return chunker
+    api.get_text_chunker = get_text_chunker
+
+
+def directory_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1024 / 1024
+
+
+def run_index(folder: str, timer: StageTimer, embedding_model: FakeEmbeddings) -> dict:
+    timer.reset()
+    texts_before = embedding_model.text_count
+    requests_before = embedding_model.request_count
+    start = time.perf_counter()
+    api.index_folder(folder)
+    seconds = time.perf_counter() - start
+    if api.index_status["error"]:
+        raise RuntimeError(api.index_status["error"])
+    stats = api.index_status["file_stats"]
+    chunk_count = timer.stages.get("chunk", {}).get("items", 0)
+    file_count = stats["success_count"] + stats["failure_count"] + stats["skipped_count"]
+    return {
+        "seconds": seconds,
+        "files": file_count,
+        "files_per_sec": file_count / seconds if seconds else 0.0,
+        "chunks": chunk_count,
+        "chunks_per_sec": chunk_count / seconds if seconds else 0.0,
+        "embedded_texts": embedding_model.text_count - texts_before,
+        "embedding_requests": embedding_model.request_count - requests_before,
+        "file_stats": dict(stats),
+        "stages": timer.report(),
+        "status": api.index_status["status"]
+    }
+
+
+def check_corpus_indexed(manifest: dict):
+    """每个语料文件都必须解析成功并生成文本块（重复文件要求其代表文件有文本块），否则报告的吞吐量没有意义"""
+    store = api.ChunkStore(os.path.join(api.get_db_path(), api.CHUNK_STORE_FILE))
+    try:
+        records = store.file_records()
+        missing = []
+        for path in manifest["files"]:
+            path = api.normalize_path(path)
+            record = records.get(path)
+            if record is None or not store.has_source(record["canonical"] or path):
+                missing.append(path)
+    finally:
+        store.close()
+    if missing:
+        raise RuntimeError(f"{len(missing)} 个语料文件没有解析出文本块: {', '.join(missing[:5])}")
+
+
+def directory_state(path: str) -> dict:
+    """目录中每个文件的 (大小, 修改时间)，用来确认基准测试没有写入临时目录之外的向量库"""
+    state = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+            state[file_path] = (stat.st_size, stat.st_mtime_ns)
+    return state
+
+
+def redirect_vector_store(vector_store_dir: str):
+    """向量库目录指向临时目录；OCR缓存在导入 api 时按原来的目录创建，需要重新创建"""
+    api.VECTOR_STORE_DIR = vector_store_dir
+    api.ocr_engine.shutdown()
+    api.ocr_engine = api.OcrEngine(os.path.join(vector_store_dir, api.OCR_CACHE_FILE), api.OCR_WORKERS, api.OCR_LANG,
+                                   api.OCR_DPI, api.OCR_MIN_TEXT_CHARS)
+    api.search_usages.clear()
+
+
+def run_search(folder: str, queries, repeat: int) -> dict:
+    latencies = []
+    result_counts = []
+    first_ms = None
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            response = asyncio.run(api.search(api.SearchRequest(query=query, folder=folder)))
+            elapsed = (time.perf_counter() - start) * 1000
+            if not response.get("success"):
+                raise RuntimeError(response.get("message"))
+            if first_ms is None:
+                first_ms = elapsed
+            latencies.append(elapsed)
+            result_counts.append(len(response["results"]))
+    return {
+        "queries": len(latencies),
+        "first_ms": first_ms,
+        "p50_ms": common.percentile(latencies, 50),
+        "p95_ms": common.percentile(latencies, 95),
+        "p99_ms": common.percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "mean_results": sum(result_counts) / len(result_counts) if result_counts else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="索引与搜索基准（离线嵌入）")
+    parser.add_argument("--corpus", help="已有的语料目录；不指定时生成合成语料")
+    parser.add_argument("--files", type=int, default=200, help="合成语料的文件数量")
+    parser.add_argument("--size-kb", type=float, default=20, help="合成语料每个文件的平均文本量(KB)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="文件类型比例，如 txt=4,pdf=1,csv=1")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--dim", type=int, default=1536, help="嵌入向量维度")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="模拟每次嵌入请求的网络延迟")
+    parser.add_argument("--storage", choices=list(api.STORAGE_MODES), default=api.INDEX_STORAGE_MODE, help="向量存储格式")
+    parser.add_argument("--queries", type=int, default=100, help="搜索查询数量")
+    parser.add_argument("--repeat", type=int, default=1, help="查询重复轮数")
+    parser.add_argument("--name", default="indexing", help="结果文件名前缀")
+    parser.add_argument("--verbose", action="store_true", help="输出后端日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = args.corpus
+        if corpus_dir is None:
+            corpus_dir = os.path.join(tmp_dir, "corpus")
+            start = time.perf_counter()
+            manifest = generate_corpus(corpus_dir, args.files, args.size_kb, args.mix, args.seed)
+            print(f"生成语料 {manifest['file_count']} 个文件 ({manifest['total_bytes'] / 1024 / 1024:.1f}MB) "
+                  f"耗时 {time.perf_counter() - start:.1f}s: {manifest['counts']}")
+        else:
+            with open(os.path.join(corpus_dir, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+        corpus_dir = api.normalize_path(corpus_dir)
+
+        # 向量库写到临时目录，不影响正式索引
+        real_vector_store_dir = api.VECTOR_STORE_DIR
+        real_state = directory_state(real_vector_store_dir)
+        redirect_vector_store(os.path.join(tmp_dir, "vector_store"))
+        api.INDEX_STORAGE_MODE = args.storage
+        timer = StageTimer()
+        embedding_model = FakeEmbeddings(dim=args.dim, latency_ms=args.latency_ms)
+        instrument(timer, embedding_model)
+
+        rss_before = common.current_rss_mb()
+        full = run_index(corpus_dir, timer, embedding_model)
+        check_corpus_indexed(manifest)
+        print(f"全量索引: {full['seconds']:.2f}s  {full['files_per_sec']:.1f} 文件/s  {full['chunks_per_sec']:.1f} 文本块/s  "
+              f"嵌入请求 {full['embedding_requests']} 次")
+        for stage, entry in full["stages"].items():
+            print(f"  {stage:<8} {entry['seconds']:8.3f}s  {entry['items']:7d} 项  {entry['items_per_sec']:10.1f} 项/s")
+
+        incremental = run_index(corpus_dir, timer, embedding_model)
+        print(f"无变化增量索引: {incremental['seconds']:.2f}s  {incremental['files_per_sec']:.1f} 文件/s")
+
+        queries = (manifest["queries"] * (args.queries // len(manifest["queries"]) + 1))[:args.queries]
+        search = run_search(corpus_dir, queries, args.repeat)
+        print(f"搜索 {search['queries']} 次: 首次 {search['first_ms']:.1f}ms  p50 {search['p50_ms']:.1f}ms  "
+              f"p95 {search['p95_ms']:.1f}ms  p99 {search['p99_ms']:.1f}ms")
+
+        db_path = api.get_db_path()
+        results = {
+            "corpus": {key: manifest[key] for key in ("file_count", "size_kb", "seed", "counts", "total_bytes")},
+            "config": {
+                "dim": args.dim,
+                "latency_ms": args.latency_ms,
+                "storage": args.storage,
+                "embedding_model": api.EMBEDDING_MODEL_NAME,
+                "max_batch_rows": api.MAX_BATCH_ROWS,
+                "max_batch_tokens": api.MAX_BATCH_TOKENS
+            },
+            "index": full,
+            "incremental_index": incremental,
+            "search": search,
+            "memory": {
+                "rss_before_mb": rss_before,
+                "rss_after_mb": common.current_rss_mb(),
+                "peak_rss_mb": common.peak_rss_mb()
+            },
+            "disk": {
+                "total_mb": directory_size_mb(db_path),
+                "index_mb": os.path.getsize(os.path.join(db_path, api.INDEX_FILE)) / 1024 / 1024,
+                "chunk_store_mb": os.path.getsize(os.path.join(db_path, api.CHUNK_STORE_FILE)) / 1024 / 1024
+            }
+        }
+        print(f"峰值内存 {results['memory']['peak_rss_mb']:.1f}MB  磁盘索引 {results['disk']['total_mb']:.2f}MB")
+        api.ocr_engine.shutdown()
+
+    if directory_state(real_vector_store_dir) != real_state:
+        raise RuntimeError(f"基准测试修改了临时目录之外的向量库目录: {real_vector_store_dir}")
+
+    print(f"结果已保存: {common.save_results(args.name, results)}")
+
+
+if __name__ == "__main__":
+    main()
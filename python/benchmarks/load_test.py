@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""端到端并发压测：在进程内启动 FastAPI 后端（使用离线嵌入替身），模拟真实使用时的混合负载
+
+负载包括：并发搜索、前端式的 /index-progress 轮询、/health 心跳（反映事件循环是否被阻塞）、
+另一个文件夹的后台全量索引，以及被监控文件夹中的文件增删改（触发文件监控更新向量库）。
+报告每个接口的延迟分布和错误数，结果保存为JSON。
+
+用法（在 python 目录下）：
+    python -m benchmarks.load_test --duration 30 --search-workers 8 --latency-ms 50
+"""
+
+import os
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+
+import httpx
+import uvicorn
+
+from benchmarks import common
+from benchmarks.corpus import generate_corpus, TextGenerator, TOPICS
+from benchmarks.fake_embeddings import FakeEmbeddings
+
+import api
+
+
+class EndpointStats:
+    """按接口收集延迟和错误"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = {}
+
+    def record(self, name: str, elapsed_ms: float, error: str = None):
+        self.latencies.setdefault(name, []).append(elapsed_ms)
+        if error:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            samples = self.error_samples.setdefault(name, [])
+            if len(samples) < 5:
+                samples.append(error)
+
+    def report(self, duration: float) -> dict:
+        report = {}
+        for name, values in self.latencies.items():
+            report[name] = {
+                "requests": len(values),
+                "requests_per_sec": len(values) / duration if duration else 0.0,
+                "errors": self.errors.get(name, 0),
+                "error_samples": self.error_samples.get(name, []),
+                "p50_ms": common.percentile(values, 50),
+                "p95_ms": common.percentile(values, 95),
+                "p99_ms": common.percentile(values, 99),
+                "max_ms": max(values)
+            }
+        return report
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> uvicorn.Server:
+    """在后台线程中启动 uvicorn，返回后即可接受请求"""
+    config = uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def timed_request(client: httpx.AsyncClient, stats: EndpointStats, name: str, method: str, url: str, **kwargs):
+    start = time.perf_counter()
+    error = None
+    data = None
+    try:
+        response = await client.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+        else:
+            data = response.json()
+            if isinstance(data, dict) and data.get("success") is False:
+                error = data.get("message", "success=false")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    stats.record(name, (time.perf_counter() - start) * 1000, error)
+    return data
+
+
+async def wait_for_index(client: httpx.AsyncClient, timeout: float):
+    """等待后台索引任务结束"""
+    deadline = time.time() + timeout
+    await asyncio.sleep(0.2)
+    while time.time() < deadline:
+        progress = (await client.get("/index-progress")).json()
+        if not progress["in_progress"]:
+            if progress["error"]:
+                raise RuntimeError(progress["error"])
+            return progress
+        await asyncio.sleep(0.2)
+    raise TimeoutError("索引超时")
+
+
+async def search_worker(client, stats, folder, queries, stop_at, seed):
+    rng = random.Random(seed)
+    while time.time() < stop_at:
+        await timed_request(client, stats, "POST /search", "POST", "/search",
+                            json={"query": rng.choice(queries), "folder": folder})
+
+
+async def poll_worker(client, stats, name, url, interval, stop_at):
+    while time.time() < stop_at:
+        await timed_request(client, stats, name, "GET", url)
+        await asyncio.sleep(interval)
+
+
+async def churn_worker(folder, interval, stop_at, seed, counters):
+    """在被监控的文件夹中新建、修改和删除文件"""
+    rng = random.Random(seed)
+    churn_dir = os.path.join(folder, "churn")
+    os.makedirs(churn_dir, exist_ok=True)
+    created = []
+    topics = list(TOPICS)
+    while time.time() < stop_at:
+        action = rng.choice(["create", "create", "modify", "delete"]) if created else "create"
+        if action == "create":
+            path = os.path.join(churn_dir, f"churn_{len(created) + counters['deleted']:05d}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(TextGenerator(rng.random()).paragraphs(rng.choice(topics), 2000)))
+            created.append(path)
+        elif action == "modify":
+            with open(rng.choice(created), "a", encoding="utf-8") as f:
+                f.write("\n\n" + TextGenerator(rng.random()).paragraph(rng.choice(topics)))
+        else:
+            os.remove(created.pop(rng.randrange(len(created))))
+            counters["deleted"] += 1
+        counters[action] = counters.get(action, 0) + 1
+        await asyncio.sleep(interval)
+
+
+async def run_load(args, base_url: str, search_folder: str, index_folder: str, queries) -> dict:
+    stats = EndpointStats()
+    churn_counters = {"deleted": 0}
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout) as client:
+        # 先建立被搜索文件夹的索引（同时启动对它的文件监控）
+        start = time.perf_counter()
+        response = (await client.post("/index", json={"folder": search_folder})).json()
+        if not response.get("success"):
+            raise RuntimeError(response.get("message"))
+        await wait_for_index(client, args.index_timeout)
+        initial_index_seconds = time.perf_counter() - start
+        print(f"初始索引完成: {initial_index_seconds:.1f}s")
+
+        stop_at = time.time() + args.duration
+        # 压测开始时启动另一个文件夹的后台全量索引，与搜索争用CPU和向量库
+        await timed_request(client, stats, "POST /index", "POST", "/index", json={"folder": index_folder})
+        tasks = [search_worker(client, stats, search_folder, queries, stop_at, seed)
+                 for seed in range(args.search_workers)]
+        tasks.append(poll_worker(client, stats, "GET /index-progress", "/index-progress", args.poll_interval, stop_at))
+        tasks.append(poll_worker(client, stats, "GET /health", "/health", args.health_interval, stop_at))
+        if args.churn_interval > 0:
+            tasks.append(churn_worker(search_folder, args.churn_interval, stop_at, args.seed, churn_counters))
+        start = time.perf_counter()
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - start
+
+        # 压测结束后后台索引可能仍在进行
+        background = (await client.get("/index-progress")).json()
+        await client.post("/stop-all-monitoring")
+
+    return {
+        "initial_index_seconds": initial_index_seconds,
+        "duration": duration,
+        "endpoints": stats.report(duration),
+        "file_churn": churn_counters,
+        "background_index": {
+            "finished": not background["in_progress"],
+            "status": background["status"],
+            "error": background["error"]
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FastAPI后端并发压测（离线嵌入）")
+    parser.add_argument("--duration", type=float, default=30, help="压测时长(秒)")
+    parser.add_argument("--search-workers", type=int, default=8, help="并发搜索的客户端数")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="/index-progress 轮询间隔（前端为1秒）")
+    parser.add_argument("--health-interval", type=float, default=0.1, help="/health 心跳间隔")
+    parser.add_argument("--churn-interval", type=float, default=0.5, help="文件增删改的间隔，0表示不修改文件")
+    parser.add_argument("--files", type=int, default=100, help="每个文件夹的合成文件数量")
+    parser.add_argument("--size-kb", type=float, default=10, help="合成文件的平均文本量(KB)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="模拟每次嵌入请求的网络延迟")
+    parser.add_argument("--dim", type=int, default=1536, help="嵌入向量维度")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--request-timeout", type=float, default=60, help="单个请求超时(秒)")
+    parser.add_argument("--index-timeout", type=float, default=600, help="初始索引超时(秒)")
+    parser.add_argument("--name", default="load_test", help="结果文件名前缀")
+    parser.add_argument("--verbose", action="store_true", help="输出后端日志")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        search_folder = api.normalize_path(os.path.join(tmp_dir, "search"))
+        index_folder = api.normalize_path(os.path.join(tmp_dir, "index"))
+        manifest = generate_corpus(search_folder, args.files, args.size_kb, seed=args.seed)
+        generate_corpus(index_folder, args.files, args.size_kb, seed=args.seed + 1)
+
+        # 向量库和监控配置写到临时目录，不影响正式索引
+        api.VECTOR_STORE_DIR = os.path.join(tmp_dir, "vector_store")
+        embedding_model = FakeEmbeddings(dim=args.dim, latency_ms=args.latency_ms)
+        api.create_embedding_model = lambda max_retries=api.EMBEDDING_MAX_RETRIES: embedding_model
+
+        port = free_port()
+        server = start_server(port)
+        try:
+            results = asyncio.run(run_load(args, f"http://127.0.0.1:{port}", search_folder, index_folder,
+                                           manifest["queries"]))
+        finally:
+            server.should_exit = True
+
+    results["config"] = {key: value for key, value in vars(args).items() if key not in ("name", "verbose")}
+    results["memory"] = {"peak_rss_mb": common.peak_rss_mb()}
+    results["embedding"] = {"requests": embedding_model.request_count, "texts": embedding_model.text_count}
+
+    print(f"压测 {results['duration']:.1f}s，后台索引{'已完成' if results['background_index']['finished'] else '未完成'}")
+    for name, entry in results["endpoints"].items():
+        print(f"{name:<22} {entry['requests']:6d} 次 {entry['requests_per_sec']:7.1f}/s  错误 {entry['errors']:4d}  "
+              f"p50 {entry['p50_ms']:8.1f}ms  p95 {entry['p95_ms']:8.1f}ms  p99 {entry['p99_ms']:8.1f}ms  "
+              f"max {entry['max_ms']:8.1f}ms")
+    print(f"结果已保存: {common.save_results(args.name, results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""本地嵌入基准：比较 all-MiniLM-L6-v2 的 fp32/int8 ONNX 推理在不同线程数下的吞吐，以及分桶前后的填充量
+
+基线按输入顺序每 batch_size 条一批、填充到本批最长（与 HuggingFaceEmbeddings 的默认行为相同）；
+分桶版本先按Token数排序再切批。同时报告 int8 与 fp32 向量的余弦相似度和近邻检索的一致率。
+安装了 sentence-transformers 并用 --reference 指定模型目录时，再与其 fp32 输出比较。
+需要 src/models/all-MiniLM-L6-v2.onnx（见 src/models/README.md）。
+
+用法（在 python 目录下）：
+    python -m benchmarks.local_embedding --texts 2000 --threads 1,2,4
+"""
+
+import time
+import random
+import logging
+import argparse
+
+import numpy as np
+
+from benchmarks import common
+from benchmarks.corpus import TextGenerator, TOPICS
+
+from local_embedding import LocalMiniLMEmbeddings
+
+
+class UnsortedEmbeddings(LocalMiniLMEmbeddings):
+    """基线：按输入顺序切批，不分桶"""
+
+    def iter_batches(self, lengths):
+        for start in range(0, len(lengths), self.batch_size):
+            batch = list(range(start, min(start + self.batch_size, len(lengths))))
+            yield sorted(batch, key=lengths.__getitem__)
+
+
+def synthetic_texts(count: int, rng: random.Random, generator: TextGenerator) -> list:
+    """长短混合的文本块：标题式短句、单段和多段，接近分块后的长度分布"""
+    topics = list(TOPICS)
+    texts = []
+    for _ in range(count):
+        topic = rng.choice(topics)
+        kind = rng.random()
+        if kind < 0.3:
+            texts.append(generator.sentence(topic))
+        elif kind < 0.8:
+            texts.append(generator.paragraph(topic))
+        else:
+            texts.append("\n\n".join(generator.paragraph(topic) for _ in range(rng.randint(2, 4))))
+    return texts
+
+
+def measure(model: LocalMiniLMEmbeddings, texts: list, repeat: int) -> tuple:
+    """返回 (向量, 吞吐统计)；先嵌入一小批预热，不计时"""
+    model.embed_array(texts[:model.batch_size])
+    seconds = []
+    vectors = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        vectors = model.embed_array(texts)
+        seconds.append(time.perf_counter() - start)
+    best = min(seconds)
+    return vectors, {
+        "texts_per_second": len(texts) / best,
+        "seconds": best,
+        "tokens": model.last_tokens,
+        "padded_tokens": model.last_padded_tokens,
+        "padding_ratio": model.last_padded_tokens / max(1, model.last_tokens) - 1
+    }
+
+
+def agreement(vectors: np.ndarray, reference: np.ndarray, queries: int, k: int = 10) -> dict:
+    """逐条余弦相似度，以及用前 queries 条作为查询时 top-k 近邻的重合率"""
+    cosines = np.sum(vectors * reference, axis=1)
+    overlap = []
+    for row in range(min(queries, len(vectors))):
+        top = set(np.argsort(-(vectors @ vectors[row]))[1:k + 1])
+        reference_top = set(np.argsort(-(reference @ reference[row]))[1:k + 1])
+        overlap.append(len(top & reference_top) / k)
+    return {
+        "cosine_mean": float(cosines.mean()),
+        "cosine_min": float(cosines.min()),
+        "cosine_p1": float(common.percentile(cosines.tolist(), 1)),
+        f"top{k}_overlap": float(np.mean(overlap)) if overlap else None
+    }
+
+
+def reference_vectors(model_dir: str, texts: list, max_tokens: int):
+    """sentence-transformers 的 fp32 输出；未安装时返回 None"""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("未安装 sentence-transformers，跳过与其输出的比较")
+        return None
+    model = SentenceTransformer(model_dir, device="cpu")
+    model.max_seq_length = max_tokens
+    return model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 MiniLM 嵌入吞吐与量化精度基准（合成文本）")
+    parser.add_argument("--texts", type=int, default=2000, help="嵌入的文本数")
+    parser.add_argument("--threads", default="1,2,4", help="逗号分隔的推理线程数")
+    parser.add_argument("--batch-size", type=int, default=64, help="每批最多的文本数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种配置重复次数，取最快一次")
+    parser.add_argument("--queries", type=int, default=200, help="计算近邻一致率的查询数")
+    parser.add_argument("--reference", default=None, help="sentence-transformers 模型目录，用于比较 fp32 输出")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--name", default="local_embedding", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    texts = synthetic_texts(args.texts, rng, TextGenerator(args.seed))
+    thread_counts = [int(value) for value in args.threads.split(",") if value.strip()]
+
+    results = {"config": vars(args), "runs": []}
+    vectors = {}
+    for threads in thread_counts:
+        for label, cls, quantized in (("fp32_unsorted", UnsortedEmbeddings, False),
+                                      ("fp32_bucketed", LocalMiniLMEmbeddings, False),
+                                      ("int8_bucketed", LocalMiniLMEmbeddings, True)):
+            model = cls(quantized=quantized, threads=threads, batch_size=args.batch_size)
+            vectors[label], entry = measure(model, texts, args.repeat)
+            entry.update(model=label, threads=threads)
+            results["runs"].append(entry)
+            print(f"{label:<14} 线程 {threads:2d}  {entry['texts_per_second']:8.1f} 条/秒  "
+                  f"填充 {entry['padding_ratio']:6.1%}  ({entry['seconds']:.2f} 秒)")
+
+    results["int8_vs_fp32"] = agreement(vectors["int8_bucketed"], vectors["fp32_bucketed"], args.queries)
+    # 分桶只改变批次组成，结果应与基线一致（差异只来自浮点误差）
+    results["bucketed_vs_unsorted"] = agreement(vectors["fp32_bucketed"], vectors["fp32_unsorted"], 0)
+    if args.reference:
+        reference = reference_vectors(args.reference, texts, LocalMiniLMEmbeddings().max_tokens)
+        if reference is not None:
+            results["fp32_vs_reference"] = agreement(vectors["fp32_bucketed"], reference, args.queries)
+            results["int8_vs_reference"] = agreement(vectors["int8_bucketed"], reference, args.queries)
+    for name in ("int8_vs_fp32", "bucketed_vs_unsorted", "fp32_vs_reference", "int8_vs_reference"):
+        if name in results:
+            entry = results[name]
+            overlap = entry["top10_overlap"]
+            print(f"{name:<22} 余弦 mean {entry['cosine_mean']:.4f}  min {entry['cosine_min']:.4f}  "
+                  f"p1 {entry['cosine_p1']:.4f}" + (f"  top10重合 {overlap:.1%}" if overlap is not None else ""))
+    print(f"结果已保存: {common.save_results(args.name, results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""多进程检索基准：用随机向量建立共享向量库，比较在检索线程池中检索与不同检索进程数下的吞吐和延迟
+
+每种配置以固定并发持续发出检索请求（绕过查询缓存和嵌入接口，只测 faiss 打分、去重和高亮）；
+--reindex 时另一个线程不断追加向量并保存新版本，检查检索进程切换版本期间没有出错。
+Linux 上同时报告每个检索进程的 PSS：索引文件由各进程内存映射共享，按进程数分摊，不随进程数成倍增加。
+
+用法（在 python 目录下）：
+    python -m benchmarks.search_processes --vectors 200000 --processes 0,1,2,4 --concurrency 8 --reindex
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+from benchmarks import common
+from benchmarks.fake_embeddings import FakeEmbeddings
+
+import vector_storage
+from search_worker import SearchProcessPool
+
+
+def process_pss_mb(pid: int):
+    """进程的按比例分摊内存(MB)，共享的文件映射页按映射它的进程数分摊；仅Linux可用，其他平台返回None"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def build_store(db_path: str, vectors: int, dim: int, files: int, folder: str, seed: int, storage_mode: str):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((vectors, dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "theta", "kappa"]
+    texts = [f"文件 {i % files} 第 {i} 块 " + " ".join(words[(i + j) % len(words)] for j in range(40))
+             for i in range(vectors)]
+    metadatas = [{"source": os.path.join(folder, f"file{i % files}.txt")} for i in range(vectors)]
+    db = vector_storage.add_embeddings(None, list(zip(texts, embeddings.tolist())), FakeEmbeddings(dim=dim), metadatas)
+    vector_storage.save_vector_store(db, db_path, storage_mode)
+    vector_storage.close_vector_store(db)
+
+
+def reindex_loop(db_path: str, dim: int, folder: str, storage_mode: str, stop: threading.Event, stats: dict):
+    """模拟索引：每轮追加一些向量并保存为新版本"""
+    rng = np.random.default_rng(0)
+    embedding_model = FakeEmbeddings(dim=dim)
+    while not stop.is_set():
+        db = vector_storage.load_vector_store(db_path, embedding_model, writable=True)
+        try:
+            batch = rng.standard_normal((100, dim), dtype=np.float32)
+            texts = [f"新增 {stats['versions']}-{i}" for i in range(len(batch))]
+            db.add_embeddings(list(zip(texts, batch.tolist())),
+                              metadatas=[{"source": os.path.join(folder, "new.txt")}] * len(batch))
+            vector_storage.save_vector_store(db, db_path, storage_mode)
+            stats["versions"] += 1
+        finally:
+            vector_storage.close_vector_store(db)
+
+
+async def run_load(search, folder: str, queries: list, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    async def client(worker_id: int):
+        i = worker_id
+        while time.perf_counter() < deadline:
+            query, embedding = queries[i % len(queries)]
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                await search(query, embedding, folder)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(i) for i in range(concurrency)])
+    seconds = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "requests_per_sec": len(latencies) / seconds if seconds else 0.0,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "p50_ms": common.percentile(latencies, 50),
+        "p95_ms": common.percentile(latencies, 95),
+        "p99_ms": common.percentile(latencies, 99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程检索基准（随机向量）")
+    parser.add_argument("--vectors", type=int, default=200000, help="向量数")
+    parser.add_argument("--dim", type=int, default=768, help="向量维度")
+    parser.add_argument("--files", type=int, default=5000, help="向量所属的文件数")
+    parser.add_argument("--processes", default="0,1,2,4", help="要比较的检索进程数，0 为检索线程池")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发检索数")
+    parser.add_argument("--duration", type=float, default=10, help="每种配置的压测时长(秒)")
+    parser.add_argument("--queries", type=int, default=200, help="不同查询向量的数量")
+    parser.add_argument("--reindex", action="store_true", help="压测期间不断保存新版本的索引")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--name", default="search_processes", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    # 检索进程以 __mp_main__ 重新导入本模块，api 只在主进程中导入
+    import api
+    logging.getLogger().setLevel(logging.WARNING)
+    process_counts = [int(value) for value in args.processes.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 向量库写到临时目录，不影响正式索引
+        api.VECTOR_STORE_DIR = os.path.join(tmp_dir, "vector_store")
+        db_path = api.get_db_path()
+        folder = os.path.join(tmp_dir, "corpus")
+        start = time.perf_counter()
+        build_store(db_path, args.vectors, args.dim, args.files, folder, args.seed, api.INDEX_STORAGE_MODE)
+        index_mb = os.path.getsize(vector_storage.current_index_path(db_path)) / 1024 / 1024
+        print(f"建立向量库 {args.vectors} 个向量 ({index_mb:.1f}MB) 耗时 {time.perf_counter() - start:.1f}s")
+        api.create_embedding_model = lambda max_retries=api.EMBEDDING_MAX_RETRIES: FakeEmbeddings(dim=args.dim)
+
+        rng = random.Random(args.seed)
+        queries = []
+        for i in range(args.queries):
+            vector = np.random.default_rng(args.seed + i).standard_normal(args.dim).astype(np.float32)
+            queries.append((rng.choice(["alpha beta", "gamma", "kappa zeta"]), (vector / np.linalg.norm(vector)).tolist()))
+
+        results = {"config": vars(args), "index_mb": index_mb, "runs": []}
+        for processes in process_counts:
+            api.SEARCH_PROCESSES = processes
+            api.search_processes = SearchProcessPool(processes, args.concurrency)
+            run = {"processes": processes}
+            if processes > 0:
+                start = time.perf_counter()
+                pids = api.search_processes.start(db_path, api.INDEX_MMAP_ENABLED, timeout=120)
+                run["startup_seconds"] = time.perf_counter() - start
+            stop = threading.Event()
+            reindex_stats = {"versions": 0}
+            reindexer = None
+            if args.reindex:
+                reindexer = threading.Thread(target=reindex_loop,
+                                             args=(db_path, args.dim, folder, api.INDEX_STORAGE_MODE, stop, reindex_stats))
+                reindexer.start()
+            try:
+                run.update(asyncio.run(run_load(api.run_semantic_search, folder, queries, args.concurrency, args.duration)))
+            finally:
+                stop.set()
+                if reindexer is not None:
+                    reindexer.join()
+            run["saved_versions"] = reindex_stats["versions"]
+            if processes > 0:
+                run["process_pss_mb"] = [process_pss_mb(pid) for pid in pids]
+            api.search_processes.shutdown()
+            results["runs"].append(run)
+            label = f"{processes} 个检索进程" if processes else f"检索线程池({api.SEARCH_WORKERS}线程)"
+            pss = run.get("process_pss_mb") or []
+            pss_text = f"  每进程PSS {', '.join(f'{value:.0f}' for value in pss if value is not None)}MB" if pss else ""
+            print(f"{label}: {run['requests_per_sec']:.1f} 次/s  p50 {run['p50_ms']:.1f}ms  p95 {run['p95_ms']:.1f}ms  "
+                  f"错误 {run['errors']}  保存版本 {run['saved_versions']}{pss_text}")
+
+    print(f"结果已保存: {common.save_results(args.name, results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""候选词接口基准：用合成的文件名和文本构建候选词索引，模拟逐字输入，测量 /suggest 的延迟分布
+
+文件名和文本块内容都在内存中合成，不需要写出文件或建立向量库；构建好的索引直接登记到后端，
+再在进程内启动 FastAPI 服务，按前端输入即搜索的方式逐字发送请求。同时报告不经过HTTP的匹配耗时。
+
+用法（在 python 目录下）：
+    python -m benchmarks.suggest --files 100000 --requests 2000
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import argparse
+
+import httpx
+
+from benchmarks import common
+from benchmarks.corpus import TextGenerator, TOPICS, COMMON_WORDS
+from benchmarks.load_test import free_port, start_server
+
+import api
+from suggest import SuggestIndex
+
+NAME_PARTS = ["报告", "会议纪要", "方案", "合同", "发票", "report", "summary", "draft", "final", "notes", "IMG", "scan"]
+EXTENSIONS = [".txt", ".pdf", ".docx", ".pptx", ".xlsx", ".csv"]
+
+
+def synthetic_files(root: str, count: int, rng: random.Random) -> dict:
+    """{路径: 修改时间}，路径分布在多级子目录中"""
+    now = time.time()
+    files = {}
+    topics = list(TOPICS)
+    for i in range(count):
+        topic = rng.choice(topics)
+        name = "_".join([rng.choice(TOPICS[topic]), rng.choice(NAME_PARTS), str(rng.randint(2015, 2025)), f"{i:06d}"])
+        path = os.path.join(root, topic, f"dir{i % 50:02d}", name + rng.choice(EXTENSIONS))
+        files[path] = now - rng.uniform(0, 3 * 365 * 86400)
+    return files
+
+
+def typing_prefixes(rng: random.Random, count: int) -> list:
+    """模拟逐字输入：从主题词、文件名片段和常用词中选词，依次发送它的每个前缀"""
+    words = [word for topic in TOPICS.values() for word in topic] + NAME_PARTS + COMMON_WORDS
+    prefixes = []
+    while len(prefixes) < count:
+        word = rng.choice(words)
+        prefixes.extend(word[:i] for i in range(1, len(word) + 1))
+    return prefixes[:count]
+
+
+def summarize(latencies) -> dict:
+    return {
+        "requests": len(latencies),
+        "mean_ms": sum(latencies) / len(latencies),
+        "p50_ms": common.percentile(latencies, 50),
+        "p95_ms": common.percentile(latencies, 95),
+        "p99_ms": common.percentile(latencies, 99),
+        "max_ms": max(latencies)
+    }
+
+
+async def run_http(base_url: str, folder: str, prefixes: list, concurrency: int) -> dict:
+    latencies = []
+    queue = list(prefixes)
+
+    async def worker(client: httpx.AsyncClient):
+        while queue:
+            prefix = queue.pop()
+            start = time.perf_counter()
+            response = await client.get("/suggest", params={"q": prefix, "folder": folder})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        # 预热连接
+        await client.get("/health")
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/suggest 接口延迟基准（合成数据）")
+    parser.add_argument("--files", type=int, default=100000, help="合成的文件数")
+    parser.add_argument("--chunks", type=int, default=5000, help="用于统计高频词的合成文本块数")
+    parser.add_argument("--history", type=int, default=500, help="预先记录的查询条数")
+    parser.add_argument("--requests", type=int, default=2000, help="发送的候选词请求数")
+    parser.add_argument("--concurrency", type=int, default=1, help="并发请求数（逐字输入时为1）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--name", default="suggest", help="结果文件名前缀")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    generator = TextGenerator(args.seed)
+    root = "/benchmark/suggest"
+    topics = list(TOPICS)
+
+    files = synthetic_files(root, args.files, rng)
+    texts = [generator.paragraph(rng.choice(topics)) for _ in range(args.chunks)]
+    rss_before = common.current_rss_mb()
+    index = SuggestIndex(root, files, texts, max_terms=api.SUGGEST_MAX_TERMS)
+    index.version = api.query_cache.version(root)
+    rss_after = common.current_rss_mb()
+    api.suggest_registry.indexes[root] = index
+    for _ in range(args.history):
+        api.query_history.record(" ".join(rng.sample(typing_prefixes(rng, 40), 2)))
+    print(f"构建候选词索引: {args.files} 个文件, {len(index.files)} 个文件名键, {len(index.terms)} 个词, "
+          f"{index.build_seconds:.2f} 秒, 内存约 {rss_after - rss_before:.0f}MB")
+
+    prefixes = typing_prefixes(rng, args.requests)
+    # 不经过HTTP的匹配耗时
+    latencies = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        api.query_history.match(prefix.lower(), 8)
+        index.match_files(prefix.lower(), 8, root)
+        index.match_terms(prefix.lower(), 8)
+        latencies.append((time.perf_counter() - start) * 1000)
+    in_process = summarize(latencies)
+
+    server = start_server(free_port())
+    try:
+        base_url = f"http://127.0.0.1:{server.config.port}"
+        http = asyncio.run(run_http(base_url, root, prefixes, args.concurrency))
+        subfolder = asyncio.run(run_http(base_url, os.path.join(root, topics[0]), prefixes, args.concurrency))
+    finally:
+        server.should_exit = True
+
+    results = {
+        "config": vars(args),
+        "index": dict(index.stats(), rss_mb=rss_after - rss_before),
+        "in_process": in_process,
+        "http": http,
+        "http_subfolder": subfolder
+    }
+    for name in ("in_process", "http", "http_subfolder"):
+        entry = results[name]
+        print(f"{name:<16} {entry['requests']:6d} 次  mean {entry['mean_ms']:6.2f}ms  p50 {entry['p50_ms']:6.2f}ms  "
+              f"p95 {entry['p95_ms']:6.2f}ms  p99 {entry['p99_ms']:6.2f}ms  max {entry['max_ms']:6.2f}ms")
+    print(f"结果已保存: {common.save_results(args.name, results)}")
+
+
+if __name__ == "__main__":
+    main()
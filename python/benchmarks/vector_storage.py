@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""向量存储基准：对比 flat(float32) / fp16 / sq8 三种存储格式、完整读入与内存映射的加载耗时、内存和召回率
+
+用法（在 python 目录下）：
+    python -m benchmarks.vector_storage --count 100000 --dim 1536
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from benchmarks import common
+import vector_storage
+
+
+def build_dataset(count: int, dim: int, query_count: int, seed: int = 42):
+    """生成归一化的随机向量，查询向量取自数据集并加入少量噪声"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = rng.choice(count, size=query_count, replace=False)
+    queries = vectors[picks] + rng.standard_normal((query_count, dim), dtype=np.float32) * 0.05
+    return vectors, queries.astype(np.float32)
+
+
+def measure_load(index_path: str, queries_path: str, mmap: bool, k: int) -> dict:
+    """在独立子进程中加载索引，避免前一次加载的内存影响测量"""
+    command = [sys.executable, "-m", "benchmarks.vector_storage", "--child", index_path, queries_path, str(int(mmap)), str(k)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True, cwd=common.BACKEND_DIR).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def child_main(index_path: str, queries_path: str, mmap: bool, k: int):
+    queries = np.load(queries_path)
+    rss_before = common.current_rss_mb()
+    anon_before = common.anon_rss_mb()
+    start = time.perf_counter()
+    index = vector_storage.read_index(index_path, mmap=mmap)
+    load_ms = (time.perf_counter() - start) * 1000
+    rss_loaded = common.current_rss_mb()
+
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(json.dumps({
+        "load_ms": load_ms,
+        "rss_after_load_mb": rss_loaded - rss_before,
+        "rss_after_search_mb": common.current_rss_mb() - rss_before,
+        "anon_after_search_mb": common.anon_rss_mb() - anon_before if anon_before is not None else None,
+        "search_ms_per_query": search_ms,
+        "ids": ids.tolist()
+    }))
+
+
+def recall_at_k(result_ids, truth_ids) -> float:
+    hits = sum(len(set(result) & set(truth)) for result, truth in zip(result_ids, truth_ids))
+    return hits / sum(len(truth) for truth in truth_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量存储格式与内存映射基准")
+    parser.add_argument("--count", type=int, default=100000, help="向量数量")
+    parser.add_argument("--dim", type=int, default=1536, help="向量维度（text-embedding-v2为1536）")
+    parser.add_argument("--queries", type=int, default=100, help="查询数量")
+    parser.add_argument("-k", type=int, default=25, help="每次查询返回的结果数")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        index_path, queries_path, mmap, k = args.child
+        child_main(index_path, queries_path, mmap == "1", int(k))
+        return
+
+    import faiss
+    print(f"生成 {args.count} 个 {args.dim} 维向量...")
+    vectors, queries = build_dataset(args.count, args.dim, args.queries)
+    flat = faiss.IndexFlatL2(args.dim)
+    flat.add(vectors)
+    _, truth = flat.search(queries, args.k)
+
+    results = {"count": args.count, "dim": args.dim, "k": args.k, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        queries_path = os.path.join(tmp_dir, "queries.npy")
+        np.save(queries_path, queries)
+        for mode in vector_storage.STORAGE_MODES:
+            index_path = os.path.join(tmp_dir, f"{mode}.faiss")
+            vector_storage.write_index(flat, index_path, mode)
+            size_mb = os.path.getsize(index_path) / 1024 / 1024
+            for mmap in (False, True):
+                run = measure_load(index_path, queries_path, mmap, args.k)
+                run.update({
+                    "mode": mode,
+                    "mmap": mmap,
+                    "file_size_mb": size_mb,
+                    "recall": recall_at_k(run.pop("ids"), truth.tolist())
+                })
+                results["runs"].append(run)
+                print(f"{mode:<5} mmap={str(mmap):<5} 文件 {size_mb:8.1f}MB  加载 {run['load_ms']:9.2f}ms  "
+                      f"加载后RSS +{run['rss_after_load_mb']:7.1f}MB  搜索后RSS +{run['rss_after_search_mb']:7.1f}MB  "
+                      f"其中匿名内存 +{run['anon_after_search_mb'] or 0:7.1f}MB  搜索 {run['search_ms_per_query']:6.2f}ms/次  "
+                      f"召回率@{args.k} {run['recall']:.4f}")
+
+    print(f"结果已保存: {common.save_results('vector_storage', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""文本块存储：用SQLite按向量编号保存压缩的文本块和元数据，查询时只读取命中的文本块；同时记录文件和文本块的内容哈希用于去重"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Dict, List, Iterable
+
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+from dedup import chunk_hash, simhash_bands, to_signed64, from_signed64, hamming_distance, SIMHASH_MAX_DISTANCE
+
+CHUNK_STORE_FILE = "chunks.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    doc_id TEXT PRIMARY KEY,
+    vector_id INTEGER UNIQUE,
+    source TEXT,
+    content BLOB NOT NULL,
+    metadata TEXT NOT NULL,
+    chunk_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(source);
+CREATE TABLE IF NOT EXISTS files (
+    source TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    content_hash TEXT,
+    simhash INTEGER,
+    band0 INTEGER,
+    band1 INTEGER,
+    band2 INTEGER,
+    band3 INTEGER,
+    canonical TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files(content_hash);
+CREATE INDEX IF NOT EXISTS idx_files_canonical ON files(canonical);
+CREATE INDEX IF NOT EXISTS idx_files_band0 ON files(band0);
+CREATE INDEX IF NOT EXISTS idx_files_band1 ON files(band1);
+CREATE INDEX IF NOT EXISTS idx_files_band2 ON files(band2);
+CREATE INDEX IF NOT EXISTS idx_files_band3 ON files(band3);
+CREATE TABLE IF NOT EXISTS roots (
+    folder TEXT PRIMARY KEY,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+# 旧版本文本库缺少的列，可写打开时自动补齐
+_MIGRATIONS = [
+    ("chunks", "chunk_hash", "ALTER TABLE chunks ADD COLUMN chunk_hash TEXT"),
+]
+
+
+def _prefix_range(prefix: str):
+    """路径前缀对应的字符串区间，用于走索引的前缀查询"""
+    return prefix, prefix + "\U0010ffff"
+
+
+def _compress(text: str) -> bytes:
+    # 解析结果中单独的代理字符原样保存，读取时还原
+    return zlib.compress(text.encode("utf-8", "surrogatepass"), 6)
+
+
+def _decompress(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8", "surrogatepass")
+
+
+def _file_record(row) -> dict:
+    return {
+        "source": row[0],
+        "mtime": row[1],
+        "size": row[2],
+        "content_hash": row[3],
+        "simhash": from_signed64(row[4]) if row[4] is not None else None,
+        "canonical": row[5]
+    }
+
+
+class ChunkStore:
+    """SQLite文本块存储
+
+    只读模式用于搜索，打开几乎不耗时，也不会把文本读入内存；
+    可写模式下所有修改都在一个事务中进行，调用 commit() 后才对其他进程可见，
+    未提交就丢弃时自动回滚，与索引文件保持一致。
+    只读模式下可以用 begin_read()/end_read() 把多次查询放在同一个读事务中，读到同一个已提交的版本。
+    """
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        self.lock = threading.RLock()
+        if writable:
+            self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self._migrate()
+            self.conn.executescript(_SCHEMA)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks(chunk_hash)")
+            self.conn.execute("BEGIN")
+        else:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._load_tables()
+
+    def _load_tables(self):
+        # 只读打开旧版本文本库时没有文件表、根目录表和版本表
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.has_files_table = "files" in tables
+        self.has_roots_table = "roots" in tables
+        self.has_meta_table = "meta" in tables
+
+    def _migrate(self):
+        for table, column, sql in _MIGRATIONS:
+            columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+            if columns and column not in columns:
+                self.conn.execute(sql)
+
+    def _execute(self, sql: str, params: Iterable = ()):
+        with self.lock:
+            return self.conn.execute(sql, tuple(params))
+
+    def _query_one(self, sql: str, params: Iterable = ()):
+        with self.lock:
+            return self.conn.execute(sql, tuple(params)).fetchone()
+
+    def get_document(self, doc_id: str):
+        row = self._query_one("SELECT content, metadata FROM chunks WHERE doc_id = ?", (doc_id,))
+        if row is None:
+            return None
+        return Document(id=doc_id, page_content=_decompress(row[0]), metadata=json.loads(row[1]))
+
+    def get_doc_id(self, vector_id: int):
+        row = self._query_one("SELECT doc_id FROM chunks WHERE vector_id = ?", (int(vector_id),))
+        return row[0] if row else None
+
+    def vector_count(self) -> int:
+        return self._query_one("SELECT COUNT(vector_id) FROM chunks")[0]
+
+    def iter_vector_ids(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT vector_id, doc_id FROM chunks WHERE vector_id IS NOT NULL ORDER BY vector_id").fetchall()
+        return iter(rows)
+
+    def sources(self, prefix: str = None) -> List[str]:
+        """所有有文本块的源文件，指定 prefix 时只返回该路径前缀下的文件"""
+        with self.lock:
+            if prefix is None:
+                rows = self.conn.execute("SELECT DISTINCT source FROM chunks WHERE source IS NOT NULL")
+            else:
+                rows = self.conn.execute("SELECT DISTINCT source FROM chunks WHERE source >= ? AND source < ?",
+                                         _prefix_range(prefix))
+            return [row[0] for row in rows]
+
+    def sample_contents(self, prefix: str, limit: int) -> List[str]:
+        """路径前缀下均匀抽取的最多 limit 个文本块内容"""
+        with self.lock:
+            total = self.conn.execute("SELECT COUNT(*) FROM chunks WHERE source >= ? AND source < ?",
+                                      _prefix_range(prefix)).fetchone()[0]
+            step = max(1, total // max(1, limit))
+            rows = self.conn.execute(
+                "SELECT content FROM chunks WHERE source >= ? AND source < ? AND rowid % ? = 0 LIMIT ?",
+                (*_prefix_range(prefix), step, limit)).fetchall()
+        return [_decompress(row[0]) for row in rows]
+
+    def vector_ids_for_prefix(self, prefix: str) -> List[int]:
+        """文件夹视图中的所有向量编号，包括视图内重复文件所对应的、位于视图外的代表文件的向量"""
+        with self.lock:
+            ids = {row[0] for row in self.conn.execute(
+                "SELECT vector_id FROM chunks WHERE source >= ? AND source < ? AND vector_id IS NOT NULL",
+                _prefix_range(prefix))}
+            if self.has_files_table:
+                ids.update(row[0] for row in self.conn.execute(
+                    "SELECT c.vector_id FROM files f JOIN chunks c ON c.source = f.canonical "
+                    "WHERE f.source >= ? AND f.source < ? AND f.canonical IS NOT NULL AND c.vector_id IS NOT NULL",
+                    _prefix_range(prefix)))
+        return sorted(ids)
+
+    def vector_ids_for_sources(self, sources: Iterable[str]) -> List[int]:
+        ids = []
+        with self.lock:
+            for source in sources:
+                ids.extend(row[0] for row in self.conn.execute(
+                    "SELECT vector_id FROM chunks WHERE source = ? AND vector_id IS NOT NULL", (source,)))
+        return sorted(ids)
+
+    def add_documents(self, docs: Dict[str, Document]):
+        rows = [(doc_id, doc.metadata.get("source"), _compress(doc.page_content),
+                 json.dumps(doc.metadata, ensure_ascii=False), chunk_hash(doc.page_content))
+                for doc_id, doc in docs.items()]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO chunks (doc_id, source, content, metadata, chunk_hash) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def vector_ids_for_chunk_hashes(self, hashes: Iterable[str]) -> Dict[str, int]:
+        """查找内容相同的已有文本块，返回 {文本块哈希: 向量编号}"""
+        found = {}
+        with self.lock:
+            for value in set(hashes):
+                row = self.conn.execute(
+                    "SELECT vector_id FROM chunks WHERE chunk_hash = ? AND vector_id IS NOT NULL LIMIT 1", (value,)).fetchone()
+                if row:
+                    found[value] = row[0]
+        return found
+
+    # ---------- 文件记录 ----------
+
+    def file_records(self, prefix: str = None) -> Dict[str, dict]:
+        """已记录文件的 {路径: 文件记录}，指定 prefix 时只返回该路径前缀下的文件"""
+        if not self.has_files_table:
+            return {}
+        sql = "SELECT source, mtime, size, content_hash, simhash, canonical FROM files"
+        with self.lock:
+            if prefix is None:
+                rows = self.conn.execute(sql).fetchall()
+            else:
+                rows = self.conn.execute(f"{sql} WHERE source >= ? AND source < ?", _prefix_range(prefix)).fetchall()
+        return {row[0]: _file_record(row) for row in rows}
+
+    def file_record(self, source: str):
+        """单个文件的记录，没有记录时返回None；逐个文件查询，不必把整个文件夹的记录读入内存"""
+        if not self.has_files_table:
+            return None
+        row = self._query_one("SELECT source, mtime, size, content_hash, simhash, canonical FROM files WHERE source = ?",
+                              (source,))
+        return _file_record(row) if row else None
+
+    def has_source(self, source: str) -> bool:
+        """该文件是否有文本块"""
+        return self._query_one("SELECT 1 FROM chunks WHERE source = ? LIMIT 1", (source,)) is not None
+
+    def upsert_file(self, source: str, mtime: float, size: int, content_hash: str,
+                    simhash_value=None, canonical: str = None):
+        """记录文件，canonical 不为空表示该文件与 canonical 内容相同或近似，自身没有单独的文本块"""
+        bands = simhash_bands(simhash_value) if simhash_value is not None and canonical is None else [None] * 4
+        signed = to_signed64(simhash_value) if simhash_value is not None else None
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (source, mtime, size, content_hash, simhash, band0, band1, band2, band3, canonical) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, mtime, size, content_hash, signed, *bands, canonical))
+
+    def delete_files(self, sources: Iterable[str]):
+        with self.lock:
+            self.conn.executemany("DELETE FROM files WHERE source = ?", [(source,) for source in sources])
+
+    def find_by_content_hash(self, content_hash: str, exclude_source: str = None):
+        """查找内容完全相同、且自身有文本块的已索引文件"""
+        row = self._query_one(
+            "SELECT source FROM files WHERE content_hash = ? AND canonical IS NULL AND source != ? LIMIT 1",
+            (content_hash, exclude_source or ""))
+        return row[0] if row else None
+
+    def find_near_duplicate(self, simhash_value: int, exclude_source: str = None):
+        """按SimHash分段找候选，再用汉明距离确认近似重复的已索引文件"""
+        bands = simhash_bands(simhash_value)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT source, simhash FROM files WHERE canonical IS NULL AND source != ? AND "
+                "(band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?)",
+                (exclude_source or "", *bands)).fetchall()
+        best = None
+        for source, signed in rows:
+            distance = hamming_distance(simhash_value, from_signed64(signed))
+            if distance <= SIMHASH_MAX_DISTANCE and (best is None or distance < best[1]):
+                best = (source, distance)
+        return best[0] if best else None
+
+    def aliases_of(self, sources: Iterable[str]) -> Dict[str, List[str]]:
+        """获取以这些文件为代表的重复文件路径"""
+        aliases = {}
+        if not self.has_files_table:
+            return aliases
+        with self.lock:
+            for source in set(sources):
+                rows = self.conn.execute("SELECT source FROM files WHERE canonical = ? ORDER BY source", (source,)).fetchall()
+                if rows:
+                    aliases[source] = [row[0] for row in rows]
+        return aliases
+
+    def detach_aliases(self, source: str) -> List[str]:
+        """代表文件被删除后，解除其重复文件的关联并返回它们，以便重新索引"""
+        aliases = self.aliases_of([source]).get(source, [])
+        if aliases:
+            self.delete_files(aliases)
+        return aliases
+
+    # ---------- 已索引的根目录（文件夹视图） ----------
+
+    def roots(self) -> List[str]:
+        if not self.has_roots_table:
+            return []
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT folder FROM roots ORDER BY folder")]
+
+    def add_root(self, folder: str):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO roots (folder, indexed_at) VALUES (?, ?)", (folder, time.time()))
+
+    def covering_root(self, folder: str):
+        """返回包含该文件夹的已索引根目录（自身或上级目录），没有时返回None"""
+        for root in self.roots():
+            if folder == root or folder.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def assign_vector_ids(self, mapping: Dict[int, str]):
+        with self.lock:
+            self.conn.executemany("UPDATE chunks SET vector_id = ? WHERE doc_id = ?",
+                                  [(int(vector_id), doc_id) for vector_id, doc_id in mapping.items()])
+
+    def delete_doc_ids(self, doc_ids: Iterable[str]):
+        with self.lock:
+            self.conn.executemany("DELETE FROM chunks WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+
+    def remove_vector_ids(self, removed_ids: List[int]):
+        """删除向量对应的文本块，并把其余向量编号前移，与faiss remove_ids 后的连续编号保持一致"""
+        removed_ids = sorted(int(vector_id) for vector_id in removed_ids)
+        if not removed_ids:
+            return
+        with self.lock:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS removed_ids (vector_id INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM removed_ids")
+            self.conn.executemany("INSERT INTO removed_ids VALUES (?)", [(vector_id,) for vector_id in removed_ids])
+            self.conn.execute("DELETE FROM chunks WHERE vector_id IN (SELECT vector_id FROM removed_ids)")
+            # 先写成负数再取反，避免更新过程中违反唯一约束
+            self.conn.execute(
+                "UPDATE chunks SET vector_id = -1 - (vector_id - "
+                "(SELECT COUNT(*) FROM removed_ids r WHERE r.vector_id < chunks.vector_id)) "
+                "WHERE vector_id > ?", (removed_ids[0],))
+            self.conn.execute("UPDATE chunks SET vector_id = -1 - vector_id WHERE vector_id < 0")
+            self.conn.execute("DELETE FROM removed_ids")
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM chunks")
+
+    # ---------- 索引版本 ----------
+
+    def index_version(self) -> int:
+        """已提交的索引文件版本号，旧版本文本库没有版本表时为0"""
+        if not self.has_meta_table:
+            return 0
+        row = self._query_one("SELECT value FROM meta WHERE key = 'index_version'")
+        return row[0] if row else 0
+
+    def set_index_version(self, version: int):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('index_version', ?)", (version,))
+
+    def begin_read(self):
+        """只读连接开始读事务，到 end_read() 为止的查询都读同一个快照（WAL模式下不阻塞写入）"""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            # 长期打开的连接在此期间可能被新版本程序补上了表
+            self._load_tables()
+
+    def end_read(self):
+        with self.lock:
+            if self.conn.in_transaction:
+                self.conn.execute("COMMIT")
+
+    def commit(self):
+        """提交当前事务并开始新事务"""
+        with self.lock:
+            self.conn.execute("COMMIT")
+            self.conn.execute("BEGIN")
+
+    def close(self):
+        with self.lock:
+            if self.writable and self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            self.conn.close()
+
+
+class ChunkDocstore(Docstore, AddableMixin):
+    """LangChain docstore 接口适配，按需从ChunkStore读取单个文本块"""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def search(self, search: str):
+        doc = self.store.get_document(search)
+        return doc if doc is not None else f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        self.store.add_documents(texts)
+
+    def delete(self, ids: List) -> None:
+        self.store.delete_doc_ids(ids)
+
+
+class ChunkIdMap(Mapping):
+    """向量编号到文本块ID的只读映射，按需查询，不在加载时读取全部映射
+
+    只支持 FAISS.add_embeddings 追加新向量时调用的 update；删除向量用 ChunkStore.remove_vector_ids，
+    它会和faiss一样把其余向量编号前移。
+    """
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def __getitem__(self, vector_id):
+        doc_id = self.store.get_doc_id(vector_id)
+        if doc_id is None:
+            raise KeyError(vector_id)
+        return doc_id
+
+    def update(self, other=(), **kwargs):
+        self.store.assign_vector_ids(dict(other, **kwargs))
+
+    def __iter__(self):
+        return (vector_id for vector_id, _ in self.store.iter_vector_ids())
+
+    def items(self):
+        return self.store.iter_vector_ids()
+
+    def __len__(self):
+        return self.store.vector_count()
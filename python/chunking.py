@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""文本分块引擎：按嵌入模型的真实Token预算，沿段落/句子边界打包文本块"""
+
+import os
+import re
+import math
+import logging
+import threading
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from metrics import CHUNKS_CREATED, CHUNKS_PER_DOCUMENT
+
+logger = logging.getLogger(__name__)
+
+# 本地模型目录由 Electron 通过这个环境变量传入（打包后 python 目录被复制到应用数据目录，与模型不在一起）
+MODELS_DIR_ENV = "FINDME_MODELS_DIR"
+# 直接从源码运行时使用的模型目录（与 src/main.py 使用的模型一致）
+SOURCE_MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "models")
+
+
+def resolve_models_dir() -> str:
+    """本地模型目录：优先使用环境变量指定的目录，否则使用源码中的 src/models；目录不存在时记录警告"""
+    configured = os.environ.get(MODELS_DIR_ENV)
+    if configured:
+        if os.path.isdir(configured):
+            return configured
+        logger.warning(f"{MODELS_DIR_ENV} 指定的模型目录不存在: {configured}，改用 {SOURCE_MODELS_DIR}")
+    if not os.path.isdir(SOURCE_MODELS_DIR):
+        logger.warning(f"本地模型目录不存在: {SOURCE_MODELS_DIR}（可通过 {MODELS_DIR_ENV} 指定），"
+                       f"本地模型的Token数改为估算，本地嵌入不可用")
+    return SOURCE_MODELS_DIR
+
+
+LOCAL_MODELS_DIR = resolve_models_dir()
+
+# 本地模型的分词器和序列长度限制
+LOCAL_MODELS = {
+    "all-MiniLM-L6-v2": {
+        "tokenizer": os.path.join(LOCAL_MODELS_DIR, "all-MiniLM-L6-v2", "tokenizer.json"),
+        "max_tokens": 256  # sentence-transformers 训练时的最大序列长度，超出部分会被模型截断
+    }
+}
+
+# 通义千问Token估算参数（偏保守的上界估计，宁可多算也不能超过模型限制）
+# 中文字符和全角标点按每字1个Token计算，英文和数字按每3.5个字符1个Token计算，其他符号每个1个Token
+DASHSCOPE_CJK_TOKENS_PER_CHAR = 1.0
+DASHSCOPE_ASCII_CHARS_PER_TOKEN = 3.5
+# 估算误差的安全余量，打包时只使用模型限制的95%
+DASHSCOPE_BUDGET_RATIO = 0.95
+
+_CJK_CLASS = r"\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef"
+_CJK_PATTERN = re.compile(f"[{_CJK_CLASS}]")
+_ASCII_WORD_PATTERN = re.compile(r"[A-Za-z0-9]+")
+_SYMBOL_PATTERN = re.compile(rf"[^\sA-Za-z0-9{_CJK_CLASS}]")
+
+# 段落边界：空行
+_PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+# 句子边界：中英文句末标点或换行之后（零宽切分，保留原文所有字符）
+_SENTENCE_PATTERN = re.compile(r"(?<=[。！？；!?;\n])|(?<=\.)(?=\s)")
+
+
+class DashScopeTokenEstimator:
+    """通义千问模型的Token估算器，不依赖分词器，按字符类别计数"""
+    # 每次调用额外占用的Token数
+    overhead = 0
+
+    def count(self, text: str) -> int:
+        cjk_count = len(_CJK_PATTERN.findall(text))
+        ascii_tokens = sum(math.ceil(len(word) / DASHSCOPE_ASCII_CHARS_PER_TOKEN)
+                           for word in _ASCII_WORD_PATTERN.findall(text))
+        symbol_count = len(_SYMBOL_PATTERN.findall(text))
+        return int(math.ceil(cjk_count * DASHSCOPE_CJK_TOKENS_PER_CHAR)) + ascii_tokens + symbol_count
+
+
+class HFTokenizerCounter:
+    """使用 tokenizer.json 的真实分词器计数（需要 tokenizers 库）"""
+    # [CLS] 和 [SEP]
+    overhead = 2
+
+    def __init__(self, tokenizer_path: str):
+        from tokenizers import Tokenizer
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        # 计数时不截断、不填充
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+_counter_cache = {}
+_counter_lock = threading.Lock()
+
+def get_token_counter(model_name: str):
+    """根据模型名称获取Token计数器，本地模型使用真实分词器，通义千问模型使用估算器"""
+    with _counter_lock:
+        if model_name in _counter_cache:
+            return _counter_cache[model_name]
+
+        counter = None
+        if model_name in LOCAL_MODELS:
+            tokenizer_path = LOCAL_MODELS[model_name]["tokenizer"]
+            try:
+                counter = HFTokenizerCounter(tokenizer_path)
+                logger.info(f"已加载分词器: {tokenizer_path}")
+            except ImportError:
+                logger.warning("tokenizers库未安装，使用估算方式计算Token数")
+            except Exception as e:
+                logger.warning(f"加载分词器失败: {str(e)}，使用估算方式计算Token数")
+        if counter is None:
+            counter = DashScopeTokenEstimator()
+
+        _counter_cache[model_name] = counter
+        return counter
+
+
+def get_chunk_token_budget(model_name: str, max_tokens: int) -> int:
+    """获取每个文本块可用的Token预算"""
+    if model_name in LOCAL_MODELS:
+        return min(max_tokens, LOCAL_MODELS[model_name]["max_tokens"])
+    return int(max_tokens * DASHSCOPE_BUDGET_RATIO)
+
+
+class TokenTextChunker:
+    """按Token预算切分文本：优先在段落边界切分，其次是句子边界，最后才按Token硬切，不丢弃任何内容"""
+
+    def __init__(self, counter, max_tokens: int, overlap_tokens: int = 0):
+        self.counter = counter
+        # 扣除特殊Token后的可用预算
+        self.max_tokens = max(1, max_tokens - counter.overhead)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 4))
+
+    def count_tokens(self, text: str) -> int:
+        return self.counter.count(text) + self.counter.overhead
+
+    def _hard_split(self, text: str) -> List[str]:
+        """单个句子超过预算时，二分查找每段能容纳的最长前缀"""
+        pieces = []
+        while text:
+            if self.counter.count(text) <= self.max_tokens:
+                pieces.append(text)
+                break
+            low, high = 1, len(text)
+            while low < high:
+                mid = (low + high + 1) // 2
+                if self.counter.count(text[:mid]) <= self.max_tokens:
+                    low = mid
+                else:
+                    high = mid - 1
+            # 尽量在空白处切开，避免切断英文单词
+            cut = text.rfind(" ", 0, low)
+            if cut <= low // 2:
+                cut = low
+            pieces.append(text[:cut])
+            text = text[cut:]
+        return pieces
+
+    def _split_units(self, text: str) -> List[tuple]:
+        """把文本拆成不超过预算的单元，返回 (与前一单元的连接符, 文本, Token数)"""
+        units = []
+        for paragraph in _PARAGRAPH_PATTERN.split(text):
+            if not paragraph.strip():
+                continue
+            tokens = self.counter.count(paragraph)
+            if tokens <= self.max_tokens:
+                units.append(("\n\n", paragraph, tokens))
+                continue
+            # 段落超出预算时按句子拆分，句子之间直接拼接即可还原原文
+            separator = "\n\n"
+            for sentence in _SENTENCE_PATTERN.split(paragraph):
+                if not sentence:
+                    continue
+                tokens = self.counter.count(sentence)
+                pieces = [(sentence, tokens)] if tokens <= self.max_tokens else \
+                    [(piece, self.counter.count(piece)) for piece in self._hard_split(sentence)]
+                for piece, piece_tokens in pieces:
+                    units.append((separator, piece, piece_tokens))
+                    separator = ""
+        return units
+
+    def split_text(self, text: str) -> List[str]:
+        """把文本贪心打包成尽量接近预算的文本块"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        for unit in self._split_units(text):
+            unit_tokens = unit[2]
+            if current and current_tokens + unit_tokens > self.max_tokens:
+                chunks.append(self._join(current))
+                # 从上一个块尾部带入重叠内容
+                overlap = []
+                overlap_tokens = 0
+                for item in reversed(current):
+                    if overlap_tokens + item[2] > self.overlap_tokens:
+                        break
+                    overlap.insert(0, item)
+                    overlap_tokens += item[2]
+                if overlap_tokens + unit_tokens > self.max_tokens:
+                    overlap, overlap_tokens = [], 0
+                current = overlap
+                current_tokens = overlap_tokens
+            current.append(unit)
+            current_tokens += unit_tokens
+        if current:
+            chunks.append(self._join(current))
+        return [chunk for chunk in chunks if chunk]
+
+    @staticmethod
+    def _join(units) -> str:
+        parts = []
+        for i, (separator, unit_text, _) in enumerate(units):
+            if i > 0:
+                parts.append(separator)
+            parts.append(unit_text)
+        return "".join(parts).strip()
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        split_docs = []
+        for doc in documents:
+            chunks = self.split_text(doc.page_content)
+            CHUNKS_PER_DOCUMENT.observe(len(chunks))
+            for chunk in chunks:
+                split_docs.append(Document(page_content=chunk, metadata=dict(doc.metadata)))
+        CHUNKS_CREATED.inc(len(split_docs))
+        return split_docs
+
+
+def create_chunker(model_name: str, max_tokens: int, overlap_tokens: Optional[int] = None) -> TokenTextChunker:
+    """为指定的嵌入模型创建分块器，默认重叠为预算的十分之一"""
+    budget = get_chunk_token_budget(model_name, max_tokens)
+    if overlap_tokens is None:
+        overlap_tokens = budget // 10
+    return TokenTextChunker(get_token_counter(model_name), budget, overlap_tokens)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""内容去重：文件内容哈希、文本块哈希，以及用于识别近似重复文件的SimHash"""
+
+import os
+import re
+import hashlib
+import threading
+
+import numpy as np
+
+# 近似重复判定阈值：SimHash汉明距离不超过该值视为同一文件的不同版本
+SIMHASH_MAX_DISTANCE = 3
+# SimHash分成4段，每段16位；距离不超过3时至少有一段完全相同，可用于快速找候选
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = 16
+# 短文本的SimHash不可靠，低于该长度不做近似去重
+SIMHASH_MIN_TEXT_LENGTH = 200
+
+_READ_BLOCK_SIZE = 1024 * 1024
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+# load_document 在每个文档开头添加的文件名行，比较内容时需要去掉
+_FILE_HEADER_PATTERN = re.compile(r"^文件: [^\n]*\n\n")
+# 单独出现的UTF-16代理字符（PDF解析结果中常见），无法按严格的UTF-8编码
+_SURROGATE_PATTERN = re.compile("[\ud800-\udfff]")
+
+
+def file_content_hash(file_path: str) -> str:
+    """按块读取计算文件内容哈希，不把整个文件读入内存"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_READ_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    """文本块哈希，相同内容的文本块可以直接复用已有向量"""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def strip_file_header(text: str) -> str:
+    """去掉 load_document 添加的文件名行"""
+    return _FILE_HEADER_PATTERN.sub("", text, count=1)
+
+
+def remove_surrogates(text: str) -> str:
+    """把单独的代理字符替换为U+FFFD，之后的哈希、存储和嵌入请求都可以正常编码"""
+    return _SURROGATE_PATTERN.sub("\ufffd", text)
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """基于字符n-gram的64位SimHash，对中英文都适用；文本过短时返回None"""
+    text = _WHITESPACE_PATTERN.sub(" ", strip_file_header(text)).strip().lower()
+    if len(text) < SIMHASH_MIN_TEXT_LENGTH:
+        return None
+    shingles = {}
+    for i in range(len(text) - shingle_size + 1):
+        shingle = text[i:i + shingle_size]
+        shingles[shingle] = shingles.get(shingle, 0) + 1
+    # 向量化统计每一位的加权票数
+    hashes = np.array([int.from_bytes(hashlib.blake2b(shingle.encode("utf-8", "surrogatepass"), digest_size=8).digest(),
+                                      "little")
+                       for shingle in shingles], dtype=np.uint64)
+    counts = np.fromiter(shingles.values(), dtype=np.int64, count=len(shingles))
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    weights = counts @ (bits.astype(np.int64) * 2 - 1)
+    result = 0
+    for bit in np.nonzero(weights > 0)[0]:
+        result |= 1 << int(bit)
+    return result
+
+
+def simhash_bands(value: int):
+    """把SimHash拆成若干段，用于在数据库中按段精确匹配候选"""
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [(value >> (i * SIMHASH_BAND_BITS)) & mask for i in range(SIMHASH_BANDS)]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed64(value: int) -> int:
+    """SQLite整数是有符号64位，存储前转换"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class DuplicateDetector:
+    """索引过程中的重复文件判断
+
+    同时查询本轮已处理的文件（内存中）和向量库中已记录的文件（ChunkStore），
+    只有自身保存了文本块的代表文件才会被当作重复的目标。
+    文件记录写入向量库后调用 forget 移出内存，内存中只保留尚未写入的文件，不随文件总数增长。
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.content_hashes = {}
+        self.band_index = {}
+        self.lock = threading.Lock()
+
+    def find_exact(self, content_hash: str, source: str):
+        with self.lock:
+            canonical = self.content_hashes.get(content_hash)
+        if canonical is None and self.store is not None:
+            canonical = self.store.find_by_content_hash(content_hash, exclude_source=source)
+        if canonical and canonical != source and os.path.exists(canonical):
+            return canonical
+        return None
+
+    def find_near(self, simhash_value: int, source: str):
+        best = None
+        with self.lock:
+            for i, band in enumerate(simhash_bands(simhash_value)):
+                for candidate, candidate_hash in self.band_index.get((i, band), []):
+                    distance = hamming_distance(simhash_value, candidate_hash)
+                    if candidate != source and distance <= SIMHASH_MAX_DISTANCE and (best is None or distance < best[1]):
+                        best = (candidate, distance)
+        if best is not None:
+            return best[0]
+        if self.store is not None:
+            canonical = self.store.find_near_duplicate(simhash_value, exclude_source=source)
+            if canonical and os.path.exists(canonical):
+                return canonical
+        return None
+
+    def add(self, source: str, content_hash: str, simhash_value=None):
+        """登记一个保存了文本块的代表文件"""
+        with self.lock:
+            self.content_hashes[content_hash] = source
+            if simhash_value is not None:
+                for i, band in enumerate(simhash_bands(simhash_value)):
+                    self.band_index.setdefault((i, band), []).append((source, simhash_value))
+
+    def forget(self, records):
+        """文件记录已写入向量库，之后通过 ChunkStore 查找，不再保留在内存中"""
+        with self.lock:
+            for record in records:
+                if self.content_hashes.get(record["content_hash"]) == record["source"]:
+                    del self.content_hashes[record["content_hash"]]
+                if record.get("simhash") is None:
+                    continue
+                for i, band in enumerate(simhash_bands(record["simhash"])):
+                    entries = self.band_index.get((i, band))
+                    if entries is None:
+                        continue
+                    entries[:] = [entry for entry in entries if entry[0] != record["source"]]
+                    if not entries:
+                        del self.band_index[(i, band)]
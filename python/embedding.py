@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""嵌入批处理：按行数和Token总数打包批次，限流时指数退避重试，最终失败的文本块进入死信队列"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from typing import List, Tuple, Optional
+
+from langchain_core.documents import Document
+
+from metrics import EMBEDDING_REQUEST_SECONDS, EMBEDDING_BATCH_SIZE, EMBEDDING_RETRIES, EMBEDDING_FAILED_TEXTS
+
+logger = logging.getLogger(__name__)
+
+# 死信队列文件名，保存在每个文件夹的向量数据库目录中
+DEAD_LETTER_FILE = "dead_letter.json"
+
+# 这些HTTP状态码表示限流或服务端临时错误，可以退避后重试
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# 没有状态码时按错误信息中的限流错误码判断（如 DashScope 的 Throttling.RateQuota），区分大小写，不匹配普通单词
+THROTTLING_ERROR_CODES = ("Throttling", "RateLimitExceeded", "TooManyRequests")
+
+
+def _status_code(error: Exception):
+    """错误携带的HTTP状态码：错误本身的 status_code，或 HTTP 库错误中响应的状态码"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """判断错误是否是限流或网络类的临时错误：按异常类型和状态码判断，只有明确的限流错误码才按错误信息判断"""
+    # 嵌入客户端抛出的错误已经标明是否可重试
+    if getattr(error, "retryable", None) is not None:
+        return error.retryable
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status_code = _status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    message = str(error)
+    return any(code in message for code in THROTTLING_ERROR_CODES)
+
+
+class EmbeddingBatcher:
+    """嵌入批处理器
+
+    - 批次同时受行数（MAX_BATCH_ROWS）和Token总数限制
+    - 限流等临时错误按指数退避加随机抖动重试
+    - 其他错误把批次一分为二继续尝试，定位出无法嵌入的单个文本块
+    - 最终仍失败的文本块作为失败结果返回，由调用方放入死信队列
+    """
+
+    def __init__(self, embedding_model, token_counter, max_rows: int, max_tokens: int,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.embedding_model = embedding_model
+        self.token_counter = token_counter
+        self.max_rows = max(1, max_rows)
+        self.max_tokens = max(1, max_tokens)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def iter_batches(self, docs: List[Document]):
+        """按行数和Token总数把文本块打包成批次"""
+        batch = []
+        batch_tokens = 0
+        for doc in docs:
+            tokens = self.token_counter.count(doc.page_content)
+            if batch and (len(batch) >= self.max_rows or batch_tokens + tokens > self.max_tokens):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(doc)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _backoff_delay(self, attempt: int) -> float:
+        """指数退避加全抖动"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _embed_with_backoff(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
+        while True:
+            start = time.perf_counter()
+            try:
+                vectors = self.embedding_model.embed_documents(texts)
+                EMBEDDING_REQUEST_SECONDS.observe(time.perf_counter() - start, outcome="success")
+                return vectors
+            except Exception as e:
+                retryable = is_retryable_error(e)
+                EMBEDDING_REQUEST_SECONDS.observe(time.perf_counter() - start, outcome="retryable" if retryable else "error")
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                EMBEDDING_RETRIES.inc()
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                logger.warning(f"嵌入请求被限流或临时失败，{delay:.1f}秒后第 {attempt} 次重试: {str(e)}")
+                time.sleep(delay)
+
+    def embed_batch(self, batch: List[Document]) -> Tuple[List[Tuple[Document, List[float]]], List[Tuple[Document, str]]]:
+        """嵌入一个批次，返回 (成功的(文本块, 向量)列表, 失败的(文本块, 错误信息)列表)"""
+        try:
+            vectors = self._embed_with_backoff([doc.page_content for doc in batch])
+            return list(zip(batch, vectors)), []
+        except Exception as e:
+            # 重试用尽的临时错误不再拆分，整批进入死信队列等待后台重试
+            if len(batch) == 1 or is_retryable_error(e):
+                logger.error(f"{len(batch)} 个文本块嵌入失败: {str(e)}")
+                EMBEDDING_FAILED_TEXTS.inc(len(batch))
+                return [], [(doc, str(e)) for doc in batch]
+            middle = len(batch) // 2
+            logger.warning(f"批量嵌入出错，拆分为 {middle} + {len(batch) - middle} 个文本块重试: {str(e)}")
+            left_ok, left_failed = self.embed_batch(batch[:middle])
+            right_ok, right_failed = self.embed_batch(batch[middle:])
+            return left_ok + right_ok, left_failed + right_failed
+
+    def embed_documents(self, docs: List[Document]):
+        """嵌入所有文本块，逐批产出 (成功列表, 失败列表)，便于调用方边嵌入边写入"""
+        for batch in self.iter_batches(docs):
+            yield self.embed_batch(batch)
+
+
+class DeadLetterQueue:
+    """持久化的死信队列，记录嵌入最终失败的文本块，供后台任务稍后重试"""
+
+    def __init__(self, db_path: str, folder: str):
+        self.path = os.path.join(db_path, DEAD_LETTER_FILE)
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.entries = {entry["id"]: entry for entry in data.get("entries", [])}
+        except Exception as e:
+            logger.error(f"读取死信队列失败 {self.path}: {str(e)}")
+
+    def _save(self):
+        if not self.entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"folder": self.folder, "entries": list(self.entries.values())}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    @staticmethod
+    def entry_id(doc: Document) -> str:
+        key = f"{doc.metadata.get('source', '')}\n{doc.page_content}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def add(self, failures: List[Tuple[Document, str]]):
+        """加入失败的文本块，同一文本块再次失败时累加尝试次数"""
+        if not failures:
+            return
+        now = time.time()
+        with self.lock:
+            for doc, error in failures:
+                entry_id = self.entry_id(doc)
+                entry = self.entries.get(entry_id)
+                if entry is None:
+                    entry = {
+                        "id": entry_id,
+                        "content": doc.page_content,
+                        "metadata": doc.metadata,
+                        "attempts": 0,
+                        "first_failed": now
+                    }
+                    self.entries[entry_id] = entry
+                entry["attempts"] += 1
+                entry["error"] = error
+                entry["last_attempt"] = now
+            self._save()
+
+    def merge(self, other: "DeadLetterQueue"):
+        """并入另一个队列中的记录（合并旧版文件夹索引时使用），已有的记录保留"""
+        with self.lock:
+            for entry_id, entry in other.entries.items():
+                self.entries.setdefault(entry_id, entry)
+            self._save()
+
+    def remove(self, docs: List[Document]):
+        with self.lock:
+            for doc in docs:
+                self.entries.pop(self.entry_id(doc), None)
+            self._save()
+
+    def remove_sources(self, sources):
+        """文件被重新解析或删除后，丢弃该文件旧的失败记录"""
+        sources = set(sources)
+        with self.lock:
+            stale = [entry_id for entry_id, entry in self.entries.items()
+                     if entry["metadata"].get("source") in sources]
+            if not stale:
+                return
+            for entry_id in stale:
+                del self.entries[entry_id]
+            self._save()
+
+    def pending(self, max_attempts: Optional[int] = None) -> List[Document]:
+        """获取待重试的文本块，超过最大尝试次数的不再自动重试"""
+        with self.lock:
+            return [Document(page_content=entry["content"], metadata=entry["metadata"])
+                    for entry in self.entries.values()
+                    if max_attempts is None or entry["attempts"] < max_attempts]
+
+    def summary(self) -> dict:
+        with self.lock:
+            sources = {entry["metadata"].get("source", "") for entry in self.entries.values()}
+            return {
+                "folder": self.folder,
+                "count": len(self.entries),
+                "file_count": len(sources),
+                "last_error": max(self.entries.values(), key=lambda entry: entry["last_attempt"])["error"] if self.entries else None
+            }
+
+    def __len__(self):
+        return len(self.entries)
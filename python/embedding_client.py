@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""DashScope嵌入HTTP客户端：进程内共享一个带连接池的 httpx 客户端，搜索、索引和文件监控复用同一组长连接
+
+每次嵌入请求不再重新建立TCP连接和TLS握手；安装了 h2 时使用HTTP/2，在一个连接上并发多个请求。
+同时提供同步和异步接口，异步接口不占用线程。
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import List, Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+from embedding import RETRYABLE_STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/api/v1"
+EMBEDDING_PATH = "/services/embeddings/text-embedding/text-embedding"
+MAX_TEXTS_PER_REQUEST = 25  # 通义千问一次调用支持的最大行数
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class DashScopeError(Exception):
+    """嵌入接口返回的错误；retryable 表示限流、超时或连接类的临时错误"""
+
+    def __init__(self, message: str, status_code: int = None, code: str = None, retryable: bool = False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.retryable = retryable
+
+
+class DashScopeClient:
+    """共享的嵌入HTTP客户端，线程安全；异步客户端按事件循环创建"""
+
+    def __init__(self, api_key: str, base_url: str = DASHSCOPE_BASE_URL, max_connections: int = 10,
+                 max_keepalive_connections: int = 5, keepalive_expiry: float = 60.0,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0, http2: bool = True, verify=True):
+        self.base_url = base_url.rstrip("/")
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.verify = verify
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        self.client = httpx.Client(base_url=self.base_url, headers=self.headers, limits=self.limits,
+                                   timeout=self.timeout, http2=self.http2, verify=verify)
+        self._async_client = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+        if http2 and not HTTP2_AVAILABLE:
+            logger.info("未安装h2，嵌入请求使用HTTP/1.1长连接")
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        # 异步客户端的连接绑定在创建它的事件循环上，事件循环变化时重新创建
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async_client is None or self._async_loop is not loop:
+                self._async_client = httpx.AsyncClient(base_url=self.base_url, headers=self.headers,
+                                                       limits=self.limits, timeout=self.timeout,
+                                                       http2=self.http2, verify=self.verify)
+                self._async_loop = loop
+            return self._async_client
+
+    @staticmethod
+    def _payload(model: str, texts: List[str], text_type: str) -> dict:
+        return {"model": model, "input": {"texts": texts}, "parameters": {"text_type": text_type}}
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> List[List[float]]:
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code != 200:
+            code = data.get("code")
+            message = data.get("message") or response.text[:200]
+            raise DashScopeError(f"嵌入请求失败 HTTP {response.status_code} {code}: {message}",
+                                 response.status_code, code, response.status_code in RETRYABLE_STATUS_CODES)
+        embeddings = sorted(data["output"]["embeddings"], key=lambda item: item["text_index"])
+        return [item["embedding"] for item in embeddings]
+
+    def embed(self, model: str, texts: List[str], text_type: str = "document") -> List[List[float]]:
+        try:
+            response = self.client.post(EMBEDDING_PATH, json=self._payload(model, texts, text_type))
+        except httpx.TransportError as e:
+            raise DashScopeError(f"连接嵌入服务失败: {type(e).__name__}: {e}", retryable=True) from e
+        return self._parse(response)
+
+    async def aembed(self, model: str, texts: List[str], text_type: str = "document") -> List[List[float]]:
+        try:
+            response = await self._get_async_client().post(EMBEDDING_PATH, json=self._payload(model, texts, text_type))
+        except httpx.TransportError as e:
+            raise DashScopeError(f"连接嵌入服务失败: {type(e).__name__}: {e}", retryable=True) from e
+        return self._parse(response)
+
+    async def awarm_up(self) -> int:
+        """预先建立异步客户端的连接（握手完成后留在连接池中），不发送嵌入请求；返回服务端的状态码"""
+        try:
+            response = await self._get_async_client().head(EMBEDDING_PATH)
+        except httpx.TransportError as e:
+            raise DashScopeError(f"连接嵌入服务失败: {type(e).__name__}: {e}", retryable=True) from e
+        return response.status_code
+
+    def close(self):
+        self.client.close()
+
+
+class DashScopeHttpEmbeddings(Embeddings):
+    """基于共享 DashScopeClient 的嵌入模型，接口与 langchain 的 DashScopeEmbeddings 相同
+
+    max_retries 是总尝试次数（与 DashScopeEmbeddings 一致），批量嵌入时传 1，由 EmbeddingBatcher 统一退避重试。
+    """
+
+    def __init__(self, client: DashScopeClient, model: str, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 10.0):
+        self.client = client
+        self.model = model
+        self.max_retries = max(1, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _embed(self, texts: List[str], text_type: str) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), MAX_TEXTS_PER_REQUEST):
+            batch = texts[start:start + MAX_TEXTS_PER_REQUEST]
+            for attempt in range(self.max_retries):
+                try:
+                    vectors.extend(self.client.embed(self.model, batch, text_type))
+                    break
+                except DashScopeError as e:
+                    if not e.retryable or attempt == self.max_retries - 1:
+                        raise
+                    time.sleep(self._delay(attempt))
+        return vectors
+
+    async def _aembed(self, texts: List[str], text_type: str) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), MAX_TEXTS_PER_REQUEST):
+            batch = texts[start:start + MAX_TEXTS_PER_REQUEST]
+            for attempt in range(self.max_retries):
+                try:
+                    vectors.extend(await self.client.aembed(self.model, batch, text_type))
+                    break
+                except DashScopeError as e:
+                    if not e.retryable or attempt == self.max_retries - 1:
+                        raise
+                    await asyncio.sleep(self._delay(attempt))
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed(texts, "document")
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._aembed([text], "query"))[0]
+
+
+_shared_client: Optional[DashScopeClient] = None
+_shared_client_key = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client(api_key: str, **options) -> DashScopeClient:
+    """返回进程内共享的客户端；API Key 或连接参数变化时重新创建"""
+    global _shared_client, _shared_client_key
+    key = (api_key, tuple(sorted(options.items())))
+    with _shared_client_lock:
+        if _shared_client is None or _shared_client_key != key:
+            # 旧客户端可能仍有请求在进行，不主动关闭，由垃圾回收释放连接
+            _shared_client = DashScopeClient(api_key, **options)
+            _shared_client_key = key
+        return _shared_client
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""有界线程池：路由中的阻塞操作（faiss检索、SQLite查询、删除目录、启动子进程等）放到专用线程池执行，事件循环不被阻塞
+
+每个线程池同时接受的任务数有上限（执行中 + 排队），超出时立即拒绝而不是无限排队；
+等待结果有超时，超时后请求立即返回，线程中的任务继续执行到结束并释放名额。
+传入 executor 时用它代替线程池（例如检索进程池），名额和超时的处理相同。
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    """线程池已满，拒绝新任务"""
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, max_workers: int, queue_size: int = 0, executor: Executor = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + queue_size
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.slots = threading.BoundedSemaphore(self.capacity)
+
+    def submit(self, func, *args, **kwargs):
+        """提交任务，线程池已满时抛出 ExecutorBusy"""
+        if not self.slots.acquire(blocking=False):
+            raise ExecutorBusy(f"{self.name} 线程池已满 ({self.capacity} 个任务)")
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    async def run(self, func, *args, timeout: float = None, **kwargs):
+        """在线程池中执行并等待结果；超时抛出 asyncio.TimeoutError
+
+        超时时仍在排队的任务被取消，已经开始执行的任务不会被中断。
+        """
+        concurrent_future = self.submit(func, *args, **kwargs)
+        future = asyncio.wrap_future(concurrent_future)
+        try:
+            # shield：超时只放弃等待，不把取消传给已在运行的任务
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            concurrent_future.cancel()
+            # 不再有人等待结果，避免任务出错时产生 "exception was never retrieved" 警告
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise asyncio.TimeoutError(f"{self.name} 操作超时（{timeout}秒）") from None
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""文件名索引：对已索引文件夹中所有文件的文件名和相对路径建立三字母组（trigram）倒排索引，支持子串和模糊查找
+
+不依赖嵌入和文本块，不支持解析的文件（图片、压缩包等）也能按名字找到。
+倒排表是 uint32 数组，查询时用 numpy 一次统计每个文件与查询共有的三字母组数；
+删除只做标记，标记过多时整体重建。
+"""
+
+import os
+import re
+import math
+import array
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# 没有空格、带扩展名或路径分隔符、或由下划线/连字符/数字拼成的查询更像文件名
+_EXTENSION = re.compile(r"\.[A-Za-z0-9]{1,5}$")
+_NAME_LIKE = re.compile(r"^[^\s]*([_\-.]|\d)[^\s]*$")
+# 被查询命中前最多按共有三字母组数检查的候选数（为 limit 的倍数）
+CANDIDATE_FACTOR = 20
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def looks_like_filename(query: str) -> bool:
+    """查询看起来像是在找某个文件名（而不是描述内容）"""
+    query = query.strip()
+    if not query or len(query) > 80:
+        return False
+    return bool(_EXTENSION.search(query) or "/" in query or "\\" in query or _NAME_LIKE.match(query))
+
+
+class FilenameIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = 0
+        self.scanning = 0  # 进行中的流式扫描数
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.docs: List[Optional[tuple]] = []    # 编号 -> (路径, 小写文件名, 小写相对路径)，已删除为 None
+            self.ids: Dict[str, int] = {}             # 路径 -> 编号
+            self.postings: Dict[str, array.array] = {}
+            self.dead = 0
+            self.loaded = False
+            # 清空后编号从头分配，进行中的扫描据此放弃删除旧文件
+            self.generation += 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _add(self, path: str, root: str):
+        name = os.path.basename(path).lower()
+        relpath = os.path.relpath(path, root).replace("\\", "/").lower() if root else path.lower()
+        doc_id = self.ids.get(path)
+        if doc_id is not None:
+            if self.docs[doc_id][2] == relpath:
+                return
+            self._remove(path)
+        doc_id = len(self.docs)
+        self.docs.append((path, name, relpath))
+        self.ids[path] = doc_id
+        # 文件名是相对路径的结尾，相对路径的三字母组已包含文件名的
+        for gram in trigrams(relpath):
+            postings = self.postings.get(gram)
+            if postings is None:
+                postings = self.postings[gram] = array.array("I")
+            postings.append(doc_id)
+
+    def _remove(self, path: str):
+        doc_id = self.ids.pop(path, None)
+        if doc_id is not None:
+            self.docs[doc_id] = None
+            self.dead += 1
+
+    def _compact(self):
+        # 删除标记超过存活文件数时重建倒排表，去掉已删除的编号；扫描进行中编号不能变化
+        if self.scanning or self.dead <= max(1000, len(self.ids)):
+            return
+        live = [doc for doc in self.docs if doc is not None]
+        self.docs, self.ids, self.postings, self.dead = [], {}, {}, 0
+        for path, _, relpath in live:
+            doc_id = len(self.docs)
+            self.docs.append((path, os.path.basename(path).lower(), relpath))
+            self.ids[path] = doc_id
+            for gram in trigrams(relpath):
+                self.postings.setdefault(gram, array.array("I")).append(doc_id)
+
+    def add(self, path: str, root: str):
+        with self.lock:
+            self._add(path, root)
+
+    def remove(self, path: str):
+        with self.lock:
+            self._remove(path)
+            self._compact()
+
+    def replace_root(self, root: str, paths: Iterable[str]):
+        """用一次完整扫描的结果替换根目录下的全部文件"""
+        prefix = root.rstrip(os.sep) + os.sep
+        paths = set(paths)
+        with self.lock:
+            for path in [path for path in self.ids if path.startswith(prefix) and path not in paths]:
+                self._remove(path)
+            for path in paths:
+                self._add(path, root)
+            self._compact()
+
+    def begin_scan(self, root: str) -> "RootScan":
+        """开始一次流式扫描：扫描到的文件逐个加入，finish 时删除根目录下本次没有扫描到的旧文件"""
+        return RootScan(self, root)
+
+    def search(self, query: str, limit: int = 10, folder: str = None, min_similarity: float = 0.5) -> List[dict]:
+        """按文件名和相对路径查找，返回 [{"path", "name", "similarity", "match"}]，按相似度降序
+
+        文件名包含查询串的排在最前，其次是相对路径包含查询串的，其余按共有三字母组的比例排序。
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        prefix = folder.rstrip(os.sep) + os.sep if folder else None
+        with self.lock:
+            if len(query) < 3:
+                # 太短没有三字母组，直接检查文件名
+                candidates = [doc_id for doc_id, doc in enumerate(self.docs) if doc is not None and query in doc[1]]
+                counts = None
+                grams = set()
+            else:
+                grams = trigrams(query)
+                arrays = [np.frombuffer(self.postings[gram], dtype=np.uint32) for gram in grams if gram in self.postings]
+                if not arrays:
+                    return []
+                counts = np.bincount(np.concatenate(arrays), minlength=len(self.docs))
+                need = max(1, math.ceil(len(grams) * min_similarity))
+                candidates = np.nonzero(counts >= need)[0]
+                # 按共有三字母组数从多到少检查
+                candidates = candidates[np.argsort(-counts[candidates], kind="stable")]
+            results = []
+            for doc_id in candidates:
+                doc = self.docs[doc_id]
+                if doc is None or (prefix and not doc[0].startswith(prefix)):
+                    continue
+                path, name, relpath = doc
+                if query in name:
+                    similarity, match = 1.0, "name"
+                elif query in relpath:
+                    similarity, match = 0.9, "path"
+                else:
+                    name_similarity = len(grams & trigrams(name)) / len(grams)
+                    similarity, match = max(name_similarity, 0.8 * counts[doc_id] / len(grams)), "fuzzy"
+                results.append({"path": path, "name": os.path.basename(path), "similarity": float(similarity),
+                                "match": match})
+                if len(results) >= limit * CANDIDATE_FACTOR:
+                    break
+        # 相似度相同时文件名短的更接近查询
+        results.sort(key=lambda result: (-result["similarity"], len(result["name"])))
+        return results[:limit]
+
+
+class RootScan:
+    """根目录的一次流式扫描，不需要先收集完整的文件列表
+
+    扫描开始时已有的每个编号用一个字节标记是否再次出现，之后新加入的文件编号更大，不需要标记。
+    """
+
+    def __init__(self, index: FilenameIndex, root: str):
+        self.index = index
+        self.root = root
+        self.finished = False
+        with index.lock:
+            index.scanning += 1
+            self.generation = index.generation
+            self.seen = bytearray(len(index.docs))
+
+    def add(self, path: str):
+        index = self.index
+        with index.lock:
+            index._add(path, self.root)
+            doc_id = index.ids[path]
+            if doc_id < len(self.seen):
+                self.seen[doc_id] = 1
+
+    def finish(self, remove_missing: bool = True):
+        """结束扫描；扫描没有完整走完时传 remove_missing=False，保留没有扫描到的旧文件"""
+        if self.finished:
+            return
+        self.finished = True
+        index = self.index
+        prefix = self.root.rstrip(os.sep) + os.sep
+        with index.lock:
+            index.scanning -= 1
+            if remove_missing and index.generation == self.generation:
+                stale = [path for path, doc_id in index.ids.items()
+                         if doc_id < len(self.seen) and not self.seen[doc_id] and path.startswith(prefix)]
+                for path in stale:
+                    index._remove(path)
+            index._compact()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""本地嵌入：用 ONNX Runtime 在CPU上运行 src/models 中的 all-MiniLM-L6-v2，默认使用 int8 动态量化模型
+
+第一次使用时由 fp32 模型（src/models/all-MiniLM-L6-v2.onnx）生成量化模型并保存在旁边，之后直接加载。
+文本先整体分词，按Token数排序后分桶成批，每批只填充到本批最长的长度，短文本不再陪长文本做无效计算；
+推理线程数（intra_op_num_threads）可调，默认使用全部CPU。
+依赖 onnxruntime 和 tokenizers，生成量化模型还需要 onnx；都在第一次嵌入时才导入，缺少时嵌入抛出 RuntimeError。
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from chunking import LOCAL_MODELS, LOCAL_MODELS_DIR
+from metrics import LOCAL_EMBEDDING_SECONDS, LOCAL_EMBEDDING_TEXTS
+from profiling import lazy_import
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_NAME = "all-MiniLM-L6-v2"
+# README 约定的 fp32 模型文件名，量化模型保存为同名的 .int8.onnx
+FP32_MODEL_PATH = os.path.join(LOCAL_MODELS_DIR, f"{LOCAL_MODEL_NAME}.onnx")
+INT8_MODEL_PATH = os.path.join(LOCAL_MODELS_DIR, f"{LOCAL_MODEL_NAME}.int8.onnx")
+LOCAL_EMBEDDING_DIM = 384
+
+
+def quantize_model(fp32_path: str = FP32_MODEL_PATH, int8_path: str = INT8_MODEL_PATH) -> str:
+    """对 fp32 模型做 int8 动态量化（权重量化为int8，激活在推理时按批量化），返回量化模型路径"""
+    from onnxruntime.quantization import quantize_dynamic, quant_pre_process, QuantType
+
+    start = time.perf_counter()
+    prepared_path = int8_path + ".prepared"
+    tmp_path = int8_path + ".tmp"
+    # 量化前先做形状推断和图优化，量化器才能识别出全部 MatMul（BERT结构用ONNX自带的形状推断即可，不需要sympy）
+    quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+    try:
+        quantize_dynamic(prepared_path, tmp_path, weight_type=QuantType.QInt8)
+    finally:
+        os.remove(prepared_path)
+    os.replace(tmp_path, int8_path)
+    logger.info(f"已生成量化模型: {int8_path}, 耗时 {time.perf_counter() - start:.1f} 秒, "
+                f"{os.path.getsize(fp32_path) / 1024 / 1024:.0f}MB -> {os.path.getsize(int8_path) / 1024 / 1024:.0f}MB")
+    return int8_path
+
+
+class LocalMiniLMEmbeddings(Embeddings):
+    """all-MiniLM-L6-v2 的本地推理
+
+    - quantized=True 时加载（必要时生成）int8 量化模型，否则加载 fp32 模型
+    - 每批最多 batch_size 行，且 行数×本批最长Token数 不超过 max_batch_tokens
+    - 输出按注意力掩码做平均池化后归一化，与 sentence-transformers 的输出一致
+    """
+
+    def __init__(self, quantized: bool = True, threads: int = 0, batch_size: int = 64,
+                 max_batch_tokens: int = 8192, max_tokens: int = None):
+        self.quantized = quantized
+        self.threads = threads or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.max_tokens = max_tokens or LOCAL_MODELS[LOCAL_MODEL_NAME]["max_tokens"]
+        self.session = None
+        self.tokenizer = None
+        self.lock = threading.Lock()
+        # 最近一次 embed_documents 的Token数和填充后的Token数，用于观察分桶效果
+        self.last_tokens = 0
+        self.last_padded_tokens = 0
+
+    @property
+    def model_path(self) -> str:
+        return INT8_MODEL_PATH if self.quantized else FP32_MODEL_PATH
+
+    def _load(self):
+        with self.lock:
+            if self.session is not None:
+                return
+            try:
+                onnxruntime = lazy_import("onnxruntime")
+                Tokenizer = lazy_import("tokenizers").Tokenizer
+            except ImportError:
+                raise RuntimeError("本地嵌入需要安装 onnxruntime 和 tokenizers")
+            if not os.path.exists(self.model_path):
+                if not os.path.exists(FP32_MODEL_PATH):
+                    raise FileNotFoundError(f"找不到模型文件 {FP32_MODEL_PATH}，请按 src/models/README.md 放置模型")
+                quantize_model()
+
+            tokenizer = Tokenizer.from_file(LOCAL_MODELS[LOCAL_MODEL_NAME]["tokenizer"])
+            tokenizer.enable_truncation(self.max_tokens)
+            # 填充在分桶后按批进行
+            tokenizer.no_padding()
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = onnxruntime.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+            self.input_names = {model_input.name for model_input in session.get_inputs()}
+            self.tokenizer = tokenizer
+            self.session = session
+            logger.info(f"已加载本地嵌入模型: {self.model_path}, {self.threads} 个推理线程")
+
+    def iter_batches(self, lengths: List[int]):
+        """按Token数从短到长排序后切分批次，返回每批的原始下标"""
+        order = sorted(range(len(lengths)), key=lengths.__getitem__)
+        batch = []
+        for index in order:
+            # 排过序，当前文本就是本批最长的
+            if batch and (len(batch) >= self.batch_size or (len(batch) + 1) * lengths[index] > self.max_batch_tokens):
+                yield batch
+                batch = []
+            batch.append(index)
+        if batch:
+            yield batch
+
+    def _run_batch(self, encodings: list) -> np.ndarray:
+        width = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), width), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+        if hidden.ndim == 2:
+            # 导出时已包含池化层
+            vectors = hidden
+        else:
+            # 平均池化只统计真实Token
+            mask = attention_mask[:, :, None].astype(np.float32)
+            vectors = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """嵌入一组文本，返回按输入顺序排列的 float32 矩阵"""
+        self._load()
+        if not texts:
+            return np.zeros((0, LOCAL_EMBEDDING_DIM), dtype=np.float32)
+        start = time.perf_counter()
+        encodings = self.tokenizer.encode_batch(list(texts))
+        lengths = [len(encoding.ids) for encoding in encodings]
+        vectors = np.zeros((len(texts), LOCAL_EMBEDDING_DIM), dtype=np.float32)
+        padded = 0
+        for batch in self.iter_batches(lengths):
+            vectors[batch] = self._run_batch([encodings[index] for index in batch])
+            padded += len(batch) * lengths[batch[-1]]
+        self.last_tokens = sum(lengths)
+        self.last_padded_tokens = padded
+        LOCAL_EMBEDDING_SECONDS.observe(time.perf_counter() - start)
+        LOCAL_EMBEDDING_TEXTS.inc(len(texts))
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+
+_shared_model: Optional[LocalMiniLMEmbeddings] = None
+_shared_lock = threading.Lock()
+
+
+def get_local_embeddings(**options) -> LocalMiniLMEmbeddings:
+    """获取进程内共用的本地嵌入模型，模型只加载一次；参数只在第一次调用时生效"""
+    global _shared_model
+    with _shared_lock:
+        if _shared_model is None:
+            _shared_model = LocalMiniLMEmbeddings(**options)
+        return _shared_model
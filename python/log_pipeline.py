@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""日志管道：业务线程只把日志记录放入有界队列，由后台线程格式化并写到标准输出
+
+标准输出通过管道交给Electron，读取变慢时只会让队列积压或丢弃低级别日志，不会阻塞索引和请求处理。
+同一调用位置的重复 INFO/DEBUG 日志按时间窗口限流，被省略的条数附在该位置下一条输出的日志上。
+"""
+
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import traceback
+from logging.handlers import QueueHandler, QueueListener
+
+from metrics import LOG_RECORDS_DROPPED
+
+LOG_QUEUE_SIZE = 10000         # 日志队列上限，写出跟不上时丢弃 WARNING 以下的日志
+RATE_LIMIT_WINDOW = 10.0       # 限流时间窗口(秒)
+RATE_LIMIT_BURST = 20          # 每个调用位置在一个窗口内最多输出的 INFO/DEBUG 日志条数
+
+# LogRecord 的标准属性，其余属性视为通过 extra 传入的结构化字段
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class StdoutLogHandler(logging.StreamHandler):
+    def __init__(self):
+        logging.StreamHandler.__init__(self, sys.stdout)
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON，extra 中的字段原样保留"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """按调用位置（模块+行号）限流 WARNING 以下的日志，警告和错误总是保留"""
+
+    def __init__(self, window: float = RATE_LIMIT_WINDOW, burst: int = RATE_LIMIT_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.sites = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self.lock:
+            state = self.sites.get(key)
+            if state is None or now - state[0] >= self.window:
+                # 新窗口：[窗口开始时间, 已输出条数, 上个窗口省略的条数]
+                suppressed = state[2] if state is not None else 0
+                state = self.sites[key] = [now, 0, suppressed]
+            if state[1] >= self.burst:
+                state[2] += 1
+                LOG_RECORDS_DROPPED.inc(reason="rate_limited")
+                return False
+            state[1] += 1
+            suppressed, state[2] = state[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """放入有界队列的日志处理器；队列已满时丢弃 WARNING 以下的日志而不是等待"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只在调用线程里合并消息参数和格式化异常堆栈（traceback 对象不能跨线程保留），其余格式化交给后台线程
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                # 警告和错误宁可短暂等待也不丢弃
+                self.queue.put(record)
+            else:
+                LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+
+def setup_logging(level: int = logging.INFO, fmt: str = "json") -> QueueListener:
+    """配置根日志记录器：限流 -> 有界队列 -> 后台线程写标准输出。fmt 为 json 或 text，返回后台监听器"""
+    stdout_handler = StdoutLogHandler()
+    if fmt == "json":
+        stdout_handler.setFormatter(JsonFormatter())
+    else:
+        stdout_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.setLevel(level)
+    queue_handler.addFilter(RateLimitFilter())
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(level)
+    # 移除所有已存在的处理器
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+
+    listener = QueueListener(queue_handler.queue, stdout_handler, respect_handler_level=True)
+    listener.start()
+    # 退出前写完队列中剩余的日志
+    atexit.register(stop_logging, listener)
+    return listener
+
+
+def stop_logging(listener: QueueListener):
+    """写完队列中剩余的日志并停止后台线程，可重复调用"""
+    if listener._thread is not None:
+        listener.stop()
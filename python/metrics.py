@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""运行指标：进程内的计数器、仪表和直方图，由 /metrics 接口按 Prometheus 文本格式输出
+
+不依赖 prometheus_client。每次记录只是一次加锁的整数/浮点累加和一次二分查找，可以放在热循环中。
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple, Sequence
+
+# 默认的耗时分桶(秒)，覆盖从毫秒级的向量检索到分钟级的文件解析
+DEFAULT_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 数量类分桶，用于批次大小、文本块数等
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = list(self.values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                                for key, value in items]
+
+
+class Gauge(Counter):
+    """可增可减、可直接设置的仪表"""
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """分桶直方图，同时记录总和与次数"""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets=DEFAULT_TIME_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：[各桶计数..., +Inf桶计数, 总和]
+        self.values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文，退出时记录耗时(秒)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self.lock:
+            items = [(key, list(series)) for key, series in self.values.items()]
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                bound_label = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, bound_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                return self.metrics[metric.name]
+            self.metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labels))
+
+
+def gauge(name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labels))
+
+
+def histogram(name: str, documentation: str, labels: Sequence[str] = (), buckets=DEFAULT_TIME_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
+
+
+# ---------- 各模块使用的指标 ----------
+
+PARSE_SECONDS = histogram("findme_parse_seconds", "load_document 解析单个文件的耗时(秒)", ["extension"])
+PARSE_FAILURES = counter("findme_parse_failures_total", "解析失败或解析结果为空的文件数", ["extension"])
+CHUNKS_CREATED = counter("findme_chunks_created_total", "分块器产生的文本块总数")
+CHUNKS_PER_DOCUMENT = histogram("findme_chunks_per_document", "每个文档切分出的文本块数", buckets=COUNT_BUCKETS)
+
+EMBEDDING_REQUEST_SECONDS = histogram("findme_embedding_request_seconds", "单次嵌入请求的耗时(秒)", ["outcome"])
+EMBEDDING_BATCH_SIZE = histogram("findme_embedding_batch_size", "每次嵌入请求的文本块数", buckets=COUNT_BUCKETS)
+EMBEDDING_RETRIES = counter("findme_embedding_retries_total", "因限流或临时错误而重试的嵌入请求数")
+EMBEDDING_FAILED_TEXTS = counter("findme_embedding_failed_texts_total", "嵌入最终失败、进入死信队列的文本块数")
+EMBEDDING_REUSED_TEXTS = counter("findme_embedding_reused_texts_total", "复用已有向量、未调用嵌入接口的文本块数")
+LOCAL_EMBEDDING_SECONDS = histogram("findme_local_embedding_seconds", "本地模型嵌入一组文本的耗时(秒)")
+LOCAL_EMBEDDING_TEXTS = counter("findme_local_embedding_texts_total", "本地模型嵌入的文本数")
+
+OCR_PAGES = counter("findme_ocr_pages_total", "OCR处理的图片和PDF页面数，source 为 cache（缓存命中）或 ocr", ["source"])
+OCR_SECONDS = histogram("findme_ocr_seconds", "一个文件中未命中缓存的图片/页面的OCR总耗时(秒)")
+
+INDEX_LOAD_SECONDS = histogram("findme_index_load_seconds", "打开向量库的耗时(秒)", ["mode"])
+INDEX_SEARCH_SECONDS = histogram("findme_index_search_seconds", "单次查询在faiss中检索的耗时(秒)")
+INDEX_VECTORS = gauge("findme_index_vectors", "最近一次打开的向量库中的向量数")
+
+INDEX_IN_PROGRESS = gauge("findme_index_in_progress", "是否有索引任务正在进行")
+INDEX_PIPELINE_QUEUE_DEPTH = gauge("findme_index_pipeline_queue_depth", "索引流水线各阶段输出队列中的条目数", ["stage"])
+INDEX_PIPELINE_BLOCKED_SECONDS = counter("findme_index_pipeline_blocked_seconds_total",
+                                         "索引流水线各阶段因下游队列已满而等待的时间(秒)", ["stage"])
+DEAD_LETTER_PENDING = gauge("findme_dead_letter_pending", "死信队列中等待重试的文本块数")
+
+WATCHER_QUEUE_DEPTH = gauge("findme_watcher_queue_depth", "等待处理的文件事件数", ["folder"])
+WATCHER_LAG_SECONDS = histogram("findme_watcher_event_lag_seconds", "从文件事件发生到变动写入索引的耗时(秒)")
+
+REQUEST_SECONDS = histogram("findme_http_request_seconds", "HTTP请求耗时(秒)", ["method", "route", "status"])
+
+QUERY_CACHE_REQUESTS = counter("findme_query_cache_requests_total", "搜索结果缓存的查找次数", ["result"])
+QUERY_CACHE_ENTRIES = gauge("findme_query_cache_entries", "搜索结果缓存中的条目数")
+
+LOG_RECORDS_DROPPED = counter("findme_log_records_dropped_total", "被限流或因日志队列已满而丢弃的日志条数", ["reason"])
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""OCR：图片和扫描版PDF中没有文字层的页面在独立的进程池中识别，识别结果按图片/页面内容哈希缓存
+
+进程数有上限（OCR_WORKERS），OCR 再多也不会占满所有CPU；PDF只渲染没有文字层的页面，
+有文字层的页面仍由原来的解析器处理。缓存保存在SQLite中，重新索引或文件只是改名、移动时不会重复识别。
+依赖 pytesseract、Pillow 和系统安装的 tesseract，缺少时图片不索引、扫描页保持为空。
+这些依赖和 PyMuPDF 都在第一次用到时才导入，不影响后端启动速度。
+"""
+
+import io
+import os
+import time
+import zlib
+import hashlib
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from metrics import OCR_PAGES, OCR_SECONDS
+from profiling import lazy_import
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+OCR_CACHE_FILE = "ocr_cache.sqlite"
+
+
+# ---------- 在OCR进程中执行 ----------
+
+def _ocr_image_file(image_path: str, lang: str) -> str:
+    import pytesseract
+    from PIL import Image
+    with Image.open(image_path) as image:
+        return pytesseract.image_to_string(image, lang=lang)
+
+
+def _ocr_pdf_page(pdf_path: str, page_number: int, dpi: int, lang: str) -> str:
+    import fitz  # PyMuPDF
+    import pytesseract
+    from PIL import Image
+    # 渲染也放在OCR进程中，与识别一起并行
+    with fitz.open(pdf_path) as pdf:
+        pixmap = pdf[page_number].get_pixmap(dpi=dpi)
+    with Image.open(io.BytesIO(pixmap.tobytes("png"))) as image:
+        return pytesseract.image_to_string(image, lang=lang)
+
+
+# ---------- 缓存 ----------
+
+class OcrCache:
+    """按内容哈希保存OCR结果，多个线程共用一个连接"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS ocr (key TEXT PRIMARY KEY, text BLOB NOT NULL, created_at REAL)")
+        return self.conn
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        with self.lock:
+            conn = self._connect()
+            for key in keys:
+                row = conn.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    found[key] = zlib.decompress(row[0]).decode("utf-8", "surrogatepass")
+        return found
+
+    def put(self, key: str, text: str):
+        # OCR结果中单独的代理字符原样保存，读取时还原
+        with self.lock:
+            self._connect().execute("INSERT OR REPLACE INTO ocr (key, text, created_at) VALUES (?, ?, ?)",
+                                    (key, zlib.compress(text.encode("utf-8", "surrogatepass"), 6), time.time()))
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+# ---------- OCR引擎 ----------
+
+class OcrEngine:
+    def __init__(self, cache_path: str, workers: int = 2, lang: str = "chi_sim+eng", dpi: int = 200,
+                 min_text_chars: int = 20, timeout: float = 300):
+        self.cache = OcrCache(cache_path)
+        self.workers = max(1, workers)
+        self.lang = lang
+        self.dpi = dpi
+        self.min_text_chars = min_text_chars
+        self.timeout = timeout
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+        self._available = None
+
+    @property
+    def available(self) -> bool:
+        """pytesseract 已安装且能找到 tesseract 程序；第一次调用时检查"""
+        if self._available is None:
+            self._available = False
+            try:
+                pytesseract = lazy_import("pytesseract")
+                lazy_import("PIL.Image")
+            except ImportError:
+                logger.warning("未安装 pytesseract 或 Pillow，图片和扫描版PDF不做OCR")
+                return False
+            try:
+                version = pytesseract.get_tesseract_version()
+                self._available = True
+                logger.info(f"OCR已启用: tesseract {version}, {self.workers} 个进程")
+            except Exception as e:
+                logger.warning(f"找不到 tesseract 程序，图片和扫描版PDF不做OCR: {str(e)}")
+        return self._available
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def _key(self, content_hash: str) -> str:
+        return f"{content_hash}:{self.lang}:{self.dpi}"
+
+    def _run(self, jobs: Dict[str, tuple]) -> Dict[str, str]:
+        """jobs 为 {缓存键: (函数, 参数...)}，未缓存的提交到进程池，返回 {缓存键: 文本}"""
+        texts = self.cache.get_many(list(jobs))
+        OCR_PAGES.inc(len(texts), source="cache")
+        missing = [key for key in jobs if key not in texts]
+        if not missing:
+            return texts
+        start = time.perf_counter()
+        pool = self._get_pool()
+        futures = {key: pool.submit(*jobs[key]) for key in missing}
+        for key, future in futures.items():
+            try:
+                text = future.result(timeout=self.timeout)
+            except Exception as e:
+                logger.error(f"OCR失败: {type(e).__name__}: {str(e)}")
+                continue
+            self.cache.put(key, text)
+            texts[key] = text
+            OCR_PAGES.inc(source="ocr")
+        OCR_SECONDS.observe(time.perf_counter() - start)
+        return texts
+
+    def ocr_image(self, image_path: str, content_hash: str) -> str:
+        key = self._key(content_hash)
+        return self._run({key: (_ocr_image_file, image_path, self.lang)}).get(key, "")
+
+    def pages_without_text(self, pdf_path: str) -> Dict[int, str]:
+        """没有文字层（提取到的文字少于 min_text_chars）但有图片的页面，返回 {页码: 页面内容哈希}"""
+        try:
+            fitz = lazy_import("fitz")  # PyMuPDF
+        except ImportError:
+            return {}
+        pages = {}
+        with fitz.open(pdf_path) as pdf:
+            for page_number in range(len(pdf)):
+                page = pdf[page_number]
+                if len(page.get_text().strip()) >= self.min_text_chars:
+                    continue
+                images = page.get_images(full=True)
+                if not images:
+                    continue
+                # 页面内容流和页面上的图片数据决定了渲染结果，据此计算缓存键，不需要先渲染
+                digest = hashlib.blake2b(digest_size=16)
+                digest.update(page.read_contents())
+                for image in images:
+                    digest.update(pdf.xref_stream_raw(image[0]) or b"")
+                pages[page_number] = digest.hexdigest()
+        return pages
+
+    def ocr_pdf_pages(self, pdf_path: str, pages: Dict[int, str]) -> Dict[int, str]:
+        """识别指定页面，pages 为 pages_without_text 的返回值，返回 {页码: 文本}"""
+        jobs = {self._key(page_hash): (_ocr_pdf_page, pdf_path, page_number, self.dpi, self.lang)
+                for page_number, page_hash in pages.items()}
+        texts = self._run(jobs)
+        return {page_number: texts.get(self._key(page_hash), "") for page_number, page_hash in pages.items()}
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+        self.cache.close()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""有界流水线：把若干生成器阶段串起来，每个阶段在自己的线程中运行，阶段之间用有界队列连接
+
+下游处理不过来时队列写满，上游阻塞在写入上（背压），同时在内存中的条目数不超过各队列容量之和，
+与输入总量无关。任一阶段出错或消费端调用 close() 时所有阶段停止，错误在消费端重新抛出。
+"""
+
+import time
+import queue
+import threading
+from typing import Callable, Iterable, Iterator
+
+from metrics import INDEX_PIPELINE_QUEUE_DEPTH, INDEX_PIPELINE_BLOCKED_SECONDS
+
+_POLL_INTERVAL = 0.1  # 阻塞在队列上时检查流水线是否已停止的间隔(秒)
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+class _End:
+    pass
+
+
+class Stage:
+    """一个阶段：线程中迭代 items，把产出放入容量为 maxsize 的队列；迭代 Stage 即按顺序取出产出"""
+
+    def __init__(self, pipeline: "Pipeline", name: str, items: Iterable, maxsize: int):
+        self.pipeline = pipeline
+        self.name = name
+        self.queue = queue.Queue(max(1, maxsize))
+        self.produced = 0
+        # 队列满时等待下游的时间，等待越多说明下游越慢
+        self.blocked_seconds = 0.0
+        self.thread = threading.Thread(target=self._run, args=(items,), name=f"index-{name}", daemon=True)
+
+    def _put(self, item):
+        start = None
+        while True:
+            if self.pipeline.stopped:
+                raise PipelineStopped()
+            try:
+                self.queue.put(item, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                if start is None:
+                    start = time.perf_counter()
+        if start is not None:
+            blocked = time.perf_counter() - start
+            self.blocked_seconds += blocked
+            INDEX_PIPELINE_BLOCKED_SECONDS.inc(blocked, stage=self.name)
+        INDEX_PIPELINE_QUEUE_DEPTH.set(self.queue.qsize(), stage=self.name)
+
+    def _run(self, items: Iterable):
+        try:
+            for item in items:
+                self._put(item)
+                self.produced += 1
+            self._put(_End())
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            # 先记录错误再停止，其他阶段发现停止时能取到这个错误
+            self.pipeline.fail(e)
+            self.pipeline.stop()
+        finally:
+            # 提前停止时关闭生成器，执行其中的 finally 清理
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    def __iter__(self) -> Iterator:
+        while True:
+            if self.pipeline.stopped:
+                self.pipeline.raise_failure()
+                raise PipelineStopped()
+            try:
+                item = self.queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            INDEX_PIPELINE_QUEUE_DEPTH.set(self.queue.qsize(), stage=self.name)
+            if isinstance(item, _End):
+                return
+            yield item
+
+
+class Pipeline:
+    """stage(name, func, source, maxsize) 新建一个阶段：func(source) 返回生成器，在阶段线程中迭代；
+    最后一个阶段由调用方在自己的线程中迭代。用 with 语句保证结束时停止并等待所有阶段线程。
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._stopped = threading.Event()
+        self._failure = None
+        self.lock = threading.Lock()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def stage(self, name: str, func: Callable[[Iterable], Iterable], source: Iterable, maxsize: int) -> Stage:
+        stage = Stage(self, name, func(source), maxsize)
+        self.stages.append(stage)
+        stage.thread.start()
+        return stage
+
+    def fail(self, error: BaseException):
+        with self.lock:
+            if self._failure is None:
+                self._failure = error
+
+    def raise_failure(self):
+        if self._failure is not None:
+            raise self._failure
+
+    def stop(self):
+        self._stopped.set()
+
+    def close(self):
+        """停止所有阶段并等待线程退出；阶段中正在进行的单个条目（如一次嵌入请求）会先完成"""
+        self.stop()
+        for stage in self.stages:
+            stage.thread.join()
+            INDEX_PIPELINE_QUEUE_DEPTH.set(0, stage=stage.name)
+
+    def stats(self) -> dict:
+        return {stage.name: {"produced": stage.produced, "queued": stage.queue.qsize(),
+                             "capacity": stage.queue.maxsize, "blocked_seconds": stage.blocked_seconds}
+                for stage in self.stages}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""索引剖析：记录一次索引任务中每个文件在各阶段（stat/parse/chunk/embed/save）的耗时，
+汇总为最慢文件、按扩展名和文件大小分组的统计以及各阶段耗时占比；可选对解析阶段做采样式CPU剖析。
+
+分块、嵌入和保存是按批进行的，一批的耗时按各文件在该批中的文本块数分摊到文件上。
+启动剖析：STARTUP 记录后端从进程创建到服务可用的各阶段耗时，以及按需导入的重依赖第一次导入的耗时。
+"""
+
+import os
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager, nullcontext
+from collections import Counter
+from typing import Dict, Iterable
+
+STAGES = ("stat", "parse", "chunk", "embed", "save")
+
+# 文件大小分组(字节上限, 名称)
+SIZE_BUCKETS = (
+    (100 * 1024, "<100KB"),
+    (1024 * 1024, "100KB-1MB"),
+    (10 * 1024 * 1024, "1MB-10MB"),
+    (float("inf"), ">=10MB"),
+)
+
+DEFAULT_SAMPLE_INTERVAL = 0.005  # CPU采样间隔(秒)
+
+
+def size_bucket(size: int) -> str:
+    for limit, name in SIZE_BUCKETS:
+        if size < limit:
+            return name
+    return SIZE_BUCKETS[-1][1]
+
+
+class StackSampler:
+    """采样式CPU剖析：后台线程定时读取目标线程的调用栈，只在 active 为真时计数
+
+    不依赖第三方库，开销与采样间隔成正比，和被剖析代码的调用次数无关。
+    """
+
+    def __init__(self, thread_id: int, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.active = False
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="index-profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.self_counts[self._frame_key(frame)] += 1
+            # 递归调用的函数在一次采样中只计一次
+            seen = set()
+            while frame is not None:
+                key = self._frame_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    self.total_counts[key] += 1
+                frame = frame.f_back
+
+    @staticmethod
+    def _frame_key(frame):
+        code = frame.f_code
+        return (code.co_name, code.co_filename, code.co_firstlineno)
+
+    def report(self, top: int) -> dict:
+        def rows(counts):
+            return [{
+                "function": name,
+                "file": filename,
+                "line": line,
+                "samples": count,
+                "share": count / self.samples if self.samples else 0.0
+            } for (name, filename, line), count in counts.most_common(top)]
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "top_self": rows(self.self_counts),
+            "top_total": rows(self.total_counts)
+        }
+
+
+class IndexProfiler:
+    """一次索引任务的剖析记录；enabled 为假时所有记录方法都是空操作"""
+
+    def __init__(self, folder: str, enabled: bool = False, cpu_profile: bool = False,
+                 sample_interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.folder = folder
+        self.enabled = enabled
+        self.started_at = time.time()
+        self.finished_at = None
+        self._start = time.perf_counter()
+        self.wall_seconds = None
+        self.files: Dict[str, dict] = {}
+        # 各阶段总耗时，包括无法归属到具体文件的部分
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self.sampler = None
+        if enabled and cpu_profile:
+            self.sampler = StackSampler(threading.get_ident(), sample_interval)
+            self.sampler.start()
+
+    def _file(self, file_path: str) -> dict:
+        entry = self.files.get(file_path)
+        if entry is None:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                size = 0
+            entry = self.files[file_path] = {
+                "stages": {stage: 0.0 for stage in STAGES},
+                "size": size,
+                "outcome": "indexed"
+            }
+        return entry
+
+    def stage(self, name: str, file_path: str):
+        """计时单个文件的某个阶段"""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name, {file_path: 1})
+
+    def batch(self, name: str, sources: Iterable[str]):
+        """计时一批文本块的某个阶段，耗时按每个文件的文本块数分摊；sources 为每个文本块的来源文件"""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name, Counter(source for source in sources if source))
+
+    @contextmanager
+    def _timed(self, name: str, weights: Dict[str, int]):
+        sampling = self.sampler is not None and name == "parse"
+        if sampling:
+            # 解析在索引流水线的解析线程中进行，采样该线程的调用栈
+            self.sampler.thread_id = threading.get_ident()
+            self.sampler.active = True
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if sampling:
+                self.sampler.active = False
+            self.stage_seconds[name] += elapsed
+            total = sum(weights.values()) or 1
+            for file_path, weight in weights.items():
+                self._file(file_path)["stages"][name] += elapsed * weight / total
+
+    def mark(self, file_path: str, outcome: str):
+        """记录文件的处理结果（unchanged/duplicate/too_large/failed 等），默认为 indexed"""
+        if self.enabled:
+            self._file(file_path)["outcome"] = outcome
+
+    def finish(self):
+        if not self.enabled or self.wall_seconds is not None:
+            return
+        self.wall_seconds = time.perf_counter() - self._start
+        self.finished_at = time.time()
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def report(self, top: int = 20) -> dict:
+        wall = self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self._start
+        staged = sum(self.stage_seconds.values())
+        stages = {stage: {"seconds": seconds, "share": seconds / wall if wall else 0.0}
+                  for stage, seconds in self.stage_seconds.items()}
+        # 扫描目录、加载已有索引等不属于任何阶段的耗时
+        other = max(0.0, wall - staged)
+        stages["other"] = {"seconds": other, "share": other / wall if wall else 0.0}
+
+        files = []
+        by_extension: Dict[str, dict] = {}
+        by_size: Dict[str, dict] = {}
+        # 索引进行中也可以查看，先复制一份文件列表
+        for file_path, entry in list(self.files.items()):
+            seconds = sum(entry["stages"].values())
+            extension = os.path.splitext(file_path)[1].lower() or "(无扩展名)"
+            bucket = size_bucket(entry["size"])
+            files.append({
+                "path": file_path,
+                "name": os.path.basename(file_path),
+                "extension": extension,
+                "size": entry["size"],
+                "seconds": seconds,
+                "outcome": entry["outcome"],
+                "stages": dict(entry["stages"])
+            })
+            for groups, key in ((by_extension, extension), (by_size, bucket)):
+                group = groups.setdefault(key, {"files": 0, "bytes": 0, "seconds": 0.0,
+                                                "stages": {stage: 0.0 for stage in STAGES}})
+                group["files"] += 1
+                group["bytes"] += entry["size"]
+                group["seconds"] += seconds
+                for stage, value in entry["stages"].items():
+                    group["stages"][stage] += value
+        for groups in (by_extension, by_size):
+            for group in groups.values():
+                group["mean_seconds"] = group["seconds"] / group["files"]
+                group["mb_per_sec"] = group["bytes"] / 1024 / 1024 / group["seconds"] if group["seconds"] else 0.0
+
+        files.sort(key=lambda item: item["seconds"], reverse=True)
+        return {
+            "folder": self.folder,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "completed": self.wall_seconds is not None,
+            "wall_seconds": wall,
+            "file_count": len(files),
+            "outcomes": dict(Counter(item["outcome"] for item in files)),
+            "stages": stages,
+            "slowest_files": files[:top],
+            "by_extension": dict(sorted(by_extension.items(), key=lambda item: item[1]["seconds"], reverse=True)),
+            "by_size": {name: by_size[name] for _, name in SIZE_BUCKETS if name in by_size},
+            "cpu_profile": self.sampler.report(top) if self.sampler is not None else None
+        }
+
+
+def process_age() -> float:
+    """进程创建至今的秒数（包括解释器自身的启动）；无法获取时返回None"""
+    # Linux 上直接比较开机后的时钟，psutil 的 create_time 换算成墙上时间时会有最多约1秒的误差
+    try:
+        with open("/proc/self/stat") as f:
+            # 进程名可能含空格，从最后一个右括号之后开始数，starttime 是第22个字段
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return time.time() - psutil.Process().create_time()
+    except ImportError:
+        return None
+
+
+class StartupTimeline:
+    """后端启动各阶段的耗时，时刻均为距进程创建的秒数（无法获取进程创建时间时从导入本模块开始计）"""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._offset = process_age() or 0.0
+        self.lock = threading.Lock()
+        self.phases = []    # [{"name", "start", "seconds"}]
+        self.marks = {}     # 名称 -> 时刻
+        self.lazy_imports = {}  # 模块名 -> {"at", "seconds", "thread"}
+
+    def now(self) -> float:
+        return self._offset + time.perf_counter() - self._start
+
+    def record_phase(self, name: str, seconds: float):
+        """记录一个刚结束的阶段"""
+        with self.lock:
+            self.phases.append({"name": name, "start": self.now() - seconds, "seconds": seconds})
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.perf_counter() - start)
+
+    def mark(self, name: str):
+        """记录一个时刻，同名只记录第一次"""
+        with self.lock:
+            self.marks.setdefault(name, self.now())
+
+    def record_import(self, name: str, seconds: float):
+        with self.lock:
+            self.lazy_imports.setdefault(name, {"at": self.now(), "seconds": seconds,
+                                                "thread": threading.current_thread().name})
+
+    def report(self) -> dict:
+        """marks 按时间排序并给出与上一个时刻的间隔；phases 是后台线程中的阶段，与主线程的时刻重叠"""
+        with self.lock:
+            marks = []
+            previous = 0.0
+            for name, at in sorted(self.marks.items(), key=lambda item: item[1]):
+                marks.append({"name": name, "at": at, "since_previous": at - previous})
+                previous = at
+            return {
+                "interpreter_seconds": self._offset,
+                "marks": marks,
+                "phases": sorted(self.phases, key=lambda phase: phase["start"]),
+                "lazy_imports": dict(sorted(self.lazy_imports.items(), key=lambda item: item[1]["at"]))
+            }
+
+
+STARTUP = StartupTimeline()
+
+
+def lazy_import(name: str):
+    """按需导入重依赖，第一次导入的耗时记录到 STARTUP；已导入时直接返回模块"""
+    # 另一个线程正在导入时 sys.modules 中已有未初始化完的模块，import_module 会等它完成
+    loaded = name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if not loaded:
+        STARTUP.record_import(name, time.perf_counter() - start)
+    return module
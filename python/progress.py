@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""索引进度的文件明细：有上限的成功/失败/跳过文件列表，按游标分页读取
+
+每条记录带有全局递增的序号 seq，客户端记住上次读到的最大序号，之后只取更新的记录；
+每类列表只在内存中保留最近的 limit 条，更早的记录被丢弃并计数。
+"""
+
+import threading
+from collections import deque
+from typing import Optional
+
+FILE_CATEGORIES = ("success", "failed", "skipped")
+
+
+class FileHistory:
+    """一次索引任务中各类文件的处理记录"""
+
+    def __init__(self, limit: int = 2000):
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.set_limit(limit)
+
+    def set_limit(self, limit: int):
+        with self.lock:
+            self.limit = max(1, int(limit))
+            self.entries = {category: deque(maxlen=self.limit) for category in FILE_CATEGORIES}
+            self.dropped = {category: 0 for category in FILE_CATEGORIES}
+
+    def clear(self):
+        """开始新的索引任务时清空记录；序号继续递增，旧游标不会误读新任务的记录"""
+        with self.lock:
+            for category in FILE_CATEGORIES:
+                self.entries[category].clear()
+                self.dropped[category] = 0
+
+    def add(self, category: str, entry: dict):
+        with self.lock:
+            self.seq += 1
+            entries = self.entries[category]
+            if len(entries) == entries.maxlen:
+                self.dropped[category] += 1
+            entries.append(dict(entry, seq=self.seq, category=category))
+
+    @property
+    def cursor(self) -> int:
+        """最新一条记录的序号"""
+        return self.seq
+
+    def page(self, after: int = 0, limit: int = 200, category: Optional[str] = None, query: str = None) -> dict:
+        """返回序号大于 after 的记录（按序号升序），可按类别和文件名/路径子串过滤
+
+        next_cursor 为本页最后一条的序号，has_more 表示还有未返回的记录。
+        """
+        categories = [category] if category else FILE_CATEGORIES
+        query = query.lower() if query else None
+        with self.lock:
+            candidates = [entry for name in categories for entry in self.entries[name] if entry["seq"] > after]
+            dropped = {name: self.dropped[name] for name in categories}
+            latest = self.seq
+        if query:
+            candidates = [entry for entry in candidates
+                          if query in entry["name"].lower() or query in entry["path"].lower()]
+        candidates.sort(key=lambda entry: entry["seq"])
+        files = candidates[:limit]
+        has_more = len(candidates) > len(files)
+        return {
+            "files": files,
+            # 没有更多记录时直接跳到最新序号，过滤掉的记录下次不必再扫描
+            "next_cursor": files[-1]["seq"] if has_more else max(after, latest),
+            "has_more": has_more,
+            "dropped": dropped
+        }
+
+    def snapshot(self, category: str) -> list:
+        """某类文件当前保留的全部记录"""
+        with self.lock:
+            return list(self.entries[category])
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""搜索结果缓存：按 (文件夹, 索引版本, 查询, 选项) 缓存检索结果，相同的并发查询只计算一次
+
+每个文件夹的索引保存后调用 invalidate 递增该文件夹的版本，与它互为上下级的文件夹视图的缓存随之失效；
+正在计算的查询以 asyncio 任务的形式登记，相同键的请求等待同一个任务（singleflight），计算出错时不缓存。
+"""
+
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional
+
+from metrics import QUERY_CACHE_REQUESTS, QUERY_CACHE_ENTRIES
+from vector_storage import folder_prefix
+
+
+def folders_overlap(a: str, b: str) -> bool:
+    """两个文件夹相同或一个包含另一个"""
+    return a == b or a.startswith(folder_prefix(b)) or b.startswith(folder_prefix(a))
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()   # 键 -> (过期时间, 结果)，按最近使用排序
+        self.versions = {}             # 文件夹 -> 保存次数
+        self.generation = 0            # 清空全部缓存时递增
+        self.inflight = {}             # 键 -> 正在计算的任务，只在事件循环线程中访问
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+        # 索引线程和文件监控线程会调用 invalidate
+        self.lock = threading.Lock()
+
+    def version(self, folder: str) -> tuple:
+        """文件夹视图当前的索引版本；与它重叠的任一文件夹保存索引后版本都会变化"""
+        with self.lock:
+            return self._version(folder)
+
+    def _version(self, folder: str) -> tuple:
+        return self.generation, sum(count for name, count in self.versions.items() if folders_overlap(name, folder))
+
+    def invalidate(self, folder: Optional[str] = None):
+        """文件夹的索引已保存；folder 为 None 时清空全部缓存（共享库整体变化、清理索引或更换模型）"""
+        with self.lock:
+            if folder is None:
+                self.generation += 1
+                self.entries.clear()
+            else:
+                self.versions[folder] = self.versions.get(folder, 0) + 1
+                for key in [key for key in self.entries if folders_overlap(key[0], folder)]:
+                    del self.entries[key]
+            self.stats["invalidations"] += 1
+            QUERY_CACHE_ENTRIES.set(len(self.entries))
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                QUERY_CACHE_ENTRIES.set(len(self.entries))
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, value):
+        with self.lock:
+            # 计算期间该文件夹的索引已保存时结果可能过期，不写入
+            if key[1] != self._version(key[0]):
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            QUERY_CACHE_ENTRIES.set(len(self.entries))
+
+    def _record(self, result: str):
+        with self.lock:
+            self.stats[result] += 1
+        QUERY_CACHE_REQUESTS.inc(result=result)
+
+    async def get_or_compute(self, folder: str, query: str, options: Hashable,
+                             compute: Callable[[], Awaitable]):
+        """返回缓存的结果，或者计算并缓存；compute 返回 None 表示结果不应缓存（例如文件夹未索引）"""
+        key = (folder, self.version(folder), query, options)
+        entry = self._get(key)
+        if entry is not None:
+            self._record("hits")
+            return entry[1]
+
+        task = self.inflight.get(key)
+        if task is not None:
+            self._record("coalesced")
+        else:
+            self._record("misses")
+            task = asyncio.ensure_future(compute())
+            self.inflight[key] = task
+
+            def on_done(finished: asyncio.Task):
+                self.inflight.pop(key, None)
+                if not finished.cancelled() and finished.exception() is None and finished.result() is not None:
+                    self._put(key, finished.result())
+
+            task.add_done_callback(on_done)
+        # shield：某个等待者断开时不取消其他请求共享的计算
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        stats["inflight"] = len(self.inflight)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""多进程检索：faiss打分、按文件去重和高亮放到独立的检索进程中进行，不与主进程的请求处理和索引争抢GIL
+
+每个检索进程用 SnapshotReader 以只读内存映射方式打开共享向量库，所有进程映射同一个索引文件，
+向量在页缓存中只有一份，不随进程数增加；索引保存后，各进程在下一次检索时读到新的版本号并映射新版本的索引文件。
+检索进程用 spawn 方式启动，不继承主进程中的线程和锁。spawn 会在子进程中以 __mp_main__ 重新导入主模块，
+后端因此由很小的 server.py 启动，子进程只导入本模块及其依赖，不执行 api 的模块级代码（日志线程、OCR进程池等）。
+查询向量由主进程的异步嵌入客户端计算后传入，检索进程不调用嵌入接口。
+"""
+
+import os
+import signal
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List
+
+from chunk_store import CHUNK_STORE_FILE
+from dedup import chunk_hash, strip_file_header
+from executors import BoundedExecutor
+from profiling import lazy_import
+from vector_storage import SnapshotReader, similarity_search_in_folder, get_chunk_store, folder_prefix
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULT_LIMIT = 5  # 每次检索返回的文件数
+
+
+def highlight(content: str, query: str) -> str:
+    """用 <mark> 标出内容中的完整查询，找不到时标出查询中尽量长的词组"""
+    if query in content:
+        # 添加高亮标记 - 使用HTML标签作为高亮标记，前端可以解析它
+        return content.replace(query, f"<mark>{query}</mark>")
+    highlighted_content = content
+    query_terms = query.split()
+    # 尝试查找较长的词组
+    for i in range(len(query_terms), 0, -1):
+        for j in range(len(query_terms) - i + 1):
+            phrase = " ".join(query_terms[j:j+i])
+            if phrase and len(phrase) > 1 and phrase in content:
+                # 避免重复替换已高亮的部分
+                highlighted_content = highlighted_content.replace(phrase, f"<mark>{phrase}</mark>")
+    return highlighted_content
+
+
+def search_folder(db, query: str, query_embedding: List[float], folder: str, k: int,
+                  limit: int = SEARCH_RESULT_LIMIT) -> list:
+    """在文件夹视图内检索并整理结果：每个文件保留最相似的文本块，内容相同的文件合并，返回前 limit 个"""
+    # 执行搜索 - 只在该文件夹的视图内查找
+    try:
+        docs_and_scores = similarity_search_in_folder(db, query, k, folder, query_embedding)
+    except Exception as search_error:
+        logger.warning(f"初始查询失败，尝试备用方法: {str(search_error)}")
+        # 如果初始查询失败，使用更保守的k值
+        try:
+            docs_and_scores = similarity_search_in_folder(db, query, 10, folder, query_embedding)
+        except Exception as fallback_error:
+            logger.error(f"备用查询也失败: {str(fallback_error)}")
+            docs_and_scores = []
+
+    # 按文件源去重，保留每个文件最相似的结果
+    unique_sources = {}
+    for doc, score in docs_and_scores:
+        source = doc.metadata.get("source", "未知文件")
+        float_score = float(score)
+        # 如果文件还未记录，或当前结果比已记录的相似度更高
+        if source not in unique_sources or float_score < unique_sources[source]["score"]:
+            unique_sources[source] = {
+                "content": doc.page_content,
+                "highlighted_content": highlight(doc.page_content, query),
+                "source": source,
+                "score": float_score
+            }
+
+    # 将去重后的结果按相似度排序
+    results = list(unique_sources.values())
+    results.sort(key=lambda x: x["score"])
+
+    # 合并重复文件：内容相同的命中只保留最相似的一个，其余路径放入duplicates
+    collapsed = []
+    content_keys = {}
+    for result in results:
+        key = chunk_hash(strip_file_header(result["content"]))
+        if key in content_keys:
+            content_keys[key]["duplicates"].append(result["source"])
+            continue
+        result["duplicates"] = []
+        content_keys[key] = result
+        collapsed.append(result)
+
+    # 限制返回数量
+    results = collapsed[:limit]
+
+    # 索引时被识别为重复、没有单独保存文本块的文件随代表文件一起返回，只返回该文件夹内的路径
+    prefix = folder_prefix(folder)
+    aliases = get_chunk_store(db).aliases_of(result["source"] for result in results)
+    for result in results:
+        duplicates = result["duplicates"] + [alias for alias in aliases.get(result["source"], [])
+                                             if alias not in result["duplicates"]]
+        duplicates = [path for path in duplicates if path.startswith(prefix)]
+        # 代表文件在文件夹之外时，改为显示文件夹内的重复文件
+        if not result["source"].startswith(prefix) and duplicates:
+            result["source"] = duplicates.pop(0)
+        result["duplicates"] = duplicates
+    return results
+
+
+# ---------- 在检索进程中执行 ----------
+
+# 向量库路径 -> 已打开的 SnapshotReader，检索进程是单线程的，进程内复用
+_readers = {}
+
+
+def _init_process():
+    # Ctrl+C 由主进程处理，检索进程随进程池关闭退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # 并行来自多个检索进程，每个进程内faiss只用一个线程，线程总数不超过进程数
+    lazy_import("faiss").omp_set_num_threads(1)
+
+
+def _get_reader(db_path: str, mmap: bool) -> SnapshotReader:
+    reader = _readers.get(db_path)
+    if reader is None or reader.mmap != mmap:
+        if reader is not None:
+            reader.close()
+        reader = _readers[db_path] = SnapshotReader(db_path, mmap=mmap)
+    return reader
+
+
+def search_in_process(db_path: str, mmap: bool, query: str, query_embedding: List[float], folder: str, k: int) -> list:
+    with _get_reader(db_path, mmap).snapshot() as db:
+        return search_folder(db, query, query_embedding, folder, k)
+
+
+def warm_up_process(db_path: str, mmap: bool) -> int:
+    """映射当前版本的索引文件，返回进程号"""
+    if os.path.exists(os.path.join(db_path, CHUNK_STORE_FILE)):
+        with _get_reader(db_path, mmap).snapshot():
+            pass
+    return os.getpid()
+
+
+# ---------- 在主进程中执行 ----------
+
+class SearchProcessPool:
+    """检索进程池，第一次使用时启动；同时接受的检索数有上限（执行中 + 排队），进程意外退出后下次使用时重建"""
+
+    def __init__(self, processes: int, queue_size: int = 0):
+        self.processes = processes
+        self.queue_size = queue_size
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def _get_executor(self) -> BoundedExecutor:
+        with self.lock:
+            if self.executor is None:
+                pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_init_process)
+                self.executor = BoundedExecutor("search-process", self.processes, self.queue_size, executor=pool)
+                logger.info(f"启动检索进程池: {self.processes} 个进程")
+            return self.executor
+
+    def _reset(self, executor: BoundedExecutor):
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+
+    def start(self, db_path: str, mmap: bool, timeout: float = None) -> List[int]:
+        """启动所有检索进程并映射当前版本的索引，返回进程号；同时提交多个任务，进程池会为每个任务启动一个进程"""
+        executor = self._get_executor()
+        futures = [executor.submit(warm_up_process, db_path, mmap) for _ in range(self.processes)]
+        return sorted({future.result(timeout) for future in futures})
+
+    async def search(self, db_path: str, mmap: bool, query: str, query_embedding: List[float], folder: str, k: int,
+                     timeout: float = None) -> list:
+        executor = self._get_executor()
+        try:
+            return await executor.run(search_in_process, db_path, mmap, query, query_embedding, folder, k,
+                                      timeout=timeout)
+        except BrokenProcessPool:
+            logger.error("检索进程意外退出，下次检索时重建进程池")
+            self._reset(executor)
+            raise
+
+    def shutdown(self, wait: bool = True):
+        """关闭所有检索进程，释放它们打开的文本库和映射的索引文件；之后再检索时重新启动"""
+        with self.lock:
+            executor = self.executor
+            self.executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def status(self) -> dict:
+        executor = self.executor
+        return {"processes": self.processes, "started": executor is not None}
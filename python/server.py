@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""后端入口：Electron 运行这个脚本启动 Python 后端
+
+检索进程用 spawn 方式启动，子进程会以 __mp_main__ 重新导入入口脚本。
+入口脚本只在作为主程序运行时才导入 api，检索进程中不会重复执行 api 的模块级代码。
+"""
+
+if __name__ == "__main__":
+    import api
+    api.main()
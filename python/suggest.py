@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""输入即搜索的候选词：文件名前缀索引、文本块中的高频词和最近的查询记录，全部在内存中匹配，不调用嵌入接口
+
+前缀索引用排序数组加二分查找代替逐字符的字典树，十万个文件名只占几个列表的内存；
+匹配范围很大的短前缀（如单个字母）在构建时预先算好得分最高的结果，查询时不需要扫描整个范围。
+文件按修改时间（最近）排序，词按出现次数排序，查询记录按次数和最近使用时间衰减后的得分排序。
+"""
+
+import os
+import re
+import time
+import heapq
+import bisect
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 文件名按这些分隔符切成词，每个词都可以作为前缀匹配的起点
+_NAME_SEPARATORS = re.compile(r"[\s_\-.,()\[\]{}【】（）《》]+")
+_LATIN_WORD = re.compile(r"[a-z][a-z0-9]{2,}")
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]{2,}")
+# 以这些字开头或结尾的中文片段通常不是完整的词
+_CJK_STOP_CHARS = frozenset("的了是在和与及或而也都就被把这那有个之为以对于中将等")
+
+
+def count_terms(texts: Iterable[str]) -> Counter:
+    """统计文本中的英文单词和中文二、三字片段的出现次数"""
+    counts = Counter()
+    for text in texts:
+        counts.update(_LATIN_WORD.findall(text.lower()))
+        for run in _CJK_RUN.findall(text):
+            counts.update(run[i:i + n] for n in (2, 3) for i in range(len(run) - n + 1)
+                          if run[i] not in _CJK_STOP_CHARS and run[i + n - 1] not in _CJK_STOP_CHARS)
+    return counts
+
+
+class PrefixIndex:
+    """按前缀查找 (键, 得分, 值) 的只读索引，返回得分最高的若干个值"""
+
+    def __init__(self, items: Iterable[Tuple[str, float, object]], top_k: int = 50, heavy_threshold: int = 256):
+        items = sorted(items, key=lambda item: item[0])
+        self.keys = [item[0] for item in items]
+        self.scores = [item[1] for item in items]
+        self.values = [item[2] for item in items]
+        self.top_k = top_k
+        self.heavy_threshold = heavy_threshold
+        self.heavy: Dict[str, List[int]] = {}
+        self._precompute()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        return bisect.bisect_left(self.keys, prefix), bisect.bisect_left(self.keys, prefix + "\U0010ffff")
+
+    def _top(self, lo: int, hi: int, k: int) -> List[int]:
+        return heapq.nlargest(k, range(lo, hi), key=self.scores.__getitem__)
+
+    def _precompute(self):
+        # 逐层展开匹配数超过阈值的前缀，只有这些前缀的子前缀才可能仍然超过阈值
+        pending = sorted({key[:1] for key in self.keys if key})
+        while pending:
+            next_level = []
+            for prefix in pending:
+                lo, hi = self._range(prefix)
+                if hi - lo <= self.heavy_threshold:
+                    continue
+                self.heavy[prefix] = self._top(lo, hi, self.top_k)
+                length = len(prefix) + 1
+                next_level.extend({self.keys[i][:length] for i in range(lo, hi) if len(self.keys[i]) >= length})
+            pending = next_level
+
+    def lookup(self, prefix: str, k: int, accept: Callable[[object], bool] = None) -> List[Tuple[object, float]]:
+        """返回前缀匹配、得分最高的 k 个不重复的 (值, 得分)
+
+        匹配数很多且带过滤条件时只在预先算好的前 top_k 个结果中过滤，结果可能少于 k 个。
+        """
+        indices = self.heavy.get(prefix)
+        if indices is None:
+            # 不在预计算表中的前缀匹配数都不超过 heavy_threshold，直接排序
+            lo, hi = self._range(prefix)
+            indices = sorted(range(lo, hi), key=self.scores.__getitem__, reverse=True)
+        results = []
+        seen = set()
+        for i in indices:
+            value = self.values[i]
+            if value in seen or (accept is not None and not accept(value)):
+                continue
+            seen.add(value)
+            results.append((value, self.scores[i]))
+            if len(results) >= k:
+                break
+        return results
+
+
+class SuggestIndex:
+    """一个已索引文件夹的文件名和高频词前缀索引"""
+
+    def __init__(self, root: str, files: Dict[str, float], texts: Iterable[str],
+                 max_terms: int = 50000, min_term_count: int = 2):
+        start = time.perf_counter()
+        self.root = root
+        self.version = None
+        file_items = []
+        for path, mtime in files.items():
+            name = os.path.basename(path).lower()
+            keys = {name}
+            # 扩展名不单独作为键，否则每个前缀 "p" 都会匹配所有 PDF
+            keys.update(token for token in _NAME_SEPARATORS.split(os.path.splitext(name)[0]) if token)
+            file_items.extend((key, mtime or 0.0, path) for key in keys)
+        self.files = PrefixIndex(file_items)
+        terms = count_terms(texts)
+        self.terms = PrefixIndex((term, count, term) for term, count in terms.most_common(max_terms)
+                                 if count >= min_term_count)
+        self.file_count = len(files)
+        self.built_at = time.time()
+        self.build_seconds = time.perf_counter() - start
+
+    def match_files(self, prefix: str, k: int, folder: str = None) -> List[dict]:
+        accept = None
+        if folder and folder != self.root:
+            folder_prefix = folder.rstrip(os.sep) + os.sep
+            accept = lambda path: path.startswith(folder_prefix)
+        return [{"type": "file", "text": os.path.basename(path), "path": path}
+                for path, _ in self.files.lookup(prefix, k, accept)]
+
+    def match_terms(self, prefix: str, k: int) -> List[dict]:
+        return [{"type": "term", "text": term, "count": count} for term, count in self.terms.lookup(prefix, k)]
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "files": self.file_count,
+            "file_keys": len(self.files),
+            "terms": len(self.terms),
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds
+        }
+
+
+class QueryHistory:
+    """最近的搜索查询，按使用次数乘以随时间衰减的系数排序"""
+
+    def __init__(self, limit: int = 500, half_life: float = 7 * 86400):
+        self.limit = limit
+        self.half_life = half_life
+        self.entries = OrderedDict()  # 小写查询 -> [原始查询, 次数, 最近使用时间]
+        self.lock = threading.Lock()
+
+    def record(self, query: str):
+        query = query.strip()
+        if not query:
+            return
+        key = query.lower()
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                entry = [query, 0, 0.0]
+            entry[0] = query
+            entry[1] += 1
+            entry[2] = time.time()
+            self.entries[key] = entry
+            while len(self.entries) > self.limit:
+                self.entries.popitem(last=False)
+
+    def match(self, prefix: str, k: int) -> List[dict]:
+        now = time.time()
+        with self.lock:
+            candidates = [(count * 0.5 ** ((now - last_used) / self.half_life), query)
+                          for key, (query, count, last_used) in self.entries.items() if key.startswith(prefix)]
+        return [{"type": "query", "text": query} for _, query in heapq.nlargest(k, candidates)]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SuggestRegistry:
+    """各已索引文件夹的候选词索引；索引版本变化后在后台线程重建，重建期间继续使用旧索引"""
+
+    def __init__(self, builder: Callable[[str], SuggestIndex], min_rebuild_interval: float = 60.0):
+        self.builder = builder
+        self.min_rebuild_interval = min_rebuild_interval
+        self.indexes: Dict[str, SuggestIndex] = {}
+        self.building = set()
+        self.lock = threading.Lock()
+
+    def find_root(self, folder: str) -> Optional[str]:
+        """已有候选词索引的根目录中包含该文件夹的一个"""
+        with self.lock:
+            roots = list(self.indexes)
+        for root in roots:
+            if folder == root or folder.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def get(self, root: str, version) -> Optional[SuggestIndex]:
+        """返回根目录的索引（可能是旧版本）；不存在或版本过期时安排重建"""
+        with self.lock:
+            index = self.indexes.get(root)
+        if index is None:
+            self.refresh(root, version)
+        elif index.version != version and time.time() - index.built_at >= self.min_rebuild_interval:
+            self.refresh(root, version)
+        return index
+
+    def is_building(self, root: str) -> bool:
+        with self.lock:
+            return root in self.building
+
+    def refresh(self, root: str, version):
+        """在后台线程重建根目录的索引，同一根目录同时只有一个重建任务"""
+        with self.lock:
+            if root in self.building:
+                return
+            self.building.add(root)
+        threading.Thread(target=self._build, args=(root, version), daemon=True, name="suggest-build").start()
+
+    def _build(self, root: str, version):
+        try:
+            index = self.builder(root)
+            # 构建期间索引又有保存时版本号仍是旧的，下次查询会再次重建
+            index.version = version
+            with self.lock:
+                self.indexes[root] = index
+            logger.info(f"候选词索引已更新: {root}, {index.file_count} 个文件, {len(index.terms)} 个词, "
+                        f"耗时 {index.build_seconds:.2f} 秒")
+        except Exception as e:
+            logger.error(f"构建候选词索引失败 {root}: {str(e)}")
+        finally:
+            with self.lock:
+                self.building.discard(root)
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+
+    def stats(self) -> List[dict]:
+        with self.lock:
+            return [index.stats() for index in self.indexes.values()]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""测试直接导入 python 目录下的后端模块"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """向量库目录指向临时目录、使用假嵌入模型的后端模块"""
+    api = pytest.importorskip("api")
+    from benchmarks.fake_embeddings import FakeEmbeddings
+    monkeypatch.setattr(api, "VECTOR_STORE_DIR", os.path.join(tmp_path, "vector_store"))
+    monkeypatch.setattr(api, "create_embedding_model", lambda max_retries=None: FakeEmbeddings(dim=32))
+    monkeypatch.setitem(api.EMBEDDING_MODELS, api.EMBEDDING_MODEL_NAME,
+                        dict(api.EMBEDDING_MODELS[api.EMBEDDING_MODEL_NAME], dimension=32))
+    return api
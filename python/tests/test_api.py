@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""索引文件夹时对共享向量库的保护"""
+
+import asyncio
+import os
+
+import pytest
+
+from benchmarks.fake_embeddings import FakeEmbeddings
+from vector_storage import current_index_path, load_vector_store
+
+
+def write_files(folder, contents):
+    os.makedirs(folder, exist_ok=True)
+    for name, content in contents.items():
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def index_files(db_path):
+    """向量库目录中的文件，不含SQLite随连接创建和删除的 -wal、-shm 文件"""
+    return sorted(name for name in os.listdir(db_path) if not name.endswith(("-wal", "-shm")))
+
+
+def test_unreadable_shared_store_is_not_deleted(tmp_path, backend):
+    write_files(os.path.join(tmp_path, "a"), {"a.txt": "第一个文件夹中的文档。" * 20})
+    backend.index_folder(os.path.join(tmp_path, "a"))
+    assert backend.index_status["error"] is None
+
+    db_path = backend.get_db_path()
+    with open(current_index_path(db_path), "wb") as f:
+        f.write(b"not a faiss index")
+    files_before = index_files(db_path)
+
+    write_files(os.path.join(tmp_path, "b"), {"b.txt": "第二个文件夹中的文档。" * 20})
+    backend.index_folder(os.path.join(tmp_path, "b"))
+
+    assert "无法加载现有向量数据库" in backend.index_status["error"]
+    assert index_files(db_path) == files_before
+
+
+def test_model_with_other_dimension_is_rejected(tmp_path, backend):
+    write_files(os.path.join(tmp_path, "a"), {"a.txt": "第一个文件夹中的文档。" * 20})
+    backend.index_folder(os.path.join(tmp_path, "a"))
+
+    response = asyncio.run(backend.update_config(backend.ConfigRequest(embedding_model="all-MiniLM-L6-v2")))
+    assert not response["success"] and "向量维度" in response["message"]
+    assert backend.EMBEDDING_MODEL_NAME == "text-embedding-v2"
+
+    with pytest.raises(ValueError, match="向量维度"):
+        load_vector_store(backend.get_db_path(), FakeEmbeddings(dim=384), dimension=384)
+
+    reader = backend.SnapshotReader(backend.get_db_path(), mmap=False)
+    try:
+        with reader.snapshot() as db, pytest.raises(ValueError, match="向量维度"):
+            backend.similarity_search_in_folder(db, "文档", 5, os.path.join(tmp_path, "a"), [0.0] * 384)
+    finally:
+        reader.close()
+
+
+def test_search_usage_follows_the_vector_store_dir(tmp_path, backend, monkeypatch):
+    monkeypatch.setattr(backend, "search_usages", {})
+    usage = backend.get_search_usage()
+    usage.record("/docs")
+    usage.save()
+
+    assert usage.path.startswith(str(tmp_path))
+    assert os.path.exists(os.path.join(backend.get_db_path(), backend.SEARCH_USAGE_FILE))
+    assert backend.get_search_usage() is usage
+
+
+def test_chunk_limit_applies_to_chunks_not_loader_documents(tmp_path, backend, monkeypatch):
+    monkeypatch.setattr(backend, "MAX_CHUNK_COUNT", 3)
+    folder = os.path.join(tmp_path, "a")
+    # 纯文本文件只有一个加载结果，分块后远多于3块
+    write_files(folder, {"long.txt": "\n\n".join(f"第{i}段，内容各不相同的长文本。" * 40 for i in range(20))})
+    backend.index_folder(folder)
+
+    store = backend.ChunkStore(os.path.join(backend.get_db_path(), backend.CHUNK_STORE_FILE))
+    try:
+        assert len(store.vector_ids_for_sources([os.path.join(folder, "long.txt")])) == 3
+    finally:
+        store.close()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""SQLite文本库：删除向量后的编号前移与faiss一致，编号映射只读"""
+
+import os
+
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from chunk_store import ChunkStore, ChunkIdMap, CHUNK_STORE_FILE
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChunkStore(os.path.join(tmp_path, CHUNK_STORE_FILE), writable=True)
+    yield store
+    store.close()
+
+
+def add_chunks(store, count):
+    store.add_documents({f"doc{i}": Document(page_content=f"文本块 {i}", metadata={"source": f"/docs/file{i % 3}.txt"})
+                         for i in range(count)})
+    store.assign_vector_ids({i: f"doc{i}" for i in range(count)})
+
+
+def test_remove_vector_ids_renumbers_like_faiss(store):
+    count = 10
+    add_chunks(store, count)
+    index = faiss.IndexFlatL2(4)
+    index.add(np.arange(count * 4, dtype=np.float32).reshape(count, 4))
+
+    removed = [7, 0, 3, 4]
+    index.remove_ids(np.array(removed, dtype=np.int64))
+    store.remove_vector_ids(removed)
+
+    expected = [f"doc{i}" for i in range(count) if i not in removed]
+    assert [doc_id for _, doc_id in store.iter_vector_ids()] == expected
+    assert [vector_id for vector_id, _ in store.iter_vector_ids()] == list(range(len(expected)))
+    assert store.vector_count() == index.ntotal
+    # 每个编号对应的向量仍是原来那个文本块的向量
+    for vector_id, doc_id in store.iter_vector_ids():
+        original = int(doc_id[3:])
+        assert index.reconstruct(vector_id)[0] == original * 4
+    assert store.get_document("doc0") is None
+
+
+def test_remove_vector_ids_by_source(store):
+    add_chunks(store, 9)
+    store.remove_vector_ids(store.vector_ids_for_sources(["/docs/file1.txt"]))
+    assert store.sources() == ["/docs/file0.txt", "/docs/file2.txt"]
+    assert [vector_id for vector_id, _ in store.iter_vector_ids()] == list(range(6))
+
+
+def test_remove_nothing_keeps_ids(store):
+    add_chunks(store, 3)
+    store.remove_vector_ids([])
+    assert dict(store.iter_vector_ids()) == {0: "doc0", 1: "doc1", 2: "doc2"}
+
+
+def test_id_map_is_read_only_except_append(store):
+    add_chunks(store, 3)
+    id_map = ChunkIdMap(store)
+    assert id_map[1] == "doc1"
+    assert len(id_map) == 3
+    with pytest.raises(KeyError):
+        id_map[5]
+    with pytest.raises(TypeError):
+        del id_map[0]
+
+    store.add_documents({"doc3": Document(page_content="新文本块", metadata={"source": "/docs/new.txt"})})
+    id_map.update({3: "doc3"})
+    assert id_map[3] == "doc3"
+
+
+def test_chunks_with_lone_surrogates_round_trip(store):
+    content = "扫描件\udcdf文字"
+    store.add_documents({"doc0": Document(page_content=content, metadata={"source": "/docs/scan.pdf"})})
+    assert store.get_document("doc0").page_content == content
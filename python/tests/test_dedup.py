@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""SimHash近似重复判断，以及代表文件删除后重复文件的接替"""
+
+import os
+
+import pytest
+
+from chunk_store import ChunkStore, CHUNK_STORE_FILE
+from dedup import simhash, chunk_hash, remove_surrogates, hamming_distance, DuplicateDetector, SIMHASH_MAX_DISTANCE
+
+REPORT = "这是一份关于季度销售的报告，记录了各地区的销售额和增长情况。" * 20
+OTHER = "The quick brown fox jumps over the lazy dog while the cat sleeps. " * 10
+
+
+def test_simhash_near_duplicates_are_close():
+    assert hamming_distance(simhash(REPORT), simhash(REPORT + "补充说明。")) <= SIMHASH_MAX_DISTANCE
+    # 只差文件名行的内容视为相同
+    assert simhash("文件: a.txt\n\n" + REPORT) == simhash(REPORT)
+    assert hamming_distance(simhash(REPORT), simhash(OTHER)) > SIMHASH_MAX_DISTANCE
+
+
+def test_simhash_skips_short_text():
+    assert simhash("太短了") is None
+
+
+def test_hashes_accept_lone_surrogates():
+    # PyPDF 解析出的文本中可能有单独的代理字符
+    text = REPORT + "\udcdf"
+    assert simhash(text) is not None
+    assert chunk_hash(text) != chunk_hash(REPORT)
+    cleaned = remove_surrogates("价格\udcdf表")
+    assert cleaned == "价格\ufffd表"
+    cleaned.encode("utf-8")
+
+
+def test_detector_finds_pending_and_stored_duplicates(tmp_path):
+    canonical = os.path.join(tmp_path, "a.txt")
+    stored = os.path.join(tmp_path, "b.txt")
+    for path in (canonical, stored):
+        open(path, "w").close()
+    store = ChunkStore(os.path.join(tmp_path, CHUNK_STORE_FILE), writable=True)
+    try:
+        detector = DuplicateDetector(store)
+        detector.add(canonical, "hash-a", simhash(REPORT))
+        assert detector.find_exact("hash-a", "/other.txt") == canonical
+        assert detector.find_exact("hash-a", canonical) is None
+        assert detector.find_near(simhash(REPORT + "补充说明。"), "/other.txt") == canonical
+        assert detector.find_near(simhash(OTHER), "/other.txt") is None
+
+        # 写入向量库后从内存中移除，之后通过文本库找到
+        record = {"source": canonical, "content_hash": "hash-a", "simhash": simhash(REPORT)}
+        store.upsert_file(canonical, 0, 0, "hash-a", simhash(REPORT))
+        detector.forget([record])
+        assert detector.content_hashes == {} and detector.band_index == {}
+        assert detector.find_exact("hash-a", "/other.txt") == canonical
+        assert detector.find_near(simhash(REPORT + "补充说明。"), "/other.txt") == canonical
+
+        # 本身是重复文件（没有文本块）的记录不会成为代表
+        store.upsert_file(stored, 0, 0, "hash-b", simhash(OTHER), canonical=canonical)
+        assert detector.find_exact("hash-b", "/other.txt") is None
+        assert detector.find_near(simhash(OTHER), "/other.txt") is None
+    finally:
+        store.close()
+
+
+def file_records(api):
+    store = ChunkStore(os.path.join(api.get_db_path(), CHUNK_STORE_FILE))
+    try:
+        return {path: (record["canonical"], store.has_source(path)) for path, record in store.file_records().items()}
+    finally:
+        store.close()
+
+
+def test_alias_is_promoted_when_canonical_is_deleted(tmp_path, backend):
+    folder = os.path.join(tmp_path, "docs")
+    os.makedirs(folder)
+    contents = {"a.txt": REPORT, "b.txt": REPORT + "补充说明。", "c.txt": REPORT}
+    for name, content in contents.items():
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            f.write(content)
+    backend.index_folder(folder)
+
+    records = file_records(backend)
+    canonicals = [path for path, (canonical, has_chunks) in records.items() if canonical is None]
+    assert len(canonicals) == 1 and records[canonicals[0]][1]
+    canonical = canonicals[0]
+    assert all(record == (canonical, False) for path, record in records.items() if path != canonical)
+
+    os.remove(canonical)
+    backend.FileIndexHandler(folder).apply_changes(set(), {canonical})
+
+    records = file_records(backend)
+    assert canonical not in records
+    promoted = [path for path, (canonical_path, has_chunks) in records.items() if canonical_path is None]
+    assert len(promoted) == 1 and records[promoted[0]][1]
+    assert all(record == (promoted[0], False) for path, record in records.items() if path != promoted[0])
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""嵌入批处理的退避重试、批次拆分，以及死信队列的持久化"""
+
+from langchain_core.documents import Document
+
+from embedding import EmbeddingBatcher, DeadLetterQueue, is_retryable_error
+
+
+class LengthCounter:
+    def count(self, text: str) -> int:
+        return len(text)
+
+
+class HttpError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedModel:
+    """按顺序抛出给定的错误后正常返回；包含 bad 的文本总是失败"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.errors:
+            raise self.errors.pop(0)
+        if any("bad" in text for text in texts):
+            raise ValueError("invalid input")
+        return [[float(len(text))] for text in texts]
+
+
+def make_batcher(model, **options):
+    return EmbeddingBatcher(model, LengthCounter(), max_rows=options.pop("max_rows", 10),
+                            max_tokens=options.pop("max_tokens", 100), base_delay=0, **options)
+
+
+def docs(*texts):
+    return [Document(page_content=text, metadata={"source": f"/docs/{text}.txt"}) for text in texts]
+
+
+def test_retryable_errors_are_classified_by_status_and_code():
+    assert is_retryable_error(HttpError(429))
+    assert is_retryable_error(HttpError(503))
+    assert not is_retryable_error(HttpError(400))
+    assert is_retryable_error(TimeoutError())
+    assert is_retryable_error(Exception("Throttling.RateQuota"))
+    assert not is_retryable_error(Exception("throttling is mentioned in lowercase"))
+
+
+def test_batches_respect_rows_and_tokens():
+    batcher = make_batcher(ScriptedModel(), max_rows=2, max_tokens=10)
+    batches = list(batcher.iter_batches(docs("aaaa", "bbbb", "cccc", "dddddddd", "e")))
+    assert [[doc.page_content for doc in batch] for batch in batches] == [["aaaa", "bbbb"], ["cccc"], ["dddddddd", "e"]]
+
+
+def test_throttled_requests_back_off_and_retry(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("embedding.time.sleep", sleeps.append)
+    model = ScriptedModel([HttpError(429), HttpError(503)])
+    embedded, failed = make_batcher(model).embed_batch(docs("one", "two"))
+    assert [doc.page_content for doc, _ in embedded] == ["one", "two"] and not failed
+    assert len(model.calls) == 3 and len(sleeps) == 2
+
+
+def test_retries_are_bounded_and_batch_goes_to_dead_letter(monkeypatch):
+    monkeypatch.setattr("embedding.time.sleep", lambda seconds: None)
+    model = ScriptedModel([HttpError(429)] * 10)
+    embedded, failed = make_batcher(model, max_retries=2).embed_batch(docs("one", "two"))
+    assert not embedded and [doc.page_content for doc, _ in failed] == ["one", "two"]
+    # 重试用尽的临时错误整批失败，不拆分
+    assert len(model.calls) == 3
+
+
+def test_permanent_errors_split_the_batch_to_isolate_bad_texts():
+    embedded, failed = make_batcher(ScriptedModel()).embed_batch(docs("one", "bad", "two", "three"))
+    assert sorted(doc.page_content for doc, _ in embedded) == ["one", "three", "two"]
+    assert [(doc.page_content, error) for doc, error in failed] == [("bad", "invalid input")]
+
+
+def test_dead_letter_queue_persists_and_counts_attempts(tmp_path):
+    queue = DeadLetterQueue(str(tmp_path), "/docs")
+    failed = docs("bad", "worse")
+    queue.add([(doc, "invalid input") for doc in failed])
+    queue.add([(failed[0], "still invalid")])
+
+    reloaded = DeadLetterQueue(str(tmp_path), "/docs")
+    assert len(reloaded) == 2
+    assert reloaded.entries[DeadLetterQueue.entry_id(failed[0])]["attempts"] == 2
+    assert [doc.page_content for doc in reloaded.pending(max_attempts=2)] == ["worse"]
+
+    reloaded.remove_sources(["/docs/worse.txt"])
+    reloaded.remove(docs("bad"))
+    assert len(DeadLetterQueue(str(tmp_path), "/docs")) == 0
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""共享嵌入客户端：按状态码和连接错误区分可重试的错误，重试与按行数分批请求"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import embedding_client
+from embedding import is_retryable_error
+from embedding_client import DashScopeClient, DashScopeError, DashScopeHttpEmbeddings, MAX_TEXTS_PER_REQUEST
+
+
+def embeddings_response(texts):
+    # 故意倒序返回，客户端按 text_index 排序
+    items = [{"text_index": i, "embedding": [float(len(text))]} for i, text in enumerate(texts)]
+    return httpx.Response(200, json={"output": {"embeddings": items[::-1]}})
+
+
+def make_client(responses):
+    """依次返回 responses 中的响应（或抛出其中的异常），之后正常返回向量"""
+    requests = []
+
+    def handler(request):
+        texts = json.loads(request.content)["input"]["texts"]
+        requests.append(texts)
+        if responses:
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return embeddings_response(texts)
+
+    client = DashScopeClient("test-key", http2=False)
+    transport = httpx.MockTransport(handler)
+    client.client = httpx.Client(base_url=client.base_url, transport=transport)
+    client._get_async_client = lambda: httpx.AsyncClient(base_url=client.base_url, transport=transport)
+    return client, requests
+
+
+@pytest.mark.parametrize("status_code, retryable", [(429, True), (500, True), (503, True), (400, False), (401, False)])
+def test_http_errors_are_classified(status_code, retryable):
+    client, _ = make_client([httpx.Response(status_code, json={"code": "Code", "message": "failed"})])
+    with pytest.raises(DashScopeError) as error:
+        client.embed("text-embedding-v2", ["text"])
+    assert error.value.status_code == status_code
+    assert error.value.retryable is retryable
+    assert is_retryable_error(error.value) is retryable
+
+
+def test_connection_errors_are_retryable():
+    client, _ = make_client([httpx.ConnectError("connection refused")])
+    with pytest.raises(DashScopeError) as error:
+        client.embed("text-embedding-v2", ["text"])
+    assert error.value.retryable and error.value.status_code is None
+
+
+def test_retryable_errors_are_retried_and_others_are_not(monkeypatch):
+    monkeypatch.setattr(embedding_client.time, "sleep", lambda seconds: None)
+    client, requests = make_client([httpx.Response(503), httpx.Response(429)])
+    assert DashScopeHttpEmbeddings(client, "text-embedding-v2", max_retries=3).embed_query("abc") == [3.0]
+    assert len(requests) == 3
+
+    client, requests = make_client([httpx.Response(400, json={"code": "InvalidParameter", "message": "bad"})])
+    with pytest.raises(DashScopeError):
+        DashScopeHttpEmbeddings(client, "text-embedding-v2", max_retries=3).embed_query("abc")
+    assert len(requests) == 1
+
+
+def test_texts_are_split_into_requests_and_kept_in_order():
+    client, requests = make_client([])
+    texts = ["x" * (i + 1) for i in range(MAX_TEXTS_PER_REQUEST + 5)]
+    vectors = DashScopeHttpEmbeddings(client, "text-embedding-v2").embed_documents(texts)
+    assert [len(batch) for batch in requests] == [MAX_TEXTS_PER_REQUEST, 5]
+    assert vectors == [[float(len(text))] for text in texts]
+
+
+def test_async_requests_retry_throttling(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+    monkeypatch.setattr(embedding_client.asyncio, "sleep", no_sleep)
+    client, requests = make_client([httpx.Response(429, json={"code": "Throttling.RateQuota", "message": "slow down"})])
+    model = DashScopeHttpEmbeddings(client, "text-embedding-v2", max_retries=2)
+    assert asyncio.run(model.aembed_query("abcd")) == [4.0]
+    assert len(requests) == 2
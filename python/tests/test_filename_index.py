@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""文件名三字母组索引：子串和模糊匹配、文件夹过滤、删除后重建以及流式扫描"""
+
+from filename_index import FilenameIndex, looks_like_filename
+
+ROOT = "/docs"
+
+
+def build(paths):
+    index = FilenameIndex()
+    index.replace_root(ROOT, paths)
+    return index
+
+
+def test_looks_like_filename():
+    assert looks_like_filename("report_2024.pdf")
+    assert looks_like_filename("a/b")
+    assert looks_like_filename("invoice-03")
+    assert not looks_like_filename("how are sales this quarter")
+
+
+def test_name_matches_rank_before_path_and_fuzzy_matches():
+    index = build(["/docs/budget/plan.xlsx", "/docs/q3_budget_plan.xlsx", "/docs/other/budgte.txt",
+                   "/docs/misc/readme.md"])
+    results = index.search("budget", limit=5)
+    assert [(result["path"], result["match"]) for result in results[:2]] == [
+        ("/docs/q3_budget_plan.xlsx", "name"), ("/docs/budget/plan.xlsx", "path")]
+    assert all(result["path"] != "/docs/misc/readme.md" for result in results)
+    assert results[0]["similarity"] == 1.0
+
+
+def test_typos_match_through_shared_trigrams():
+    index = build(["/docs/quarterly_report.pdf", "/docs/notes.txt"])
+    results = index.search("quartely_report", limit=5)
+    assert [result["path"] for result in results] == ["/docs/quarterly_report.pdf"]
+    assert results[0]["match"] == "fuzzy"
+
+
+def test_short_queries_and_folder_filter():
+    index = build(["/docs/a/ab.txt", "/docs/b/ab.txt", "/docs/b/cd.txt"])
+    assert {result["path"] for result in index.search("ab")} == {"/docs/a/ab.txt", "/docs/b/ab.txt"}
+    assert [result["path"] for result in index.search("ab", folder="/docs/b")] == ["/docs/b/ab.txt"]
+    assert index.search("ab", folder="/docs/bb") == []
+
+
+def test_removed_files_disappear_and_compaction_keeps_results():
+    paths = [f"/docs/file_{i:05d}.txt" for i in range(2500)]
+    index = build(paths)
+    for path in paths[:2000]:
+        index.remove(path)
+    # 删除标记超过存活文件数后倒排表重建
+    assert index.dead < 2000 and len(index) == 500
+    assert all(result["path"] not in paths[:2000] for result in index.search("file_00001", limit=50))
+    assert [result["path"] for result in index.search("file_02400.txt", limit=1)] == ["/docs/file_02400.txt"]
+
+
+def test_stream_scan_removes_files_not_seen_again():
+    index = build(["/docs/old.txt", "/docs/kept.txt", "/other/x.txt"])
+    scan = index.begin_scan(ROOT)
+    scan.add("/docs/kept.txt")
+    scan.add("/docs/new.txt")
+    scan.finish()
+    assert {doc[0] for doc in index.docs if doc is not None} == {"/docs/kept.txt", "/docs/new.txt", "/other/x.txt"}
+
+    scan = index.begin_scan(ROOT)
+    scan.finish(remove_missing=False)
+    assert len(index) == 3
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""本地嵌入的分桶和平均池化，不需要模型文件"""
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from local_embedding import LocalMiniLMEmbeddings
+
+
+def test_batches_are_sorted_by_length_and_bounded():
+    model = LocalMiniLMEmbeddings(batch_size=3, max_batch_tokens=40)
+    lengths = [12, 3, 30, 5, 4, 8, 7]
+    batches = list(model.iter_batches(lengths))
+
+    assert sorted(index for batch in batches for index in batch) == list(range(len(lengths)))
+    flattened = [lengths[index] for batch in batches for index in batch]
+    assert flattened == sorted(lengths)
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) == 1 or len(batch) * max(lengths[index] for index in batch) <= 40
+
+
+class FakeSession:
+    def __init__(self, hidden):
+        self.hidden = hidden
+        self.feeds = None
+
+    def run(self, outputs, feeds):
+        self.feeds = feeds
+        return [self.hidden]
+
+
+def test_mean_pooling_ignores_padding():
+    model = LocalMiniLMEmbeddings()
+    model.input_names = {"input_ids", "attention_mask", "token_type_ids"}
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]],
+                       [[0.0, 2.0], [0.0, 4.0], [0.0, 6.0]]], dtype=np.float32)
+    model.session = FakeSession(hidden)
+    encodings = [SimpleNamespace(ids=[101, 7]), SimpleNamespace(ids=[101, 8, 9])]
+
+    vectors = model._run_batch(encodings)
+
+    assert model.session.feeds["attention_mask"].tolist() == [[1, 1, 0], [1, 1, 1]]
+    assert "token_type_ids" in model.session.feeds
+    np.testing.assert_allclose(vectors, [[1.0, 0.0], [0.0, 1.0]], atol=1e-6)
@@ -0,0 +1,25 @@
+from ocr import OcrCache, OcrEngine
+
+
+def test_cache_round_trips_lone_surrogates(tmp_path):
+    cache = OcrCache(str(tmp_path / "ocr_cache.sqlite"))
+    cache.put("page0", "识别\udcdf结果")
+    assert cache.get_many(["page0", "page1"]) == {"page0": "识别\udcdf结果"}
+    cache.close()
+
+
+def test_cache_key_includes_lang_and_dpi(tmp_path):
+    cache_path = str(tmp_path / "ocr_cache.sqlite")
+    engine = OcrEngine(cache_path, lang="eng", dpi=200)
+    assert engine._key("abc") != OcrEngine(cache_path, lang="chi_sim", dpi=200)._key("abc")
+    assert engine._key("abc") != OcrEngine(cache_path, lang="eng", dpi=300)._key("abc")
+    assert engine._key("abc") == OcrEngine(cache_path, lang="eng", dpi=200)._key("abc")
+
+
+def test_cached_pages_skip_the_process_pool(tmp_path):
+    engine = OcrEngine(str(tmp_path / "ocr_cache.sqlite"))
+    engine.cache.put(engine._key("hash0"), "已缓存")
+    # 图片路径不存在，只有命中缓存时才能返回文本
+    assert engine.ocr_image(str(tmp_path / "missing.png"), "hash0") == "已缓存"
+    assert engine.pool is None
+    engine.shutdown()
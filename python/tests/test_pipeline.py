@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""有界流水线：顺序传递、背压、消费端提前停止和阶段出错时的传播"""
+
+import threading
+import itertools
+
+import pytest
+
+from pipeline import Pipeline, PipelineStopped
+
+
+def double(items):
+    for item in items:
+        yield item * 2
+
+
+def test_items_pass_through_in_order():
+    with Pipeline() as pipeline:
+        first = pipeline.stage("first", double, range(100), maxsize=4)
+        second = pipeline.stage("second", double, first, maxsize=4)
+        assert list(second) == [i * 4 for i in range(100)]
+    assert pipeline.stats()["first"]["produced"] == 100
+    assert all(not stage.thread.is_alive() for stage in pipeline.stages)
+
+
+def test_close_stops_upstream_and_runs_generator_cleanup():
+    produced = []
+    cleaned_up = threading.Event()
+
+    def source(_):
+        try:
+            for i in itertools.count():
+                produced.append(i)
+                yield i
+        finally:
+            cleaned_up.set()
+
+    with Pipeline() as pipeline:
+        stage = pipeline.stage("source", source, None, maxsize=2)
+        for item in stage:
+            if item == 5:
+                break
+    assert cleaned_up.is_set()
+    assert not stage.thread.is_alive()
+    # 无限的上游被有界队列挡住，只多产出了队列容量附近的几个条目
+    assert len(produced) <= 5 + 1 + 2 + 1
+
+
+def test_stage_error_propagates_to_consumer_and_stops_all_stages():
+    upstream_closed = threading.Event()
+
+    def source(_):
+        try:
+            yield from itertools.count()
+        finally:
+            upstream_closed.set()
+
+    def failing(items):
+        for item in items:
+            if item == 10:
+                raise ValueError("解析失败")
+            yield item
+
+    pipeline = Pipeline()
+    with pytest.raises(ValueError, match="解析失败"):
+        with pipeline:
+            first = pipeline.stage("source", source, None, maxsize=2)
+            second = pipeline.stage("parse", failing, first, maxsize=2)
+            list(second)
+    assert pipeline.stopped
+    assert upstream_closed.is_set()
+    assert all(not stage.thread.is_alive() for stage in pipeline.stages)
+
+
+def test_first_error_wins():
+    pipeline = Pipeline()
+    pipeline.fail(ValueError("第一个"))
+    pipeline.fail(RuntimeError("第二个"))
+    with pytest.raises(ValueError, match="第一个"):
+        pipeline.raise_failure()
+
+
+def test_consumer_sees_stop_without_failure_as_pipeline_stopped():
+    def endless(_):
+        yield from itertools.count()
+
+    with Pipeline() as pipeline:
+        stage = pipeline.stage("source", endless, None, maxsize=1)
+        pipeline.stop()
+        with pytest.raises(PipelineStopped):
+            for _ in stage:
+                pass
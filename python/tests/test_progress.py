@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""索引进度文件明细的游标分页"""
+
+from progress import FileHistory
+
+
+def entry(i):
+    return {"name": f"file{i}.txt", "path": f"/docs/sub/file{i}.txt"}
+
+
+def test_cursor_pages_through_all_categories_in_order():
+    history = FileHistory()
+    for i in range(10):
+        history.add(("success", "failed", "skipped")[i % 3], entry(i))
+
+    seen = []
+    cursor = 0
+    while True:
+        page = history.page(after=cursor, limit=3)
+        seen.extend(item["name"] for item in page["files"])
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    assert seen == [f"file{i}.txt" for i in range(10)]
+    assert cursor == history.cursor == 10
+
+    # 之后只返回新的记录
+    history.add("success", entry(10))
+    page = history.page(after=cursor)
+    assert [item["seq"] for item in page["files"]] == [11]
+    assert page["next_cursor"] == 11 and not page["has_more"]
+
+
+def test_filters_by_category_and_query():
+    history = FileHistory()
+    for i in range(6):
+        history.add("failed" if i % 2 else "success", entry(i))
+
+    page = history.page(category="failed")
+    assert [item["name"] for item in page["files"]] == ["file1.txt", "file3.txt", "file5.txt"]
+    assert all(item["category"] == "failed" for item in page["files"])
+
+    page = history.page(query="FILE4")
+    assert [item["name"] for item in page["files"]] == ["file4.txt"]
+    # 过滤后没有更多记录时游标直接跳到最新序号
+    assert page["next_cursor"] == 6 and not page["has_more"]
+
+
+def test_limit_drops_oldest_entries_and_counts_them():
+    history = FileHistory(limit=3)
+    for i in range(5):
+        history.add("success", entry(i))
+    page = history.page()
+    assert [item["name"] for item in page["files"]] == ["file2.txt", "file3.txt", "file4.txt"]
+    assert page["dropped"]["success"] == 2
+    assert len(history.snapshot("success")) == 3
+
+
+def test_clear_keeps_sequence_so_old_cursors_skip_new_task():
+    history = FileHistory()
+    for i in range(3):
+        history.add("success", entry(i))
+    cursor = history.cursor
+    history.clear()
+    history.add("skipped", entry(3))
+    page = history.page(after=cursor)
+    assert [item["seq"] for item in page["files"]] == [4]
+    assert page["dropped"] == {"success": 0, "failed": 0, "skipped": 0}
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""搜索结果缓存：相同查询只计算一次，重叠文件夹的索引保存后缓存失效"""
+
+import asyncio
+
+import pytest
+
+from query_cache import QueryCache, folders_overlap
+
+
+class Counter:
+    def __init__(self, result="results", delay: float = 0):
+        self.calls = 0
+        self.result = result
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+def test_folders_overlap_only_on_path_boundaries():
+    assert folders_overlap("/docs", "/docs/a")
+    assert folders_overlap("/docs/a", "/docs")
+    assert not folders_overlap("/docs/a", "/docs/ab")
+
+
+def test_concurrent_identical_queries_share_one_computation():
+    cache = QueryCache()
+    compute = Counter(delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_compute("/docs", "q", None, compute) for _ in range(5)])
+
+    assert asyncio.run(run()) == ["results"] * 5
+    assert compute.calls == 1
+    assert cache.get_stats()["coalesced"] == 4
+    assert asyncio.run(cache.get_or_compute("/docs", "q", None, compute)) == "results"
+    assert compute.calls == 1
+
+
+def test_saving_an_overlapping_folder_invalidates_results():
+    cache = QueryCache()
+    compute = Counter()
+    for folder in ("/docs", "/docs/a", "/other"):
+        asyncio.run(cache.get_or_compute(folder, "q", None, compute))
+    assert compute.calls == 3
+
+    cache.invalidate("/docs/a")
+    for folder in ("/docs", "/docs/a", "/other"):
+        asyncio.run(cache.get_or_compute(folder, "q", None, compute))
+    # 只有与 /docs/a 重叠的两个文件夹重新计算
+    assert compute.calls == 5
+
+    cache.invalidate()
+    asyncio.run(cache.get_or_compute("/other", "q", None, compute))
+    assert compute.calls == 6
+
+
+def test_results_computed_across_a_save_are_not_cached():
+    cache = QueryCache()
+
+    async def compute_during_save():
+        cache.invalidate("/docs")
+        return "stale"
+
+    assert asyncio.run(cache.get_or_compute("/docs", "q", None, compute_during_save)) == "stale"
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_errors_and_none_results_are_not_cached():
+    cache = QueryCache()
+
+    async def failing():
+        raise RuntimeError("search failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_compute("/docs", "q", None, failing))
+    not_indexed = Counter(result=None)
+    asyncio.run(cache.get_or_compute("/docs", "q", None, not_indexed))
+    asyncio.run(cache.get_or_compute("/docs", "q", None, not_indexed))
+    assert not_indexed.calls == 2
+    assert cache.get_stats()["entries"] == 0 and not cache.inflight
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""候选词：前缀索引的排序和预计算、文件名与高频词匹配、查询记录"""
+
+import threading
+import time
+
+from suggest import PrefixIndex, SuggestIndex, SuggestRegistry, QueryHistory, count_terms
+
+
+def test_prefix_lookup_returns_best_scores_without_duplicates():
+    index = PrefixIndex([("report", 1.0, "a"), ("repo", 3.0, "b"), ("readme", 2.0, "c"),
+                         ("report", 5.0, "b"), ("zip", 9.0, "d")])
+    assert index.lookup("rep", 5) == [("b", 5.0), ("a", 1.0)]
+    assert index.lookup("r", 2) == [("b", 5.0), ("c", 2.0)]
+    assert index.lookup("x", 5) == []
+
+
+def test_heavy_prefixes_match_a_full_scan():
+    items = [(f"file{i:04d}", float(i % 97), f"/docs/file{i:04d}") for i in range(1000)]
+    index = PrefixIndex(items, top_k=10, heavy_threshold=50)
+    assert "f" in index.heavy and "file0" in index.heavy
+    expected = sorted(items, key=lambda item: item[1], reverse=True)[:10]
+    assert [score for _, score in index.lookup("file", 10)] == [item[1] for item in expected]
+
+
+def test_count_terms_skips_stop_characters():
+    counts = count_terms(["光伏储能的报告", "Solar solar battery"])
+    assert counts["solar"] == 2 and counts["battery"] == 1
+    assert counts["光伏"] == 1 and counts["储能"] == 1
+    assert "能的" not in counts and "的报" not in counts
+
+
+def test_files_match_by_any_name_token_and_folder():
+    files = {"/docs/a/季度_销售报告.pdf": 3.0, "/docs/b/sales-report.docx": 2.0, "/docs/b/notes.txt": 1.0}
+    index = SuggestIndex("/docs", files, ["销售报告 销售报告 revenue revenue"])
+    assert [match["path"] for match in index.match_files("report", 5)] == ["/docs/b/sales-report.docx"]
+    assert [match["path"] for match in index.match_files("销售", 5)] == ["/docs/a/季度_销售报告.pdf"]
+    assert index.match_files("销售", 5, folder="/docs/b") == []
+    # 扩展名不单独作为键
+    assert index.match_files("pdf", 5) == []
+    assert {match["text"] for match in index.match_terms("销售", 5)} >= {"销售"}
+    assert index.match_terms("rev", 5) == [{"type": "term", "text": "revenue", "count": 2}]
+
+
+def test_query_history_prefers_frequent_queries():
+    history = QueryHistory(limit=2)
+    for query in ["Solar panels", "solar battery", "solar battery", "grid"]:
+        history.record(query)
+    assert [match["text"] for match in history.match("solar", 5)] == ["solar battery"]
+
+
+def test_registry_rebuilds_in_background_and_keeps_old_index():
+    built = threading.Event()
+
+    def builder(root):
+        index = SuggestIndex(root, {f"{root}/a.txt": 1.0}, [])
+        built.set()
+        return index
+
+    registry = SuggestRegistry(builder, min_rebuild_interval=0)
+    assert registry.get("/docs", 1) is None
+    assert built.wait(5)
+    deadline = time.time() + 5
+    while registry.is_building("/docs") and time.time() < deadline:
+        time.sleep(0.01)
+    index = registry.get("/docs", 1)
+    assert index is not None and index.version == 1
+    assert registry.find_root("/docs/sub") == "/docs"
+    assert registry.find_root("/docsx") is None
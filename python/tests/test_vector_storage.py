@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""向量库存储：旧版 pickle 文本库的迁移、版本快照，以及SQ8取值范围的重新训练"""
+
+import os
+
+import numpy as np
+import pytest
+
+import vector_storage
+from benchmarks.fake_embeddings import FakeEmbeddings
+from vector_storage import (load_vector_store, save_vector_store, close_vector_store, add_embeddings,
+                            SnapshotReader, similarity_search_in_folder, LEGACY_DOCSTORE_FILE, INDEX_FILE)
+
+DIM = 16
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings(dim=DIM)
+
+
+def write_legacy_store(db_path, embeddings, texts):
+    from langchain_community.vectorstores import FAISS
+    db = FAISS.from_texts(texts, embeddings, metadatas=[{"source": f"/docs/{i}.txt"} for i in range(len(texts))])
+    db.save_local(db_path)
+    return db
+
+
+def test_read_only_load_does_not_migrate_legacy_store(tmp_path, embeddings):
+    db_path = str(tmp_path)
+    write_legacy_store(db_path, embeddings, ["甲", "乙"])
+    with pytest.raises(FileNotFoundError):
+        load_vector_store(db_path, embeddings)
+    assert sorted(os.listdir(db_path)) == [INDEX_FILE, LEGACY_DOCSTORE_FILE]
+
+
+def test_writable_load_migrates_legacy_store(tmp_path, embeddings):
+    db_path = str(tmp_path)
+    texts = ["第一段内容", "第二段内容", "第三段内容"]
+    legacy = write_legacy_store(db_path, embeddings, texts)
+
+    db = load_vector_store(db_path, embeddings, writable=True)
+    try:
+        assert not os.path.exists(os.path.join(db_path, LEGACY_DOCSTORE_FILE))
+        assert db.index.ntotal == len(texts)
+        assert len(db.index_to_docstore_id) == len(texts)
+        for vector_id, doc_id in legacy.index_to_docstore_id.items():
+            assert db.index_to_docstore_id[vector_id] == doc_id
+            assert db.docstore.search(doc_id).page_content == legacy.docstore.search(doc_id).page_content
+    finally:
+        close_vector_store(db)
+
+    # 迁移后的向量库可以只读加载和检索
+    db = load_vector_store(db_path, embeddings)
+    try:
+        results = similarity_search_in_folder(db, "第二段内容", 1, "/docs")
+        assert results[0][0].page_content == "第二段内容"
+    finally:
+        close_vector_store(db)
+
+
+def test_snapshot_reader_follows_new_versions(tmp_path, embeddings):
+    db_path = str(tmp_path)
+    db = add_embeddings(None, [("旧内容", embeddings.embed_query("旧内容"))], embeddings, [{"source": "/docs/a.txt"}])
+    save_vector_store(db, db_path)
+    close_vector_store(db)
+
+    reader = SnapshotReader(db_path, mmap=False)
+    try:
+        query = embeddings.embed_query("新内容")
+        with reader.snapshot() as snapshot:
+            assert snapshot.index.ntotal == 1
+            first_version = reader.version
+
+        db = load_vector_store(db_path, embeddings, writable=True)
+        add_embeddings(db, [("新内容", query)], embeddings, [{"source": "/docs/b.txt"}])
+        save_vector_store(db, db_path)
+        close_vector_store(db)
+
+        with reader.snapshot() as snapshot:
+            assert reader.version == first_version + 1
+            results = similarity_search_in_folder(snapshot, "新内容", 1, "/docs", query)
+            assert results[0][0].page_content == "新内容"
+    finally:
+        reader.close()
+
+
+def test_folder_selectors_are_cached_per_version(tmp_path, embeddings):
+    db_path = str(tmp_path)
+    texts = [("甲文件夹", "/docs/a/1.txt"), ("乙文件夹", "/docs/b/1.txt")]
+    db = add_embeddings(None, [(text, embeddings.embed_query(text)) for text, _ in texts], embeddings,
+                        [{"source": source} for _, source in texts])
+    save_vector_store(db, db_path)
+    close_vector_store(db)
+
+    reader = SnapshotReader(db_path, mmap=False)
+    try:
+        query = embeddings.embed_query("甲文件夹")
+        with reader.snapshot() as snapshot:
+            similarity_search_in_folder(snapshot, "甲文件夹", 5, "/docs/a", query)
+            selector = snapshot.folder_selectors["/docs/a/"]
+            results = similarity_search_in_folder(snapshot, "甲文件夹", 5, "/docs/a", query)
+            assert snapshot.folder_selectors["/docs/a/"] is selector
+            assert [doc.page_content for doc, _ in results] == ["甲文件夹"]
+
+        db = load_vector_store(db_path, embeddings, writable=True)
+        add_embeddings(db, [("甲文件夹新文件", embeddings.embed_query("甲文件夹新文件"))], embeddings,
+                       [{"source": "/docs/a/2.txt"}])
+        save_vector_store(db, db_path)
+        close_vector_store(db)
+
+        with reader.snapshot() as snapshot:
+            results = similarity_search_in_folder(snapshot, "甲文件夹", 5, "/docs/a", query)
+            assert sorted(doc.page_content for doc, _ in results) == ["甲文件夹", "甲文件夹新文件"]
+    finally:
+        reader.close()
+
+
+def test_sq8_is_retrained_before_adding_vectors_outside_its_range(tmp_path, embeddings):
+    db_path = str(tmp_path)
+    rng = np.random.default_rng(0)
+    small = (rng.standard_normal((100, DIM)) * 0.1).astype(np.float32)
+    db = add_embeddings(None, [(f"小{i}", vector.tolist()) for i, vector in enumerate(small)], embeddings,
+                        [{"source": "/docs/small.txt"}] * len(small))
+    save_vector_store(db, db_path, "sq8")
+    close_vector_store(db)
+
+    large = (rng.standard_normal((50, DIM)) * 2.0).astype(np.float32)
+    db = load_vector_store(db_path, embeddings, writable=True)
+    try:
+        add_embeddings(db, [(f"大{i}", vector.tolist()) for i, vector in enumerate(large)], embeddings,
+                       [{"source": "/docs/large.txt"}] * len(large))
+        save_vector_store(db, db_path, "sq8")
+        assert vector_storage.get_index_qtype(db.index) is not None
+        # 新向量没有被截断到旧的取值范围，旧向量重新编码后仍接近原值
+        step = (large.max(axis=0) - large.min(axis=0)).max() / 255
+        assert np.abs(db.index.reconstruct_n(len(small), len(large)) - large).max() < 2 * step
+        assert np.abs(db.index.reconstruct_n(0, len(small)) - small).max() < 2 * step
+    finally:
+        close_vector_store(db)
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""向量索引存储：只读内存映射加载索引文件，可选SQ8/fp16标量量化压缩存储的向量，文本块保存在SQLite中按需读取
+
+所有已索引文件夹共用一个向量库，每个文件夹是按路径前缀过滤的视图，重叠或嵌套的文件夹不会重复嵌入。
+索引文件按版本保存（index-<版本>.faiss），版本号与文本块在同一个SQLite事务中提交，
+读取方在一个读事务中先读版本号再打开对应的索引文件，索引和文本块总是属于同一个版本；
+index.faiss 是最新版本的硬链接，用于判断向量库是否存在，没有版本号的旧向量库只有这个文件。
+"""
+
+import os
+import re
+import time
+import pickle
+import shutil
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, TYPE_CHECKING
+
+import numpy as np
+
+from chunk_store import ChunkStore, ChunkDocstore, ChunkIdMap, CHUNK_STORE_FILE
+from dedup import chunk_hash
+from metrics import INDEX_LOAD_SECONDS, INDEX_SEARCH_SECONDS, INDEX_VECTORS
+from profiling import lazy_import
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+_VERSIONED_INDEX_PATTERN = re.compile(r"^index-(\d+)\.faiss$")
+# 旧版本由 FAISS.save_local 写入的 pickle 文本库，以可写方式加载时迁移到 CHUNK_STORE_FILE
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# 向量存储格式，qtype 为 faiss.ScalarQuantizer 中的量化类型名
+STORAGE_MODES = {
+    "flat": {"name": "原始float32", "qtype": None},
+    "fp16": {"name": "半精度(fp16)，体积减半", "qtype": "QT_fp16"},
+    "sq8": {"name": "8位标量量化(SQ8)，体积为原来的1/4", "qtype": "QT_8bit"}
+}
+FOLDER_SELECTOR_CACHE_SIZE = 32  # 每个索引版本缓存的文件夹向量编号选择器数量
+SQ8_RANGE_MARGIN = 0.1  # 训练SQ8取值范围时每一维两端各放宽的比例（相对于训练向量的取值跨度）
+
+
+def _faiss():
+    """faiss 和 langchain 的 FAISS 向量库导入耗时较长，不在启动时导入，第一次用到时才导入"""
+    return lazy_import("faiss")
+
+
+def _faiss_store():
+    return lazy_import("langchain_community.vectorstores.faiss").FAISS
+
+
+def get_index_qtype(index):
+    """返回索引的标量量化类型，非量化索引返回None"""
+    faiss = _faiss()
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return index.sq.qtype
+    return None
+
+
+def convert_index(index, mode: str):
+    """把索引转换为指定的存储格式，格式相同时原样返回"""
+    faiss = _faiss()
+    qtype_name = STORAGE_MODES[mode]["qtype"]
+    target_qtype = getattr(faiss.ScalarQuantizer, qtype_name) if qtype_name else None
+    if get_index_qtype(index) == target_qtype:
+        return index
+    if target_qtype is None and isinstance(index, faiss.IndexFlat):
+        return index
+
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal > 0 else None
+    if target_qtype is None:
+        converted = faiss.IndexFlat(index.d, index.metric_type)
+    else:
+        converted = _new_quantized_index(index, target_qtype, vectors)
+    if vectors is not None:
+        converted.add(vectors)
+    return converted
+
+
+def _new_quantized_index(index, qtype, training_vectors):
+    faiss = _faiss()
+    converted = faiss.IndexScalarQuantizer(index.d, qtype, index.metric_type)
+    # 每一维的取值范围两端再放宽一些，之后追加的向量略超出训练时的范围也不必重新训练
+    converted.sq.rangestat_arg = SQ8_RANGE_MARGIN
+    if training_vectors is not None:
+        # SQ8需要根据现有向量训练每一维的取值范围
+        converted.train(training_vectors)
+    return converted
+
+
+def fit_quantizer(index, vectors: np.ndarray):
+    """要追加的向量超出SQ8索引训练的取值范围时（否则会被截断），用现有向量和新向量重新训练并重新编码现有向量
+
+    返回可以直接加入这些向量的索引，取值范围足够时原样返回。
+    """
+    faiss = _faiss()
+    if get_index_qtype(index) != faiss.ScalarQuantizer.QT_8bit or not index.is_trained or index.ntotal == 0:
+        return index
+    # 非均匀SQ8的训练结果是每一维的最小值和取值跨度
+    trained = faiss.vector_to_array(index.sq.trained)
+    vmin, vdiff = trained[:index.d], trained[index.d:]
+    if ((vectors >= vmin) & (vectors <= vmin + vdiff)).all():
+        return index
+    existing = index.reconstruct_n(0, index.ntotal)
+    converted = _new_quantized_index(index, faiss.ScalarQuantizer.QT_8bit, np.vstack([existing, vectors]))
+    converted.add(existing)
+    logger.info(f"追加的向量超出SQ8取值范围，已重新训练并重新编码 {index.ntotal} 个向量")
+    return converted
+
+
+def write_index(index, path: str, mode: str):
+    """按指定格式写入索引文件，先写临时文件再替换，读取方不会看到写了一半的文件"""
+    index = convert_index(index, mode)
+    temp_path = f"{path}.tmp"
+    _faiss().write_index(index, temp_path)
+    os.replace(temp_path, path)
+    return index
+
+
+def read_index(path: str, mmap: bool = True):
+    """读取索引文件，mmap=True时以只读内存映射方式打开，不把向量复制到进程内存"""
+    faiss = _faiss()
+    # 零拷贝内存映射需要较新的faiss版本
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap and mmap_flag is not None:
+        return faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    if mmap:
+        logger.warning("当前faiss版本不支持内存映射加载索引，将完整读入内存")
+    return faiss.read_index(path)
+
+
+def migrate_legacy_docstore(db_path: str):
+    """把旧版 index.pkl 中的文本块迁移到SQLite文本库，迁移完成后删除 pickle 文件
+
+    会写入文本库并删除文件，只在写入路径上调用，调用方需持有向量库的写锁。
+    """
+    legacy_path = os.path.join(db_path, LEGACY_DOCSTORE_FILE)
+    if not os.path.exists(legacy_path):
+        return
+    logger.info(f"迁移旧版文本库到SQLite: {db_path}")
+    # index.pkl 是本程序自己写入的文件
+    with open(legacy_path, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    store = ChunkStore(os.path.join(db_path, CHUNK_STORE_FILE), writable=True)
+    try:
+        store.clear()
+        store.add_documents({doc_id: docstore.search(doc_id) for doc_id in index_to_docstore_id.values()})
+        store.assign_vector_ids(index_to_docstore_id)
+        store.commit()
+    finally:
+        store.close()
+    os.remove(legacy_path)
+
+
+def add_embeddings(db: "FAISS", text_embeddings, embedding_model, metadatas) -> "FAISS":
+    """把已计算好的向量加入向量库，向量库为None时新建（文本块在内存中，保存时写入SQLite）"""
+    if db is None:
+        return _faiss_store().from_embeddings(text_embeddings, embedding_model, metadatas=metadatas)
+    db.index = fit_quantizer(db.index, np.array([vector for _, vector in text_embeddings], dtype=np.float32))
+    db.add_embeddings(text_embeddings, metadatas=metadatas)
+    return db
+
+
+def index_path(db_path: str, version: int) -> str:
+    """指定版本的索引文件路径，版本0（旧向量库）为 index.faiss"""
+    return os.path.join(db_path, f"index-{version}.faiss" if version else INDEX_FILE)
+
+
+def current_index_path(db_path: str) -> str:
+    """当前已提交版本的索引文件路径"""
+    store = ChunkStore(os.path.join(db_path, CHUNK_STORE_FILE))
+    try:
+        return index_path(db_path, store.index_version())
+    finally:
+        store.close()
+
+
+def check_dimension(index, dimension: int):
+    """向量库的向量维度与嵌入模型不一致时抛出 ValueError，避免不同模型的向量混在一个索引中"""
+    if dimension is not None and index.d != dimension:
+        raise ValueError(f"向量库的向量维度为 {index.d}，当前嵌入模型的向量维度为 {dimension}，两者不一致。"
+                         f"请切换回建立索引时使用的嵌入模型，或清理所有索引后重新索引")
+
+
+def index_dimension(db_path: str) -> int:
+    """当前已提交版本索引的向量维度，只映射索引文件，不读入向量"""
+    return read_index(current_index_path(db_path), mmap=True).d
+
+
+def load_vector_store(db_path: str, embedding_model, writable: bool = False, mmap: bool = True,
+                      dimension: int = None) -> "FAISS":
+    """加载向量库
+
+    writable=False 时索引以只读内存映射方式打开，文本块在搜索命中时才从SQLite读取（仅用于搜索）；
+    需要增删向量的场景必须传入 writable=True，把索引完整读入内存，修改在 save_vector_store 时提交。
+    反复检索同一个向量库时用 SnapshotReader，每次检索读到的索引和文本块属于同一个版本。
+    旧版 pickle 文本库只在 writable=True 时迁移（调用方持有写锁），只读加载不写任何文件。
+    传入 dimension（嵌入模型的向量维度）时检查索引的维度，不一致时抛出 ValueError。
+    """
+    start_time = time.time()
+    if writable:
+        migrate_legacy_docstore(db_path)
+    elif not os.path.exists(os.path.join(db_path, CHUNK_STORE_FILE)):
+        raise FileNotFoundError(f"文本库不存在（旧版向量库需要先以可写方式加载完成迁移）: {db_path}")
+    store = ChunkStore(os.path.join(db_path, CHUNK_STORE_FILE), writable=writable)
+    try:
+        index = read_index(index_path(db_path, store.index_version()), mmap=mmap and not writable)
+        check_dimension(index, dimension)
+    except Exception:
+        store.close()
+        raise
+    db = _faiss_store()(embedding_model, index, ChunkDocstore(store), ChunkIdMap(store))
+    elapsed = time.time() - start_time
+    INDEX_LOAD_SECONDS.observe(elapsed, mode="writable" if writable else ("mmap" if mmap else "memory"))
+    INDEX_VECTORS.set(index.ntotal)
+    logger.debug(f"加载向量库耗时 {elapsed * 1000:.1f}ms: {db_path}")
+    return db
+
+
+def _publish_latest(db_path: str, path: str):
+    """让 index.faiss 指向最新版本；不支持硬链接的文件系统上复制一份"""
+    latest_path = os.path.join(db_path, INDEX_FILE)
+    temp_path = f"{latest_path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(path, temp_path)
+    except OSError:
+        shutil.copyfile(path, temp_path)
+    try:
+        os.replace(temp_path, latest_path)
+    except OSError as e:
+        # Windows 上旧向量库的 index.faiss 仍被内存映射时无法替换；读取方按版本号打开索引文件，不受影响
+        logger.warning(f"更新 {INDEX_FILE} 失败: {str(e)}")
+        os.remove(temp_path)
+
+
+def _remove_old_versions(db_path: str, version: int):
+    """删除比上一个版本更旧的索引文件
+
+    保留上一个版本：刚读到上一个版本号、还没打开索引文件的读取方仍能打开它。已经映射了旧文件的进程不受删除影响；
+    Windows 上仍被映射的文件删除失败，留到下次保存时再删。
+    """
+    for name in os.listdir(db_path):
+        match = _VERSIONED_INDEX_PATTERN.match(name)
+        if match and int(match.group(1)) < version - 1:
+            try:
+                os.remove(os.path.join(db_path, name))
+            except OSError as e:
+                logger.debug(f"删除旧版本索引文件失败 {name}: {str(e)}")
+
+
+def save_vector_store(db: "FAISS", db_path: str, mode: str = "flat", file_records=None):
+    """保存向量库，索引按指定格式存储；量化后的索引会替换内存中的索引，保证后续追加的向量格式一致
+
+    新建的向量库（FAISS.from_embeddings 创建，文本块在内存中）会整体写入SQLite，
+    之后改为由SQLite文本库支撑，后续追加的文本块直接写入未提交的事务。
+    file_records 是本次新增或更新的文件记录，与文本块和新的版本号在同一事务中提交；
+    新版本的索引文件在提交前写好，读到新版本号的读取方一定能打开它。
+    """
+    os.makedirs(db_path, exist_ok=True)
+    db.index = convert_index(db.index, mode)
+
+    if isinstance(db.docstore, ChunkDocstore):
+        store = db.docstore.store
+    else:
+        store = ChunkStore(os.path.join(db_path, CHUNK_STORE_FILE), writable=True)
+        store.clear()
+        store.add_documents({doc_id: db.docstore.search(doc_id) for doc_id in db.index_to_docstore_id.values()})
+        store.assign_vector_ids(db.index_to_docstore_id)
+        db.docstore = ChunkDocstore(store)
+        db.index_to_docstore_id = ChunkIdMap(store)
+    version = store.index_version() + 1
+    path = index_path(db_path, version)
+    temp_path = f"{path}.tmp"
+    _faiss().write_index(db.index, temp_path)
+    os.replace(temp_path, path)
+
+    for record in file_records or []:
+        store.upsert_file(record["source"], record["mtime"], record["size"], record["content_hash"],
+                          record.get("simhash"), record.get("canonical"))
+    store.set_index_version(version)
+    store.commit()
+    _publish_latest(db_path, path)
+    _remove_old_versions(db_path, version)
+
+    # 已迁移或新建的向量库不再需要旧的 pickle 文件
+    legacy_path = os.path.join(db_path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+class IndexSnapshot:
+    """某个已提交版本的只读向量库：索引和背后的文本库，没有嵌入模型，检索时传入已算好的查询向量"""
+
+    def __init__(self, index, store: ChunkStore):
+        self.index = index
+        self.docstore = ChunkDocstore(store)
+        self.index_to_docstore_id = ChunkIdMap(store)
+        # 文件夹前缀 -> (向量数, 选择器)；快照只对应一个版本，版本变化时随快照一起丢弃
+        self.folder_selectors = OrderedDict()
+
+
+class SnapshotReader:
+    """只读打开共享向量库，缓存已映射的索引供反复检索；同一个实例不能在多个线程中同时使用
+
+    snapshot() 在一个SQLite读事务中进行：事务开始时读到的版本号决定使用哪个索引文件，事务期间读到的文本块也属于这个版本，
+    保存进行中的检索不会出现向量编号与文本块错位。版本变化时映射新版本的索引文件；
+    文本库文件被替换（清空所有索引后重建）时重新打开连接。
+    """
+
+    def __init__(self, db_path: str, mmap: bool = True):
+        self.db_path = db_path
+        self.mmap = mmap
+        self.store = None
+        self.store_id = None
+        self.db = None
+        self.version = None
+
+    def _open_store(self):
+        path = os.path.join(self.db_path, CHUNK_STORE_FILE)
+        stat = os.stat(path)
+        store_id = (stat.st_dev, stat.st_ino)
+        if self.store is not None and store_id == self.store_id:
+            return
+        self.close()
+        self.store = ChunkStore(path)
+        self.store_id = store_id
+
+    @contextmanager
+    def snapshot(self):
+        """返回与当前已提交版本一致的 IndexSnapshot，只在 with 语句块内使用"""
+        self._open_store()
+        store = self.store
+        store.begin_read()
+        try:
+            version = store.index_version()
+            if self.db is None or version != self.version:
+                start_time = time.time()
+                index = read_index(index_path(self.db_path, version), mmap=self.mmap)
+                self.db = IndexSnapshot(index, store)
+                self.version = version
+                INDEX_LOAD_SECONDS.observe(time.time() - start_time, mode="mmap" if self.mmap else "memory")
+                INDEX_VECTORS.set(index.ntotal)
+            yield self.db
+        finally:
+            store.end_read()
+
+    def close(self):
+        self.db = None
+        self.version = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+            self.store_id = None
+
+
+def close_vector_store(db: "FAISS"):
+    """关闭向量库的文本库连接，未保存的修改会被回滚"""
+    if isinstance(db.docstore, ChunkDocstore):
+        db.docstore.store.close()
+
+
+def get_indexed_sources(db: "FAISS") -> List[str]:
+    """获取向量库中所有已索引的源文件路径"""
+    if isinstance(db.docstore, ChunkDocstore):
+        return db.docstore.store.sources()
+    return list({db.docstore.search(doc_id).metadata.get("source") for doc_id in db.index_to_docstore_id.values()})
+
+
+def get_chunk_store(db: "FAISS"):
+    """获取向量库背后的SQLite文本库，新建且尚未保存的向量库返回None"""
+    if db is not None and isinstance(db.docstore, ChunkDocstore):
+        return db.docstore.store
+    return None
+
+
+def reuse_vectors(db: "FAISS", docs):
+    """查找内容完全相同的已有文本块并复用其向量，返回 (复用的(文本块, 向量)列表, 仍需嵌入的文本块)"""
+    store = get_chunk_store(db)
+    if store is None or not docs:
+        return [], list(docs)
+    hashes = [chunk_hash(doc.page_content) for doc in docs]
+    found = store.vector_ids_for_chunk_hashes(hashes)
+    reused = []
+    remaining = []
+    for doc, value in zip(docs, hashes):
+        if value in found:
+            reused.append((doc, db.index.reconstruct(found[value]).tolist()))
+        else:
+            remaining.append(doc)
+    return reused, remaining
+
+
+def delete_sources(db: "FAISS", sources) -> int:
+    """从可写的向量库中删除指定源文件的所有向量和文本块，返回删除的向量数"""
+    store = db.docstore.store
+    vector_ids = store.vector_ids_for_sources(sources)
+    if not vector_ids:
+        return 0
+    db.index.remove_ids(np.array(vector_ids, dtype=np.int64))
+    store.remove_vector_ids(vector_ids)
+    return len(vector_ids)
+
+
+def folder_prefix(folder: str) -> str:
+    """文件夹视图的路径前缀"""
+    return folder.rstrip(os.sep) + os.sep
+
+
+def _folder_selector(db: "FAISS", folder: str):
+    """文件夹视图内的向量数和faiss选择器，视图包含全部向量时选择器为None
+
+    IndexSnapshot 按文件夹缓存结果，同一版本上反复检索时不再扫描文本库、重建选择器。
+    """
+    prefix = folder_prefix(folder)
+    cache = getattr(db, "folder_selectors", None)
+    if cache is not None and prefix in cache:
+        cache.move_to_end(prefix)
+        return cache[prefix]
+    vector_ids = get_chunk_store(db).vector_ids_for_prefix(prefix)
+    selector = None
+    if vector_ids and len(vector_ids) != db.index.ntotal:
+        selector = _faiss().IDSelectorBatch(np.array(vector_ids, dtype=np.int64))
+    result = (len(vector_ids), selector)
+    if cache is not None:
+        cache[prefix] = result
+        if len(cache) > FOLDER_SELECTOR_CACHE_SIZE:
+            cache.popitem(last=False)
+    return result
+
+
+def similarity_search_in_folder(db: "FAISS", query: str, k: int, folder: str, query_embedding: List[float] = None):
+    """只在文件夹视图内搜索：用向量编号选择器让faiss跳过视图外的向量，返回 [(文本块, 距离)]
+
+    query_embedding 为已经计算好的查询向量，不传时用向量库的嵌入模型计算（IndexSnapshot 没有嵌入模型，必须传入）。
+    """
+    vector_count, selector = _folder_selector(db, folder)
+    if vector_count == 0:
+        return []
+    if query_embedding is None:
+        query_embedding = db._embed_query(query)
+    check_dimension(db.index, len(query_embedding))
+    query_vector = np.array([query_embedding], dtype=np.float32)
+    with INDEX_SEARCH_SECONDS.time():
+        if selector is None:
+            distances, indices = db.index.search(query_vector, k)
+        else:
+            distances, indices = db.index.search(query_vector, k, params=_faiss().SearchParameters(sel=selector))
+    results = []
+    for distance, vector_id in zip(distances[0], indices[0]):
+        if vector_id == -1:
+            continue
+        doc = db.docstore.search(db.index_to_docstore_id[int(vector_id)])
+        results.append((doc, float(distance)))
+    return results
+
+
+def import_vector_store(db: "FAISS", source_path: str, embedding_model):
+    """把旧版按文件夹单独保存的向量库合并进共享向量库，向量直接复制，不重新嵌入
+
+    返回 (合并后的向量库, 合并的文本块数, 文件记录)，文件记录需要在保存时传给 save_vector_store；维度不一致（使用了不同的嵌入模型）时不合并，抛出ValueError。
+    """
+    source_db = load_vector_store(source_path, embedding_model, writable=True)
+    try:
+        if db is not None and db.index.d != source_db.index.d:
+            raise ValueError(f"向量维度不一致 ({source_db.index.d} != {db.index.d})，无法合并: {source_path}")
+        source_store = get_chunk_store(source_db)
+        text_embeddings = []
+        metadatas = []
+        for vector_id, doc_id in source_store.iter_vector_ids():
+            doc = source_store.get_document(doc_id)
+            text_embeddings.append((doc.page_content, source_db.index.reconstruct(vector_id).tolist()))
+            metadatas.append(doc.metadata)
+        file_records = list(source_store.file_records().values())
+    finally:
+        close_vector_store(source_db)
+
+    if text_embeddings:
+        db = add_embeddings(db, text_embeddings, embedding_model, metadatas)
+    return db, len(text_embeddings), file_records
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""启动预热：记录每个文件夹最近的搜索使用情况，服务启动后在后台预热最近用过的索引和嵌入模型，
+启动后的第一次搜索不必再等待读盘、建立连接和加载模型
+
+预热按步骤顺序执行，每一步之前检查是否已取消（开始索引时取消，索引会改变向量库，预热的结果也就过期了）。
+读取索引文件等占用页缓存的步骤先从内存预算中预留，超出预算的步骤跳过；
+这类步骤在降低了调度优先级的独立线程中执行（Linux），读盘按固定大小分块并限速，不与前台请求争抢磁盘和CPU。
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+SEARCH_USAGE_FILE = "search_usage.json"
+LOW_PRIORITY_NICE = 10            # 低优先级步骤所在线程的 nice 增量
+PREFETCH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+class WarmupCancelled(Exception):
+    pass
+
+
+class WarmupSkipped(Exception):
+    """步骤不适用或超出内存预算时抛出，消息为跳过的原因"""
+
+
+class SearchUsage:
+    """每个文件夹的搜索次数和最近搜索时间，保存在JSON文件中；两次写入至少间隔 save_interval 秒"""
+
+    def __init__(self, path: str, limit: int = 200, save_interval: float = 30.0):
+        self.path = path
+        self.limit = limit
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.entries = {}  # 文件夹 -> {"count", "last_used"}
+        self.dirty = False
+        self.saved_at = 0.0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取搜索使用记录失败: {str(e)}")
+
+    def record(self, folder: str):
+        with self.lock:
+            entry = self.entries.setdefault(folder, {"count": 0, "last_used": 0.0})
+            entry["count"] += 1
+            entry["last_used"] = time.time()
+            if len(self.entries) > self.limit:
+                oldest = sorted(self.entries, key=lambda key: self.entries[key]["last_used"])
+                for key in oldest[:len(self.entries) - self.limit]:
+                    del self.entries[key]
+            self.dirty = True
+            due = time.time() - self.saved_at >= self.save_interval
+        if due:
+            self.save()
+
+    def recent(self, limit: int) -> List[str]:
+        """最近搜索过的文件夹，最近的在前"""
+        with self.lock:
+            folders = sorted(self.entries, key=lambda key: self.entries[key]["last_used"], reverse=True)
+        return folders[:limit]
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.entries, ensure_ascii=False)
+            self.dirty = False
+            self.saved_at = time.time()
+        tmp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"保存搜索使用记录失败: {str(e)}")
+
+
+def lower_thread_priority(increment: int = LOW_PRIORITY_NICE) -> bool:
+    """降低当前线程的调度优先级；只有 Linux 的 setpriority 能作用于单个线程，其他平台不做处理"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        tid = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) + increment)
+        return True
+    except OSError as e:
+        logger.debug(f"降低预热线程优先级失败: {str(e)}")
+        return False
+
+
+class Warmer:
+    """按顺序执行预热步骤，记录每一步的结果；memory_budget 是预热最多占用的内存（字节）
+
+    步骤是 (名称, 函数, 低优先级) 三元组，函数的返回值作为该步骤的说明。低优先级的步骤在单独的线程中降低优先级后执行；
+    其余步骤在调用 run 的线程中执行，例如本地模型的推理线程会继承创建它的线程的优先级，不能在低优先级线程中加载。
+    """
+
+    def __init__(self, memory_budget: int, read_rate: float = 200 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self.read_rate = read_rate  # 预读文件的速率上限(字节/秒)，0 为不限速
+        self.reserved = 0
+        self.state = "idle"  # idle / running / completed / cancelled
+        self.cancel_reason = None
+        self.steps = []
+        self.started_at = None
+        self.finished_at = None
+        self._cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+    def cancel(self, reason: str):
+        """取消预热；正在执行的步骤在下一个检查点停止，之后的步骤不再执行"""
+        if self._cancelled.is_set():
+            return
+        self.cancel_reason = reason
+        self._cancelled.set()
+        if self.state == "running":
+            logger.info(f"预热已取消: {reason}")
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise WarmupCancelled(self.cancel_reason)
+
+    def reserve(self, nbytes: int) -> bool:
+        """从内存预算中预留 nbytes，剩余预算不足时返回 False"""
+        with self.lock:
+            if self.reserved + nbytes > self.memory_budget:
+                return False
+            self.reserved += nbytes
+            return True
+
+    def prefetch_file(self, path: str) -> int:
+        """分块读取文件，让内容进入页缓存（内存映射的索引之后直接命中），返回读取的字节数"""
+        buffer = bytearray(PREFETCH_CHUNK_BYTES)
+        total = 0
+        start = time.perf_counter()
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                self.check()
+                read = f.readinto(buffer)
+                if not read:
+                    return total
+                total += read
+                if self.read_rate:
+                    # 按速率上限计算已读字节数应该用的时间，读得太快就等一等
+                    delay = total / self.read_rate - (time.perf_counter() - start)
+                    if delay > 0:
+                        self._cancelled.wait(delay)
+
+    def _run_low_priority(self, func: Callable):
+        outcome = {}
+
+        def target():
+            lower_thread_priority()
+            try:
+                outcome["result"] = func()
+            except BaseException as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=target, name="warmup", daemon=True)
+        thread.start()
+        thread.join()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome.get("result")
+
+    def run(self, steps: List[tuple]):
+        self.state = "running"
+        self.started_at = time.time()
+        for name, func, low_priority in steps:
+            entry = {"name": name, "status": "running", "seconds": 0.0, "detail": None}
+            self.steps.append(entry)
+            start = time.perf_counter()
+            try:
+                self.check()
+                entry["detail"] = self._run_low_priority(func) if low_priority else func()
+                entry["status"] = "done"
+            except WarmupCancelled:
+                entry["status"] = "cancelled"
+            except WarmupSkipped as e:
+                entry["status"] = "skipped"
+                entry["detail"] = str(e)
+            except Exception as e:
+                entry["status"] = "failed"
+                entry["detail"] = str(e)
+                logger.warning(f"预热步骤 {name} 失败: {str(e)}")
+            entry["seconds"] = time.perf_counter() - start
+            if entry["status"] == "cancelled":
+                break
+        self.state = "cancelled" if self.cancelled else "completed"
+        self.finished_at = time.time()
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "cancel_reason": self.cancel_reason,
+            "memory_budget": self.memory_budget,
+            "reserved": self.reserved,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "steps": [dict(step) for step in self.steps]
+        }
@@ -32,6 +32,7 @@ import FeedbackForm from './components/FeedbackForm';
 import Announcement from './components/Announcement';
 import UpdateChecker from './components/UpdateChecker';
 import { apiBaseUrl } from './services/config';
+import { IndexProgressSnapshot, IndexFileEntry } from './types';
 
 // 索引状态接口
 interface IndexedDirectory {
@@ -41,6 +42,9 @@ interface IndexedDirectory {
   monitoring?: boolean; // 是否监控中
 }
 
+// 索引进度对话框中每类文件最多保留的条数，与后端保留的上限一致
+const MAX_FILE_ENTRIES = 2000;
+
 const theme = createTheme({
   palette: {
     primary: {
@@ -388,79 +392,164 @@ const App: React.FC = () => {
     }
   };
 
-  // 轮询索引进度
+  // 跟踪索引进度：优先使用SSE推送进度变化，推送不可用时退回到每秒轮询精简进度；
+  // 文件明细不随进度返回，按游标只获取新增的部分
   const pollIndexProgress = (directory: string) => {
-    const progressInterval = setInterval(async () => {
+    const progressState: Partial<IndexProgressSnapshot> = {};
+    let fileCursor = 0;
+    let targetCursor = 0;
+    let filesLoading = false;
+    let finished = false;
+    let eventSource: EventSource | null = null;
+    let progressInterval: ReturnType<typeof setInterval> | null = null;
+
+    setSuccessFiles([]);
+    setFailedFiles([]);
+    setSkippedFiles([]);
+
+    const appendFiles = (
+      setter: React.Dispatch<React.SetStateAction<any[]>>,
+      files: IndexFileEntry[],
+      category: IndexFileEntry['category']
+    ) => {
+      const entries = files.filter(file => file.category === category);
+      if (entries.length > 0) {
+        setter(prev => [...prev, ...entries].slice(-MAX_FILE_ENTRIES));
+      }
+    };
+
+    // 获取游标之后新增的文件明细；正在获取时只更新目标游标，由进行中的循环继续读取
+    const fetchNewFiles = async (latestCursor: number) => {
+      targetCursor = Math.max(targetCursor, latestCursor);
+      if (filesLoading) return;
+      filesLoading = true;
       try {
-        const response = await fetch(`${apiBaseUrl}/index-progress`);
-        const data = await response.json();
-        
-        // 更新进度
-        setIndexProgress(data.progress);
-        setProgressStatus(data.status);
-        
-        // 更新文件处理统计
-        if (data.file_stats) {
-          setSuccessCount(data.file_stats.success_count || 0);
-          setFailureCount(data.file_stats.failure_count || 0);
-          setSkippedCount(data.file_stats.skipped_count || 0);
-          setTotalProcessedCount(data.file_stats.total_count || 0);
+        while (fileCursor < targetCursor) {
+          const response = await fetch(`${apiBaseUrl}/index-progress/files?after=${fileCursor}&limit=500`);
+          const page = await response.json();
+          if (!page.success) break;
+          appendFiles(setSuccessFiles, page.files, 'success');
+          appendFiles(setFailedFiles, page.files, 'failed');
+          appendFiles(setSkippedFiles, page.files, 'skipped');
+          fileCursor = page.next_cursor;
         }
+      } finally {
+        filesLoading = false;
+      }
+    };
+
+    const stopTracking = () => {
+      finished = true;
+      eventSource?.close();
+      if (progressInterval) clearInterval(progressInterval);
+    };
+
+    // 处理一次进度更新：SSE推送的是变化的字段，轮询返回的是完整的精简快照
+    const handleProgress = async (update: Partial<IndexProgressSnapshot>) => {
+      if (finished) return;
+      Object.assign(progressState, update);
+      const data = progressState;
+
+      // 更新进度
+      setIndexProgress(data.progress || 0);
+      setProgressStatus(data.status || '');
+      
+      // 更新文件处理统计
+      if (data.file_stats) {
+        setSuccessCount(data.file_stats.success_count || 0);
+        setFailureCount(data.file_stats.failure_count || 0);
+        setSkippedCount(data.file_stats.skipped_count || 0);
+        setTotalProcessedCount(data.file_stats.total_count || 0);
+      }
+      
+      // 更新文件列表
+      if (data.file_cursor !== undefined) {
+        await fetchNewFiles(data.file_cursor);
+      }
+      
+      // 如果索引完成或出错
+      if (data.completed || data.error) {
+        stopTracking();
         
-        // 更新文件列表
-        setSuccessFiles(data.success_files || []);
-        setFailedFiles(data.failed_files || []);
-        setSkippedFiles(data.skipped_files || []);
-        
-        // 如果索引完成或出错
-        if (data.completed || data.error) {
-          clearInterval(progressInterval);
+        if (data.completed) {
+          setIndexProgress(100);
+          setProgressStatus('索引完成');
           
-          if (data.completed) {
-            setIndexProgress(100);
-            setProgressStatus('索引完成');
-            
-            // 更新目录索引状态
-            const updatedStatusMap = {...directoryStatusMap};
-            updatedStatusMap[directory] = {
-              path: directory,
-              indexed: true,
-              lastIndexed: Date.now()
-            };
-            setDirectoryStatusMap(updatedStatusMap);
-            setSearchEnabled(true);
-            
-            // 保存更新后的配置
-            await saveConfig({
-              indexedDirectories,
-              directoryStatusMap: updatedStatusMap
-            });
-            
-            // 从状态信息中提取文件处理统计
-            const statsMatch = data.status.match(/成功处理\s+(\d+)\s+个文件，失败\s+(\d+)\s+个文件，跳过\s+(\d+)\s+个文件/);
-            if (statsMatch && statsMatch.length >= 4) {
-              setSuccessCount(parseInt(statsMatch[1]) || 0);
-              setFailureCount(parseInt(statsMatch[2]) || 0);
-              setSkippedCount(parseInt(statsMatch[3]) || 0);
-              setTotalProcessedCount((parseInt(statsMatch[1]) || 0) + (parseInt(statsMatch[2]) || 0) + (parseInt(statsMatch[3]) || 0));
-            }
-            
-            showNotification(`目录索引完成: ${directory}`, 'success');
-          } else if (data.error) {
-            setProgressStatus(`索引错误: ${data.error}`);
-            showNotification(`索引错误: ${data.error}`, 'error');
+          // 更新目录索引状态
+          const updatedStatusMap = {...directoryStatusMap};
+          updatedStatusMap[directory] = {
+            path: directory,
+            indexed: true,
+            lastIndexed: Date.now()
+          };
+          setDirectoryStatusMap(updatedStatusMap);
+          setSearchEnabled(true);
+          
+          // 保存更新后的配置
+          await saveConfig({
+            indexedDirectories,
+            directoryStatusMap: updatedStatusMap
+          });
+          
+          // 从状态信息中提取文件处理统计
+          const statsMatch = (data.status || '').match(/成功处理\s+(\d+)\s+个文件，失败\s+(\d+)\s+个文件，跳过\s+(\d+)\s+个文件/);
+          if (statsMatch && statsMatch.length >= 4) {
+            setSuccessCount(parseInt(statsMatch[1]) || 0);
+            setFailureCount(parseInt(statsMatch[2]) || 0);
+            setSkippedCount(parseInt(statsMatch[3]) || 0);
+            setTotalProcessedCount((parseInt(statsMatch[1]) || 0) + (parseInt(statsMatch[2]) || 0) + (parseInt(statsMatch[3]) || 0));
           }
           
-          setIsIndexing(false);
+          showNotification(`目录索引完成: ${directory}`, 'success');
+        } else if (data.error) {
+          setProgressStatus(`索引错误: ${data.error}`);
+          showNotification(`索引错误: ${data.error}`, 'error');
         }
-      } catch (error) {
-        console.error('获取索引进度失败:', error);
-        clearInterval(progressInterval);
-        setProgressStatus('获取索引进度失败');
+        
         setIsIndexing(false);
-        showNotification('获取索引进度失败', 'error');
       }
-    }, 1000);
+    };
+
+    const handleTrackingError = (error: unknown) => {
+      console.error('获取索引进度失败:', error);
+      stopTracking();
+      setProgressStatus('获取索引进度失败');
+      setIsIndexing(false);
+      showNotification('获取索引进度失败', 'error');
+    };
+
+    // 退回到轮询精简进度
+    const startPolling = () => {
+      progressInterval = setInterval(async () => {
+        try {
+          const response = await fetch(`${apiBaseUrl}/index-progress`);
+          await handleProgress(await response.json());
+        } catch (error) {
+          handleTrackingError(error);
+        }
+      }, 1000);
+    };
+
+    if (typeof EventSource === 'undefined') {
+      startPolling();
+      return;
+    }
+    eventSource = new EventSource(`${apiBaseUrl}/index-progress/stream`);
+    eventSource.onmessage = (event) => {
+      const update = JSON.parse(event.data);
+      // 索引结束后服务端会关闭连接，先关闭以免浏览器自动重连
+      if (update.completed || update.error) {
+        eventSource?.close();
+      }
+      handleProgress(update).catch(handleTrackingError);
+    };
+    eventSource.onerror = () => {
+      if (finished) return;
+      console.warn('索引进度推送连接中断，改为轮询');
+      eventSource?.close();
+      eventSource = null;
+      startPolling();
+    };
   };
 
   // 获取目录索引状态信息
@@ -241,6 +241,21 @@ const ResultsList: React.FC = () => {
                       >
                         {result.source}
                       </Typography>
+                      {result.duplicates && result.duplicates.length > 0 && (
+                        <Tooltip title={result.duplicates.join('\n')}>
+                          <Typography 
+                            variant="caption" 
+                            color="text.secondary"
+                            sx={{ 
+                              mb: 1,
+                              display: 'block',
+                              fontSize: '0.75rem'
+                            }}
+                          >
+                            另有 {result.duplicates.length} 个内容相同的文件: {result.duplicates.map(path => path.split('/').pop()).join(', ')}
+                          </Typography>
+                        </Tooltip>
+                      )}
                       <Typography 
                         variant="body2" 
                         color="text.secondary"
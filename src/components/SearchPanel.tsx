@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { 
   Paper, 
   TextField, 
@@ -6,11 +6,12 @@ import {
   Box, 
   CircularProgress,
   Typography,
-  InputAdornment 
+  InputAdornment,
+  Autocomplete
 } from '@mui/material';
 import SearchIcon from '@mui/icons-material/Search';
 import HelpOutlineIcon from '@mui/icons-material/HelpOutline';
-import { SearchResult } from '../types';
+import { SearchResult, Suggestion } from '../types';
 
 interface SearchPanelProps {
   disabled: boolean;
@@ -29,8 +30,55 @@ const SearchPanel: React.FC<SearchPanelProps> = ({
   const [searching, setSearching] = useState(false);
   const [error, setError] = useState<string | null>(null);
   
+  const [suggestions, setSuggestions] = useState<Suggestion[]>([]);
+  const suggestRequest = useRef(0);
+  
   // 匹配度阈值 - 低于这个匹配度的结果将被过滤掉
   const MATCH_THRESHOLD = 30;
+  // 候选词：输入停顿后请求，最多显示的条数
+  const SUGGEST_DEBOUNCE_MS = 80;
+  const SUGGESTION_LIMIT = 12;
+  const SUGGESTION_LABELS: Record<Suggestion['type'], string> = { query: '最近搜索', file: '文件', term: '关键词' };
+  const directoriesKey = indexedDirectories.join('\n');
+
+  // 输入变化时从 /suggest 获取候选词，只在后端内存中匹配，不调用嵌入接口
+  useEffect(() => {
+    const prefix = query.trim();
+    if (!prefix || disabled) {
+      setSuggestions([]);
+      return;
+    }
+    const requestId = ++suggestRequest.current;
+    const timer = setTimeout(async () => {
+      try {
+        const folders = indexedDirectories.length > 0 ? indexedDirectories : [null];
+        const responses = await Promise.all(folders.map(folder => {
+          const params = new URLSearchParams({ q: prefix });
+          if (folder) params.set('folder', folder);
+          return fetch(`${apiBaseUrl}/suggest?${params}`).then(response => response.json());
+        }));
+        // 等待期间输入已经变化，丢弃过期的结果
+        if (requestId !== suggestRequest.current) return;
+        const seen = new Set<string>();
+        const merged: Suggestion[] = [];
+        for (const data of responses) {
+          for (const suggestion of (data.suggestions || []) as Suggestion[]) {
+            const key = `${suggestion.type}:${suggestion.path || suggestion.text}`;
+            if (!seen.has(key)) {
+              seen.add(key);
+              merged.push(suggestion);
+            }
+          }
+        }
+        setSuggestions(merged.slice(0, SUGGESTION_LIMIT));
+      } catch (suggestError) {
+        // 候选词失败不影响正常搜索
+        console.error('获取候选词失败:', suggestError);
+      }
+    }, SUGGEST_DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [query, disabled, directoriesKey, apiBaseUrl]);
   
   // 计算匹配度百分比，与ResultsList.tsx中保持一致
   const calculateMatchPercentage = (score: number): number => {
@@ -151,27 +199,51 @@ const SearchPanel: React.FC<SearchPanelProps> = ({
           mb: 0.5
         }}>
           <Box sx={{ flexGrow: 1, mr: 1.5 }}>
-            <TextField
-              fullWidth
-              variant="outlined"
-              placeholder="请输入搜索内容，例如：'一份大模型的技术原理介绍文档，张三写的'"
-              value={query}
-              onChange={(e) => setQuery(e.target.value)}
-              onKeyPress={handleKeyPress}
-              disabled={disabled || searching}
-              error={!!error}
-              InputProps={{
-                startAdornment: (
-                  <InputAdornment position="start">
-                    <SearchIcon color={disabled ? "disabled" : "primary"} />
-                  </InputAdornment>
-                ),
-              }}
-              sx={{ 
-                '& .MuiInputBase-root': {
-                  height: '46px'
-                }
+            <Autocomplete
+              freeSolo
+              options={suggestions}
+              // 候选词已由后端按前缀匹配和排序
+              filterOptions={(options) => options}
+              getOptionLabel={(option) => typeof option === 'string' ? option : option.text}
+              inputValue={query}
+              onInputChange={(_, value) => setQuery(value)}
+              onChange={(_, value) => {
+                if (value && typeof value !== 'string') setQuery(value.text);
               }}
+              disabled={disabled || searching}
+              renderOption={(props, option) => (
+                <li {...props} key={`${option.type}:${option.path || option.text}`}>
+                  <Typography variant="body2" sx={{ flexGrow: 1 }} noWrap title={option.path}>
+                    {option.text}
+                  </Typography>
+                  <Typography variant="caption" color="text.secondary" sx={{ ml: 1 }}>
+                    {SUGGESTION_LABELS[option.type]}
+                  </Typography>
+                </li>
+              )}
+              renderInput={(params) => (
+                <TextField
+                  {...params}
+                  fullWidth
+                  variant="outlined"
+                  placeholder="请输入搜索内容，例如：'一份大模型的技术原理介绍文档，张三写的'"
+                  onKeyPress={handleKeyPress}
+                  error={!!error}
+                  InputProps={{
+                    ...params.InputProps,
+                    startAdornment: (
+                      <InputAdornment position="start">
+                        <SearchIcon color={disabled ? "disabled" : "primary"} />
+                      </InputAdornment>
+                    ),
+                  }}
+                  sx={{ 
+                    '& .MuiInputBase-root': {
+                      height: '46px'
+                    }
+                  }}
+                />
+              )}
             />
           </Box>
           <Button
@@ -2,15 +2,19 @@
 # 文件：main.py
 
 import os
-import faiss
-import pickle
+import sys
+import json
+import time
+import uuid
+import threading
 from typing import List
-from sentence_transformers import SentenceTransformer
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.document_loaders import UnstructuredFileLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from fastapi import FastAPI, Query
+from langchain.schema import Document
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import uvicorn
 import pytesseract
@@ -20,8 +24,36 @@ from PIL import Image
 DOC_DIR = "./docs"
 DB_PATH = "./vector_store"
 MODEL_NAME = "/Users/zhaozdw/workspace/findme/src/models/all-MiniLM-L6-v2/"
-# 初始化嵌入模型
-embedding_model = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+# 本地推理（int8 量化 ONNX、按长度分桶）在 python 目录中，与后端共用
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+# 记录每个文件索引时的修改时间、大小和文本块编号，下次启动只重新嵌入变化的文件
+MANIFEST_FILE = os.path.join(DB_PATH, "manifest.json")
+# 每处理这么多个文件保存一次向量库，中途退出时已完成的部分不会丢失
+SAVE_EVERY_FILES = 20
+
+TEXT_EXTENSIONS = (".txt", ".pdf", ".docx")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# 嵌入模型和向量库都在后台线程中加载，服务启动时不等待
+embedding_model = None
+db = None
+# 后台构建写向量库时，搜索需要等待这一次写入完成
+db_lock = threading.Lock()
+
+# 后台构建的状态，由 /ready 和 /progress 返回
+build_status = {
+    "state": "starting",    # starting / loading_model / loading_index / building / ready / error
+    "total_files": 0,
+    "processed_files": 0,
+    "changed_files": 0,
+    "removed_files": 0,
+    "failed_files": 0,      # 加载失败的文件，清单和旧向量保持不变，下次启动时重试
+    "embedded_chunks": 0,
+    "current_file": None,
+    "error": None,
+    "started_at": None,
+    "finished_at": None
+}
 
 # 图片 OCR 识别函数
 def extract_text_from_image(image_path: str) -> str:
@@ -33,46 +65,190 @@ def extract_text_from_image(image_path: str) -> str:
         print(f"OCR failed on {image_path}: {e}")
         return ""
 
-# 加载或创建向量数据库
-def build_vector_db():
-    documents = []
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    for root, _, files in os.walk(DOC_DIR):
-        for file in files:
-            path = os.path.join(root, file)
-            if file.endswith((".txt", ".pdf", ".docx")):
-                loader = UnstructuredFileLoader(path)
-                docs = loader.load()
-                docs_split = splitter.split_documents(docs)
-                for doc in docs_split:
-                    doc.metadata["source"] = path
-                documents.extend(docs_split)
-            elif file.lower().endswith((".png", ".jpg", ".jpeg")):
-                text = extract_text_from_image(path)
-                if text.strip():
-                    from langchain.schema import Document
-                    doc = Document(page_content=text, metadata={"source": path})
-                    documents.append(doc)
-    db = FAISS.from_documents(documents, embedding_model)
+# 创建嵌入模型：优先使用量化的 ONNX 推理，缺少 onnxruntime 或模型文件时退回 HuggingFaceEmbeddings
+def create_embedding_model():
+    try:
+        from local_embedding import LocalMiniLMEmbeddings
+        model = LocalMiniLMEmbeddings()
+        # 加载模型（第一次使用时生成量化模型）
+        model.embed_query("warmup")
+        return model
+    except Exception as e:
+        print(f"ONNX inference unavailable, falling back to HuggingFaceEmbeddings: {e}")
+        return HuggingFaceEmbeddings(model_name=MODEL_NAME)
+
+# 加载单个文件并切分
+def load_file(path: str, splitter: RecursiveCharacterTextSplitter) -> List[Document]:
+    if path.endswith(TEXT_EXTENSIONS):
+        loader = UnstructuredFileLoader(path)
+        docs_split = splitter.split_documents(loader.load())
+        for doc in docs_split:
+            doc.metadata["source"] = path
+        return docs_split
+    text = extract_text_from_image(path)
+    if text.strip():
+        return [Document(page_content=text, metadata={"source": path})]
+    return []
+
+# 扫描文档目录，返回 {路径: {"mtime", "size"}}
+def scan_documents() -> dict:
+    files = {}
+    for root, _, names in os.walk(DOC_DIR):
+        for file in names:
+            if file.endswith(TEXT_EXTENSIONS) or file.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, file)
+                stat = os.stat(path)
+                files[path] = {"mtime": stat.st_mtime, "size": stat.st_size}
+    return files
+
+def load_manifest() -> dict:
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+# 清单丢失时按向量库中每个文本块的来源重建清单；修改时间和大小未知，这些文件会重新嵌入并删除旧向量，不会重复
+def manifest_from_db(db) -> dict:
+    manifest = {}
+    for doc_id in db.index_to_docstore_id.values():
+        doc = db.docstore.search(doc_id)
+        source = doc.metadata.get("source") if hasattr(doc, "metadata") else None
+        if source is None:
+            continue
+        manifest.setdefault(source, {"mtime": None, "size": None, "ids": []})["ids"].append(doc_id)
+    return manifest
+
+# 保存向量库和清单：先写临时文件再替换，中途退出时不会留下不完整的清单
+def save_progress(manifest: dict):
+    if db is None:
+        return
     db.save_local(DB_PATH)
-    return db
+    tmp_file = MANIFEST_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_file, MANIFEST_FILE)
 
-# 如果向量库已存在则加载
-if os.path.exists(DB_PATH):
-    db = FAISS.load_local(DB_PATH, embedding_model)
-else:
-    db = build_vector_db()
+# 加载或增量更新向量数据库
+def build_vector_db():
+    global embedding_model, db
+    build_status["started_at"] = time.time()
+    try:
+        build_status["state"] = "loading_model"
+        embedding_model = create_embedding_model()
+
+        # 如果向量库已存在则加载，加载后即可搜索，更新在后面进行
+        manifest = {}
+        if os.path.exists(os.path.join(DB_PATH, "index.faiss")):
+            build_status["state"] = "loading_index"
+            with db_lock:
+                db = FAISS.load_local(DB_PATH, embedding_model, allow_dangerous_deserialization=True)
+            manifest = load_manifest()
+            if not os.path.exists(MANIFEST_FILE):
+                print("manifest.json not found, re-embedding all files in the existing index")
+                manifest = manifest_from_db(db)
+
+        build_status["state"] = "building"
+        files = scan_documents()
+        build_status["total_files"] = len(files)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+
+        # 已删除的文件从向量库中移除
+        removed = [path for path in manifest if path not in files]
+        if removed:
+            with db_lock:
+                ids = [doc_id for path in removed for doc_id in manifest[path]["ids"]]
+                if ids and db is not None:
+                    db.delete(ids)
+                for path in removed:
+                    del manifest[path]
+                save_progress(manifest)
+            build_status["removed_files"] = len(removed)
+
+        unsaved = 0
+        for path, info in files.items():
+            build_status["current_file"] = path
+            previous = manifest.get(path)
+            # 修改时间和大小都没变的文件沿用已有向量
+            if previous and previous["mtime"] == info["mtime"] and previous["size"] == info["size"]:
+                build_status["processed_files"] += 1
+                continue
+
+            try:
+                docs = load_file(path, splitter)
+            except Exception as e:
+                # 可能只是暂时无法读取：不更新清单也不删除旧向量，下次启动时重试
+                print(f"Failed to load {path}: {e}")
+                build_status["failed_files"] += 1
+                build_status["processed_files"] += 1
+                continue
+            ids = [str(uuid.uuid4()) for _ in docs]
+
+            # 加载和嵌入在锁外进行，只有写入向量库时短暂持锁
+            vectors = embedding_model.embed_documents([doc.page_content for doc in docs]) if docs else []
+            with db_lock:
+                if previous and previous["ids"] and db is not None:
+                    db.delete(previous["ids"])
+                if docs:
+                    text_embeddings = list(zip([doc.page_content for doc in docs], vectors))
+                    metadatas = [doc.metadata for doc in docs]
+                    if db is None:
+                        db = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas, ids=ids)
+                    else:
+                        db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                manifest[path] = dict(info, ids=ids)
+                unsaved += 1
+                if unsaved >= SAVE_EVERY_FILES:
+                    save_progress(manifest)
+                    unsaved = 0
+
+            build_status["changed_files"] += 1
+            build_status["embedded_chunks"] += len(docs)
+            build_status["processed_files"] += 1
+
+        if unsaved:
+            with db_lock:
+                save_progress(manifest)
+        build_status["state"] = "ready"
+    except Exception as e:
+        print(f"Failed to build vector db: {e}")
+        build_status["state"] = "error"
+        build_status["error"] = str(e)
+    finally:
+        build_status["current_file"] = None
+        build_status["finished_at"] = time.time()
 
 # 创建 API 应用
 app = FastAPI()
 
+# 在服务进程启动后才开始构建：reload 模式下监控代码变化的父进程不会构建
+@app.on_event("startup")
+def start_background_build():
+    threading.Thread(target=build_vector_db, daemon=True).start()
+
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 5
 
+# 可以搜索时返回200（已有索引在后台更新时也可以搜索），否则返回503
+@app.get("/ready")
+def ready():
+    is_ready = db is not None and embedding_model is not None
+    return JSONResponse(status_code=200 if is_ready else 503, content={
+        "ready": is_ready,
+        "building": build_status["state"] not in ("ready", "error"),
+        "state": build_status["state"]
+    })
+
+@app.get("/progress")
+def progress():
+    return build_status
+
 @app.post("/search")
 def search_files(request: QueryRequest):
-    results = db.similarity_search(request.query, k=request.top_k)
+    if db is None or embedding_model is None:
+        return JSONResponse(status_code=503, content={"message": "索引正在构建，请稍后再试", "state": build_status["state"]})
+    with db_lock:
+        results = db.similarity_search(request.query, k=request.top_k)
     return [
         {
             "content": r.page_content,
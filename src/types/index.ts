@@ -4,6 +4,8 @@ export interface SearchResult {
   highlighted_content?: string;
   source: string;
   score: number;
+  duplicates?: string[];  // 内容相同或近似的其他文件
+  match?: 'filename';     // 按文件名匹配到的结果
 }
 
 // 索引状态类型
@@ -15,6 +17,36 @@ export interface IndexStatus {
   completed: boolean;
 }
 
+// 输入即搜索的候选词（/suggest）
+export interface Suggestion {
+  type: 'query' | 'file' | 'term';
+  text: string;
+  path?: string;   // 文件候选词的完整路径
+  count?: number;  // 高频词的出现次数
+}
+
+// 索引进度的精简快照（/index-progress 和进度推送流）
+export interface IndexProgressSnapshot extends IndexStatus {
+  file_stats: {
+    success_count: number;
+    failure_count: number;
+    skipped_count: number;
+    duplicate_count?: number;
+    total_count: number;
+  };
+  file_cursor: number;  // 最新文件明细的序号，用于增量获取
+}
+
+// 索引过程中的文件明细（/index-progress/files）
+export interface IndexFileEntry {
+  seq: number;
+  category: 'success' | 'failed' | 'skipped';
+  name: string;
+  path: string;
+  reason?: string;
+  skipped?: boolean;
+}
+
 // 索引目录配置类型
 export interface IndexConfig {
   indexedDirectories: string[];